@@ -3,13 +3,30 @@ Batch Processor cho FAZZYTOOL - Phiên bản tối ưu
 Xử lý hàng loạt prompt từ các file template với các tính năng nâng cao
 """
 
-import asyncio
+import dataclasses
+import hashlib
 import json
 import re
 import os
 from datetime import datetime
-from typing import List, Dict, Any
-import configparser
+from typing import Callable, List, Dict, Any, Optional
+
+from file_placement import atomic_write_json, atomic_write_bytes
+from output_paths import reserve_file
+from prompt_job import BatchJob, JobResult, JobStatus, MediaType, PromptJob, PromptType
+
+# Từ số kết quả này trở lên, báo cáo JSON ghi liền (không thụt lề) để giảm kích thước file
+COMPACT_REPORT_THRESHOLD = 1000
+
+# Credits ước tính của Pikaso (dùng cho tóm tắt, pre-flight và báo cáo)
+IMAGE_CREDITS = 10
+VIDEO_CREDITS = 25
+
+# Workflow chạy được với batch spec: mỗi prompt sinh ảnh, ảnh rồi video, hoặc video từ text
+SPEC_WORKFLOWS = ('image_only', 'image_then_video', 'video_text_to_video')
+
+# Checkpoint khi batch dừng vì hết credits (đọc lại bằng `batch --resume`)
+CHECKPOINT_FILE = os.path.join('output', 'batch_checkpoint.json')
 
 class BatchProcessor:
     def __init__(self):
@@ -24,6 +41,11 @@ class BatchProcessor:
             'wait_time': 3,
             'max_retries': 3,
             'max_concurrent': 2,
+            # Autoscale số browser song song trong [min_concurrent, max_concurrent] theo RAM/CPU
+            'min_concurrent': 1,
+            'browser_memory_mb': 400,
+            'memory_reserve_mb': 1024,
+            'max_cpu_load': 0.85,
             'delay_between_requests': 5,
             'browser': 'firefox',
             'headless': False,
@@ -31,7 +53,19 @@ class BatchProcessor:
             # Cấu hình mới cho image generation
             'default_num_images': 4,
             'default_download_count': 2,
-            'auto_filename_prefix': True
+            'auto_filename_prefix': True,
+            # Số lần sinh ảnh chạy chồng nhau trên cùng một page (1 = tắt pipeline)
+            'pipeline_depth': 1,
+            # Số PROMPT_IDEA được Gemini mở rộng trước, chạy trước browser worker (0 = mở rộng lúc cần)
+            'ai_prefetch_depth': 3,
+            # Chuyển thẳng ảnh vừa sinh sang video trong Pikaso (không download/upload lại)
+            'video_handoff': False,
+            # Biến thể "duration:ratio" sinh từ mỗi ảnh sau một lần upload (rỗng = một video mỗi ảnh)
+            'video_variants': [],
+            # Số credits tối đa một batch được tiêu (0 = chỉ giới hạn bởi số dư tài khoản)
+            'credit_budget': 0,
+            # Đọc lại số dư sau mỗi N job để đo credits thực tế (0 = chỉ đọc khi kết thúc)
+            'credit_check_every': 5
         }
         
         try:
@@ -59,7 +93,15 @@ class BatchProcessor:
                             elif key == 'max_retries':
                                 config['max_retries'] = int(value)
                             elif key == 'max_concurrent':
-                                config['max_concurrent'] = int(value)
+                                config['max_concurrent'] = max(1, int(value))
+                            elif key == 'min_concurrent':
+                                config['min_concurrent'] = max(1, int(value))
+                            elif key == 'browser_memory_mb':
+                                config['browser_memory_mb'] = max(1, int(value))
+                            elif key == 'memory_reserve_mb':
+                                config['memory_reserve_mb'] = max(0, int(value))
+                            elif key == 'max_cpu_load':
+                                config['max_cpu_load'] = float(value)
                             elif key == 'delay_between_requests':
                                 config['delay_between_requests'] = int(value)
                             elif key == 'browser':
@@ -74,6 +116,18 @@ class BatchProcessor:
                                 config['default_download_count'] = int(value)
                             elif key == 'auto_filename_prefix':
                                 config['auto_filename_prefix'] = value.lower() == 'true'
+                            elif key == 'pipeline_depth':
+                                config['pipeline_depth'] = max(1, int(value))
+                            elif key == 'ai_prefetch_depth':
+                                config['ai_prefetch_depth'] = max(0, int(value))
+                            elif key == 'video_handoff':
+                                config['video_handoff'] = value.lower() == 'true'
+                            elif key == 'video_variants':
+                                config['video_variants'] = [v.strip() for v in value.split(',') if v.strip()]
+                            elif key == 'credit_budget':
+                                config['credit_budget'] = max(0, int(value or 0))
+                            elif key == 'credit_check_every':
+                                config['credit_check_every'] = max(0, int(value or 0))
                         except ValueError as e:
                             print(f"Lỗi parse {key}={value}: {e}")
                             continue
@@ -114,7 +168,7 @@ class BatchProcessor:
             
         return cookies
         
-    def parse_prompts_from_template(self, file_path: str = 'prompts_template.txt') -> List[Dict]:
+    def parse_prompts_from_template(self, file_path: str = 'prompts_template.txt') -> List[PromptJob]:
         """Parse prompts từ template file với hỗ trợ cấu hình nâng cao"""
         prompts = []
         
@@ -131,30 +185,31 @@ class BatchProcessor:
             idea_matches = re.findall(idea_pattern, content, re.DOTALL)
             
             for i, idea in enumerate(idea_matches, 1):
-                prompts.append({
-                    'type': 'ai_idea',
-                    'content': idea.strip(),
-                    'use_ai': True,
-                    'prompt_id': f'ai_idea_{i:03d}',
-                    'num_images': self.config['default_num_images'],
-                    'download_count': self.config['default_download_count'],
-                    'filename_prefix': f'ai_idea_{i:03d}' if self.config['auto_filename_prefix'] else None
-                })
+                prompt_id = f'ai_idea_{i:03d}'
+                prompts.append(PromptJob(
+                    content=idea.strip(),
+                    prompt_id=prompt_id,
+                    kind=PromptType.AI_IDEA,
+                    use_ai=True,
+                    num_images=self.config['default_num_images'],
+                    download_count=self.config['default_download_count'],
+                    filename_prefix=prompt_id if self.config['auto_filename_prefix'] else None
+                ))
                 
             # Parse DETAILED_PROMPT (thủ công)
             detail_pattern = r'DETAILED_PROMPT_START\s*(.*?)\s*DETAILED_PROMPT_END'
             detail_matches = re.findall(detail_pattern, content, re.DOTALL)
             
             for i, detail in enumerate(detail_matches, 1):
-                prompts.append({
-                    'type': 'detailed',
-                    'content': detail.strip(),
-                    'use_ai': False,
-                    'prompt_id': f'detailed_{i:03d}',
-                    'num_images': self.config['default_num_images'],
-                    'download_count': self.config['default_download_count'],
-                    'filename_prefix': f'detailed_{i:03d}' if self.config['auto_filename_prefix'] else None
-                })
+                prompt_id = f'detailed_{i:03d}'
+                prompts.append(PromptJob(
+                    content=detail.strip(),
+                    prompt_id=prompt_id,
+                    kind=PromptType.DETAILED,
+                    num_images=self.config['default_num_images'],
+                    download_count=self.config['default_download_count'],
+                    filename_prefix=prompt_id if self.config['auto_filename_prefix'] else None
+                ))
                 
             # Parse JSON_PROMPTS với cấu hình nâng cao
             json_pattern = r'JSON_PROMPTS_START\s*(.*?)\s*JSON_PROMPTS_END'
@@ -164,19 +219,20 @@ class BatchProcessor:
                 try:
                     json_prompts = json.loads(json_content.strip())
                     for i, jp in enumerate(json_prompts, 1):
-                        prompt_item = {
-                            'type': 'json',
-                            'content': jp.get('prompt', ''),
-                            'style': jp.get('style', ''),
-                            'media_type': jp.get('type', 'image'),
-                            'use_ai': False,
-                            'prompt_id': f'json_{i:03d}',
+                        prompt_id = f'json_{i:03d}'
+                        prompts.append(PromptJob(
+                            content=jp.get('prompt', ''),
+                            prompt_id=prompt_id,
+                            kind=PromptType.JSON,
+                            media=MediaType.VIDEO if jp.get('type') == 'video' else MediaType.IMAGE,
+                            style=jp.get('style', ''),
                             # Hỗ trợ cấu hình nâng cao từ JSON
-                            'num_images': jp.get('num_images', self.config['default_num_images']),
-                            'download_count': jp.get('download_count', self.config['default_download_count']),
-                            'filename_prefix': jp.get('filename_prefix') or (f'json_{i:03d}' if self.config['auto_filename_prefix'] else None)
-                        }
-                        prompts.append(prompt_item)
+                            num_images=jp.get('num_images', self.config['default_num_images']),
+                            download_count=jp.get('download_count', self.config['default_download_count']),
+                            filename_prefix=jp.get('filename_prefix') or (prompt_id if self.config['auto_filename_prefix'] else None),
+                            duration=jp.get('duration', '5s'),
+                            ratio=jp.get('ratio', '1:1')
+                        ))
                 except json.JSONDecodeError as e:
                     print(f"Lỗi parse JSON prompt: {e}")
                     
@@ -198,11 +254,13 @@ class BatchProcessor:
         image_files.sort()
         return image_files
     
-    def create_batch_job(self) -> Dict[str, Any]:
+    def create_batch_job(self) -> BatchJob:
         """Tạo batch job từ các template với cấu hình nâng cao"""
         cookies = self.load_cookies_from_template()
         prompts = self.parse_prompts_from_template()
         available_images = self.get_available_images()
+        # Giữ danh sách đầy đủ theo thứ tự template: checkpoint ghi vị trí prompt trong danh sách này
+        self.prompts = prompts
         
         if not cookies:
             print("⚠️  Chưa có cookie! Vui lòng cập nhật cookie_template.txt")
@@ -215,39 +273,117 @@ class BatchProcessor:
             else:
                 print(f"❌ File không tồn tại")
         
-        # Phân loại prompts thành image và video với thông tin chi tiết
-        image_prompts = []
-        video_prompts = []
+        # BatchJob tự phân loại prompts thành image / video (chỉ tham chiếu, không sao chép)
+        batch_job = BatchJob(
+            prompts=prompts,
+            config=self.config,
+            cookies=cookies,
+            available_images=available_images
+        )
+        batch_job.workflow = self._determine_workflow(batch_job.image_prompts, batch_job.video_prompts, available_images)
+        
+        return batch_job
+    
+    def load_batch_spec(self, spec_file: str = 'batch_config.json') -> Optional[BatchJob]:
+        """
+        Tạo batch job từ batch spec JSON (batch_info / settings / prompts)
+        
+        settings ghi đè config: concurrent_jobs → max_concurrent, max_retries, delay_between_jobs →
+        delay_between_requests, default_num_images, default_download_count, auto_filename_prefix.
+        Prompt enabled=false bị bỏ qua; prompt "file" chỉ ghi lại đường dẫn, nội dung được đọc qua
+        PromptLoader khi job được cấp phát (xem batch_scheduler).
+        """
+        try:
+            with open(spec_file, 'r', encoding='utf-8') as f:
+                spec = json.load(f)
+        except Exception as e:
+            print(f"❌ Lỗi đọc batch spec {spec_file}: {e}")
+            return None
+        
+        settings = spec.get('settings', {})
+        config = dict(self.config)
+        try:
+            if 'concurrent_jobs' in settings:
+                config['max_concurrent'] = max(1, int(settings['concurrent_jobs']))
+                config['min_concurrent'] = min(config['min_concurrent'], config['max_concurrent'])
+            if 'max_retries' in settings:
+                config['max_retries'] = max(0, int(settings['max_retries']))
+            if 'delay_between_jobs' in settings:
+                config['delay_between_requests'] = max(0, int(settings['delay_between_jobs']))
+            for key in ('default_num_images', 'default_download_count'):
+                if key in settings:
+                    config[key] = int(settings[key])
+            if 'auto_filename_prefix' in settings:
+                config['auto_filename_prefix'] = bool(settings['auto_filename_prefix'])
+        except (TypeError, ValueError) as e:
+            print(f"❌ settings không hợp lệ trong {spec_file}: {e}")
+            return None
+        
+        workflow = settings.get('workflow', 'image_only')
+        if workflow not in SPEC_WORKFLOWS:
+            print(f"❌ Workflow '{workflow}' không hỗ trợ trong batch spec (dùng: {', '.join(SPEC_WORKFLOWS)})")
+            return None
+        media = MediaType.VIDEO if workflow == 'video_text_to_video' else MediaType.IMAGE
         
-        for prompt in prompts:
-            media_type = prompt.get('media_type', 'image')
-            if media_type == 'video':
-                video_prompts.append(prompt)
+        prompts = []
+        skipped = 0
+        for i, item in enumerate(spec.get('prompts', []), 1):
+            if not item.get('enabled', True):
+                skipped += 1
+                continue
+            
+            source = item.get('source') if item.get('type') == 'file' else None
+            content = item.get('content', {})
+            if isinstance(content, str):
+                content = {'prompt': content}
+            if not source and not (content.get('image_prompt') or content.get('prompt')):
+                print(f"⚠️ Bỏ qua prompt {i} trong {spec_file}: không có source / content")
+                continue
+            
+            prompt_id = item.get('id') or f'spec_{i:03d}'
+            priority = item.get('priority', 0)
+            try:
+                if isinstance(priority, bool) or (isinstance(priority, float) and not priority.is_integer()):
+                    raise ValueError(priority)
+                priority = int(priority)
+            except (TypeError, ValueError):
+                print(f"❌ priority không hợp lệ ở prompt {i} ({prompt_id}) trong {spec_file}: {priority!r} (cần số nguyên)")
+                return None
+            
+            options = dict(
+                prompt_id=prompt_id,
+                media=media,
+                num_images=item.get('num_images', config['default_num_images']),
+                download_count=item.get('download_count', config['default_download_count']),
+                filename_prefix=item.get('filename_prefix') or (prompt_id if config['auto_filename_prefix'] else None),
+                priority=priority
+            )
+            if source:
+                prompts.append(PromptJob(content='', kind=PromptType.FILE, source=source, **options))
             else:
-                image_prompts.append(prompt)
-        
-        # Tính toán thống kê
-        total_images_to_generate = sum(p.get('num_images', 4) for p in image_prompts)
-        total_images_to_download = sum(p.get('download_count', 2) for p in image_prompts)
-        
-        batch_job = {
-            'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
-            'config': self.config,
-            'cookies': cookies,
-            'prompts': prompts,
-            'image_prompts': image_prompts,
-            'video_prompts': video_prompts,
-            'available_images': available_images,
-            'total_items': len(prompts),
-            'total_images_to_generate': total_images_to_generate,
-            'total_images_to_download': total_images_to_download,
-            'workflow': self._determine_workflow(image_prompts, video_prompts, available_images),
-            'status': 'ready'
-        }
+                job = PromptJob.from_prompt_data(content, **options)
+                job.kind = PromptType.DETAILED
+                prompts.append(job)
         
-        return batch_job
+        if skipped:
+            print(f"⏭️ Bỏ qua {skipped} prompt enabled=false trong {spec_file}")
+        
+        # Checkpoint ghi vị trí prompt trong danh sách prompt đang bật của spec
+        self.prompts = prompts
+        cookies = self.load_cookies_from_template()
+        if not cookies:
+            print("⚠️  Chưa có cookie! Vui lòng cập nhật cookie_template.txt")
+        
+        return BatchJob(
+            prompts=prompts,
+            config=config,
+            cookies=cookies,
+            workflow=workflow,
+            spec_file=spec_file,
+            name=spec.get('batch_info', {}).get('name', '')
+        )
     
-    def _determine_workflow(self, image_prompts: List[Dict], video_prompts: List[Dict], available_images: List[str]) -> str:
+    def _determine_workflow(self, image_prompts: List[PromptJob], video_prompts: List[PromptJob], available_images: List[str]) -> str:
         """Xác định workflow dựa trên prompts và ảnh có sẵn"""
         
         if len(image_prompts) > 0 and len(video_prompts) > 0:
@@ -261,124 +397,117 @@ class BatchProcessor:
         else:
             return "unknown"
         
-    def save_batch_report(self, results: List[Dict], job_info: Dict):
-        """Lưu báo cáo batch với thông tin chi tiết hơn"""
-        timestamp = job_info['timestamp']
-        report_file = f"output/batch_report_{timestamp}.json"
+    def save_batch_report(self, results: List[JobResult], job_info: BatchJob, ledger=None):
+        """
+        Lưu báo cáo batch: mỗi prompt ghi một lần trong job_info, kết quả chỉ tham chiếu prompt_id
         
-        os.makedirs('output', exist_ok=True)
+        Args:
+            ledger: CreditLedger của batch (credits thực tế / ước tính theo từng job)
+        """
+        # Tên report không trùng kể cả khi nhiều batch kết thúc trong cùng một giây
+        report_file = reserve_file('output', 'batch_report', '.json')
         
         # Tính toán thống kê chi tiết
-        total_images_generated = sum(len(r.get('downloaded_files', [])) for r in results if r.get('type') == 'image')
-        total_videos_generated = len([r for r in results if r.get('type') == 'video' and r.get('status') == 'success'])
+        total_images_generated = sum(len(r.files) for r in results if r.media is MediaType.IMAGE)
+        total_videos_generated = sum(1 for r in results if r.media is MediaType.VIDEO and r.ok)
+        success = sum(1 for r in results if r.ok)
         
         report = {
-            'job_info': job_info,
-            'results': results,
+            'job_info': job_info.to_dict(),
+            'results': [r.to_dict() for r in results],
             'summary': {
                 'total_prompts': len(results),
-                'success': len([r for r in results if r.get('status') == 'success']),
-                'failed': len([r for r in results if r.get('status') == 'failed']),
+                'success': success,
+                'failed': sum(1 for r in results if r.status is JobStatus.FAILED),
+                'skipped': sum(1 for r in results if r.status is JobStatus.SKIPPED),
                 'total_images_generated': total_images_generated,
                 'total_videos_generated': total_videos_generated,
                 'completion_time': datetime.now().isoformat(),
-                'estimated_credits_used': total_images_generated * 10 + total_videos_generated * 25  # Ước tính
+                'estimated_credits_used': total_images_generated * IMAGE_CREDITS + total_videos_generated * VIDEO_CREDITS  # Ước tính
             },
+            'credits': ledger.to_dict() if ledger else None,
             'file_mapping': self._create_file_mapping(results)
         }
         
-        with open(report_file, 'w', encoding='utf-8') as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        if len(results) >= COMPACT_REPORT_THRESHOLD:
+            atomic_write_json(report_file, report, indent=None, separators=(',', ':'))
+        else:
+            atomic_write_json(report_file, report)
             
         print(f"📊 Báo cáo batch đã lưu: {report_file}")
         
-        # Tạo file CSV đơn giản để dễ xem
-        self._create_csv_report(results, job_info, timestamp)
+        # Tạo file CSV đơn giản để dễ xem (cùng tên với report JSON)
+        self._create_csv_report(results, job_info, os.path.splitext(report_file)[0] + '.csv')
         
-    def _create_file_mapping(self, results: List[Dict]) -> Dict:
-        """Tạo bản đồ file để dễ tracking"""
+    def _create_file_mapping(self, results: List[JobResult]) -> Dict:
+        """Tạo bản đồ prompt_id → file để dễ tracking"""
         mapping = {
             'images': {},
             'videos': {}
         }
         
         for result in results:
-            prompt_id = result.get('prompt_id', 'unknown')
-            if result.get('type') == 'image' and result.get('downloaded_files'):
-                mapping['images'][prompt_id] = {
-                    'prompt': result.get('prompt', '')[:50] + '...',
-                    'files': result['downloaded_files']
-                }
-            elif result.get('type') == 'video' and result.get('path'):
-                mapping['videos'][prompt_id] = {
-                    'prompt': result.get('prompt', '')[:50] + '...',
-                    'file': result['path']
-                }
+            if result.files:
+                group = mapping['images'] if result.media is MediaType.IMAGE else mapping['videos']
+                group.setdefault(result.job.prompt_id or 'unknown', []).extend(result.files)
         
         return mapping
     
-    def _create_csv_report(self, results: List[Dict], job_info: Dict, timestamp: str):
+    def _create_csv_report(self, results: List[JobResult], job_info: BatchJob, csv_file: str):
         """Tạo báo cáo CSV đơn giản"""
-        csv_file = f"output/batch_report_{timestamp}.csv"
-        
         try:
-            with open(csv_file, 'w', encoding='utf-8') as f:
-                # Header
-                f.write("Prompt ID,Type,Status,Prompt,Files Generated\n")
+            # Header
+            lines = ["Prompt ID,Type,Status,Prompt,Files Generated\n"]
+            
+            # Data
+            for result in results:
+                prompt_id = result.job.prompt_id or 'unknown'
+                prompt = result.job.content.replace(',', ';').replace('\n', ' ')[:100]
+                files_str = ';'.join(os.path.basename(f) for f in result.files)
                 
-                # Data
-                for result in results:
-                    prompt_id = result.get('prompt_id', 'unknown')
-                    prompt_type = result.get('type', 'unknown')
-                    status = result.get('status', 'unknown')
-                    prompt = result.get('prompt', '').replace(',', ';').replace('\n', ' ')[:100]
-                    
-                    files = []
-                    if prompt_type == 'image' and result.get('downloaded_files'):
-                        files = [os.path.basename(f) for f in result['downloaded_files']]
-                    elif prompt_type == 'video' and result.get('path'):
-                        files = [os.path.basename(result['path'])]
-                    
-                    files_str = ';'.join(files)
-                    
-                    f.write(f"{prompt_id},{prompt_type},{status},\"{prompt}\",\"{files_str}\"\n")
+                lines.append(f"{prompt_id},{result.media.value},{result.status.value},\"{prompt}\",\"{files_str}\"\n")
+            
+            atomic_write_bytes(csv_file, ''.join(lines).encode('utf-8'))
                     
             print(f"📈 Báo cáo CSV đã lưu: {csv_file}")
             
         except Exception as e:
             print(f"⚠️ Lỗi tạo CSV report: {e}")
         
-    def print_batch_summary(self, job: Dict[str, Any]):
+    def print_batch_summary(self, job: BatchJob):
         """In tóm tắt batch job với thông tin chi tiết hơn"""
         print("\n" + "="*60)
         print("🚀 BATCH JOB SUMMARY - PHIÊN BẢN TỐI ỬU")
         print("="*60)
-        print(f"📅 Thời gian: {job['timestamp']}")
-        print(f"🔧 Cấu hình: {job['config']['browser']} | Concurrent: {job['config']['max_concurrent']}")
-        print(f"🍪 Cookie: {'✅ Có' if job['cookies'] else '❌ Không'}")
-        print(f"📝 Tổng prompt: {job['total_items']}")
-        
-        if job['prompts']:
-            ai_prompts = len([p for p in job['prompts'] if p.get('use_ai')])
-            manual_prompts = job['total_items'] - ai_prompts
+        print(f"📅 Thời gian: {job.timestamp}")
+        if job.spec_file:
+            print(f"📄 Batch spec: {job.name or job.spec_file} ({job.spec_file}) | Retry: {job.config['max_retries']} lần")
+        print(f"🔧 Cấu hình: {job.config['browser']} | Concurrent: {job.config['min_concurrent']}-{job.config['max_concurrent']} (autoscale)")
+        print(f"🍪 Cookie: {'✅ Có' if job.cookies else '❌ Không'}")
+        print(f"📝 Tổng prompt: {job.total_items}")
+        
+        if job.prompts:
+            ai_prompts = sum(1 for p in job.prompts if p.use_ai)
+            manual_prompts = job.total_items - ai_prompts
             print(f"   ├─ AI tự động: {ai_prompts}")
             print(f"   └─ Thủ công: {manual_prompts}")
         
         # Hiển thị phân loại media với thông tin chi tiết
-        image_count = len(job.get('image_prompts', []))
-        video_count = len(job.get('video_prompts', []))
-        available_images = len(job.get('available_images', []))
+        image_count = len(job.image_prompts)
+        video_count = len(job.video_prompts)
+        available_images = len(job.available_images)
+        total_images_to_generate = job.total_images_to_generate
         
         print(f"🎨 Ảnh: {image_count} prompt")
         if image_count > 0:
-            print(f"   ├─ Tổng ảnh sẽ sinh: {job['total_images_to_generate']}")
-            print(f"   └─ Tổng ảnh sẽ tải: {job['total_images_to_download']}")
+            print(f"   ├─ Tổng ảnh sẽ sinh: {total_images_to_generate}")
+            print(f"   └─ Tổng ảnh sẽ tải: {job.total_images_to_download}")
         
         print(f"🎬 Video: {video_count} prompt")
         print(f"🖼️ Ảnh có sẵn: {available_images} file")
         
         # Hiển thị workflow
-        workflow = job.get('workflow', 'unknown')
+        workflow = job.workflow
         workflow_descriptions = {
             'image_then_video': '🔄 Tạo ảnh trước → Dùng ảnh tạo video',
             'image_only': '🎨 Chỉ tạo ảnh với cấu hình nâng cao',
@@ -392,8 +521,8 @@ class BatchProcessor:
         # Thông tin chi tiết cho từng workflow
         if workflow == 'image_only' and image_count > 0:
             print(f"   📸 Chi tiết cấu hình:")
-            for i, prompt in enumerate(job['image_prompts'][:3], 1):  # Chỉ hiển thị 3 prompt đầu
-                print(f"     {i}. {prompt['prompt_id']}: {prompt['num_images']} ảnh → tải {prompt['download_count']}")
+            for i, prompt in enumerate(job.image_prompts[:3], 1):  # Chỉ hiển thị 3 prompt đầu
+                print(f"     {i}. {prompt.prompt_id}: {prompt.num_images} ảnh → tải {prompt.download_count}")
             if image_count > 3:
                 print(f"     ... và {image_count - 3} prompt khác")
         
@@ -408,22 +537,24 @@ class BatchProcessor:
         
         print(f"⏱️ Thời gian ước tính: {estimated_time}")
         print(f"💰 Credits ước tính: {estimated_credits}")
+        if job.config.get('credit_budget'):
+            print(f"💳 Ngân sách credits: {job.config['credit_budget']}")
         
         print("="*60)
         
         # Kiểm tra các điều kiện cần thiết
         warnings = []
         
-        if not job['cookies']:
+        if not job.cookies:
             warnings.append("⚠️ Chưa có cookie Freepik! Cập nhật cookie_template.txt")
             
-        if not job['prompts']:
+        if not job.prompts:
             warnings.append("⚠️ Chưa có prompt! Cập nhật prompts_template.txt")
         
         if workflow == 'video_from_existing_images' and available_images == 0:
             warnings.append("⚠️ Có video prompt nhưng không có ảnh! Tạo ảnh trước hoặc upload ảnh vào output/")
         
-        if job['total_images_to_generate'] > 20:
+        if total_images_to_generate > 20:
             warnings.append("⚠️ Số lượng ảnh lớn có thể tiêu tốn nhiều credits Premium!")
             
         for warning in warnings:
@@ -434,11 +565,11 @@ class BatchProcessor:
         
         return len(critical_warnings) == 0  # True nếu không có critical warning
     
-    def _estimate_processing_time(self, job: Dict) -> str:
+    def _estimate_processing_time(self, job: BatchJob) -> str:
         """Ước tính thời gian xử lý"""
-        image_time = job['total_images_to_generate'] * 8  # 8s per image
-        video_time = len(job.get('video_prompts', [])) * 15  # 15s per video
-        delay_time = (job['total_items'] - 1) * job['config']['delay_between_requests']
+        image_time = job.total_images_to_generate * 8  # 8s per image
+        video_time = len(job.video_prompts) * 15  # 15s per video
+        delay_time = max(0, job.total_items - 1) * job.config['delay_between_requests']
         
         total_seconds = image_time + video_time + delay_time
         
@@ -451,10 +582,150 @@ class BatchProcessor:
             minutes = (total_seconds % 3600) // 60
             return f"~{hours} giờ {minutes} phút"
     
-    def _estimate_credits_usage(self, job: Dict) -> str:
+    def prompt_credits(self, prompt: PromptJob) -> int:
+        """Credits ước tính của một prompt (video nhân theo số biến thể video_variants)"""
+        if prompt.media is MediaType.IMAGE:
+            return prompt.num_images * IMAGE_CREDITS
+        return VIDEO_CREDITS * max(1, len(self.config.get('video_variants') or []))
+    
+    def credit_cost(self, job: BatchJob) -> Callable[[PromptJob], int]:
+        """Hàm credits ước tính của một prompt trong batch (prompt batch spec image_then_video gồm cả video)"""
+        if job.spec_file and job.workflow == 'image_then_video':
+            return lambda prompt: self.prompt_credits(prompt) + self.prompt_credits(prompt.as_video())
+        return self.prompt_credits
+    
+    def estimate_credits(self, job: BatchJob) -> int:
+        """Tổng credits ước tính của batch"""
+        cost = self.credit_cost(job)
+        return sum(cost(prompt) for prompt in job.prompts)
+    
+    def _budget_units(self, job: BatchJob) -> List[List[PromptJob]]:
+        """
+        Nhóm prompt chạy / bỏ cùng nhau: với image_then_video là cặp ảnh i + video i,
+        video thừa (nhiều video hơn ảnh) là nhóm riêng
+        """
+        if job.workflow == 'image_then_video':
+            images = job.image_prompts
+            units = [[images[i]] + ([job.video_prompts[i]] if i < len(job.video_prompts) else [])
+                     for i in range(len(images))]
+            return units + [[video] for video in job.video_prompts[len(images):]]
+        return [[prompt] for prompt in job.prompts]
+    
+    def order_for_budget(self, job: BatchJob) -> BatchJob:
+        """
+        Sắp xếp lại batch khi không đủ credits cho tất cả: nhóm rẻ chạy trước để số job
+        hoàn thành trước khi chạm giới hạn là nhiều nhất (cùng giá thì giữ thứ tự template)
+        
+        Video ghép với ảnh theo vị trí, nên các cặp ảnh + video vẫn đứng trước ảnh lẻ.
+        """
+        cost = self.credit_cost(job)
+        
+        def unit_cost(unit):
+            return sum(cost(p) for p in unit)
+        
+        units = self._budget_units(job)
+        paired = sorted((unit for unit in units if len(unit) > 1), key=unit_cost)
+        units = paired + sorted((unit for unit in units if len(unit) == 1), key=unit_cost)
+        return dataclasses.replace(job, prompts=[prompt for unit in units for prompt in unit])
+    
+    def _template_fingerprint(self) -> str:
+        digest = hashlib.sha1()
+        for prompt in self.prompts:
+            digest.update(f"{prompt.prompt_id}\x00{prompt.media.value}\x00{prompt.content}\x00".encode('utf-8'))
+            if prompt.source:
+                digest.update(f"{prompt.source}\x00".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def save_checkpoint(self, job: BatchJob, results: List[JobResult], ledger=None) -> Optional[str]:
+        """
+        Ghi các prompt chưa hoàn thành (lỗi hoặc bị bỏ qua) để chạy tiếp bằng `batch --resume`
+        
+        Prompt AI được ghi theo ý tưởng gốc trong template (Gemini mở rộng lại khi resume);
+        với image_then_video, video chưa xong thì ảnh cùng cặp cũng được chạy lại.
+        """
+        # Job (kể cả bản đã mở rộng AI) xong khi mọi kết quả của nó thành công
+        job_ok: Dict[int, bool] = {}
+        job_key: Dict[int, tuple] = {}
+        for result in results:
+            key = id(result.job)
+            job_ok[key] = job_ok.get(key, True) and result.ok
+            job_key[key] = (result.job.prompt_id, result.job.media)
+        done_counts: Dict[tuple, int] = {}
+        for key, ok in job_ok.items():
+            if ok:
+                done_counts[job_key[key]] = done_counts.get(job_key[key], 0) + 1
+        
+        done = set()
+        for prompt in job.prompts:
+            key = (prompt.prompt_id, prompt.media)
+            if done_counts.get(key, 0) > 0:
+                done_counts[key] -= 1
+                done.add(id(prompt))
+        
+        pending = set()
+        for unit in self._budget_units(job):
+            if any(id(prompt) not in done for prompt in unit):
+                pending.update(id(prompt) for prompt in unit)
+        if not pending:
+            self.clear_checkpoint()
+            return None
+        
+        positions = [i for i, prompt in enumerate(self.prompts) if id(prompt) in pending]
+        checkpoint = {
+            'created': datetime.now().isoformat(),
+            'batch_timestamp': job.timestamp,
+            'workflow': job.workflow,
+            'reason': ledger.stop_reason if ledger else None,
+            'template_prompts': len(self.prompts),
+            'template_fingerprint': self._template_fingerprint(),
+            'pending': positions,
+            'credits': {key: value for key, value in ledger.to_dict().items() if key != 'jobs'} if ledger else None
+        }
+        os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
+        atomic_write_json(CHECKPOINT_FILE, checkpoint)
+        print(f"💾 Checkpoint: {len(positions)} prompt chưa xong → {CHECKPOINT_FILE} (chạy tiếp: python main.py batch --resume)")
+        return CHECKPOINT_FILE
+    
+    def resume_batch_job(self, job: BatchJob) -> Optional[BatchJob]:
+        """Batch chỉ gồm các prompt còn lại trong checkpoint, None nếu không có / không khớp template"""
+        if not os.path.exists(CHECKPOINT_FILE):
+            print(f"⚠️ Không có checkpoint {CHECKPOINT_FILE}")
+            return None
+        try:
+            with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Lỗi đọc checkpoint: {e}")
+            return None
+        
+        if checkpoint.get('template_fingerprint') != self._template_fingerprint():
+            print(f"⚠️ {job.spec_file or 'prompts_template.txt'} đã thay đổi kể từ checkpoint, không thể chạy tiếp")
+            return None
+        
+        prompts = [self.prompts[i] for i in checkpoint.get('pending', []) if 0 <= i < len(self.prompts)]
+        resumed = dataclasses.replace(job, prompts=prompts)
+        if not job.spec_file:
+            # Batch spec giữ workflow khai báo trong file
+            resumed.workflow = self._determine_workflow(resumed.image_prompts, resumed.video_prompts, resumed.available_images)
+        print(f"▶️ Chạy tiếp batch {checkpoint.get('batch_timestamp')}: {resumed.total_items}/{len(self.prompts)} prompt còn lại"
+              + (f" (đã dừng vì {checkpoint['reason']})" if checkpoint.get('reason') else ""))
+        return resumed
+    
+    def clear_checkpoint(self) -> None:
+        if os.path.exists(CHECKPOINT_FILE):
+            try:
+                os.remove(CHECKPOINT_FILE)
+                print(f"🧹 Đã xóa checkpoint {CHECKPOINT_FILE}")
+            except OSError as e:
+                print(f"⚠️ Không xóa được checkpoint: {e}")
+    
+    def _estimate_credits_usage(self, job: BatchJob) -> str:
         """Ước tính số credits sử dụng"""
-        image_credits = job['total_images_to_generate'] * 10  # 10 credits per image
-        video_credits = len(job.get('video_prompts', [])) * 25  # 25 credits per video
+        image_credits = sum(self.prompt_credits(p) for p in job.image_prompts)
+        video_credits = sum(self.prompt_credits(p) for p in job.video_prompts)
+        if job.spec_file and job.workflow == 'image_then_video':
+            # Mỗi prompt của batch spec sinh thêm video từ ảnh của nó
+            video_credits += sum(self.prompt_credits(p.as_video()) for p in job.image_prompts)
         total_credits = image_credits + video_credits
         
-        return f"~{total_credits} credits ({image_credits} ảnh + {video_credits} video)" 
\ No newline at end of file
+        return f"~{total_credits} credits ({image_credits} ảnh + {video_credits} video)"
\ No newline at end of file
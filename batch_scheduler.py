@@ -0,0 +1,132 @@
+"""
+Hàng đợi ưu tiên cho batch spec (batch_config.json)
+
+Mỗi prompt của batch spec có priority (số nhỏ chạy trước, cùng priority theo thứ tự trong
+file). Scheduler lấy job theo heap; prompt dạng file chỉ được đọc qua PromptLoader lúc được
+cấp phát, nên batch hàng nghìn file không phải đọc hết trước khi chạy và file hỏng chỉ làm
+lỗi đúng job đó. Job thất bại được đưa lại hàng đợi (cùng priority) tối đa max_retries lần.
+
+Số job chạy song song do BrowserAutoscaler quyết định (max_concurrent = concurrent_jobs
+của batch spec), giống run_autoscaled.
+"""
+
+import dataclasses
+import heapq
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from prompt_job import PromptJob
+from resource_autoscaler import BrowserAutoscaler, DispatchStopped
+
+
+def load_job_source(job: PromptJob) -> PromptJob:
+    """Đọc prompt của job dạng file qua PromptLoader (job đã có nội dung thì trả về nguyên)"""
+    if job.loaded:
+        return job
+
+    from prompt_loader import PromptLoader
+    data = PromptLoader.load_prompt(job.source)
+    return dataclasses.replace(
+        job,
+        content=data.get('image_prompt') or data.get('prompt', ''),
+        video_prompt=data.get('video_prompt', ''),
+        duration=data.get('video_duration') or job.duration,
+        ratio=data.get('video_ratio') or job.ratio
+    )
+
+
+class PriorityScheduler:
+    """Heap (priority, thứ tự vào hàng) của các PromptJob chờ chạy"""
+
+    def __init__(self, jobs: Iterable[PromptJob] = (), max_retries: int = 0):
+        self.max_retries = max(0, max_retries)
+        self.retried = 0
+        self._heap: List[Tuple[int, int, int, PromptJob]] = []
+        self._counter = itertools.count()
+        for job in jobs:
+            self.push(job)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, job: PromptJob, attempt: int = 0) -> None:
+        heapq.heappush(self._heap, (job.priority, next(self._counter), attempt, job))
+
+    def pop(self) -> Tuple[PromptJob, int]:
+        """Job ưu tiên nhất cùng số lần đã thử (chưa đọc file prompt)"""
+        _, _, attempt, job = heapq.heappop(self._heap)
+        return job, attempt
+
+    def retry(self, job: PromptJob, attempt: int) -> bool:
+        """Đưa job lỗi lại hàng đợi nếu còn lượt thử; False = đã hết lượt"""
+        if attempt >= self.max_retries:
+            return False
+        self.retried += 1
+        print(f"🔁 Thử lại {job.prompt_id} (lần {attempt + 1}/{self.max_retries})")
+        self.push(job, attempt + 1)
+        return True
+
+    def drain(self) -> List[PromptJob]:
+        """Lấy hết các job còn chờ theo thứ tự ưu tiên"""
+        jobs = []
+        while self._heap:
+            jobs.append(self.pop()[0])
+        return jobs
+
+
+def run_prioritized(scheduler: PriorityScheduler, worker: Callable[[PromptJob], Any],
+                    autoscaler: BrowserAutoscaler, launch_delay: float = 0,
+                    failed: Optional[Callable[[Any], bool]] = None,
+                    should_stop: Optional[Callable[[], bool]] = None) -> List[Tuple[PromptJob, Any, Optional[Exception]]]:
+    """
+    Chạy worker(job) cho các job của scheduler theo priority với số slot do autoscaler quyết định
+
+    Args:
+        failed: Hàm kết quả → True nếu job cần thử lại (lỗi ném ra luôn được thử lại)
+        should_stop: Trả về True thì ngừng cấp phát job mới (vd. hết credits)
+
+    Returns:
+        List[(job đã đọc prompt, kết quả, lỗi)] theo thứ tự hoàn thành; job không được chạy có lỗi DispatchStopped
+    """
+    outcomes: List[Tuple[PromptJob, Any, Optional[Exception]]] = []
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=autoscaler.max_slots, thread_name_prefix="fazzy-spec") as pool:
+        while len(scheduler) or running:
+            if len(scheduler) and should_stop and should_stop():
+                for job in scheduler.drain():
+                    outcomes.append((job, None, DispatchStopped("Batch đã dừng trước khi chạy job này")))
+
+            while len(scheduler) and autoscaler.can_launch(len(running)):
+                job, attempt = scheduler.pop()
+                try:
+                    job = load_job_source(job)
+                except Exception as e:
+                    # File prompt hỏng / không tồn tại: thử lại cũng không khác
+                    print(f"⚠️ Không đọc được prompt {job.prompt_id} từ {job.source}: {e}")
+                    outcomes.append((job, None, e))
+                    continue
+                running[pool.submit(worker, job)] = (job, attempt)
+                # Giãn cách lần mở browser để không dồn request lên Freepik cùng lúc
+                if launch_delay and len(scheduler) and not (should_stop and should_stop()):
+                    time.sleep(launch_delay)
+
+            if not running:
+                continue
+            done, _ = wait(list(running), timeout=5, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, attempt = running.pop(future)
+                try:
+                    result, error = future.result(), None
+                except Exception as e:
+                    result, error = None, e
+                if isinstance(error, DispatchStopped):
+                    outcomes.append((job, None, error))
+                    continue
+                if (error is not None or (failed and failed(result))) and scheduler.retry(job, attempt):
+                    continue
+                outcomes.append((job, result, error))
+
+    return outcomes
@@ -5,15 +5,47 @@ Browser automation cho việc sinh ảnh từ Freepik AI
 import os
 import time
 import json
+import base64
+import threading
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable
 
 from playwright.sync_api import sync_playwright, Page
 
+from debug_artifacts import DebugRecorder
+from generator_presets import PresetEngine
+from file_placement import atomic_write_bytes, atomic_save_download
+from output_paths import reserve_file, release
+from launch_profiles import resolve_launch_profile, open_browser
+
 
 class FreepikImageGenerator:
     """Lớp xử lý việc sinh ảnh từ Freepik AI bằng browser automation."""
 
+    AI_GENERATOR_URL = "https://www.freepik.com/pikaso/ai-image-generator"
+    GENERATE_BUTTON_SELECTOR = "button[data-cy='generate-button'][data-tour='generate-button']"
+    # Các phần tử kết quả cần đánh dấu "đã thấy" trước mỗi lần sinh trên page warm
+    # Ô kết quả / khung chứa được theo dõi riêng cho từng lần sinh ở chế độ pipeline
+    PIPELINE_TILE_SELECTOR = (
+        "img[src*='generated'], img[alt*='Generated'], .result-image img, .generated-image img, "
+        "[data-testid*='result'] img, img[src*='blob:'], img[src*='freepik'], canvas"
+    )
+    PIPELINE_CONTAINER_SELECTOR = (
+        ".result-item, .generated-item, .image-result, [data-testid*='result-item'], .grid-item, "
+        ".result-image, .generated-image, [data-testid*='result']"
+    )
+    # Chuyển ảnh vừa sinh sang Image-to-Video ngay trong Pikaso
+    VIDEO_GENERATOR_PATH = "/pikaso/ai-video-generator"
+    HANDOFF_ACTION_TEXTS = ["Animate", "Create video", "Use for video", "Image to video"]
+    SEEN_MARK_SELECTOR = (
+        "img, canvas, svg, button, a[download], .download-btn, "
+        ".result-item, .generated-item, .image-result, .grid-item, .result-image, .generated-image, "
+        "[data-testid*='result'], [data-testid*='download'], [data-testid*='menu'], "
+        "[data-testid*='more'], [data-tour*='download']"
+    )
+    # Dialog chặn thao tác: sau khi xóa popup chỉ chờ tới khi không còn cái nào hiển thị
+    DIALOG_SELECTOR = "[role='dialog'], [role='alertdialog'], [aria-modal='true']"
+
     def __init__(self, headless: bool = True, output_dir: str = "output"):
         self.headless = headless
         self.output_dir = output_dir
@@ -27,6 +59,26 @@ class FreepikImageGenerator:
             "successful_downloads": 0,
             "failed_downloads": 0
         }
+        
+        # Trạng thái browser khi chạy ở chế độ warm (start/close)
+        self._playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self._applied_cookie_string = None
+        # Page warm đã qua một lần sinh thành công -> lần sau chỉ cần reset form
+        self._page_ready = False
+        self._prompt_selector = None
+        
+        # Debug artifact (tắt mặc định, bật bằng --debug hoặc debug_mode=true)
+        self.debug = DebugRecorder(output_dir=self.output_dir)
+        
+        # Model ảnh (image_model trong config, trống = mặc định của Pikaso), áp qua preset engine
+        self.presets = PresetEngine()
+        self.image_model = self._read_image_model()
+        
+        # Thread lưu trữ ảnh ở nền (chế độ handoff sang video)
+        self._archive_threads = []
 
     def parse_cookies(self, cookie_input: str):
         """
@@ -115,15 +167,142 @@ class FreepikImageGenerator:
         except Exception as e:
             print(f"Lỗi set cookies: {e}")
 
-    def _setup_browser(self) -> None:
-        """Thiết lập browser và context"""
-        # Setup trong method generate_image
-        pass
+    def _read_browser_config(self):
+        """Đọc loại browser và show_browser từ config_template.txt"""
+        # Mặc định Chrome để tránh lỗi
+        browser_type = "chrome"
+        config_show_browser = False
+        
+        try:
+            if os.path.exists('config_template.txt'):
+                with open('config_template.txt', 'r', encoding='utf-8') as f:
+                    content = f.read()
+                if 'browser=firefox' in content:
+                    browser_type = "firefox"
+                elif 'browser=chrome' in content:
+                    browser_type = "chrome"
+                
+                # Đọc show_browser setting
+                if 'show_browser=true' in content:
+                    config_show_browser = True
+                    print("⚙️ Config: show_browser=true - sử dụng visible mode")
+        except:
+            pass
+        
+        return browser_type, config_show_browser
+
+    def _read_image_model(self) -> str:
+        """Đọc image_model từ config_template.txt (vd: Flux Kontext Pro)"""
+        try:
+            if os.path.exists('config_template.txt'):
+                with open('config_template.txt', 'r', encoding='utf-8') as f:
+                    for line in f:
+                        line = line.split('#')[0].strip()
+                        if line.lower().startswith('image_model='):
+                            return line.split('=', 1)[1].strip()
+        except:
+            pass
+        return ""
+
+    def _image_settings(self) -> Dict[str, str]:
+        """Preset cho AI Image Generator (rỗng nếu không cấu hình model)"""
+        return {"model": self.image_model} if self.image_model else {}
+
+    def _launch_browser(self, p):
+        """
+        Khởi động browser và context theo cấu hình
+        
+        Args:
+            p: Playwright instance
+            
+        Returns:
+            Tuple (browser, context)
+        """
+        browser_type, config_show_browser = self._read_browser_config()
+        
+        # Ưu tiên config setting nếu không có parameter explicit
+        final_headless = self.headless and not config_show_browser
+        profile_name, profile = resolve_launch_profile(final_headless)
+        
+        print(f"🌐 Sử dụng browser: {browser_type}")
+        print(f"👁️ Chế độ: {'Visible' if not profile['headless'] else 'Headless'} (profile {profile_name})")
+        
+        # Browser server chung / profile lưu cache / khởi động mới theo cấu hình
+        browser, context = open_browser(
+            p, browser_type, profile, "image",
+            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/109.0"
+        )
+        
+        # Thiết lập timeout mặc định
+        context.set_default_timeout(30000)
+        self.debug.attach(context)
+        
+        return browser, context
+
+    @property
+    def is_warm(self) -> bool:
+        """True nếu browser đang được giữ mở giữa các lần sinh ảnh"""
+        return self._playwright is not None and self.page is not None
+
+    def start(self) -> None:
+        """
+        Khởi động browser và giữ mở (warm) cho nhiều lần generate_image liên tiếp.
+        Phải gọi close() khi dùng xong.
+        """
+        if self.is_warm:
+            return
+        
+        self._playwright = sync_playwright().start()
+        self.browser, self.context = self._launch_browser(self._playwright)
+        self.page = self.context.new_page()
+        print("🔥 Browser ảnh đã sẵn sàng (warm)")
+
+    def close(self) -> None:
+        """Đóng browser đã mở bằng start()"""
+        self.wait_for_archive()
+        self.debug.detach()
+        self.debug.flush()
+        try:
+            if self.browser:
+                self.browser.close()
+        except Exception as e:
+            print(f"⚠️ Lỗi đóng browser: {e}")
+        finally:
+            if self._playwright:
+                self._playwright.stop()
+            self._playwright = None
+            self.browser = None
+            self.context = None
+            self.page = None
+            self._applied_cookie_string = None
+            self._page_ready = False
 
-    def _close_browser(self) -> None:
-        """Đóng browser"""
-        # Cleanup trong method generate_image
-        pass
+    def prepare_generator_page(self, cookie_string: str = None) -> bool:
+        """
+        Khởi động browser (nếu chưa warm) và mở sẵn AI Image Generator tới ô nhập prompt
+        khi chưa có prompt (vd. Gemini đang sinh). Lần generate_image sau qua health probe
+        nên chỉ còn reset form và nhập prompt. Người gọi chịu trách nhiệm close().
+        
+        Returns:
+            True nếu page đã sẵn sàng nhận prompt
+        """
+        if not self.is_warm:
+            self.start()
+        page = self.page
+        
+        if self._probe_generator_page(page, cookie_string):
+            return True
+        
+        try:
+            self._open_generator_page(page, cookie_string)
+            self._prompt_selector = self._find_prompt_input(page)
+            self._page_ready = True
+            print("🔥 AI Image Generator đã mở sẵn, chờ prompt")
+            return True
+        except Exception as e:
+            print(f"⚠️ Chưa mở sẵn được AI Image Generator ({e}), sẽ mở lại khi có prompt")
+            self._page_ready = False
+            return False
         
     def _wait_and_click(self, selector: str, timeout: int = 10000) -> None:
         """Đợi element và click"""
@@ -173,11 +352,11 @@ class FreepikImageGenerator:
         Returns:
             Đường dẫn đến file ảnh đã tải, None nếu không thành công
         """
+        filepath = None
         try:
-            # Tạo timestamp để đảm bảo tên file unique
-            timestamp = int(time.time())
-            filename = f"{filename_prefix}_{image_index + 1:03d}_{timestamp}.png"
-            filepath = os.path.join(self.output_dir, filename)
+            # Giữ chỗ tên file unique (an toàn khi nhiều worker ghi chung output/)
+            filepath = reserve_file(self.output_dir, f"{filename_prefix}_{image_index + 1:03d}", ".png")
+            filename = os.path.basename(filepath)
             
             print(f"💾 Đang tải ảnh {image_index + 1}...")
             
@@ -199,7 +378,7 @@ class FreepikImageGenerator:
                 target_container = None
                 for container_selector in image_containers:
                     try:
-                        containers = self.page.query_selector_all(container_selector)
+                        containers = self.page.query_selector_all(self._fresh(container_selector))
                         if containers and len(containers) > image_index:
                             target_container = containers[image_index]
                             print(f"🔍 Tìm thấy container ảnh {image_index + 1}: {container_selector}")
@@ -256,7 +435,7 @@ class FreepikImageGenerator:
             for base_selector in base_download_selectors:
                 try:
                     # Tìm tất cả elements với base selector
-                    elements = self.page.query_selector_all(base_selector)
+                    elements = self.page.query_selector_all(self._fresh(base_selector))
                     print(f"🔍 Tìm thấy {len(elements)} download buttons với '{base_selector}'")
                     
                     # Chọn element theo index
@@ -273,7 +452,7 @@ class FreepikImageGenerator:
                         with self.page.expect_download() as download_info:
                             element.click(timeout=5000)
                         download = download_info.value
-                        download.save_as(filepath)
+                        atomic_save_download(download, filepath)
                         downloaded = True
                         print(f"✅ Đã tải ảnh qua nút download: {os.path.basename(filepath)}")
                         break
@@ -299,7 +478,7 @@ class FreepikImageGenerator:
                     img_element = None
                     for selector in img_selectors:
                         try:
-                            elements = self.page.query_selector_all(selector)
+                            elements = self.page.query_selector_all(self._fresh(selector))
                             if elements and len(elements) > image_index:
                                 img_element = elements[image_index]
                                 if img_element and img_element.is_visible():
@@ -378,7 +557,7 @@ class FreepikImageGenerator:
                                     if trigger_result:
                                         # Wait for download and save to correct location
                                         download = download_promise.value
-                                        download.save_as(filepath)
+                                        atomic_save_download(download, filepath)
                                         downloaded = True
                                         print(f"✅ Đã download qua Playwright: {filename}")
                                     
@@ -416,8 +595,7 @@ class FreepikImageGenerator:
                                             import base64
                                             image_data = base64.b64decode(base64_data)
                                             
-                                            with open(filepath, 'wb') as f:
-                                                f.write(image_data)
+                                            atomic_write_bytes(filepath, image_data)
                                             
                                             downloaded = True
                                             print(f"✅ Đã download qua Base64: {filename}")
@@ -455,7 +633,7 @@ class FreepikImageGenerator:
                     try:
                         # Tách selector và index
                         base_selector = selector.split(':nth(')[0]
-                        elements = self.page.query_selector_all(base_selector)
+                        elements = self.page.query_selector_all(self._fresh(base_selector))
                         
                         if elements and len(elements) > image_index:
                             element = elements[image_index]
@@ -472,7 +650,7 @@ class FreepikImageGenerator:
                             time.sleep(1)
                             
                             # Screenshot ảnh
-                            element.screenshot(path=filepath)
+                            atomic_write_bytes(filepath, element.screenshot())
                             downloaded = True
                             print(f"✅ Đã screenshot ảnh {image_index + 1}: {filepath}")
                             break
@@ -494,11 +672,11 @@ class FreepikImageGenerator:
                     for selector in result_area_selectors:
                         try:
                             base_selector = selector.split(':nth(')[0]
-                            elements = self.page.query_selector_all(base_selector)
+                            elements = self.page.query_selector_all(self._fresh(base_selector))
                             
                             if elements and len(elements) > image_index:
                                 element = elements[image_index]
-                                element.screenshot(path=filepath)
+                                atomic_write_bytes(filepath, element.screenshot())
                                 downloaded = True
                                 print(f"✅ Đã screenshot vùng kết quả {image_index + 1}: {filepath}")
                                 break
@@ -512,22 +690,20 @@ class FreepikImageGenerator:
                 self.generation_stats["successful_downloads"] += 1
                 return filepath
             else:
+                release(filepath)
                 self.generation_stats["failed_downloads"] += 1
                 print(f"❌ Không thể tải ảnh {image_index + 1}")
                 return None
                     
         except Exception as e:
             print(f"❌ Lỗi khi tải ảnh {image_index + 1}: {e}")
+            release(filepath)
             self.generation_stats["failed_downloads"] += 1
             return None
 
     def _download_image_fallback(self, image_index: int, filename_prefix: str = "freepik_image") -> Optional[str]:
         """Method dự phòng để tải ảnh khi method chính thất bại"""
         try:
-            timestamp = int(time.time())
-            filename = f"{filename_prefix}_{timestamp}_{image_index + 1}.png"
-            filepath = os.path.join(self.output_dir, filename)
-            
             print(f"🔧 Thử method dự phòng: screenshot toàn màn hình...")
             
             # Method 1: Screenshot toàn bộ viewport và crop
@@ -536,15 +712,11 @@ class FreepikImageGenerator:
                 self.page.evaluate("window.scrollTo(0, document.body.scrollHeight/2)")
                 time.sleep(2)
                 
-                # Take full page screenshot
-                full_screenshot = os.path.join(self.output_dir, f"temp_full_{timestamp}.png")
-                self.page.screenshot(path=full_screenshot, full_page=True)
-                
                 # This is a basic fallback - in reality you'd want to crop specific regions
-                # For now, just rename the file to indicate it's a fallback
-                fallback_filepath = os.path.join(self.output_dir, f"fallback_{filename}")
-                import shutil
-                shutil.move(full_screenshot, fallback_filepath)
+                # For now, just save the full page under a name that marks it as a fallback
+                screenshot = self.page.screenshot(full_page=True)
+                fallback_filepath = reserve_file(self.output_dir, f"fallback_{filename_prefix}_{image_index + 1}", ".png")
+                atomic_write_bytes(fallback_filepath, screenshot)
                 
                 print(f"✅ Fallback screenshot thành công: {os.path.basename(fallback_filepath)}")
                 return fallback_filepath
@@ -566,7 +738,9 @@ class FreepikImageGenerator:
                     try:
                         element = self.page.query_selector(selector)
                         if element and element.is_visible():
-                            element.screenshot(path=filepath)
+                            screenshot = element.screenshot()
+                            filepath = reserve_file(self.output_dir, f"{filename_prefix}_{image_index + 1}", ".png")
+                            atomic_write_bytes(filepath, screenshot)
                             print(f"✅ Fallback selector thành công: {selector}")
                             return filepath
                     except:
@@ -611,759 +785,1407 @@ class FreepikImageGenerator:
         print(f"🎨 Bắt đầu sinh {num_images} ảnh, tải về {download_count} ảnh")
         print(f"📝 Prompt: {prompt}")
         
-        downloaded_files = []
+        # Browser đã được giữ ấm bằng start() → dùng lại page hiện có
+        if self.is_warm:
+            return self._generate_on_page(self.page, prompt, cookie_string, num_images,
+                                          download_count, filename_prefix)
         
         with sync_playwright() as p:
-            # Đọc cấu hình browser từ config (mặc định Chrome để tránh lỗi)
-            browser_type = "chrome"
-            config_show_browser = False
+            browser, context = self._launch_browser(p)
+            page = context.new_page()
+            self.page = page  # Store for use in other methods
             
             try:
-                if os.path.exists('config_template.txt'):
-                    with open('config_template.txt', 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    if 'browser=firefox' in content:
-                        browser_type = "firefox"
-                    elif 'browser=chrome' in content:
-                        browser_type = "chrome"
-                    
-                    # Đọc show_browser setting
-                    if 'show_browser=true' in content:
-                        config_show_browser = True
-                        print("⚙️ Config: show_browser=true - sử dụng visible mode")
-            except:
-                pass
+                return self._generate_on_page(page, prompt, cookie_string, num_images,
+                                              download_count, filename_prefix)
+            finally:
+                self.debug.detach()
+                self.debug.flush()
+                browser.close()
+                self.page = None
+                self._applied_cookie_string = None
+                self._page_ready = False
+
+    def _generate_on_page(self, page: Page, prompt: str, cookie_string: Optional[str], num_images: int,
+                          download_count: int, filename_prefix: str) -> List[str]:
+        """
+        Chạy toàn bộ quy trình sinh + tải ảnh trên một page đã mở sẵn.
+        Page warm còn ở AI Image Generator và qua health probe thì chỉ reset form,
+        không điều hướng lại.
+        
+        Returns:
+            List[str]: Danh sách đường dẫn các file ảnh đã tải về
+        """
+        downloaded_files = []
+        self.page = page
+        self.debug.begin_job(prompt)
+        
+        try:
+            if self._probe_generator_page(page, cookie_string):
+                print("♻️ Dùng lại trang AI Image Generator đang mở, chỉ reset form")
+                self._reset_generator_form(page)
+                prompt_selector = self._prompt_selector
+            else:
+                self._page_ready = False
+                self._open_generator_page(page, cookie_string)
+                prompt_selector = self._find_prompt_input(page)
+            
+            self.debug.snapshot(page, "prompt_input_ready")
+            self._enter_prompt(page, prompt_selector, prompt)
+            self._apply_generator_settings(page)
+            self._click_generate(page)
+            self.debug.snapshot(page, "generate_clicked")
+            self._wait_for_results(page, num_images)
+            self.debug.snapshot(page, "results_ready")
+            downloaded_files = self._download_results(page, download_count, filename_prefix)
+            
+            # Page sẵn sàng cho prompt tiếp theo (chỉ có tác dụng khi browser warm)
+            self._prompt_selector = prompt_selector
+            self._page_ready = True
+            self.debug.end_job()
+            return downloaded_files
+                
+        except Exception as e:
+            print(f"❌ Lỗi khi sinh ảnh: {e}")
+            self._page_ready = False
+            self.debug.dump_failure(page, str(e))
+            return downloaded_files
+
+    def _probe_generator_page(self, page: Page, cookie_string: Optional[str]) -> bool:
+        """
+        Health probe cho page warm: còn ở AI Image Generator, ô prompt còn dùng được,
+        nút Generate còn đó và không bị đăng xuất.
+        
+        Returns:
+            True nếu có thể nhập prompt tiếp mà không cần điều hướng lại
+        """
+        if not self._page_ready or not self._prompt_selector:
+            return False
+        if cookie_string and cookie_string != self._applied_cookie_string:
+            return False
+        
+        try:
+            if self.AI_GENERATOR_URL not in page.url:
+                print(f"🩺 Page đã rời AI Image Generator ({page.url}), điều hướng lại")
+                return False
             
-            # Ưu tiên config setting nếu không có parameter explicit
-            final_headless = self.headless and not config_show_browser
+            element = page.query_selector(self._prompt_selector)
+            if not element or not element.is_visible() or not element.is_enabled():
+                print("🩺 Ô prompt không còn dùng được, điều hướng lại")
+                return False
             
-            print(f"🌐 Sử dụng browser: {browser_type}")
-            print(f"👁️ Chế độ: {'Visible' if not final_headless else 'Headless'}")
+            if page.query_selector("text=Log in") or page.query_selector("text=Sign up"):
+                print("🩺 Phát hiện yêu cầu đăng nhập, điều hướng lại")
+                return False
             
-            # Khởi động trình duyệt tùy theo cấu hình
-            if browser_type == "chrome":
-                browser = p.chromium.launch(
-                    headless=final_headless,
-                    args=[
-                        "--disable-blink-features=AutomationControlled",
-                        "--disable-extensions",
-                        "--no-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--disable-gpu",
-                        "--window-size=1920,1080"
-                    ]
-                )
-            else:  # firefox
-                browser = p.firefox.launch(
-                    headless=final_headless,
-                    args=["--no-sandbox", "--disable-dev-shm-usage"]
-                )
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/109.0",
-                viewport={"width": 1920, "height": 1080},
-                ignore_https_errors=True
-            )
+            if not (page.query_selector(self.GENERATE_BUTTON_SELECTOR)
+                    or page.query_selector("button:has-text('Generate')")):
+                print("🩺 Không thấy nút Generate, điều hướng lại")
+                return False
             
-            # Thiết lập timeout mặc định
-            context.set_default_timeout(30000)
+            return True
+        except Exception as e:
+            print(f"🩺 Health probe lỗi ({e}), điều hướng lại")
+            return False
+
+    def _reset_generator_form(self, page: Page) -> None:
+        """
+        Chuẩn bị page warm cho prompt mới: đánh dấu kết quả cũ để không bị đếm/tải lại,
+        xóa prompt cũ và dọn popup mới xuất hiện.
+        """
+        self._mark_previous_results(page)
+        self._clear_prompt(page)
+        self._dismiss_popups(page)
+        page.evaluate("window.scrollTo(0, 0)")
+
+    def _clear_prompt(self, page: Page) -> None:
+        """Xóa nội dung ô prompt đã cache selector"""
+        try:
+            page.evaluate("""
+            (selector) => {
+                const el = document.querySelector(selector);
+                if (!el) return;
+                if (el.value !== undefined) el.value = '';
+                if (el.contentEditable === 'true') el.textContent = '';
+                el.dispatchEvent(new Event('input', { bubbles: true }));
+                el.dispatchEvent(new Event('change', { bubbles: true }));
+            }
+            """, self._prompt_selector)
+        except Exception as e:
+            print(f"⚠️ Không thể xóa prompt cũ: {e}")
+
+    def _apply_generator_settings(self, page: Page) -> None:
+        """
+        Kiểm tra lại các thiết lập trước khi Generate: model ảnh đã cấu hình (một probe,
+        chỉ chọn lại qua UI khi cần). Popup đã được dọn một lần khi mở / reset form.
+        """
+        self.presets.ensure(page, "image", self._image_settings())
+
+    def _mark_previous_results(self, page: Page) -> None:
+        """Gắn data-fazzy-seen cho mọi kết quả hiện có để lần sinh sau chỉ xét kết quả mới"""
+        try:
+            page.evaluate("""
+            (selector) => {
+                window.__fazzySeen = window.__fazzySeen || new Set();
+                document.querySelectorAll(selector).forEach(el => {
+                    // Kết quả của lần sinh pipeline còn đang chạy thì không đánh dấu
+                    if (el.closest('[data-fazzy-gen]')) return;
+                    el.setAttribute('data-fazzy-seen', '1');
+                    const src = el.currentSrc || el.src;
+                    if (src) window.__fazzySeen.add(src);
+                });
+            }
+            """, self.SEEN_MARK_SELECTOR)
+        except Exception as e:
+            print(f"⚠️ Không thể đánh dấu kết quả cũ: {e}")
+
+    def _refresh_seen_marks(self, page: Page) -> None:
+        """Bỏ dấu seen khỏi các <img> được app tái sử dụng nhưng đã đổi sang src mới"""
+        try:
+            page.evaluate("""
+            () => {
+                const seen = window.__fazzySeen;
+                if (!seen) return;
+                document.querySelectorAll('img[data-fazzy-seen]').forEach(img => {
+                    if (!seen.has(img.currentSrc || img.src)) img.removeAttribute('data-fazzy-seen');
+                });
+            }
+            """)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _fresh(selector: str) -> str:
+        """Selector chỉ khớp kết quả của lần sinh hiện tại (chưa bị đánh dấu seen)"""
+        return f"{selector}:not([data-fazzy-seen])"
+
+    def _open_generator_page(self, page: Page, cookie_string: Optional[str]) -> None:
+        """Điều hướng tới AI Image Generator, thiết lập cookie và dọn popup"""
+
+        # Truy cập thẳng vào AI Image Generator trước
+        ai_generator_url = self.AI_GENERATOR_URL
+        print(f"🎯 Truy cập trực tiếp AI Image Generator: {ai_generator_url}")
+        
+        try:
+            self.presets.navigate(page, "image", ai_generator_url, self._image_settings(),
+                                  wait_until="domcontentloaded", timeout=30000)
+            time.sleep(2)  # Chờ trang load cơ bản
             
-            page = context.new_page()
-            self.page = page  # Store for use in other methods
+            print(f"✅ Đã truy cập: {page.url}")
             
-            try:
-                # Truy cập thẳng vào AI Image Generator trước
-                ai_generator_url = "https://www.freepik.com/pikaso/ai-image-generator"
-                print(f"🎯 Truy cập trực tiếp AI Image Generator: {ai_generator_url}")
-                
-                try:
-                    page.goto(ai_generator_url, wait_until="domcontentloaded", timeout=30000)
-                    time.sleep(2)  # Chờ trang load cơ bản
-                    
-                    print(f"✅ Đã truy cập: {page.url}")
-                    
-                except Exception as e:
-                    print(f"❌ Lỗi truy cập: {e}")
-                    # Fallback với URL đơn giản hơn
-                    fallback_url = "https://www.freepik.com/pikaso"
-                    print(f"🔄 Thử fallback: {fallback_url}")
-                    page.goto(fallback_url, wait_until="domcontentloaded", timeout=20000)
-                    time.sleep(2)
-                
-                # Thiết lập cookie sau khi đã vào trang
-                if cookie_string:
-                    cookies = self.parse_cookies(cookie_string)
-                    if cookies:
-                        print("🍪 Đang thiết lập cookie...")
-                        self.set_cookies(page, cookies)
-                        print("✓ Đã thiết lập cookie, reload trang...")
-                        
-                        # Reload để áp dụng cookie
-                        page.reload(wait_until="domcontentloaded")
-                        time.sleep(3)
-                        
-                        if page.query_selector("text=Log in") or page.query_selector("text=Sign up"):
-                            print("⚠️ Cookie có thể đã hết hạn hoặc không hợp lệ")
-                        else:
-                            print("✅ Đã đăng nhập thành công!")
+        except Exception as e:
+            print(f"❌ Lỗi truy cập: {e}")
+            # Fallback với URL đơn giản hơn
+            fallback_url = "https://www.freepik.com/pikaso"
+            print(f"🔄 Thử fallback: {fallback_url}")
+            page.goto(fallback_url, wait_until="domcontentloaded", timeout=20000)
+            time.sleep(2)
+        
+        # Thiết lập cookie sau khi đã vào trang (bỏ qua nếu context warm đã có cookie này)
+        if cookie_string and cookie_string != self._applied_cookie_string:
+            cookies = self.parse_cookies(cookie_string)
+            if cookies:
+                print("🍪 Đang thiết lập cookie...")
+                self.set_cookies(page, cookies)
+                self._applied_cookie_string = cookie_string
+                print("✓ Đã thiết lập cookie, reload trang...")
                 
-                # Kiểm tra trạng thái đăng nhập
+                # Reload để áp dụng cookie
+                page.reload(wait_until="domcontentloaded")
                 time.sleep(3)
                 
-                current_cookies = page.context.cookies()
-                has_auth_cookies = any(c['name'] in ['GR_TOKEN', 'GRID', 'UID'] for c in current_cookies)
-                
-                login_indicators = [
-                    "text=Sign in", "text=Log in", "text=Sign up for free",
-                    "text=Get started", "text=Create account"
-                ]
-                
-                has_login_prompt = False
-                for indicator in login_indicators:
-                    if page.query_selector(indicator):
-                        has_login_prompt = True
-                        break
-                
-                if has_auth_cookies and not has_login_prompt:
-                    print("✅ Đã đăng nhập Premium!")
-                elif has_auth_cookies:
-                    print("⚠️ Có cookie nhưng vẫn thấy prompt đăng nhập")
-                    page.reload(wait_until="networkidle")
-                    time.sleep(3)
+                if page.query_selector("text=Log in") or page.query_selector("text=Sign up"):
+                    print("⚠️ Cookie có thể đã hết hạn hoặc không hợp lệ")
                 else:
-                    print("ℹ️ Sử dụng free tier (chưa đăng nhập)")
-                
-                print("✅ Đã truy cập thành công vào AI Image Generator!")
-                
-                # Chờ trang load hoàn toàn trước khi tìm input
-                print("⏳ Chờ trang load hoàn toàn...")
-                time.sleep(5)  # Chờ 5 giây để đảm bảo trang load xong
-                
-                # Debug: Screenshot và URL hiện tại
-                print(f"🔍 Debug: Current URL: {page.url}")
-                page.screenshot(path=os.path.join(self.output_dir, "debug_main_tool_page.png"))
-                print(f"🔍 Debug: Screenshot saved to debug_main_tool_page.png")
-                
-                # Xử lý popup/modal có thể che mất input
-                print("🔍 Kiểm tra và xóa popup/modal...")
-                popup_selectors = [
-                    # Modal/overlay selectors
-                    ".modal", ".popup", ".overlay", ".dialog",
-                    "[role='dialog']", "[role='alertdialog']",
-                    ".cookie-banner", ".cookie-notice",
-                    ".notification", ".toast", ".alert",
-                    # Freepik specific
-                    ".onboarding", ".tutorial", ".intro",
-                    ".welcome", ".guide", ".tooltip",
-                    # Generic blocking elements
-                    "[data-testid*='modal']", "[data-testid*='popup']",
-                    "[aria-modal='true']", ".backdrop"
-                ]
-                
-                for popup_selector in popup_selectors:
-                    try:
-                        popup_elements = page.query_selector_all(popup_selector)
-                        for popup in popup_elements:
-                            if popup.is_visible():
-                                print(f"🗑️ Tìm thấy và xóa popup: {popup_selector}")
-                                popup.evaluate("element => element.remove()")
-                    except:
-                        continue
-                
-                # Thêm thời gian chờ sau khi xóa popup
-                time.sleep(2)
-                
-                # Kiểm tra xem có bị redirect không và force navigate nếu cần
-                current_url = page.url
-                target_url = "https://www.freepik.com/pikaso/ai-image-generator"
-                if target_url not in current_url:
-                    print(f"🔄 Bị redirect từ {target_url} đến {current_url}, force navigate...")
-                    try:
-                        page.goto(target_url, wait_until="domcontentloaded", timeout=15000)
-                        time.sleep(3)
-                        print(f"✅ Đã force navigate về: {page.url}")
-                    except Exception as e:
-                        print(f"⚠️ Lỗi force navigate: {e}")
-                
-                # Tìm và nhập prompt
-                print("🔍 Tìm ô nhập prompt...")
-                
-                potential_selectors = [
-                    # Selectors phù hợp với UI mới của Freepik 2024
-                    "[contenteditable='true']",  # Thường dùng cho prompt input
-                    "textarea[placeholder*='Describe']", "textarea[placeholder*='describe']", 
-                    "textarea[placeholder*='prompt']", "textarea[placeholder*='Prompt']",
-                    "textarea",  # Fallback textarea
-                    "[role='textbox']",  # Accessibility role
-                    "input[type='text']",  # Basic text input
-                    "textarea[data-testid*='prompt']", "textarea[data-testid*='input']",
-                    ".prompt-input", "#prompt", "#prompt-input", ".text-input", "[name='prompt']",
-                    
-                    # Selectors dành riêng cho Freepik Pikaso
-                    ".ai-prompt-input", ".generate-prompt-input", ".pikaso-prompt",
-                    "[data-cy*='prompt']", "[data-cy*='input']", "[data-cy*='text']",
-                    "[aria-label*='prompt']", "[aria-label*='Prompt']", "[aria-label*='describe']",
-                    "[class*='prompt'][class*='input']", "[class*='text'][class*='area']"
-                ]
-                
-                prompt_selector = None
-                for i, selector in enumerate(potential_selectors):
-                    print(f"  🔍 Thử selector {i+1}/{len(potential_selectors)}: {selector}")
-                    try:
-                        # Kiểm tra element có tồn tại không
-                        element = page.query_selector(selector)
-                        if element:
-                            print(f"    ✓ Element tồn tại")
-                            if element.is_visible():
-                                print(f"    ✓ Element visible")
-                                if element.is_enabled():
-                                    print(f"    ✓ Element enabled")
-                                    prompt_selector = selector
-                                    print(f"✅ Tìm thấy ô prompt: {selector}")
-                                    
-                                    # Debug thông tin về element
-                                    try:
-                                        element_info = page.evaluate("""
-                                        (selector) => {
-                                            try {
-                                                const el = document.querySelector(selector);
-                                                if (el) {
-                                                    return {
-                                                        tagName: el.tagName,
-                                                        contentEditable: el.contentEditable,
-                                                        placeholder: el.placeholder || '',
-                                                        value: el.value || '',
-                                                        textContent: el.textContent.substring(0, 50) || '',
-                                                        innerHTML: el.innerHTML.substring(0, 50) || '',
-                                                        visible: !el.hidden && el.offsetParent !== null,
-                                                        rect: el.getBoundingClientRect(),
-                                                        className: el.className
-                                                    };
-                                                }
-                                                return null;
-                                            } catch(e) {
-                                                return { error: e.toString() };
-                                            }
-                                        }
-                                        """, selector)
-                                        print(f"🔍 Element debug: {element_info}")
-                                    except Exception as e:
-                                        print(f"⚠️ Không thể debug element: {e}")
-                                    
-                                    break
-                                else:
-                                    print(f"    ❌ Element disabled")
-                            else:
-                                print(f"    ❌ Element not visible")
-                        else:
-                            print(f"    ❌ Element không tồn tại")
-                    except Exception as e:
-                        print(f"    ❌ Lỗi: {e}")
-                        continue
-                
-                if not prompt_selector:
-                    # Fallback: Scan tất cả input elements trên trang
-                    print("🔍 Fallback: Tìm tất cả input có thể trên trang...")
-                    try:
-                        all_inputs_info = page.evaluate("""
-                        (() => {
-                            const inputs = [];
-                            
-                            // Tìm tất cả input, textarea, contenteditable
-                            const allElements = [
-                                ...document.querySelectorAll('input'),
-                                ...document.querySelectorAll('textarea'),
-                                ...document.querySelectorAll('[contenteditable="true"]'),
-                                ...document.querySelectorAll('[role="textbox"]')
-                            ];
+                    print("✅ Đã đăng nhập thành công!")
+        
+        # Kiểm tra trạng thái đăng nhập
+        time.sleep(3)
+        
+        current_cookies = page.context.cookies()
+        has_auth_cookies = any(c['name'] in ['GR_TOKEN', 'GRID', 'UID'] for c in current_cookies)
+        
+        login_indicators = [
+            "text=Sign in", "text=Log in", "text=Sign up for free",
+            "text=Get started", "text=Create account"
+        ]
+        
+        has_login_prompt = False
+        for indicator in login_indicators:
+            if page.query_selector(indicator):
+                has_login_prompt = True
+                break
+        
+        if has_auth_cookies and not has_login_prompt:
+            print("✅ Đã đăng nhập Premium!")
+        elif has_auth_cookies:
+            print("⚠️ Có cookie nhưng vẫn thấy prompt đăng nhập")
+            page.reload(wait_until="networkidle")
+            time.sleep(3)
+        else:
+            print("ℹ️ Sử dụng free tier (chưa đăng nhập)")
+        
+        print("✅ Đã truy cập thành công vào AI Image Generator!")
+        
+        # Chờ trang load hoàn toàn trước khi tìm input
+        print("⏳ Chờ trang load hoàn toàn...")
+        time.sleep(5)  # Chờ 5 giây để đảm bảo trang load xong
+        
+        # Debug: URL hiện tại (screenshot chỉ khi bật debug, ghi file ở thread nền)
+        print(f"🔍 Debug: Current URL: {page.url}")
+        self.debug.snapshot(page, "main_tool_page")
+        self.debug.screenshot(page, "main_tool_page")
+        
+        self._dismiss_popups(page)
+        
+        # Kiểm tra xem có bị redirect không và force navigate nếu cần
+        current_url = page.url
+        target_url = self.AI_GENERATOR_URL
+        if target_url not in current_url:
+            print(f"🔄 Bị redirect từ {target_url} đến {current_url}, force navigate...")
+            try:
+                page.goto(target_url, wait_until="domcontentloaded", timeout=15000)
+                time.sleep(3)
+                print(f"✅ Đã force navigate về: {page.url}")
+            except Exception as e:
+                print(f"⚠️ Lỗi force navigate: {e}")
+
+    def _dismiss_popups(self, page: Page) -> None:
+        """Xóa popup/modal có thể che mất ô nhập prompt"""
+        # Xử lý popup/modal có thể che mất input
+        print("🔍 Kiểm tra và xóa popup/modal...")
+        popup_selectors = [
+            # Modal/overlay selectors
+            ".modal", ".popup", ".overlay", ".dialog",
+            "[role='dialog']", "[role='alertdialog']",
+            ".cookie-banner", ".cookie-notice",
+            ".notification", ".toast", ".alert",
+            # Freepik specific
+            ".onboarding", ".tutorial", ".intro",
+            ".welcome", ".guide", ".tooltip",
+            # Generic blocking elements
+            "[data-testid*='modal']", "[data-testid*='popup']",
+            "[aria-modal='true']", ".backdrop"
+        ]
+        
+        removed = 0
+        for popup_selector in popup_selectors:
+            try:
+                popup_elements = page.query_selector_all(popup_selector)
+                for popup in popup_elements:
+                    if popup.is_visible():
+                        print(f"🗑️ Tìm thấy và xóa popup: {popup_selector}")
+                        popup.evaluate("element => element.remove()")
+                        removed += 1
+            except:
+                continue
+        
+        # Chỉ chờ khi vừa xóa popup: tới lúc không còn dialog hiển thị (app có thể render lại)
+        if removed:
+            try:
+                page.wait_for_selector(self.DIALOG_SELECTOR, state="hidden", timeout=2000)
+            except Exception:
+                pass
+
+    def _find_prompt_input(self, page: Page) -> str:
+        """
+        Tìm selector của ô nhập prompt
+        
+        Returns:
+            str: Selector tìm được (raise nếu không tìm thấy)
+        """
+        # Tìm và nhập prompt
+        print("🔍 Tìm ô nhập prompt...")
+        
+        potential_selectors = [
+            # Selectors phù hợp với UI mới của Freepik 2024
+            "[contenteditable='true']",  # Thường dùng cho prompt input
+            "textarea[placeholder*='Describe']", "textarea[placeholder*='describe']", 
+            "textarea[placeholder*='prompt']", "textarea[placeholder*='Prompt']",
+            "textarea",  # Fallback textarea
+            "[role='textbox']",  # Accessibility role
+            "input[type='text']",  # Basic text input
+            "textarea[data-testid*='prompt']", "textarea[data-testid*='input']",
+            ".prompt-input", "#prompt", "#prompt-input", ".text-input", "[name='prompt']",
+            
+            # Selectors dành riêng cho Freepik Pikaso
+            ".ai-prompt-input", ".generate-prompt-input", ".pikaso-prompt",
+            "[data-cy*='prompt']", "[data-cy*='input']", "[data-cy*='text']",
+            "[aria-label*='prompt']", "[aria-label*='Prompt']", "[aria-label*='describe']",
+            "[class*='prompt'][class*='input']", "[class*='text'][class*='area']"
+        ]
+        
+        prompt_selector = None
+        for i, selector in enumerate(potential_selectors):
+            print(f"  🔍 Thử selector {i+1}/{len(potential_selectors)}: {selector}")
+            try:
+                # Kiểm tra element có tồn tại không
+                element = page.query_selector(selector)
+                if element:
+                    print(f"    ✓ Element tồn tại")
+                    if element.is_visible():
+                        print(f"    ✓ Element visible")
+                        if element.is_enabled():
+                            print(f"    ✓ Element enabled")
+                            prompt_selector = selector
+                            print(f"✅ Tìm thấy ô prompt: {selector}")
                             
-                            allElements.forEach((el, index) => {
-                                try {
-                                    if (el.offsetParent !== null && !el.disabled && !el.hidden) { // Visible and enabled
-                                        const rect = el.getBoundingClientRect();
-                                        if (rect.width > 0 && rect.height > 0) {
-                                            // Tạo selector đơn giản và an toàn
-                                            let simpleSelector = el.tagName.toLowerCase();
-                                            if (el.contentEditable === 'true') {
-                                                simpleSelector = '[contenteditable="true"]';
-                                            } else if (el.getAttribute('role') === 'textbox') {
-                                                simpleSelector = '[role="textbox"]';
-                                            } else if (el.type) {
-                                                simpleSelector += '[type="' + el.type + '"]';
-                                            }
-                                            
-                                            inputs.push({
-                                                selector: simpleSelector,
+                            # Debug thông tin về element
+                            try:
+                                element_info = page.evaluate("""
+                                (selector) => {
+                                    try {
+                                        const el = document.querySelector(selector);
+                                        if (el) {
+                                            return {
                                                 tagName: el.tagName,
-                                                type: el.type || '',
-                                                placeholder: el.placeholder || '',
-                                                value: (el.value || el.textContent || '').substring(0, 20),
-                                                className: el.className.substring(0, 50),
                                                 contentEditable: el.contentEditable,
-                                                width: rect.width,
-                                                height: rect.height,
-                                                x: rect.x,
-                                                y: rect.y,
-                                                visible: true
-                                            });
+                                                placeholder: el.placeholder || '',
+                                                value: el.value || '',
+                                                textContent: el.textContent.substring(0, 50) || '',
+                                                innerHTML: el.innerHTML.substring(0, 50) || '',
+                                                visible: !el.hidden && el.offsetParent !== null,
+                                                rect: el.getBoundingClientRect(),
+                                                className: el.className
+                                            };
                                         }
+                                        return null;
+                                    } catch(e) {
+                                        return { error: e.toString() };
                                     }
-                                } catch(e) {
-                                    // Skip element nếu có lỗi
                                 }
-                            });
-                            
-                            return inputs;
-                        })()
-                        """)
-                        
-                        print(f"🔍 Tìm thấy {len(all_inputs_info)} input elements:")
-                        for i, input_info in enumerate(all_inputs_info):
-                            print(f"  {i+1}. {input_info}")
-                        
-                        # Tìm input phù hợp nhất - thường là cái lớn nhất ở phía trên
-                        best_input = None
-                        best_score = 0
-                        
-                        for input_info in all_inputs_info:
-                            score = 0
-                            
-                            # Ưu tiên input lớn
-                            if input_info['width'] > 200 and input_info['height'] > 30:
-                                score += 3
-                            
-                            # Ưu tiên contenteditable
-                            if input_info['contentEditable'] == 'true':
-                                score += 2
-                            
-                            # Ưu tiên textarea
-                            if input_info['tagName'] == 'TEXTAREA':
-                                score += 2
-                            
-                            # Ưu tiên vị trí phía trên
-                            if input_info['y'] < 500:
-                                score += 1
-                            
-                            # Ưu tiên có placeholder phù hợp
-                            placeholder = input_info['placeholder'].lower()
-                            if any(word in placeholder for word in ['describe', 'prompt', 'text', 'enter']):
-                                score += 2
-                            
-                            print(f"  Input score: {score} - {input_info['tagName']} {input_info['className'][:20]}")
-                            
-                            if score > best_score:
-                                best_score = score
-                                best_input = input_info
-                        
-                        if best_input:
-                            # Tạo selector cho input tốt nhất
-                            if best_input['contentEditable'] == 'true':
-                                prompt_selector = "[contenteditable='true']"
-                            elif best_input['tagName'] == 'TEXTAREA':
-                                prompt_selector = "textarea"
-                            elif best_input['tagName'] == 'INPUT':
-                                prompt_selector = "input[type='text']"
-                            else:
-                                prompt_selector = "[role='textbox']"
+                                """, selector)
+                                print(f"🔍 Element debug: {element_info}")
+                            except Exception as e:
+                                print(f"⚠️ Không thể debug element: {e}")
                             
-                            print(f"✅ Chọn input tốt nhất: {prompt_selector} (score: {best_score})")
-                        
-                    except Exception as e:
-                        print(f"⚠️ Lỗi fallback scan: {e}")
-                
-                if not prompt_selector:
-                    # Screenshot để debug
-                    page.screenshot(path=os.path.join(self.output_dir, "debug_no_input_found.png"))
-                    raise Exception("Không tìm thấy ô nhập prompt sau tất cả các method")
-                
-                # Nhập prompt với nhiều phương pháp fallback
-                print("✍️ Đang nhập prompt...")
-                
-                # Thử nhiều cách nhập prompt với error handling tốt hơn
-                prompt_entered = False
-                
-                def method_1():
-                    """Method 1: Click và fill cơ bản"""
-                    page.click(prompt_selector, timeout=10000)
-                    time.sleep(0.5)
-                    page.fill(prompt_selector, prompt, timeout=10000)
-                
-                def method_2():
-                    """Method 2: Focus và clear trước"""
-                    page.focus(prompt_selector, timeout=5000)
-                    time.sleep(0.3)
-                    page.fill(prompt_selector, "", timeout=3000)  # Clear first
-                    time.sleep(0.2)
-                    page.fill(prompt_selector, prompt, timeout=10000)
-                
-                def method_3():
-                    """Method 3: JavaScript trực tiếp - safe với proper escaping"""
-                    # Escape both selector and prompt properly
-                    escaped_selector = prompt_selector.replace("'", "\\'").replace('"', '\\"')
-                    escaped_prompt = prompt.replace("'", "\\'").replace('"', '\\"').replace('\n', '\\n').replace('\r', '')
-                    js_code = f"""
-                    try {{
-                        const element = document.querySelector('{escaped_selector}');
-                        if (element) {{
-                            element.focus();
-                            if (element.value !== undefined) {{
-                                element.value = '{escaped_prompt}';
-                            }}
-                            if (element.textContent !== undefined) {{
-                                element.textContent = '{escaped_prompt}';
-                            }}
-                            element.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                            element.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                        }}
-                    }} catch(e) {{
-                        console.log('Method 3 error:', e);
-                    }}
-                    """
-                    page.evaluate(js_code)
-                
-                def method_4():
-                    """Method 4: Contenteditable specific - click, clear, type"""
-                    # Click vào element contenteditable
-                    page.click(prompt_selector, timeout=5000)
-                    time.sleep(0.5)
-                    
-                    # Chọn tất cả nội dung hiện tại và xóa
-                    page.keyboard.press("Control+A")
-                    time.sleep(0.2)
-                    page.keyboard.press("Backspace")
-                    time.sleep(0.5)
+                            break
+                        else:
+                            print(f"    ❌ Element disabled")
+                    else:
+                        print(f"    ❌ Element not visible")
+                else:
+                    print(f"    ❌ Element không tồn tại")
+            except Exception as e:
+                print(f"    ❌ Lỗi: {e}")
+                continue
+        
+        if not prompt_selector:
+            # Fallback: Scan tất cả input elements trên trang
+            print("🔍 Fallback: Tìm tất cả input có thể trên trang...")
+            try:
+                all_inputs_info = page.evaluate("""
+                (() => {
+                    const inputs = [];
                     
-                    # Type từ từ với delay để tránh mất ký tự
-                    page.keyboard.type(prompt, delay=50)
-                    time.sleep(0.5)
+                    // Tìm tất cả input, textarea, contenteditable
+                    const allElements = [
+                        ...document.querySelectorAll('input'),
+                        ...document.querySelectorAll('textarea'),
+                        ...document.querySelectorAll('[contenteditable="true"]'),
+                        ...document.querySelectorAll('[role="textbox"]')
+                    ];
                     
-                    # Press Enter hoặc Tab để trigger events
-                    page.keyboard.press("Tab")
-                    time.sleep(0.2)
-                
-                def method_5():
-                    """Method 5: Force value với multiple events - safely escaped"""
-                    try:
-                        # Sử dụng page.evaluate với arguments thay vì string formatting
-                        page.evaluate("""
-                        (args) => {
-                            try {
-                                const element = document.querySelector(args.selector);
-                                if (element) {
-                                    // Clear first
-                                    if (element.value !== undefined) {
-                                        element.value = '';
-                                    }
-                                    if (element.textContent !== undefined) {
-                                        element.textContent = '';
-                                    }
-                                    
-                                    // Set value
-                                    if (element.value !== undefined) {
-                                        element.value = args.prompt;
+                    allElements.forEach((el, index) => {
+                        try {
+                            if (el.offsetParent !== null && !el.disabled && !el.hidden) { // Visible and enabled
+                                const rect = el.getBoundingClientRect();
+                                if (rect.width > 0 && rect.height > 0) {
+                                    // Tạo selector đơn giản và an toàn
+                                    let simpleSelector = el.tagName.toLowerCase();
+                                    if (el.contentEditable === 'true') {
+                                        simpleSelector = '[contenteditable="true"]';
+                                    } else if (el.getAttribute('role') === 'textbox') {
+                                        simpleSelector = '[role="textbox"]';
+                                    } else if (el.type) {
+                                        simpleSelector += '[type="' + el.type + '"]';
                                     }
                                     
-                                    // For contenteditable
-                                    if (element.contentEditable === 'true') {
-                                        element.textContent = args.prompt;
-                                        element.innerHTML = args.prompt;
-                                    }
-                                    
-                                    // Trigger events
-                                    const events = ['focus', 'input', 'change', 'keyup', 'blur'];
-                                    events.forEach(eventType => {
-                                        const event = new Event(eventType, { bubbles: true });
-                                        element.dispatchEvent(event);
+                                    inputs.push({
+                                        selector: simpleSelector,
+                                        tagName: el.tagName,
+                                        type: el.type || '',
+                                        placeholder: el.placeholder || '',
+                                        value: (el.value || el.textContent || '').substring(0, 20),
+                                        className: el.className.substring(0, 50),
+                                        contentEditable: el.contentEditable,
+                                        width: rect.width,
+                                        height: rect.height,
+                                        x: rect.x,
+                                        y: rect.y,
+                                        visible: true
                                     });
                                 }
-                            } catch(e) {
-                                console.log('Method 5 error:', e);
                             }
+                        } catch(e) {
+                            // Skip element nếu có lỗi
                         }
-                        """, {"selector": prompt_selector, "prompt": prompt})
-                    except Exception as e:
-                        print(f"Method 5 JavaScript error: {e}")
+                    });
+                    
+                    return inputs;
+                })()
+                """)
                 
-                # ƯU TIÊN METHOD 3 (JavaScript) theo yêu cầu user
-                methods = [method_3, method_5, method_1, method_2, method_4]
+                print(f"🔍 Tìm thấy {len(all_inputs_info)} input elements:")
+                for i, input_info in enumerate(all_inputs_info):
+                    print(f"  {i+1}. {input_info}")
                 
-                for i, method in enumerate(methods):
-                    try:
-                        print(f"  🔄 Thử phương pháp {i+1}...")
-                        method()
-                        
-                        # Chờ lâu hơn để DOM update
-                        time.sleep(2)
-                        
-                        # Kiểm tra xem đã nhập thành công chưa - với nhiều cách
-                        current_value = ""
-                        
-                        # Cách 1: input_value (cho input/textarea)
-                        try:
-                            current_value = page.input_value(prompt_selector)
-                            if current_value:
-                                print(f"  📝 Phát hiện qua input_value: '{current_value[:30]}...'")
-                        except:
-                            pass
-                        
-                        # Cách 2: JavaScript get content (cho contenteditable)
-                        if not current_value:
-                            try:
-                                current_value = page.evaluate("""
-                                (selector) => {
-                                    try {
-                                        const el = document.querySelector(selector);
-                                        if (el) {
-                                            const content = el.textContent || el.innerText || el.value || '';
-                                            return content.trim();
-                                        }
-                                        return '';
-                                    } catch(e) {
-                                        return '';
-                                    }
-                                }
-                                """, prompt_selector)
-                                if current_value:
-                                    print(f"  📝 Phát hiện qua JavaScript: '{current_value[:30]}...'")
-                            except Exception as e:
-                                print(f"  ⚠️ Lỗi JavaScript check: {e}")
-                        
-                        # Cách 3: Check visual - nếu có text xuất hiện trên trang
-                        if not current_value:
-                            try:
-                                # Tìm text prompt trong page content
-                                if prompt[:10] in page.content():
-                                    current_value = prompt  # Assume success
-                                    print(f"  📝 Phát hiện qua page content search")
-                            except:
-                                pass
-                        
-                        # Đánh giá kết quả
-                        prompt_words = prompt.lower().split()[:3]  # 3 từ đầu
-                        current_words = current_value.lower().split()[:3] if current_value else []
-                        
-                        # Thành công nếu có ít nhất 2/3 từ đầu khớp hoặc length > 5
-                        success = False
-                        if current_value and len(current_value.strip()) > 5:
-                            if len(set(prompt_words) & set(current_words)) >= 2:
-                                success = True
-                            elif len(current_value.strip()) >= len(prompt) * 0.7:  # 70% length
-                                success = True
-                        
-                        if success:
-                            print(f"  ✅ THÀNH CÔNG với phương pháp {i+1}! Content: '{current_value[:50]}...'")
-                            prompt_entered = True
-                            break
-                        else:
-                            print(f"  ⚠️ Phương pháp {i+1} chưa đủ: '{current_value[:30]}...' (len={len(current_value) if current_value else 0})")
-                            
-                    except Exception as e:
-                        print(f"  ❌ Phương pháp {i+1} lỗi: {e}")
-                        continue
+                # Tìm input phù hợp nhất - thường là cái lớn nhất ở phía trên
+                best_input = None
+                best_score = 0
                 
-                if not prompt_entered:
-                    print("❌ Không thể nhập prompt bằng bất kỳ phương pháp nào")
-                    # Screenshot để debug
-                    page.screenshot(path=os.path.join(self.output_dir, "debug_prompt_error.png"))
-                    raise Exception("Không thể nhập prompt vào ô input")
+                for input_info in all_inputs_info:
+                    score = 0
+                    
+                    # Ưu tiên input lớn
+                    if input_info['width'] > 200 and input_info['height'] > 30:
+                        score += 3
+                    
+                    # Ưu tiên contenteditable
+                    if input_info['contentEditable'] == 'true':
+                        score += 2
+                    
+                    # Ưu tiên textarea
+                    if input_info['tagName'] == 'TEXTAREA':
+                        score += 2
+                    
+                    # Ưu tiên vị trí phía trên
+                    if input_info['y'] < 500:
+                        score += 1
+                    
+                    # Ưu tiên có placeholder phù hợp
+                    placeholder = input_info['placeholder'].lower()
+                    if any(word in placeholder for word in ['describe', 'prompt', 'text', 'enter']):
+                        score += 2
+                    
+                    print(f"  Input score: {score} - {input_info['tagName']} {input_info['className'][:20]}")
+                    
+                    if score > best_score:
+                        best_score = score
+                        best_input = input_info
                 
-                print(f"✅ Đã nhập prompt thành công")
+                if best_input:
+                    # Tạo selector cho input tốt nhất
+                    if best_input['contentEditable'] == 'true':
+                        prompt_selector = "[contenteditable='true']"
+                    elif best_input['tagName'] == 'TEXTAREA':
+                        prompt_selector = "textarea"
+                    elif best_input['tagName'] == 'INPUT':
+                        prompt_selector = "input[type='text']"
+                    else:
+                        prompt_selector = "[role='textbox']"
+                    
+                    print(f"✅ Chọn input tốt nhất: {prompt_selector} (score: {best_score})")
                 
-                # TRỰC TIẾP TÌM VÀ CLICK NÚT GENERATE (theo yêu cầu user)
-                print("🎯 Nhấn trực tiếp vào nút Generate...")
+            except Exception as e:
+                print(f"⚠️ Lỗi fallback scan: {e}")
+        
+        if not prompt_selector:
+            self.debug.snapshot(page, "no_input_found")
+            raise Exception("Không tìm thấy ô nhập prompt sau tất cả các method")
+        
+        return prompt_selector
+
+    def _enter_prompt(self, page: Page, prompt_selector: str, prompt: str) -> None:
+        """Nhập prompt với nhiều phương pháp fallback (raise nếu tất cả thất bại)"""
+        # Nhập prompt với nhiều phương pháp fallback
+        print("✍️ Đang nhập prompt...")
+        
+        # Thử nhiều cách nhập prompt với error handling tốt hơn
+        prompt_entered = False
+        
+        def method_1():
+            """Method 1: Click và fill cơ bản"""
+            page.click(prompt_selector, timeout=10000)
+            time.sleep(0.5)
+            page.fill(prompt_selector, prompt, timeout=10000)
+        
+        def method_2():
+            """Method 2: Focus và clear trước"""
+            page.focus(prompt_selector, timeout=5000)
+            time.sleep(0.3)
+            page.fill(prompt_selector, "", timeout=3000)  # Clear first
+            time.sleep(0.2)
+            page.fill(prompt_selector, prompt, timeout=10000)
+        
+        def method_3():
+            """Method 3: JavaScript trực tiếp - safe với proper escaping"""
+            # Escape both selector and prompt properly
+            escaped_selector = prompt_selector.replace("'", "\\'").replace('"', '\\"')
+            escaped_prompt = prompt.replace("'", "\\'").replace('"', '\\"').replace('\n', '\\n').replace('\r', '')
+            js_code = f"""
+            try {{
+                const element = document.querySelector('{escaped_selector}');
+                if (element) {{
+                    element.focus();
+                    if (element.value !== undefined) {{
+                        element.value = '{escaped_prompt}';
+                    }}
+                    if (element.textContent !== undefined) {{
+                        element.textContent = '{escaped_prompt}';
+                    }}
+                    element.dispatchEvent(new Event('input', {{ bubbles: true }}));
+                    element.dispatchEvent(new Event('change', {{ bubbles: true }}));
+                }}
+            }} catch(e) {{
+                console.log('Method 3 error:', e);
+            }}
+            """
+            page.evaluate(js_code)
+        
+        def method_4():
+            """Method 4: Contenteditable specific - click, clear, type"""
+            # Click vào element contenteditable
+            page.click(prompt_selector, timeout=5000)
+            time.sleep(0.5)
+            
+            # Chọn tất cả nội dung hiện tại và xóa
+            page.keyboard.press("Control+A")
+            time.sleep(0.2)
+            page.keyboard.press("Backspace")
+            time.sleep(0.5)
+            
+            # Type từ từ với delay để tránh mất ký tự
+            page.keyboard.type(prompt, delay=50)
+            time.sleep(0.5)
+            
+            # Press Enter hoặc Tab để trigger events
+            page.keyboard.press("Tab")
+            time.sleep(0.2)
+        
+        def method_5():
+            """Method 5: Force value với multiple events - safely escaped"""
+            try:
+                # Sử dụng page.evaluate với arguments thay vì string formatting
+                page.evaluate("""
+                (args) => {
+                    try {
+                        const element = document.querySelector(args.selector);
+                        if (element) {
+                            // Clear first
+                            if (element.value !== undefined) {
+                                element.value = '';
+                            }
+                            if (element.textContent !== undefined) {
+                                element.textContent = '';
+                            }
+                            
+                            // Set value
+                            if (element.value !== undefined) {
+                                element.value = args.prompt;
+                            }
+                            
+                            // For contenteditable
+                            if (element.contentEditable === 'true') {
+                                element.textContent = args.prompt;
+                                element.innerHTML = args.prompt;
+                            }
+                            
+                            // Trigger events
+                            const events = ['focus', 'input', 'change', 'keyup', 'blur'];
+                            events.forEach(eventType => {
+                                const event = new Event(eventType, { bubbles: true });
+                                element.dispatchEvent(event);
+                            });
+                        }
+                    } catch(e) {
+                        console.log('Method 5 error:', e);
+                    }
+                }
+                """, {"selector": prompt_selector, "prompt": prompt})
+            except Exception as e:
+                print(f"Method 5 JavaScript error: {e}")
+        
+        # ƯU TIÊN METHOD 3 (JavaScript) theo yêu cầu user
+        methods = [method_3, method_5, method_1, method_2, method_4]
+        
+        for i, method in enumerate(methods):
+            try:
+                print(f"  🔄 Thử phương pháp {i+1}...")
+                method()
                 
-                # Selector đúng từ user (không sử dụng gì khác)
-                selector = "button[data-cy='generate-button'][data-tour='generate-button']"
+                # Chờ lâu hơn để DOM update
+                time.sleep(2)
+                
+                # Kiểm tra xem đã nhập thành công chưa - với nhiều cách
+                current_value = ""
                 
+                # Cách 1: input_value (cho input/textarea)
                 try:
-                    generate_button = page.query_selector(selector)
-                    if generate_button and generate_button.is_visible():
-                        generate_button.click()
-                        print("✅ Đã click nút Generate")
-                    else:
-                        # Fallback đơn giản
-                        page.click("button:has-text('Generate')")
-                        print("✅ Đã click nút Generate (fallback)")
-                except Exception as e:
-                    print(f"❌ Lỗi click Generate: {e}")
-                    raise Exception("Không thể click nút Generate")
+                    current_value = page.input_value(prompt_selector)
+                    if current_value:
+                        print(f"  📝 Phát hiện qua input_value: '{current_value[:30]}...'")
+                except:
+                    pass
                 
-                # Chờ ảnh được sinh ra
-                print("⏳ Đang chờ ảnh được sinh ra...")
+                # Cách 2: JavaScript get content (cho contenteditable)
+                if not current_value:
+                    try:
+                        current_value = page.evaluate("""
+                        (selector) => {
+                            try {
+                                const el = document.querySelector(selector);
+                                if (el) {
+                                    const content = el.textContent || el.innerText || el.value || '';
+                                    return content.trim();
+                                }
+                                return '';
+                            } catch(e) {
+                                return '';
+                            }
+                        }
+                        """, prompt_selector)
+                        if current_value:
+                            print(f"  📝 Phát hiện qua JavaScript: '{current_value[:30]}...'")
+                    except Exception as e:
+                        print(f"  ⚠️ Lỗi JavaScript check: {e}")
                 
-                # Đợi kết quả trong 120 giây (tăng thời gian chờ cho nhiều ảnh)
-                result_found = False
-                for i in range(120):
+                # Cách 3: Check visual - nếu có text xuất hiện trên trang
+                if not current_value:
                     try:
-                        # Kiểm tra các thông báo lỗi chi tiết hơn
-                        error_messages = [
-                            "text=Sign up", "text=Credits required", "text=Credit", 
-                            "text=Subscribe", "text=Upgrade", "text=Premium",
-                            "text=Limit reached", "text=Daily limit", "text=Free limit"
-                        ]
-                        
-                        found_error = False
-                        error_type = ""
-                        
-                        for error_msg in error_messages:
-                            if page.query_selector(error_msg):
-                                found_error = True
-                                error_type = error_msg
-                                break
-                        
-                        if found_error:
-                            print(f"⚠️ Phát hiện thông báo: {error_type}")
-                            
-                            # Kiểm tra thêm context để xác định chính xác
-                            page_content = page.content().lower()
-                            
-                            # Debug: In ra một phần content để hiểu
-                            debug_content = page_content[max(0, page_content.find("credit")-50):page_content.find("credit")+100] if "credit" in page_content else ""
-                            if debug_content:
-                                print(f"🔍 Debug content: ...{debug_content}...")
-                            
-                            if "credit" in page_content and ("required" in page_content or "needed" in page_content):
-                                print("❌ Xác nhận: Hết credits")
-                                break
-                            elif "sign up" in page_content or "log in" in page_content:
-                                print("❌ Xác nhận: Cần đăng nhập")
-                                break
-                            else:
-                                print("⚠️ Thông báo không rõ ràng, tiếp tục chờ...")
-                                # Screenshot để debug
-                                if i == 10:  # Screenshot sau 10 giây
-                                    page.screenshot(path=os.path.join(self.output_dir, f"debug_generation_{i}s.png"))
-                                    print(f"📸 Đã chụp screenshot debug tại {i}s")
-                                # Không break, tiếp tục chờ
-                        
-                        # Tìm ảnh kết quả - tìm tất cả ảnh
-                        result_selectors = [
-                            "img[src*='generated']", "img[alt*='Generated']", 
-                            ".result-image img", ".generated-image", "[data-testid*='result'] img",
-                            "img[src*='blob:']", "canvas"
-                        ]
-                        
-                        found_images = 0
-                        for selector in result_selectors:
-                            try:
-                                elements = page.query_selector_all(selector)
-                                visible_elements = [e for e in elements if e.is_visible()]
-                                found_images = max(found_images, len(visible_elements))
-                            except:
-                                continue
-                        
-                        if found_images >= num_images:
-                            print(f"✅ Đã sinh ra {found_images} ảnh!")
-                            result_found = True
-                            break
-                        elif found_images > 0:
-                            print(f"⏳ Đã có {found_images}/{num_images} ảnh... ({i+1}/120s)")
-                            
-                        time.sleep(1)
-                        
+                        # Tìm text prompt trong page content
+                        if prompt[:10] in page.content():
+                            current_value = prompt  # Assume success
+                            print(f"  📝 Phát hiện qua page content search")
                     except:
-                        time.sleep(1)
+                        pass
+                
+                # Đánh giá kết quả
+                prompt_words = prompt.lower().split()[:3]  # 3 từ đầu
+                current_words = current_value.lower().split()[:3] if current_value else []
+                
+                # Thành công nếu có ít nhất 2/3 từ đầu khớp hoặc length > 5
+                success = False
+                if current_value and len(current_value.strip()) > 5:
+                    if len(set(prompt_words) & set(current_words)) >= 2:
+                        success = True
+                    elif len(current_value.strip()) >= len(prompt) * 0.7:  # 70% length
+                        success = True
+                
+                if success:
+                    print(f"  ✅ THÀNH CÔNG với phương pháp {i+1}! Content: '{current_value[:50]}...'")
+                    prompt_entered = True
+                    break
+                else:
+                    print(f"  ⚠️ Phương pháp {i+1} chưa đủ: '{current_value[:30]}...' (len={len(current_value) if current_value else 0})")
+                    
+            except Exception as e:
+                print(f"  ❌ Phương pháp {i+1} lỗi: {e}")
+                continue
+        
+        if not prompt_entered:
+            print("❌ Không thể nhập prompt bằng bất kỳ phương pháp nào")
+            self.debug.snapshot(page, "prompt_error")
+            raise Exception("Không thể nhập prompt vào ô input")
+        
+        print(f"✅ Đã nhập prompt thành công")
+
+    def _click_generate(self, page: Page) -> None:
+        """Click nút Generate"""
+        # TRỰC TIẾP TÌM VÀ CLICK NÚT GENERATE (theo yêu cầu user)
+        print("🎯 Nhấn trực tiếp vào nút Generate...")
+        
+        # Selector đúng từ user (không sử dụng gì khác)
+        selector = self.GENERATE_BUTTON_SELECTOR
+        
+        try:
+            generate_button = page.query_selector(selector)
+            if generate_button and generate_button.is_visible():
+                generate_button.click()
+                print("✅ Đã click nút Generate")
+            else:
+                # Fallback đơn giản
+                page.click("button:has-text('Generate')")
+                print("✅ Đã click nút Generate (fallback)")
+        except Exception as e:
+            print(f"❌ Lỗi click Generate: {e}")
+            raise Exception("Không thể click nút Generate")
+
+    def _wait_for_results(self, page: Page, num_images: int) -> bool:
+        """
+        Chờ đủ num_images ảnh mới xuất hiện
+        
+        Returns:
+            True nếu đủ ảnh trước khi hết giờ (raise nếu hết credits / cần đăng nhập)
+        """
+        # Chờ ảnh được sinh ra
+        print("⏳ Đang chờ ảnh được sinh ra...")
+        
+        # Đợi kết quả trong 120 giây (tăng thời gian chờ cho nhiều ảnh)
+        result_found = False
+        for i in range(120):
+            try:
+                # Kiểm tra các thông báo lỗi chi tiết hơn
+                error_messages = [
+                    "text=Sign up", "text=Credits required", "text=Credit", 
+                    "text=Subscribe", "text=Upgrade", "text=Premium",
+                    "text=Limit reached", "text=Daily limit", "text=Free limit"
+                ]
+                
+                found_error = False
+                error_type = ""
                 
-                if not result_found:
-                    # Kiểm tra lại lý do timeout chi tiết
+                for error_msg in error_messages:
+                    if page.query_selector(error_msg):
+                        found_error = True
+                        error_type = error_msg
+                        break
+                
+                if found_error:
+                    print(f"⚠️ Phát hiện thông báo: {error_type}")
+                    
+                    # Kiểm tra thêm context để xác định chính xác
                     page_content = page.content().lower()
                     
-                    if page.query_selector("text=Sign up") or "sign up" in page_content:
-                        raise Exception("Free tier yêu cầu đăng ký - cần tài khoản Premium")
-                    elif "credit" in page_content and ("required" in page_content or "needed" in page_content or "insufficient" in page_content):
-                        raise Exception("Hết credits - cần tài khoản Premium")
-                    elif page.query_selector("text=Error") or "error" in page_content:
-                        print("⚠️ Có lỗi xảy ra, thử tải ảnh có sẵn...")
+                    # Debug: In ra một phần content để hiểu
+                    debug_content = page_content[max(0, page_content.find("credit")-50):page_content.find("credit")+100] if "credit" in page_content else ""
+                    if debug_content:
+                        print(f"🔍 Debug content: ...{debug_content}...")
+                    
+                    if "credit" in page_content and ("required" in page_content or "needed" in page_content):
+                        print("❌ Xác nhận: Hết credits")
+                        break
+                    elif "sign up" in page_content or "log in" in page_content:
+                        print("❌ Xác nhận: Cần đăng nhập")
+                        break
                     else:
-                        print("⚠️ Timeout nhưng thử tải ảnh có sẵn...")
-                
-                # Tải ảnh về theo thứ tự với retry logic
-                print(f"💾 Đang tải {download_count} ảnh về theo thứ tự...")
+                        print("⚠️ Thông báo không rõ ràng, tiếp tục chờ...")
+                        # Snapshot để debug (screenshot chỉ khi bật debug)
+                        if i == 10:
+                            self.debug.snapshot(page, f"generation_{i}s")
+                            self.debug.screenshot(page, f"generation_{i}s")
+                        # Không break, tiếp tục chờ
                 
-                # Đầu tiên kiểm tra có bao nhiêu ảnh thực tế có sẵn
-                print("🔍 Kiểm tra số ảnh có sẵn trên trang...")
-                available_images = 0
+                # Tìm ảnh kết quả - chỉ đếm ảnh của lần sinh này (bỏ qua ảnh đã đánh dấu seen)
+                self._refresh_seen_marks(page)
                 result_selectors = [
                     "img[src*='generated']", "img[alt*='Generated']", 
-                    ".result-image img", ".generated-image img", "[data-testid*='result'] img",
-                    "img[src*='blob:']", "img[src*='freepik']", "canvas"
+                    ".result-image img", ".generated-image", "[data-testid*='result'] img",
+                    "img[src*='blob:']", "canvas"
                 ]
                 
+                found_images = 0
                 for selector in result_selectors:
                     try:
-                        elements = page.query_selector_all(selector)
+                        elements = page.query_selector_all(self._fresh(selector))
                         visible_elements = [e for e in elements if e.is_visible()]
-                        available_images = max(available_images, len(visible_elements))
+                        found_images = max(found_images, len(visible_elements))
                     except:
                         continue
                 
-                print(f"📊 Phát hiện {available_images} ảnh có sẵn trên trang")
-                actual_download_count = min(download_count, available_images)
-                
-                if actual_download_count < download_count:
-                    print(f"⚠️ Chỉ có thể tải {actual_download_count}/{download_count} ảnh")
-                
-                # Tải từng ảnh với retry và tránh xung đột
-                for i in range(actual_download_count):
-                    print(f"\n📥 Tải ảnh {i+1}/{actual_download_count}...")
+                if found_images >= num_images:
+                    print(f"✅ Đã sinh ra {found_images} ảnh!")
+                    result_found = True
+                    break
+                elif found_images > 0:
+                    print(f"⏳ Đã có {found_images}/{num_images} ảnh... ({i+1}/120s)")
                     
-                    # Scroll lên top để reset vị trí trang, tránh click nhầm
-                    page.evaluate("window.scrollTo(0, 0)")
-                    time.sleep(1)
-                    
-                    # Scroll đến vùng kết quả để thấy ảnh cần tải
-                    page.evaluate("window.scrollTo(0, document.body.scrollHeight * 0.6)")
-                    time.sleep(1)
-                    
-                    # Thử tải với retry logic
-                    max_retries = 3
-                    filepath = None
-                    
-                    for retry in range(max_retries):
-                        if retry > 0:
-                            print(f"🔄 Thử lại lần {retry + 1}/{max_retries}...")
-                            time.sleep(3)  # Chờ lâu hơn khi retry
-                    
-                        filepath = self._download_single_image(
-                            image_index=i, 
-                            filename_prefix=filename_prefix
-                        )
-                        
-                        if filepath:
-                            break  # Thành công thì thoát khỏi retry loop
-                        
-                    if filepath:
-                        downloaded_files.append(filepath)
-                        print(f"✅ Thành công: {os.path.basename(filepath)}")
-                    else:
-                        print(f"❌ Thất bại tải ảnh {i+1} sau {max_retries} lần thử")
-                        
-                        # Thử các cách khác nếu download thất bại
-                        print(f"🔧 Thử method dự phòng cho ảnh {i+1}...")
-                        fallback_filepath = self._download_image_fallback(i, filename_prefix)
-                        if fallback_filepath:
-                            downloaded_files.append(fallback_filepath)
-                            print(f"✅ Dự phòng thành công: {os.path.basename(fallback_filepath)}")
-                    
-                    # Delay dài hơn giữa các lần tải để tránh xung đột
-                    if i < actual_download_count - 1:
-                        print(f"⏳ Chờ {3} giây trước khi tải ảnh tiếp theo...")
-                        time.sleep(3)
-                
-                self.generation_stats["total_generated"] += len(downloaded_files)
+                time.sleep(1)
                 
-                # Tóm tắt kết quả
-                print(f"\n🎯 TỔNG KẾT:")
-                print(f"✅ Đã tải thành công: {len(downloaded_files)}/{download_count}")
-                print(f"📁 Thư mục lưu: {self.output_dir}/")
+            except:
+                time.sleep(1)
+        
+        if not result_found:
+            # Kiểm tra lại lý do timeout chi tiết
+            page_content = page.content().lower()
+            
+            if page.query_selector("text=Sign up") or "sign up" in page_content:
+                raise Exception("Free tier yêu cầu đăng ký - cần tài khoản Premium")
+            elif "credit" in page_content and ("required" in page_content or "needed" in page_content or "insufficient" in page_content):
+                raise Exception("Hết credits - cần tài khoản Premium")
+            elif page.query_selector("text=Error") or "error" in page_content:
+                print("⚠️ Có lỗi xảy ra, thử tải ảnh có sẵn...")
+            else:
+                print("⚠️ Timeout nhưng thử tải ảnh có sẵn...")
+        
+        return result_found
+
+    def _download_results(self, page: Page, download_count: int, filename_prefix: str) -> List[str]:
+        """
+        Tải các ảnh mới sinh về theo thứ tự
+        
+        Returns:
+            List[str]: Danh sách đường dẫn các file ảnh đã tải về
+        """
+        downloaded_files = []
+        
+        # Tải ảnh về theo thứ tự với retry logic
+        print(f"💾 Đang tải {download_count} ảnh về theo thứ tự...")
+        
+        # Đầu tiên kiểm tra có bao nhiêu ảnh thực tế có sẵn
+        print("🔍 Kiểm tra số ảnh có sẵn trên trang...")
+        self._refresh_seen_marks(page)
+        available_images = 0
+        result_selectors = [
+            "img[src*='generated']", "img[alt*='Generated']", 
+            ".result-image img", ".generated-image img", "[data-testid*='result'] img",
+            "img[src*='blob:']", "img[src*='freepik']", "canvas"
+        ]
+        
+        for selector in result_selectors:
+            try:
+                elements = page.query_selector_all(self._fresh(selector))
+                visible_elements = [e for e in elements if e.is_visible()]
+                available_images = max(available_images, len(visible_elements))
+            except:
+                continue
+        
+        print(f"📊 Phát hiện {available_images} ảnh có sẵn trên trang")
+        actual_download_count = min(download_count, available_images)
+        
+        if actual_download_count < download_count:
+            print(f"⚠️ Chỉ có thể tải {actual_download_count}/{download_count} ảnh")
+        
+        # Tải từng ảnh với retry và tránh xung đột
+        for i in range(actual_download_count):
+            print(f"\n📥 Tải ảnh {i+1}/{actual_download_count}...")
+            
+            # Scroll lên top để reset vị trí trang, tránh click nhầm
+            page.evaluate("window.scrollTo(0, 0)")
+            time.sleep(1)
+            
+            # Scroll đến vùng kết quả để thấy ảnh cần tải
+            page.evaluate("window.scrollTo(0, document.body.scrollHeight * 0.6)")
+            time.sleep(1)
+            
+            # Thử tải với retry logic
+            max_retries = 3
+            filepath = None
+            
+            for retry in range(max_retries):
+                if retry > 0:
+                    print(f"🔄 Thử lại lần {retry + 1}/{max_retries}...")
+                    time.sleep(3)  # Chờ lâu hơn khi retry
+            
+                filepath = self._download_single_image(
+                    image_index=i, 
+                    filename_prefix=filename_prefix
+                )
                 
-                for i, filepath in enumerate(downloaded_files, 1):
-                    print(f"  {i}. {os.path.basename(filepath)}")
+                if filepath:
+                    break  # Thành công thì thoát khỏi retry loop
                 
-                return downloaded_files
-                    
-            except Exception as e:
-                print(f"❌ Lỗi khi sinh ảnh: {e}")
-                return downloaded_files
+            if filepath:
+                downloaded_files.append(filepath)
+                print(f"✅ Thành công: {os.path.basename(filepath)}")
+            else:
+                print(f"❌ Thất bại tải ảnh {i+1} sau {max_retries} lần thử")
                 
+                # Thử các cách khác nếu download thất bại
+                print(f"🔧 Thử method dự phòng cho ảnh {i+1}...")
+                fallback_filepath = self._download_image_fallback(i, filename_prefix)
+                if fallback_filepath:
+                    downloaded_files.append(fallback_filepath)
+                    print(f"✅ Dự phòng thành công: {os.path.basename(fallback_filepath)}")
+            
+            # Delay dài hơn giữa các lần tải để tránh xung đột
+            if i < actual_download_count - 1:
+                print(f"⏳ Chờ {3} giây trước khi tải ảnh tiếp theo...")
+                time.sleep(3)
+        
+        self.generation_stats["total_generated"] += len(downloaded_files)
+        
+        # Tóm tắt kết quả
+        print(f"\n🎯 TỔNG KẾT:")
+        print(f"✅ Đã tải thành công: {len(downloaded_files)}/{download_count}")
+        print(f"📁 Thư mục lưu: {self.output_dir}/")
+        
+        for i, filepath in enumerate(downloaded_files, 1):
+            print(f"  {i}. {os.path.basename(filepath)}")
+        
+        return downloaded_files
+
+    def generate_images_pipelined(self, prompt_items: Iterable[Dict[str, Any]], cookie_string: str = None,
+                                  max_in_flight: int = 2, total: Optional[int] = None) -> List[List[str]]:
+        """
+        Sinh ảnh cho nhiều prompt trên cùng một page theo kiểu pipeline: prompt k+1 được gửi
+        ngay khi lần sinh của prompt k đã bắt đầu. Ảnh của mỗi lần sinh được theo dõi riêng
+        theo thứ tự gửi và được tải về ngay khi xong, không cần thêm browser.
+
+        Args:
+            prompt_items: Các dict prompt giống batch ('content', 'num_images',
+                          'download_count', 'filename_prefix'); có thể là generator,
+                          mỗi prompt chỉ được lấy khi tới lượt gửi
+            cookie_string: Cookie để đăng nhập (string hoặc JSON)
+            max_in_flight: Số lần sinh tối đa đang chạy cùng lúc trên page
+            total: Số prompt dự kiến (chỉ để hiển thị khi prompt_items là generator)
+
+        Returns:
+            List[List[str]]: File đã tải của từng prompt đã lấy, cùng thứ tự với prompt_items
+        """
+        generations = []
+        max_in_flight = max(1, max_in_flight)
+        if total is None and isinstance(prompt_items, (list, tuple)):
+            total = len(prompt_items)
+
+        print(f"🚀 Pipeline {total if total is not None else '?'} prompt, "
+              f"tối đa {max_in_flight} lần sinh cùng lúc trên một page")
+
+        if self.is_warm:
+            self._pipeline_on_page(self.page, prompt_items, generations, cookie_string, max_in_flight, total)
+            return [g['files'] for g in generations]
+
+        with sync_playwright() as p:
+            browser, context = self._launch_browser(p)
+            page = context.new_page()
+            self.page = page
+
+            try:
+                self._pipeline_on_page(page, prompt_items, generations, cookie_string, max_in_flight, total)
+                return [g['files'] for g in generations]
             finally:
-                browser.close() 
\ No newline at end of file
+                self.debug.detach()
+                self.debug.flush()
+                browser.close()
+                self.page = None
+                self._applied_cookie_string = None
+                self._page_ready = False
+
+    def _pipeline_on_page(self, page: Page, prompt_items: Iterable[Dict[str, Any]], generations: List[Dict[str, Any]],
+                          cookie_string: Optional[str], max_in_flight: int, total: Optional[int] = None) -> None:
+        """Gửi lần lượt các prompt (thêm vào generations khi lấy ra), tải ảnh của lần sinh nào xong trước trong lúc chờ"""
+        self.page = page
+        in_flight = []
+        of_total = f"/{total}" if total is not None else ""
+        self.debug.begin_job(f"pipeline {total if total is not None else '?'} prompt")
+
+        try:
+            if self._probe_generator_page(page, cookie_string):
+                print("♻️ Dùng lại trang AI Image Generator đang mở")
+                prompt_selector = self._prompt_selector
+            else:
+                self._page_ready = False
+                self._open_generator_page(page, cookie_string)
+                prompt_selector = self._find_prompt_input(page)
+            self._prompt_selector = prompt_selector
+
+            # Mọi kết quả đang có trên trang không thuộc lần sinh nào của pipeline
+            self._mark_previous_results(page)
+
+            for index, item in enumerate(prompt_items):
+                num_images = item.get('num_images') or 4
+                download_count = item.get('download_count') or num_images
+                generation = {
+                    'index': index,
+                    'prompt': item.get('content', ''),
+                    'num_images': num_images,
+                    'download_count': min(download_count, num_images),
+                    'filename_prefix': item.get('filename_prefix') or f"pipeline_{index + 1:03d}",
+                    'started_at': None,
+                    'files': []
+                }
+                generations.append(generation)
+                if not generation['prompt']:
+                    print(f"⚠️ Bỏ qua prompt {generation['index'] + 1}: prompt rỗng")
+                    continue
+
+                # Giữ số lần sinh đang chạy trong giới hạn, vừa chờ vừa tải ảnh đã xong
+                while len(in_flight) >= max_in_flight:
+                    self._collect_pipeline_results(page, in_flight)
+                    if len(in_flight) >= max_in_flight:
+                        time.sleep(1)
+
+                print(f"\n📤 [{generation['index'] + 1}{of_total}] Gửi prompt: {generation['prompt'][:60]}")
+                self._clear_prompt(page)
+                self._dismiss_popups(page)
+                self._enter_prompt(page, prompt_selector, generation['prompt'])
+                self._apply_generator_settings(page)
+                self._click_generate(page)
+                self.debug.snapshot(page, f"pipeline_submit_{generation['index'] + 1}")
+                generation['started_at'] = time.time()
+                in_flight.append(generation)
+
+                self._wait_generation_started(page, generation['index'])
+                self._collect_pipeline_results(page, in_flight)
+
+            # Gửi hết prompt → chờ và tải nốt các lần sinh còn lại
+            while in_flight:
+                self._collect_pipeline_results(page, in_flight)
+                if in_flight:
+                    time.sleep(1)
+
+            self._page_ready = True
+            self.debug.end_job()
+
+        except Exception as e:
+            print(f"❌ Lỗi pipeline sinh ảnh: {e}")
+            self._page_ready = False
+            self.debug.dump_failure(page, str(e))
+
+        finally:
+            self._end_pipeline(page)
+
+            total = sum(len(g['files']) for g in generations)
+            self.generation_stats["total_generated"] += total
+            print(f"\n🎯 TỔNG KẾT PIPELINE: đã tải {total} ảnh cho {len(generations)} prompt")
+            for generation in generations:
+                print(f"  {generation['index'] + 1}. {len(generation['files'])}/{generation['download_count']} ảnh - {generation['prompt'][:40]}")
+
+    def _wait_generation_started(self, page: Page, gen_index: int, timeout_seconds: int = 15) -> bool:
+        """
+        Chờ lần sinh vừa gửi thực sự bắt đầu (xuất hiện khung kết quả mới và nút Generate
+        dùng được trở lại), đồng thời gắn data-fazzy-gen cho các khung đó.
+
+        Returns:
+            True nếu đã thấy lần sinh bắt đầu trước khi hết giờ
+        """
+        claimed = 0
+        for _ in range(timeout_seconds * 2):
+            try:
+                claimed += page.evaluate("""
+                (args) => {
+                    let count = 0;
+                    document.querySelectorAll(args.selector).forEach(el => {
+                        if (el.hasAttribute('data-fazzy-seen') || el.closest('[data-fazzy-gen]')) return;
+                        el.setAttribute('data-fazzy-gen', String(args.gen));
+                        count++;
+                    });
+                    return count;
+                }
+                """, {"selector": self.PIPELINE_CONTAINER_SELECTOR, "gen": gen_index})
+
+                button = page.query_selector(self.GENERATE_BUTTON_SELECTOR)
+                button_ready = bool(button and button.is_enabled())
+
+                if claimed and button_ready:
+                    print(f"▶️ Lần sinh {gen_index + 1} đã bắt đầu ({claimed} khung kết quả)")
+                    return True
+
+                if page.query_selector("text=Sign up"):
+                    raise Exception("Free tier yêu cầu đăng ký - cần tài khoản Premium")
+            except Exception as e:
+                if "Premium" in str(e):
+                    raise
+            time.sleep(0.5)
+
+        # Không thấy khung riêng: ảnh sẽ được gán theo thứ tự gửi khi xuất hiện
+        print(f"⚠️ Chưa xác nhận được lần sinh {gen_index + 1} đã bắt đầu, gửi tiếp theo thứ tự")
+        return False
+
+    def _collect_pipeline_results(self, page: Page, in_flight: List[Dict[str, Any]],
+                                  timeout_seconds: int = 120) -> None:
+        """
+        Một lượt quét không chặn: gán ảnh mới cho lần sinh tương ứng, tải ảnh đã sẵn sàng
+        và loại khỏi in_flight các lần sinh đã đủ ảnh hoặc quá thời gian chờ.
+        """
+        if not in_flight:
+            return
+
+        self._refresh_seen_marks(page)
+        try:
+            # Ảnh nằm trong khung đã gắn data-fazzy-gen thuộc lần sinh đó; ảnh không có
+            # khung thì gán cho lần sinh gửi sớm nhất còn thiếu ảnh
+            page.evaluate("""
+            (args) => {
+                const counts = {};
+                args.order.forEach(g => {
+                    counts[g] = document.querySelectorAll(`[data-fazzy-tile][data-fazzy-gen="${g}"]`).length;
+                });
+                document.querySelectorAll(args.selector).forEach(el => {
+                    if (el.hasAttribute('data-fazzy-seen') || el.hasAttribute('data-fazzy-tile')) return;
+                    const rect = el.getBoundingClientRect();
+                    if (rect.width === 0 || rect.height === 0) return;
+                    const owner = el.closest('[data-fazzy-gen]');
+                    const gen = owner ? Number(owner.getAttribute('data-fazzy-gen'))
+                                      : args.order.find(g => counts[g] < args.need[g]);
+                    if (gen === undefined) return;
+                    el.setAttribute('data-fazzy-gen', String(gen));
+                    el.setAttribute('data-fazzy-tile', '1');
+                    counts[gen] = (counts[gen] || 0) + 1;
+                });
+                document.querySelectorAll('[data-fazzy-tile]:not([data-fazzy-ready])').forEach(el => {
+                    if (el.tagName === 'CANVAS' || (el.complete && el.naturalWidth > 0)) {
+                        el.setAttribute('data-fazzy-ready', '1');
+                    }
+                });
+            }
+            """, {
+                "selector": self.PIPELINE_TILE_SELECTOR,
+                "order": [g['index'] for g in in_flight],
+                "need": {str(g['index']): g['num_images'] for g in in_flight}
+            })
+        except Exception as e:
+            print(f"⚠️ Lỗi quét kết quả pipeline: {e}")
+            return
+
+        for generation in list(in_flight):
+            index = generation['index']
+            files = generation['files']
+
+            ready_selector = f"[data-fazzy-tile][data-fazzy-ready][data-fazzy-gen='{index}']:not([data-fazzy-done])"
+            for element in page.query_selector_all(ready_selector):
+                if len(files) >= generation['download_count']:
+                    break
+
+                filepath = reserve_file(self.output_dir, f"{generation['filename_prefix']}_{len(files) + 1:03d}", ".png")
+                if self._save_result_element(page, element, filepath):
+                    files.append(filepath)
+                    self.generation_stats["successful_downloads"] += 1
+                    print(f"💾 Prompt {index + 1}: {os.path.basename(filepath)}")
+                else:
+                    release(filepath)
+                    self.generation_stats["failed_downloads"] += 1
+
+                # Đánh dấu đã xử lý kể cả khi lỗi để không thử lại vô hạn
+                element.evaluate("el => el.setAttribute('data-fazzy-done', '1')")
+
+            elapsed = time.time() - generation['started_at']
+            if len(files) >= generation['download_count']:
+                print(f"✅ Prompt {index + 1}: xong {len(files)}/{generation['download_count']} ảnh sau {elapsed:.0f}s")
+                in_flight.remove(generation)
+            elif elapsed > timeout_seconds:
+                print(f"⏰ Prompt {index + 1}: hết thời gian chờ, tải được {len(files)}/{generation['download_count']} ảnh")
+                in_flight.remove(generation)
+
+    def _save_result_element(self, page: Page, element, filepath: str) -> bool:
+        """Lưu một ảnh/canvas kết quả ra file, fallback sang screenshot phần tử"""
+        try:
+            src = element.get_attribute('src') or ''
+            if src.startswith('http'):
+                response = page.context.request.get(src)
+                if response.ok:
+                    atomic_write_bytes(filepath, response.body())
+                    return True
+
+            data_url = self._element_data_url(element)
+            if data_url:
+                atomic_write_bytes(filepath, base64.b64decode(data_url.split(',', 1)[1]))
+                return True
+
+            atomic_write_bytes(filepath, element.screenshot())
+            return True
+
+        except Exception as e:
+            print(f"⚠️ Không tải được {os.path.basename(filepath)}: {e}")
+            return False
+
+    def _element_data_url(self, element) -> Optional[str]:
+        """Data URL của canvas hoặc ảnh blob:/data: (đọc ngay trong trang)"""
+        tag = element.evaluate("el => el.tagName")
+        if tag == 'CANVAS':
+            data_url = element.evaluate("c => c.toDataURL('image/png')")
+        else:
+            src = element.get_attribute('src') or ''
+            if not (src.startswith('blob:') or src.startswith('data:')):
+                return None
+            data_url = element.evaluate("""
+            async (img) => {
+                const blob = await (await fetch(img.src)).blob();
+                return await new Promise(resolve => {
+                    const reader = new FileReader();
+                    reader.onload = () => resolve(reader.result);
+                    reader.readAsDataURL(blob);
+                });
+            }
+            """)
+        return data_url if data_url and ',' in data_url else None
+
+    def _end_pipeline(self, page: Page) -> None:
+        """Gỡ các thẻ theo dõi của pipeline và đánh dấu seen để generate_image sau đó không đếm lại"""
+        try:
+            page.evaluate("""
+            () => {
+                const attrs = ['data-fazzy-gen', 'data-fazzy-tile', 'data-fazzy-ready', 'data-fazzy-done'];
+                document.querySelectorAll('[data-fazzy-gen]').forEach(el => {
+                    attrs.forEach(attr => el.removeAttribute(attr));
+                });
+            }
+            """)
+        except Exception:
+            pass
+        self._mark_previous_results(page)
+
+    def generate_image_for_handoff(self, prompt: str, cookie_string: str = None, num_images: int = 4,
+                                   download_count: int = None, filename_prefix: str = None) -> Dict[str, Any]:
+        """
+        Sinh ảnh trên browser warm và giữ nguyên kết quả trên trang để chuyển thẳng sang
+        Image-to-Video bằng handoff_to_video(). Ảnh chỉ được tải về ở thread nền để lưu trữ.
+        Tự start() browser nếu chưa warm; người gọi chịu trách nhiệm close().
+        
+        Returns:
+            Dict: {'ready': True nếu có ảnh để chuyển, 'archive': đường dẫn ảnh đang được lưu trữ}
+        """
+        if not filename_prefix:
+            safe_prompt = "".join(c for c in prompt[:30] if c.isalnum() or c in (' ', '-', '_')).strip()
+            filename_prefix = safe_prompt.replace(' ', '_') or "freepik_image"
+        if download_count is None or download_count > num_images:
+            download_count = num_images
+        
+        if not self.is_warm:
+            self.start()
+        page = self.page
+        
+        print(f"🎨 Sinh {num_images} ảnh để chuyển thẳng sang video")
+        print(f"📝 Prompt: {prompt}")
+        self.debug.begin_job(prompt)
+        
+        try:
+            if self._probe_generator_page(page, cookie_string):
+                self._reset_generator_form(page)
+                prompt_selector = self._prompt_selector
+            else:
+                self._page_ready = False
+                self._open_generator_page(page, cookie_string)
+                prompt_selector = self._find_prompt_input(page)
+            
+            self._enter_prompt(page, prompt_selector, prompt)
+            self._apply_generator_settings(page)
+            self._click_generate(page)
+            self._wait_for_results(page, num_images)
+            
+            archive = self._archive_results_in_background(page, download_count, filename_prefix)
+            self._prompt_selector = prompt_selector
+            self._page_ready = True
+            self.debug.end_job()
+            return {'ready': bool(archive), 'archive': archive}
+            
+        except Exception as e:
+            print(f"❌ Lỗi khi sinh ảnh: {e}")
+            self._page_ready = False
+            self.debug.dump_failure(page, str(e))
+            return {'ready': False, 'archive': []}
+
+    def handoff_to_video(self, image_index: int = 0, timeout_ms: int = 15000) -> Optional[Page]:
+        """
+        Chuyển ảnh kết quả thứ image_index sang AI Video Generator bằng hành động
+        "Animate / Use for video" ngay trên ô ảnh, không download rồi upload lại.
+        
+        Returns:
+            Page đang ở AI Video Generator với ảnh đã được gắn, None nếu không chuyển được
+        """
+        page = self.page
+        try:
+            tiles = [e for e in page.query_selector_all(self._fresh(self.PIPELINE_TILE_SELECTOR)) if e.is_visible()]
+            if len(tiles) <= image_index:
+                print(f"⚠️ Không có ảnh thứ {image_index + 1} để chuyển sang video")
+                return None
+            
+            tile = tiles[image_index]
+            tile.hover()
+            container = tile.evaluate_handle(
+                f"el => el.closest({json.dumps(self.PIPELINE_CONTAINER_SELECTOR)}) || el.parentElement"
+            ).as_element() or tile
+            
+            pages_before = len(page.context.pages)
+            action = self._find_handoff_action(page, container)
+            if not action:
+                print("⚠️ Không tìm thấy nút Animate / Use for video trên ô ảnh")
+                return None
+            action.click()
+            
+            # Pikaso có thể mở Video Generator ngay trên tab hiện tại hoặc ở tab mới
+            deadline = time.time() + timeout_ms / 1000
+            while time.time() < deadline:
+                if self.VIDEO_GENERATOR_PATH in page.url:
+                    print("🔗 Đã chuyển ảnh sang AI Video Generator (cùng tab)")
+                    return page
+                if len(page.context.pages) > pages_before:
+                    new_page = page.context.pages[-1]
+                    new_page.wait_for_load_state("domcontentloaded")
+                    if self.VIDEO_GENERATOR_PATH in new_page.url:
+                        print("🔗 Đã chuyển ảnh sang AI Video Generator (tab mới)")
+                        return new_page
+                page.wait_for_timeout(250)
+            
+            print("⚠️ Hết thời gian chờ chuyển sang AI Video Generator")
+            return None
+        
+        except Exception as e:
+            print(f"⚠️ Lỗi chuyển ảnh sang video: {e}")
+            return None
+
+    def _find_handoff_action(self, page: Page, container):
+        """Tìm nút chuyển sang video trong ô ảnh, hoặc trong menu "More" của ô"""
+        selectors = [f"button:has-text('{text}')" for text in self.HANDOFF_ACTION_TEXTS] + [
+            "button[aria-label*='Animate']",
+            "button[aria-label*='video' i]",
+            "[data-cy*='video']",
+            "a[href*='ai-video-generator']"
+        ]
+        for selector in selectors:
+            action = container.query_selector(selector)
+            if action and action.is_visible():
+                return action
+        
+        more = container.query_selector("button[aria-label*='More']") or \
+            container.query_selector("button[aria-label*='Options']")
+        if more and more.is_visible():
+            more.click()
+            page.wait_for_timeout(300)
+            # Menu thường được render ở portal ngoài ô ảnh
+            for text in self.HANDOFF_ACTION_TEXTS:
+                action = page.query_selector(f"[role='menuitem']:has-text('{text}')") or \
+                    page.query_selector(f"[role='menu'] button:has-text('{text}')")
+                if action and action.is_visible():
+                    return action
+            page.keyboard.press("Escape")
+        return None
+
+    def _archive_results_in_background(self, page: Page, count: int, filename_prefix: str) -> List[str]:
+        """
+        Lấy nguồn của các ảnh mới (URL hoặc data URL trong trang) rồi ghi file ở thread nền
+        bằng requests với cookie của session, không chặn bước chuyển sang video.
+        
+        Returns:
+            List[str]: Đường dẫn các file sẽ được ghi
+        """
+        self._refresh_seen_marks(page)
+        elements = [e for e in page.query_selector_all(self._fresh(self.PIPELINE_TILE_SELECTOR)) if e.is_visible()]
+        
+        jobs = []
+        for i, element in enumerate(elements[:count]):
+            # Giữ chỗ ngay: đường dẫn được trả về cho người gọi trước khi thread nền ghi xong
+            filepath = reserve_file(self.output_dir, f"{filename_prefix}_{i + 1:03d}", ".png")
+            try:
+                src = element.get_attribute('src') or ''
+                if src.startswith('http'):
+                    jobs.append((filepath, src, None))
+                else:
+                    data_url = self._element_data_url(element)
+                    if data_url:
+                        jobs.append((filepath, None, base64.b64decode(data_url.split(',', 1)[1])))
+                    else:
+                        release(filepath)
+            except Exception as e:
+                release(filepath)
+                print(f"⚠️ Bỏ qua ảnh {i + 1} khi lưu trữ: {e}")
+        
+        if not jobs:
+            return []
+        
+        cookies = {c['name']: c['value'] for c in page.context.cookies()}
+        user_agent = page.evaluate("navigator.userAgent")
+        thread = threading.Thread(target=self._write_archive, args=(jobs, cookies, user_agent),
+                                  name="fazzy-archive", daemon=True)
+        thread.start()
+        self._archive_threads.append(thread)
+        print(f"🗄️ Đang lưu trữ {len(jobs)} ảnh ở nền")
+        return [job[0] for job in jobs]
+
+    def _write_archive(self, jobs: List, cookies: Dict[str, str], user_agent: str) -> None:
+        """Thread nền: tải URL bằng requests hoặc ghi bytes đã lấy từ trang"""
+        import requests
+        
+        session = requests.Session()
+        session.cookies.update(cookies)
+        session.headers["User-Agent"] = user_agent
+        
+        for filepath, url, data in jobs:
+            try:
+                if url:
+                    response = session.get(url, timeout=60)
+                    response.raise_for_status()
+                    data = response.content
+                atomic_write_bytes(filepath, data)
+                self.generation_stats["successful_downloads"] += 1
+                print(f"🗄️ Đã lưu trữ: {os.path.basename(filepath)}")
+            except Exception as e:
+                release(filepath)
+                self.generation_stats["failed_downloads"] += 1
+                print(f"⚠️ Lưu trữ {os.path.basename(filepath)} thất bại: {e}")
+
+    def wait_for_archive(self, timeout: Optional[float] = None) -> None:
+        """Chờ các thread lưu trữ ảnh ở nền hoàn tất"""
+        for thread in self._archive_threads:
+            thread.join(timeout)
+        self._archive_threads = [t for t in self._archive_threads if t.is_alive()]
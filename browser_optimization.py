@@ -412,50 +412,35 @@ class BrowserOptimizer:
         return False
 
 
-def create_optimized_browser_context(playwright, browser_type: str = "firefox"):
+def create_optimized_browser_context(playwright, browser_type: str = "firefox", headless: bool = True,
+                                     profile_name: Optional[str] = None):
     """
     Tạo browser context được tối ưu cho automation
     
     Args:
         playwright: Playwright instance
         browser_type: "firefox" hoặc "chrome"
+        headless: Chạy ẩn (chỉ dùng khi launch_profile=auto)
+        profile_name: Tên profile trong launch_profiles (mặc định: đọc từ config)
         
     Returns:
         Browser context đã được tối ưu
     """
-    if browser_type.lower() == "chrome":
-        browser = playwright.chromium.launch(
-            headless=False,
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--disable-extensions",
-                "--no-sandbox", 
-                "--disable-dev-shm-usage",
-                "--disable-gpu",
-                "--window-size=1920,1080"
-            ]
-        )
-    else:  # firefox
-        browser = playwright.firefox.launch(
-            headless=False,
-            firefox_user_prefs={
-                "dom.webdriver.enabled": False,
-                "useAutomationExtension": False,
-                "general.platform.override": "Win32"
-            }
-        )
+    from launch_profiles import resolve_launch_profile, launch_browser, context_options
+    
+    _, profile = resolve_launch_profile(headless, profile_name)
+    browser = launch_browser(playwright, browser_type.lower(), profile)
     
     # Create optimized context
-    context = browser.new_context(
-        viewport={"width": 1920, "height": 1080},
+    context = browser.new_context(**context_options(
+        profile,
         user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         java_script_enabled=True,
-        permissions=["notifications"],
         color_scheme="light"
-    )
+    ))
     
     # Set optimized timeouts
     context.set_default_timeout(30000)
     context.set_default_navigation_timeout(45000)
     
-    return context 
\ No newline at end of file
+    return context
@@ -0,0 +1,271 @@
+"""
+Tái khởi động browser warm định kỳ để batch / daemon chạy nhiều giờ không phình bộ nhớ
+
+SPA của Pikaso giữ lại gallery kết quả, blob URL, buffer websocket... nên một browser dùng
+lại qua nhiều job sẽ tăng bộ nhớ không giới hạn. BrowserRecycler bọc một generator có
+start()/close() (FreepikImageGenerator, FreepikVideoGenerator) và chỉ can thiệp GIỮA các job:
+- sau recycle_after_jobs job: mở page mới trong cùng context, đóng page cũ (rẻ, giữ cookie)
+- sau recycle_after_minutes phút hoặc khi bộ nhớ vượt recycle_max_rss_mb: khởi động lại browser
+
+Bộ nhớ đo bằng tổng PSS (hoặc RSS) của cây tiến trình Playwright driver + browser đọc từ
+/proc; nơi không có /proc thì dùng JS heap của page (performance.memory, chỉ Chromium).
+Trước khi tái khởi động, việc dở dang (ảnh đang lưu trữ ở nền, debug artifact) được chờ xong.
+"""
+
+import os
+import time
+import threading
+from typing import Dict, List, Optional, Set
+
+# pid driver Playwright của các generator trong process này (đăng ký khi mở browser), để đo
+# bộ nhớ browser mà không lẫn tiến trình con khác (worker ProcessPoolExecutor, ffmpeg, ...)
+_driver_pids: Set[int] = set()
+_driver_pids_lock = threading.Lock()
+
+DEFAULT_RECYCLE_SETTINGS = {
+    'recycle_after_jobs': 25,
+    'recycle_after_minutes': 60,
+    'recycle_max_rss_mb': 2048
+}
+
+
+def load_recycle_settings() -> Dict[str, int]:
+    """Đọc recycle_after_jobs / recycle_after_minutes / recycle_max_rss_mb (0 = tắt) từ config"""
+    settings = dict(DEFAULT_RECYCLE_SETTINGS)
+
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip()
+                    if '=' not in line:
+                        continue
+                    key, value = [part.strip() for part in line.split('=', 1)]
+                    if key.lower() in settings and value:
+                        settings[key.lower()] = max(0, int(value))
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc cấu hình recycle, dùng mặc định: {e}")
+
+    return settings
+
+
+def _parent_map() -> Dict[int, int]:
+    """pid → ppid của mọi tiến trình (một lượt đọc /proc/*/stat), rỗng nếu không có /proc"""
+    parents = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return parents
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # comm nằm trong ngoặc và có thể chứa khoảng trắng → tách sau dấu ')' cuối
+                fields = f.read().rsplit(')', 1)[1].split()
+            parents[int(entry)] = int(fields[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return parents
+
+
+def child_pids(pid: int) -> Set[int]:
+    """Các tiến trình con trực tiếp của pid"""
+    return {child for child, parent in _parent_map().items() if parent == pid}
+
+
+def playwright_driver_pid(playwright) -> Optional[int]:
+    """
+    pid của tiến trình driver mà Playwright này đã khởi động (browser là tiến trình con của nó),
+    lấy từ chính process handle nên không lẫn với driver do thread / generator khác mở cùng lúc.
+    None nếu không lấy được (API nội bộ của Playwright đổi, hoặc không có Playwright).
+    """
+    try:
+        return playwright._impl_obj._connection._transport._proc.pid
+    except AttributeError:
+        return None
+
+
+def register_driver(playwright) -> Optional[int]:
+    """Ghi nhận driver của Playwright này là của một browser slot; trả về pid (None nếu không lấy được)"""
+    pid = playwright_driver_pid(playwright)
+    if pid:
+        with _driver_pids_lock:
+            _driver_pids.add(pid)
+    return pid
+
+
+def registered_driver_pids() -> Set[int]:
+    """
+    Các driver đã đăng ký còn sống. Driver là tiến trình con trực tiếp của process này nên pid
+    không còn là con của nó (driver đã dừng, pid bị tái sử dụng) thì được bỏ khỏi danh sách.
+    """
+    parents = _parent_map()
+    me = os.getpid()
+    with _driver_pids_lock:
+        if parents:
+            _driver_pids.intersection_update(pid for pid in _driver_pids if parents.get(pid) == me)
+        return set(_driver_pids)
+
+
+def tree_memory_bytes(root_pids: Set[int]) -> Optional[int]:
+    """
+    Tổng bộ nhớ của các tiến trình gốc và mọi tiến trình con cháu.
+    Ưu tiên PSS (smaps_rollup, chia đều trang nhớ dùng chung giữa các renderer) thay vì RSS.
+    """
+    parents = _parent_map()
+    if not root_pids or not parents:
+        return None
+
+    children: Dict[int, List[int]] = {}
+    for child, parent in parents.items():
+        children.setdefault(parent, []).append(child)
+
+    total = 0
+    seen = set()
+    pending = [pid for pid in root_pids if pid in parents]
+    if not pending:
+        return None
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    while pending:
+        pid = pending.pop()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        pending.extend(children.get(pid, []))
+        total += _process_memory_bytes(pid, page_size)
+    return total
+
+
+def _process_memory_bytes(pid: int, page_size: int) -> int:
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * page_size
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+class BrowserRecycler:
+    """Chính sách tái khởi động page / browser cho một generator warm"""
+
+    def __init__(self, generator, name: str = "browser", settings: Optional[Dict[str, int]] = None):
+        self.generator = generator
+        self.name = name
+        self.settings = settings or load_recycle_settings()
+
+        self.jobs_on_page = 0
+        self.browser_started_at: Optional[float] = None
+        self.recycle_count = 0
+        self.reclaimed_bytes = 0
+        self.last_memory_bytes: Optional[int] = None
+        self._root_pids: Set[int] = set()
+
+    def ensure_started(self):
+        """start() generator nếu chưa warm và ghi nhận tiến trình Playwright driver của nó để đo bộ nhớ"""
+        if not self.generator.is_warm:
+            self.generator.start()
+            # Không dò tiến trình con mới của process: các slot khởi động cùng lúc sẽ lấy nhầm của nhau
+            driver_pid = playwright_driver_pid(getattr(self.generator, "_playwright", None))
+            self._root_pids = {driver_pid} if driver_pid else set()
+            self.browser_started_at = time.monotonic()
+            self.jobs_on_page = 0
+        return self.generator
+
+    def after_job(self) -> Optional[str]:
+        """
+        Gọi sau mỗi job (khi không còn thao tác nào trên page): tái khởi động nếu chạm ngưỡng.
+
+        Returns:
+            "page" / "browser" nếu vừa tái khởi động, None nếu không
+        """
+        if not self.generator.is_warm:
+            return None
+
+        self.jobs_on_page += 1
+        max_jobs = self.settings['recycle_after_jobs']
+        max_minutes = self.settings['recycle_after_minutes']
+        max_mb = self.settings['recycle_max_rss_mb']
+
+        memory = self.last_memory_bytes = self.memory_bytes()
+        if max_mb and memory is not None and memory > max_mb * 1024 * 1024:
+            return self._recycle("browser", f"bộ nhớ {memory / 1048576:.0f}MB > {max_mb}MB", memory)
+        if max_minutes and self.browser_started_at is not None \
+                and time.monotonic() - self.browser_started_at > max_minutes * 60:
+            return self._recycle("browser", f"đã chạy quá {max_minutes} phút", memory)
+        if max_jobs and self.jobs_on_page >= max_jobs:
+            return self._recycle("page", f"đã xử lý {self.jobs_on_page} job", memory)
+        return None
+
+    def memory_bytes(self) -> Optional[int]:
+        """Bộ nhớ hiện tại của browser: cây tiến trình từ /proc, fallback JS heap của page"""
+        memory = tree_memory_bytes(self._root_pids)
+        if memory is not None:
+            return memory
+        try:
+            return self.generator.page.evaluate(
+                "() => (performance.memory && performance.memory.usedJSHeapSize) || null"
+            )
+        except Exception:
+            return None
+
+    def stats(self) -> Dict[str, object]:
+        """Số liệu lần đo gần nhất (không chạm vào page → gọi được từ thread khác)"""
+        memory = self.last_memory_bytes
+        return {
+            "jobs_on_page": self.jobs_on_page,
+            "recycles": self.recycle_count,
+            "memory_mb": round(memory / 1048576, 1) if memory else None,
+            "reclaimed_mb": round(self.reclaimed_bytes / 1048576, 1)
+        }
+
+    def _recycle(self, level: str, reason: str, memory_before: Optional[int]) -> str:
+        print(f"♻️ Tái khởi động {level} {self.name}: {reason}")
+        self._drain()
+
+        if level == "page":
+            self._recycle_page()
+        else:
+            self.generator.close()
+            self.ensure_started()
+        self.jobs_on_page = 0
+        self.recycle_count += 1
+
+        memory_after = self.last_memory_bytes = self.memory_bytes()
+        if memory_before is not None and memory_after is not None:
+            reclaimed = memory_before - memory_after
+            self.reclaimed_bytes += max(0, reclaimed)
+            print(f"🧹 {self.name}: {memory_before / 1048576:.0f}MB → {memory_after / 1048576:.0f}MB "
+                  f"(giải phóng {reclaimed / 1048576:.0f}MB)")
+        return level
+
+    def _drain(self) -> None:
+        """Chờ việc nền của generator (lưu trữ ảnh, ghi debug artifact) trước khi đóng page"""
+        if hasattr(self.generator, "wait_for_archive"):
+            self.generator.wait_for_archive()
+        debug = getattr(self.generator, "debug", None)
+        if debug is not None:
+            debug.flush()
+
+    def _recycle_page(self) -> None:
+        """Page mới trong cùng context (giữ cookie), page cũ đóng lại để renderer giải phóng bộ nhớ"""
+        old_page = self.generator.page
+        try:
+            self.generator.page = self.generator.context.new_page()
+            old_page.close()
+        except Exception as e:
+            print(f"⚠️ Không thay được page, khởi động lại browser: {e}")
+            self.generator.close()
+            self.ensure_started()
+            return
+
+        # Trang mới chưa mở Pikaso → lần sau điều hướng lại từ đầu
+        if hasattr(self.generator, "_page_ready"):
+            self.generator._page_ready = False
@@ -0,0 +1,215 @@
+"""
+Browser Chromium dùng chung giữa các lần chạy CLI (main.py image / video / batch từ cron, ...)
+
+`python main.py browser-server start` mở một Chromium tách rời (vẫn sống sau khi lệnh kết thúc)
+với cổng remote debugging và ghi websocket endpoint vào .fazzytool/browser_server.json.
+Các generator đọc state file và connect_over_cdp() tới browser này, mỗi job dùng một context
+riêng rồi chỉ ngắt kết nối khi close(), nên lần chạy sau không phải khởi động browser lại.
+Browser server chết hoặc không kết nối được → tự mở browser cục bộ như trước.
+
+Playwright Python không có launch_server() (chỉ có ở Node), và browser server qua
+`playwright run-server` mở browser mới cho mỗi kết nối, nên dùng CDP của Chromium.
+Tắt hẳn bằng browser_server=off trong config_template.txt.
+"""
+
+import os
+import json
+import time
+import signal
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from file_placement import atomic_write_json
+
+BROWSER_SERVER_STATE_FILE = os.path.join(".fazzytool", "browser_server.json")
+BROWSER_SERVER_PROFILE_DIR = os.path.join(".fazzytool", "browser-server-profile")
+START_TIMEOUT_SECONDS = 20
+
+
+def load_browser_server_mode() -> str:
+    """Đọc browser_server từ config_template.txt: auto (dùng nếu đang chạy) | off"""
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip()
+                    if '=' not in line:
+                        continue
+                    key, value = [part.strip() for part in line.split('=', 1)]
+                    if key.lower() == 'browser_server' and value.lower() in ('auto', 'off'):
+                        return value.lower()
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc browser_server, dùng auto: {e}")
+    return "auto"
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return _windows_pid_alive(pid)
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+
+
+def _windows_pid_alive(pid: int) -> bool:
+    """Trên Windows os.kill(pid, 0) gọi TerminateProcess nên hỏi trạng thái qua OpenProcess"""
+    import ctypes
+    from ctypes import wintypes
+
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    STILL_ACTIVE = 259
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.GetExitCodeProcess.argtypes = [wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD)]
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # Không mở được vì quyền (ERROR_ACCESS_DENIED) nghĩa là process vẫn tồn tại
+        return ctypes.get_last_error() == 5
+    try:
+        exit_code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return False
+        return exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def read_server_state(state_file: str = BROWSER_SERVER_STATE_FILE) -> Optional[Dict[str, Any]]:
+    """State của browser server đang chạy, None (và dọn state file cũ) nếu không còn chạy"""
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if _pid_alive(int(state["pid"])) and state.get("ws_endpoint"):
+            return state
+    except (OSError, ValueError, KeyError):
+        return None
+
+    _remove_state_file(state_file)
+    return None
+
+
+def start_server(headless: bool = True, state_file: str = BROWSER_SERVER_STATE_FILE) -> Dict[str, Any]:
+    """
+    Khởi động Chromium tách rời với remote debugging, ghi state file và trả về state.
+    Đã có browser server chạy thì trả về state hiện tại.
+    """
+    state = read_server_state(state_file)
+    if state:
+        print(f"♻️ Browser server đã chạy (pid {state['pid']})")
+        return state
+
+    from playwright.sync_api import sync_playwright
+    from launch_profiles import resolve_launch_profile
+
+    with sync_playwright() as p:
+        executable = p.chromium.executable_path
+
+    profile_name, profile = resolve_launch_profile(headless)
+    profile_dir = os.path.abspath(BROWSER_SERVER_PROFILE_DIR)
+    os.makedirs(profile_dir, exist_ok=True)
+    port_file = os.path.join(profile_dir, "DevToolsActivePort")
+    if os.path.exists(port_file):
+        os.remove(port_file)
+
+    args = [executable, f"--user-data-dir={profile_dir}", "--remote-debugging-port=0",
+            "--remote-debugging-address=127.0.0.1"] + list(profile["chromium_args"])
+    if profile["headless"]:
+        args.append("--headless=new")
+    args.append("about:blank")
+
+    # Phiên / process group riêng: browser không bị dừng theo Ctrl+C / khi terminal đóng
+    if os.name == "nt":
+        detach = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {"start_new_session": True}
+    process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, **detach)
+
+    ws_endpoint = _wait_for_endpoint(port_file, process)
+    state = {
+        "pid": process.pid,
+        "ws_endpoint": ws_endpoint,
+        "profile": profile_name,
+        "user_data_dir": profile_dir,
+        "started_at": datetime.now().isoformat()
+    }
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    atomic_write_json(state_file, state)
+    print(f"🚀 Browser server đã chạy (pid {process.pid}, profile {profile_name}): {ws_endpoint}")
+    return state
+
+
+def stop_server(state_file: str = BROWSER_SERVER_STATE_FILE) -> bool:
+    """Dừng browser server (nếu có) và xóa state file"""
+    state = read_server_state(state_file)
+    if not state:
+        return False
+
+    pid = int(state["pid"])
+    try:
+        os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + 10
+        while _pid_alive(pid) and time.monotonic() < deadline:
+            time.sleep(0.2)
+    except OSError as e:
+        print(f"⚠️ Không dừng được browser server: {e}")
+    _remove_state_file(state_file)
+    return True
+
+
+def connect_shared_browser(playwright):
+    """
+    Kết nối tới browser server đang chạy.
+
+    Returns:
+        Browser đã kết nối, hoặc None nếu không có server / kết nối lỗi (→ tự launch cục bộ)
+    """
+    if load_browser_server_mode() == "off":
+        return None
+    state = read_server_state()
+    if not state:
+        return None
+
+    try:
+        browser = playwright.chromium.connect_over_cdp(state["ws_endpoint"], timeout=5000)
+        print(f"🔌 Dùng browser server chung (pid {state['pid']}), bỏ qua khởi động browser")
+        return browser
+    except Exception as e:
+        print(f"⚠️ Không kết nối được browser server, tự mở browser: {e}")
+        return None
+
+
+def _wait_for_endpoint(port_file: str, process: subprocess.Popen) -> str:
+    """Chromium ghi cổng + đường dẫn websocket vào DevToolsActivePort khi sẵn sàng"""
+    deadline = time.monotonic() + START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Chromium thoát ngay khi khởi động (mã {process.returncode})")
+        try:
+            with open(port_file, "r", encoding="utf-8") as f:
+                lines = f.read().split()
+            if len(lines) >= 2:
+                return f"ws://127.0.0.1:{lines[0]}{lines[1]}"
+        except OSError:
+            pass
+        time.sleep(0.1)
+
+    process.terminate()
+    raise RuntimeError("Hết thời gian chờ browser server khởi động")
+
+
+def _remove_state_file(state_file: str) -> None:
+    try:
+        if os.path.exists(state_file):
+            os.remove(state_file)
+    except OSError:
+        pass
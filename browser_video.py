@@ -5,18 +5,35 @@ Module xử lý việc điều khiển trình duyệt tự động để sinh vi
 import os
 import time
 import json
-import shutil
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple, TYPE_CHECKING
 from datetime import datetime
 
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright, Page, Browser
+
+from video_job_tracker import VideoJobTracker
+from generator_presets import PresetEngine
+from upload_optimizer import UploadOptimizer, PendingUpload
+from file_placement import place_file, load_placement_mode, atomic_write_json, atomic_save_download
+from output_paths import reserve_dir, reserve_file, release
+from launch_profiles import resolve_launch_profile, open_browser
+from page_prewarm import PagePrewarmer
+
+# Playwright chỉ được import khi thực sự mở browser, để các lệnh chỉ đọc
+# session (vd. `main.py sessions`) không phải trả chi phí import.
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
 
 
 class FreepikVideoGenerator:
     """Lớp xử lý việc điều khiển trình duyệt để sinh video từ Freepik AI."""
 
+    # Thời gian chờ tối đa cho một lần sinh video (deadline thật, không cộng dồn timeout)
+    VIDEO_TIMEOUT_SECONDS = 300
+    VIDEO_GENERATOR_URL = "https://www.freepik.com/pikaso/ai-video-generator"
+    VIDEO_MODEL = "Kling 2.1 Master"
+    DOWNLOAD_SELECTORS = ["a[download]", "button:has-text('Download')", ".download-btn"]
+
     def __init__(self, headless: bool = True, output_dir: str = "output"):
         """
         Khởi tạo trình điều khiển browser.
@@ -29,6 +46,28 @@ class FreepikVideoGenerator:
         self.base_output_dir = output_dir
         self.current_session_dir = None
         
+        # Trạng thái browser khi chạy ở chế độ warm (start/close)
+        self._playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self._applied_cookie_string = None
+        
+        # Áp model/duration/ratio một lần (URL params / localStorage), fallback UI
+        self.presets = PresetEngine()
+        
+        # Thu nhỏ / nén ảnh đầu vào ở process pool trước khi upload
+        self.upload_optimizer = UploadOptimizer()
+        
+        # Ảnh đầu vào được reflink / hard link vào session thay vì copy
+        self.placement_mode = load_placement_mode()
+        self.last_input_placement = None
+        
+        # Page của job kế tiếp được chuẩn bị sẵn trong lúc job hiện tại đang sinh (browser warm).
+        # Scheduler gán next_job_settings: hàm trả về (duration, ratio) của job video kế tiếp hoặc None
+        self.prewarmer = PagePrewarmer("video")
+        self.next_job_settings: Optional[Callable[[], Optional[Tuple[str, str]]]] = None
+        
         # Tạo thư mục output chính nếu chưa tồn tại
         os.makedirs(self.base_output_dir, exist_ok=True)
     
@@ -42,13 +81,9 @@ class FreepikVideoGenerator:
         Returns:
             str: Đường dẫn tới session folder
         """
-        # Tạo timestamp cho session
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        session_name = f"{session_type}_{timestamp}"
-        
-        # Tạo đường dẫn session folder
-        session_dir = os.path.join(self.base_output_dir, session_name)
-        os.makedirs(session_dir, exist_ok=True)
+        # Tên <type>_<timestamp>_<token>, giữ chỗ bằng mkdir để job song song không dùng chung folder
+        session_dir = reserve_dir(self.base_output_dir, session_type)
+        session_name = os.path.basename(session_dir)
         
         # Lưu session hiện tại
         self.current_session_dir = session_dir
@@ -70,21 +105,21 @@ class FreepikVideoGenerator:
         metadata["session_created"] = datetime.now().isoformat()
         metadata["session_folder"] = os.path.basename(self.current_session_dir)
         
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        atomic_write_json(metadata_path, metadata)
         
         print(f"📋 Lưu session metadata: session_info.json")
     
     def _copy_input_file(self, source_path: str, new_name: str = None) -> str:
         """
-        Copy file input vào session folder
+        Đặt file input vào session folder (reflink / hard link, chỉ copy khi khác ổ,
+        hoặc chỉ giữ tham chiếu tới file gốc). Phương pháp đã dùng nằm ở last_input_placement.
         
         Args:
             source_path: Đường dẫn file gốc
             new_name: Tên mới cho file (optional)
             
         Returns:
-            str: Đường dẫn file đã copy
+            str: Đường dẫn file trong session (file gốc nếu chỉ giữ tham chiếu)
         """
         if not self.current_session_dir or not os.path.exists(source_path):
             return source_path
@@ -96,10 +131,10 @@ class FreepikVideoGenerator:
             dest_name = f"input_{source_file.name}"
         
         dest_path = os.path.join(self.current_session_dir, dest_name)
-        shutil.copy2(source_path, dest_path)
+        placed_path, self.last_input_placement = place_file(source_path, dest_path, self.placement_mode)
         
-        print(f"📎 Copy input file: {dest_name}")
-        return dest_path
+        print(f"📎 Input file ({self.last_input_placement}): {os.path.basename(placed_path)}")
+        return placed_path
     
     def get_session_summary(self) -> dict:
         """
@@ -170,28 +205,60 @@ class FreepikVideoGenerator:
         else:
             print("Chưa có session nào.")
     
-    def _download_video_to_session(self, page = None) -> Optional[str]:
+    def _download_video_to_session(self, page: "Page" = None,
+                                   tracker: Optional[VideoJobTracker] = None) -> Optional[str]:
         """
         Download video vào session folder hiện tại
         
         Args:
-            page: Playwright page object (sẽ được lấy từ context nếu không có)
+            page: Playwright page object (mặc định: self.page)
+            tracker: Tracker của lần sinh vừa xong; có asset URL thì tải thẳng bằng context.request
             
         Returns:
-            str: Đường dẫn file video đã download
+            str: Đường dẫn file video đã download, None nếu thất bại
         """
         if not self.current_session_dir:
             print("❌ Không có session folder để lưu video")
             return None
         
-        # Tạo tên file video với timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"video_output_{timestamp}.mp4"
-        filepath = os.path.join(self.current_session_dir, filename)
+        page = page or self.page
+        
+        # Giữ chỗ tên file video (không trùng kể cả khi nhiều job ghi cùng lúc)
+        filepath = reserve_file(self.current_session_dir, "video_output", ".mp4")
+        
+        # Cách 1: URL video đã được công bố qua status API
+        if tracker and tracker.download(filepath):
+            return filepath
         
-        # Note: Method này sẽ được gọi từ context có page
-        # Logic download sẽ được thêm vào trong context generate_video_from_image
-        return filepath
+        # Cách 2: Click nút download trên trang
+        for selector in self.DOWNLOAD_SELECTORS:
+            try:
+                with page.expect_download() as download_info:
+                    page.click(selector, timeout=5000)
+                atomic_save_download(download_info.value, filepath)
+                return filepath
+            except Exception:
+                continue
+        
+        release(filepath)
+        return None
+
+    def _video_settings(self, duration: str, ratio: str) -> Dict[str, str]:
+        """Preset model/thời lượng/tỉ lệ cho một lần sinh video"""
+        return {"model": self.VIDEO_MODEL, "duration": duration, "ratio": ratio}
+
+    def _wait_for_video_generation(self, tracker: VideoJobTracker, prewarm: bool = False) -> bool:
+        """
+        Chờ video được sinh theo tiến độ từ status API của Pikaso
+        
+        Args:
+            tracker: Tracker đã start() trước khi click Generate
+            prewarm: Chuẩn bị page image-to-video cho job kế tiếp trong lúc video đang sinh
+            
+        Returns:
+            bool: True nếu video đã sẵn sàng để tải
+        """
+        return tracker.wait(during_wait=self._prewarm_next_page if prewarm else None)
     
     def parse_cookies(self, cookie_input: str):
         """
@@ -260,7 +327,7 @@ class FreepikVideoGenerator:
             print(f"❌ Lỗi parse cookie: {e}")
             return []
     
-    def set_cookies(self, page: Page, cookies):
+    def set_cookies(self, page: "Page", cookies):
         """
         Thiết lập cookie cho trang web
         
@@ -277,6 +344,60 @@ class FreepikVideoGenerator:
         except Exception as e:
             print(f"❌ Lỗi thiết lập cookie: {e}")
 
+    def _launch_browser(self, p):
+        """
+        Khởi động Firefox và context cho Pikaso Video
+        
+        Args:
+            p: Playwright instance
+            
+        Returns:
+            Tuple (browser, context)
+        """
+        profile_name, profile = resolve_launch_profile(self.headless)
+        print(f"👁️ Profile browser video: {profile_name}")
+        return open_browser(
+            p, "firefox", profile, "video",
+            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        )
+
+    @property
+    def is_warm(self) -> bool:
+        """True nếu browser đang được giữ mở giữa các lần sinh video"""
+        return self._playwright is not None and self.page is not None
+
+    def start(self) -> None:
+        """
+        Khởi động browser và giữ mở (warm) cho nhiều lần sinh video liên tiếp.
+        Phải gọi close() khi dùng xong.
+        """
+        if self.is_warm:
+            return
+        
+        from playwright.sync_api import sync_playwright
+        
+        self._playwright = sync_playwright().start()
+        self.browser, self.context = self._launch_browser(self._playwright)
+        self.page = self.context.new_page()
+        print("🔥 Browser video đã sẵn sàng (warm)")
+
+    def close(self) -> None:
+        """Đóng browser đã mở bằng start()"""
+        self.prewarmer.discard()
+        try:
+            if self.browser:
+                self.browser.close()
+        except Exception as e:
+            print(f"⚠️ Lỗi đóng browser: {e}")
+        finally:
+            if self._playwright:
+                self._playwright.stop()
+            self._playwright = None
+            self.browser = None
+            self.context = None
+            self.page = None
+            self._applied_cookie_string = None
+
     def generate_video_from_image(self, image_path: str, prompt: str, cookie_string: str = None, duration: str = "5s", ratio: str = "1:1"):
         """
         Sinh video từ ảnh sử dụng Freepik AI Image-to-Video với Kling 2.1 Master
@@ -297,6 +418,9 @@ class FreepikVideoGenerator:
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Không tìm thấy file ảnh: {image_path}")
         
+        # Tối ưu ảnh upload ở nền trong lúc mở browser / trang
+        upload = self.upload_optimizer.submit(image_path, ratio)
+        
         # Tạo session folder cho lần generate này
         session_dir = self._create_session_folder("image_to_video")
         
@@ -310,303 +434,426 @@ class FreepikVideoGenerator:
             "duration": duration,
             "ratio": ratio,
             "input_image": os.path.basename(input_image_path),
+            "input_placement": self.last_input_placement,
             "original_image_path": image_path
         }
         
+        # Browser đã được giữ ấm bằng start() → dùng lại page hiện có (hoặc page đã chuẩn bị trước)
+        if self.is_warm:
+            page_prepared = self._take_prewarmed_page(duration, ratio)
+            return self._image_to_video_on_page(self.page, image_path, prompt, cookie_string,
+                                                duration, ratio, session_metadata, upload, page_prepared)
+        
+        from playwright.sync_api import sync_playwright
+        
         with sync_playwright() as p:
-            # Khởi động trình duyệt
-            browser = p.firefox.launch(headless=self.headless)
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            )
+            browser, context = self._launch_browser(p)
             page = context.new_page()
             
             try:
-                # Thiết lập cookie nếu có
-                if cookie_string:
-                    cookies = self.parse_cookies(cookie_string)
-                    self.set_cookies(page, cookies)
-                
-                # Đi đến trang Pikaso Video
-                print("🌐 Đang mở trang Freepik Pikaso Video...")
-                page.goto("https://www.freepik.com/pikaso/ai-video-generator", 
-                         wait_until="networkidle", timeout=30000)
+                return self._image_to_video_on_page(page, image_path, prompt, cookie_string,
+                                                    duration, ratio, session_metadata, upload)
+            finally:
+                browser.close()
+                self._applied_cookie_string = None
+
+    def _take_prewarmed_page(self, duration: str, ratio: str) -> bool:
+        """Thay page warm bằng page đã chuẩn bị trước cho (duration, ratio) nếu còn hạn"""
+        spare = self.prewarmer.take((duration, ratio))
+        if spare is None:
+            return False
+        old_page, self.page = self.page, spare
+        try:
+            old_page.close()
+        except Exception:
+            pass
+        return True
+
+    def _prewarm_next_page(self) -> None:
+        """Chuẩn bị page cho job kế tiếp (chỉ khi browser warm và scheduler biết job kế tiếp)"""
+        if not self.is_warm or self.next_job_settings is None:
+            return
+        try:
+            self.prewarmer.expect(self.next_job_settings())
+        except Exception as e:
+            print(f"⚠️ Không đọc được job kế tiếp: {e}")
+            return
+        self.prewarmer.prepare(self.context, self._prepare_image_to_video)
+
+    def _prepare_image_to_video(self, page: "Page", settings) -> None:
+        """Chuẩn bị trước: mở Image-to-Video và áp luôn model/duration/ratio để job sau nhập prompt ngay"""
+        duration, ratio = settings
+        self._open_image_to_video(page, duration, ratio)
+        self.presets.ensure(page, "video", self._video_settings(duration, ratio))
+
+    def _open_image_to_video(self, page: "Page", duration: str, ratio: str) -> None:
+        """Mở AI Video Generator (preset gắn qua URL / localStorage) và chọn chế độ Image-to-Video"""
+        # Đi đến trang Pikaso Video
+        print("🌐 Đang mở trang Freepik Pikaso Video...")
+        self.presets.navigate(page, "video", self.VIDEO_GENERATOR_URL,
+                              self._video_settings(duration, ratio),
+                              wait_until="networkidle", timeout=30000)
+        
+        # Chờ trang load (wait_for_timeout thay time.sleep: khi chuẩn bị trước trong lúc job khác
+        # đang sinh, event response của job đó vẫn được xử lý)
+        page.wait_for_timeout(5000)
+        
+        # Chọn chế độ Image-to-Video
+        print("🖼️ Chọn chế độ Image-to-Video...")
+        try:
+            img_to_video_selectors = [
+                "button:has-text('Image to Video')",
+                "button:has-text('image to video')",
+                "[data-testid*='image-to-video']",
+                ".image-to-video",
+                "tab:has-text('Image')",
+                "button[aria-label*='Image']"
+            ]
+            
+            for selector in img_to_video_selectors:
+                try:
+                    if page.query_selector(selector):
+                        page.click(selector, timeout=3000)
+                        print("✅ Đã chọn chế độ Image-to-Video")
+                        page.wait_for_timeout(2000)
+                        break
+                except:
+                    continue
+            else:
+                print("⚠️ Không tìm thấy chế độ Image-to-Video, tiếp tục...")
+        
+        except Exception as e:
+            print(f"⚠️ Lỗi khi chọn chế độ Image-to-Video: {e}")
+
+    def _image_to_video_on_page(self, page: "Page", image_path: str, prompt: str, cookie_string: Optional[str],
+                                duration: str, ratio: str, session_metadata: dict,
+                                upload: Optional[PendingUpload] = None, page_prepared: bool = False) -> Optional[str]:
+        """
+        Chạy quy trình image-to-video trên một page đã mở sẵn
+        
+        Args:
+            page_prepared: Page đã ở Image-to-Video với đúng preset (pre-warm) → bỏ qua điều hướng
+        
+        Returns:
+            str: Đường dẫn file video đã tải về, None nếu thất bại
+        """
+        try:
+            # Thiết lập cookie nếu có (bỏ qua nếu context warm đã có cookie này)
+            if cookie_string and cookie_string != self._applied_cookie_string:
+                cookies = self.parse_cookies(cookie_string)
+                self.set_cookies(page, cookies)
+                self._applied_cookie_string = cookie_string
+            
+            if page_prepared:
+                session_metadata["prewarmed_page"] = True
+            else:
+                self._open_image_to_video(page, duration, ratio)
+
+            # Upload ảnh (bản đã thu nhỏ nếu có)
+            upload_path = upload.path() if upload else image_path
+            if upload_path != image_path:
+                session_metadata["upload_image"] = os.path.basename(upload_path)
+            print("📤 Đang upload ảnh...")
+            try:
+                upload_selectors = [
+                    "input[type='file']",
+                    "[data-testid*='upload']",
+                    ".upload-input",
+                    "input[accept*='image']"
+                ]
                 
-                # Chờ trang load
-                time.sleep(5)
+                uploaded = False
+                for selector in upload_selectors:
+                    try:
+                        upload_input = page.query_selector(selector)
+                        if upload_input:
+                            upload_input.set_input_files(upload_path)
+                            print("✅ Đã upload ảnh thành công")
+                            uploaded = True
+                            time.sleep(3)
+                            break
+                    except:
+                        continue
                 
-                # Chọn chế độ Image-to-Video
-                print("🖼️ Chọn chế độ Image-to-Video...")
-                try:
-                    img_to_video_selectors = [
-                        "button:has-text('Image to Video')",
-                        "button:has-text('image to video')",
-                        "[data-testid*='image-to-video']",
-                        ".image-to-video",
-                        "tab:has-text('Image')",
-                        "button[aria-label*='Image']"
+                if not uploaded:
+                    # Thử tìm button upload và click
+                    upload_button_selectors = [
+                        "button:has-text('Upload')",
+                        "button:has-text('Choose')",
+                        ".upload-button",
+                        "[data-testid*='upload-button']"
                     ]
                     
-                    for selector in img_to_video_selectors:
+                    for selector in upload_button_selectors:
                         try:
                             if page.query_selector(selector):
-                                page.click(selector, timeout=3000)
-                                print("✅ Đã chọn chế độ Image-to-Video")
-                                time.sleep(2)
-                                break
+                                page.click(selector)
+                                time.sleep(1)
+                                
+                                # Tìm input file sau khi click
+                                file_input = page.query_selector("input[type='file']")
+                                if file_input:
+                                    file_input.set_input_files(upload_path)
+                                    print("✅ Đã upload ảnh thành công")
+                                    uploaded = True
+                                    time.sleep(3)
+                                    break
                         except:
                             continue
-                    else:
-                        print("⚠️ Không tìm thấy chế độ Image-to-Video, tiếp tục...")
-                        
-                except Exception as e:
-                    print(f"⚠️ Lỗi khi chọn chế độ Image-to-Video: {e}")
                 
-                # Upload ảnh
-                print("📤 Đang upload ảnh...")
-                try:
-                    upload_selectors = [
-                        "input[type='file']",
-                        "[data-testid*='upload']",
-                        ".upload-input",
-                        "input[accept*='image']"
-                    ]
+                if not uploaded:
+                    raise Exception("Không thể upload ảnh")
                     
-                    uploaded = False
-                    for selector in upload_selectors:
-                        try:
-                            upload_input = page.query_selector(selector)
-                            if upload_input:
-                                upload_input.set_input_files(image_path)
-                                print("✅ Đã upload ảnh thành công")
-                                uploaded = True
-                                time.sleep(3)
-                                break
-                        except:
-                            continue
-                    
-                    if not uploaded:
-                        # Thử tìm button upload và click
-                        upload_button_selectors = [
-                            "button:has-text('Upload')",
-                            "button:has-text('Choose')",
-                            ".upload-button",
-                            "[data-testid*='upload-button']"
-                        ]
-                        
-                        for selector in upload_button_selectors:
-                            try:
-                                if page.query_selector(selector):
-                                    page.click(selector)
-                                    time.sleep(1)
-                                    
-                                    # Tìm input file sau khi click
-                                    file_input = page.query_selector("input[type='file']")
-                                    if file_input:
-                                        file_input.set_input_files(image_path)
-                                        print("✅ Đã upload ảnh thành công")
-                                        uploaded = True
-                                        time.sleep(3)
-                                        break
-                            except:
-                                continue
-                    
-                    if not uploaded:
-                        raise Exception("Không thể upload ảnh")
-                        
-                except Exception as e:
-                    print(f"❌ Lỗi upload ảnh: {e}")
-                    raise
+            except Exception as e:
+                print(f"❌ Lỗi upload ảnh: {e}")
+                raise
+            
+            return self._generate_video_on_loaded_page(page, prompt, duration, ratio, session_metadata)
                 
-                # Chọn model Kling 2.1 Master
-                print("⚙️ Đang chọn model Kling 2.1 Master...")
+        except Exception as e:
+            print(f"❌ Lỗi sinh video: {e}")
+            return None
+
+    def generate_video_variants(self, image_path: str, variants: List[Dict[str, str]],
+                                cookie_string: str = None) -> List[Optional[str]]:
+        """
+        Fan-out một ảnh thành nhiều video: upload ảnh một lần rồi Generate lần lượt từng biến thể
+        (prompt, duration, ratio) trên cùng trang. Mỗi biến thể có session folder, tracker và
+        file video riêng.
+        
+        Args:
+            image_path: Đường dẫn tới ảnh đầu vào
+            variants: Danh sách dict {'prompt', 'duration', 'ratio'}
+            cookie_string: Cookie để đăng nhập (string hoặc JSON)
+            
+        Returns:
+            List[Optional[str]]: Video của từng biến thể (None nếu biến thể đó lỗi), cùng thứ tự
+        """
+        print(f"🎬 Fan-out {len(variants)} biến thể video từ ảnh: {image_path}")
+        
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Không tìm thấy file ảnh: {image_path}")
+        if not variants:
+            return []
+        
+        # Cùng một lần upload cho mọi biến thể → chỉ cắt theo tỉ lệ khi mọi biến thể chung tỉ lệ
+        ratios = {variant.get('ratio', '1:1') for variant in variants}
+        upload = self.upload_optimizer.submit(image_path, ratios.pop() if len(ratios) == 1 else None)
+        
+        if self.is_warm:
+            return self._variants_on_page(self.page, image_path, variants, cookie_string, upload)
+        
+        from playwright.sync_api import sync_playwright
+        
+        with sync_playwright() as p:
+            browser, context = self._launch_browser(p)
+            page = context.new_page()
+            
+            try:
+                return self._variants_on_page(page, image_path, variants, cookie_string, upload)
+            finally:
+                browser.close()
+                self._applied_cookie_string = None
+
+    def _variants_on_page(self, page: "Page", image_path: str, variants: List[Dict[str, str]],
+                          cookie_string: Optional[str], upload: PendingUpload) -> List[Optional[str]]:
+        """Upload một lần, các biến thể sau chỉ đổi prompt/preset rồi Generate lại"""
+        results = []
+        uploaded = False
+        start = time.time()
+        
+        for index, variant in enumerate(variants):
+            prompt = variant.get('prompt', '')
+            duration = variant.get('duration', '5s')
+            ratio = variant.get('ratio', '1:1')
+            print(f"\n🎞️ Biến thể {index + 1}/{len(variants)}: {duration}, {ratio}")
+            
+            self._create_session_folder(f"image_to_video_v{index + 1}")
+            input_image_path = self._copy_input_file(image_path, "input_image" + Path(image_path).suffix)
+            session_metadata = {
+                "type": "image_to_video",
+                "prompt": prompt,
+                "duration": duration,
+                "ratio": ratio,
+                "input_image": os.path.basename(input_image_path),
+                "input_placement": self.last_input_placement,
+                "original_image_path": image_path,
+                "variant": f"{index + 1}/{len(variants)}"
+            }
+            
+            # Ảnh vẫn còn trong form → chỉ Generate lại; mất ảnh (trang reload, lỗi trước đó) → upload lại
+            if uploaded and self._has_loaded_image(page):
+                session_metadata["reused_upload"] = True
+                video_path = self._generate_video_on_loaded_page(page, prompt, duration, ratio, session_metadata)
+            else:
+                video_path = self._image_to_video_on_page(page, image_path, prompt, cookie_string,
+                                                          duration, ratio, session_metadata, upload)
+                uploaded = video_path is not None
+            
+            results.append(video_path)
+        
+        done = sum(1 for path in results if path)
+        print(f"\n🎯 Fan-out xong {done}/{len(variants)} biến thể trong {time.time() - start:.0f}s")
+        return results
+
+    def _has_loaded_image(self, page: "Page") -> bool:
+        """Một probe: form Image-to-Video còn giữ ảnh đã upload hay không"""
+        try:
+            return page.evaluate("""
+            () => {
+                if (Array.from(document.querySelectorAll("input[type='file']")).some(i => i.files && i.files.length)) {
+                    return true;
+                }
+                return Array.from(document.querySelectorAll('img')).some(img => {
+                    const src = img.currentSrc || img.src || '';
+                    const zone = img.closest("[class*='upload'], [class*='Upload'], [data-testid*='upload'], form");
+                    return (src.startsWith('blob:') || src.startsWith('data:')) && zone;
+                });
+            }
+            """)
+        except Exception:
+            return False
+
+    def generate_video_on_page(self, page: "Page", prompt: str, duration: str = "5s", ratio: str = "1:1",
+                               source_image: Optional[str] = None) -> Optional[str]:
+        """
+        Sinh video trên page đã có sẵn ảnh đầu vào trong Image-to-Video (vd. ảnh Pikaso vừa sinh
+        được chuyển thẳng sang bằng nút Animate), không download / upload lại ảnh.
+        
+        Args:
+            page: Page đang ở AI Video Generator với ảnh đã được gắn
+            prompt: Mô tả video cần sinh
+            duration: Thời lượng video ("5s" hoặc "10s")
+            ratio: Tỷ lệ khung hình ("1:1", "16:9", "9:16")
+            source_image: Đường dẫn bản lưu trữ của ảnh nguồn (chỉ để ghi metadata)
+            
+        Returns:
+            str: Đường dẫn file video đã tải về, None nếu thất bại
+        """
+        print(f"🎬 Sinh video từ ảnh đã chuyển thẳng trong Pikaso")
+        print(f"📝 Prompt: {prompt}")
+        
+        self._create_session_folder("image_to_video")
+        session_metadata = {
+            "type": "image_to_video",
+            "handoff": True,
+            "prompt": prompt,
+            "duration": duration,
+            "ratio": ratio,
+            "original_image_path": source_image
+        }
+        
+        return self._generate_video_on_loaded_page(page, prompt, duration, ratio, session_metadata)
+
+    def _generate_video_on_loaded_page(self, page: "Page", prompt: str, duration: str, ratio: str,
+                                       session_metadata: dict) -> Optional[str]:
+        """
+        Phần chung của image-to-video sau khi ảnh đã nằm trong form: nhập prompt, áp preset,
+        Generate, chờ theo status API và tải video
+        
+        Returns:
+            str: Đường dẫn file video đã tải về, None nếu thất bại
+        """
+        try:
+            # Nhập prompt (nếu có)
+            if prompt:
+                print("✍️ Đang nhập prompt...")
                 try:
-                    time.sleep(3)
-                    
-                    # Tìm dropdown model
-                    model_selectors = [
-                        "button:has-text('Model')",
-                        "[data-testid*='model']",
-                        "button[aria-label*='model']",
-                        ".model-selector",
-                        ".model-dropdown",
-                        "select",
-                        "[role='combobox']"
+                    prompt_selectors = [
+                        "textarea[placeholder*='Describe']",
+                        "textarea[placeholder*='describe']", 
+                        "textarea[placeholder*='prompt']",
+                        "textarea[placeholder*='Prompt']",
+                        "textarea[data-testid*='prompt']",
+                        "textarea",
+                        "[contenteditable='true']",
+                        "[role='textbox']"
                     ]
                     
-                    model_clicked = False
-                    for selector in model_selectors:
+                    prompt_entered = False
+                    for selector in prompt_selectors:
                         try:
-                            if page.query_selector(selector):
-                                page.click(selector, timeout=3000)
-                                time.sleep(2)
-                                model_clicked = True
-                                print(f"✓ Đã click model selector: {selector}")
+                            element = page.query_selector(selector)
+                            if element and element.is_enabled() and element.is_visible():
+                                page.click(selector)
+                                page.fill(selector, prompt)
+                                print("✅ Đã nhập prompt")
+                                prompt_entered = True
                                 break
                         except:
                             continue
                     
-                    if model_clicked:
-                        # Tìm và chọn Kling 2.1 Master
-                        kling_selectors = [
-                            "text=Kling 2.1 Master",
-                            "text=kling 2.1 master",
-                            "text=Kling 2.1",
-                            "text=kling 2.1",
-                            "[data-value*='kling']",
-                            "option[value*='kling']",
-                            "li:has-text('Kling')",
-                            "div:has-text('Kling 2.1')"
-                        ]
-                        
-                        kling_selected = False
-                        for kling_selector in kling_selectors:
-                            try:
-                                if page.query_selector(kling_selector):
-                                    page.click(kling_selector, timeout=2000)
-                                    print("✅ Đã chọn model Kling 2.1 Master")
-                                    kling_selected = True
-                                    break
-                            except:
-                                continue
-                        
-                        if not kling_selected:
-                            print("⚠️ Không tìm thấy model Kling 2.1 Master, sử dụng model mặc định")
-                    else:
-                        print("⚠️ Không tìm thấy model selector, sử dụng model mặc định")
+                    if not prompt_entered:
+                        print("⚠️ Không thể nhập prompt, tiếp tục...")
                         
                 except Exception as e:
-                    print(f"⚠️ Lỗi khi chọn model: {e}")
-                    print("📝 Tiếp tục với model mặc định")
-                
-                # Nhập prompt (nếu có)
-                if prompt:
-                    print("✍️ Đang nhập prompt...")
-                    try:
-                        prompt_selectors = [
-                            "textarea[placeholder*='Describe']",
-                            "textarea[placeholder*='describe']", 
-                            "textarea[placeholder*='prompt']",
-                            "textarea[placeholder*='Prompt']",
-                            "textarea[data-testid*='prompt']",
-                            "textarea",
-                            "[contenteditable='true']",
-                            "[role='textbox']"
-                        ]
-                        
-                        prompt_entered = False
-                        for selector in prompt_selectors:
-                            try:
-                                element = page.query_selector(selector)
-                                if element and element.is_enabled() and element.is_visible():
-                                    page.click(selector)
-                                    page.fill(selector, prompt)
-                                    print("✅ Đã nhập prompt")
-                                    prompt_entered = True
-                                    break
-                            except:
-                                continue
-                        
-                        if not prompt_entered:
-                            print("⚠️ Không thể nhập prompt, tiếp tục...")
-                            
-                    except Exception as e:
-                        print(f"⚠️ Lỗi nhập prompt: {e}")
-                
-                # Thiết lập duration và ratio
-                print(f"⚙️ Thiết lập duration: {duration}, ratio: {ratio}")
+                    print(f"⚠️ Lỗi nhập prompt: {e}")
+            
+            # Áp model Kling 2.1 Master + duration + ratio (một probe xác minh, fallback UI)
+            print(f"⚙️ Thiết lập model: {self.VIDEO_MODEL}, duration: {duration}, ratio: {ratio}")
+            self.presets.ensure(page, "video", self._video_settings(duration, ratio))
+            
+            # Bắt đầu nghe status API trước khi click Generate để không lỡ response đầu tiên
+            tracker = VideoJobTracker(page, timeout_seconds=self.VIDEO_TIMEOUT_SECONDS)
+            tracker.start()
+            
+            # Tìm và click nút Generate
+            print("🚀 Đang bắt đầu sinh video...")
+            generate_selectors = [
+                "button[data-testid*='generate']",
+                "button:has-text('Generate')",
+                "button:has-text('Create')", 
+                ".generate-btn",
+                "input[type='submit']"
+            ]
+            
+            generated = False
+            for selector in generate_selectors:
                 try:
-                    # Thiết lập duration
-                    duration_selectors = [
-                        f"button:has-text('{duration}')",
-                        f"[data-value='{duration}']",
-                        f"option[value='{duration}']"
-                    ]
-                    
-                    for selector in duration_selectors:
-                        try:
-                            if page.query_selector(selector):
-                                page.click(selector)
-                                print(f"✓ Đã chọn duration: {duration}")
-                                break
-                        except:
-                            continue
-                    
-                    # Thiết lập ratio
-                    ratio_selectors = [
-                        f"button:has-text('{ratio}')",
-                        f"[data-value='{ratio}']",
-                        f"option[value='{ratio}']"
-                    ]
-                    
-                    for selector in ratio_selectors:
-                        try:
-                            if page.query_selector(selector):
-                                page.click(selector)
-                                print(f"✓ Đã chọn ratio: {ratio}")
-                                break
-                        except:
-                            continue
-                            
-                except Exception as e:
-                    print(f"⚠️ Lỗi thiết lập duration/ratio: {e}")
-                
-                # Tìm và click nút Generate
-                print("🚀 Đang bắt đầu sinh video...")
-                generate_selectors = [
-                    "button[data-testid*='generate']",
-                    "button:has-text('Generate')",
-                    "button:has-text('Create')", 
-                    ".generate-btn",
-                    "input[type='submit']"
-                ]
-                
-                generated = False
-                for selector in generate_selectors:
-                    try:
-                        if page.query_selector(selector):
-                            page.click(selector, timeout=3000)
-                            print("✓ Đã click nút sinh video")
-                            generated = True
-                            break
-                    except:
-                        continue
-                
-                if not generated:
-                    raise Exception("Không tìm thấy nút Generate")
-                
-                # Đợi video được sinh
-                print("⏳ Đang chờ video được sinh...")
-                success = self._wait_for_video_generation(timeout_seconds=180)  # 3 phút
-                
-                if not success:
-                    raise Exception("Sinh video thất bại hoặc timeout")
+                    if page.query_selector(selector):
+                        # Id của job lấy từ đúng response Generate của lần click này
+                        tracker.click_generate(lambda: page.click(selector, timeout=3000))
+                        print("✓ Đã click nút sinh video")
+                        generated = True
+                        break
+                except:
+                    continue
+            
+            if not generated:
+                tracker.stop()
+                raise Exception("Không tìm thấy nút Generate")
+            
+            # Đợi video được sinh
+            print("⏳ Đang chờ video được sinh...")
+            success = self._wait_for_video_generation(tracker, prewarm=True)
+            session_metadata["generation"] = tracker.summary()
+            
+            if not success:
+                raise Exception(tracker.error or f"Timeout: Video không được sinh ra sau {self.VIDEO_TIMEOUT_SECONDS} giây")
+            
+            # Tải video về
+            print("💾 Đang tải video...")
+            video_path = self._download_video_to_session(page, tracker)
+            
+            if video_path:
+                # Lưu metadata cuối cùng
+                session_metadata["output_video"] = os.path.basename(video_path)
+                session_metadata["status"] = "completed"
+                self._save_session_metadata(session_metadata)
                 
-                # Tải video về
-                print("💾 Đang tải video...")
-                video_path = self._download_video_to_session()
+                print(f"✅ Đã tải video thành công: {video_path}")
+                print(f"📁 Session folder: {self.current_session_dir}")
+                return video_path
+            else:
+                # Lưu metadata thất bại
+                session_metadata["status"] = "failed"
+                session_metadata["error"] = "Download failed"
+                self._save_session_metadata(session_metadata)
+                raise Exception("Không thể tải video")
                 
-                if video_path:
-                    # Lưu metadata cuối cùng
-                    session_metadata["output_video"] = os.path.basename(video_path)
-                    session_metadata["status"] = "completed"
-                    self._save_session_metadata(session_metadata)
-                    
-                    print(f"✅ Đã tải video thành công: {video_path}")
-                    print(f"📁 Session folder: {self.current_session_dir}")
-                    return video_path
-                else:
-                    # Lưu metadata thất bại
-                    session_metadata["status"] = "failed"
-                    session_metadata["error"] = "Download failed"
-                    self._save_session_metadata(session_metadata)
-                    raise Exception("Không thể tải video")
-                    
-            except Exception as e:
-                print(f"❌ Lỗi sinh video: {e}")
-                return None
-            finally:
-                browser.close()
+        except Exception as e:
+            print(f"❌ Lỗi sinh video: {e}")
+            return None
 
     def generate_video(self, prompt: str, cookie_string: str = None, duration: str = "5s", ratio: str = "1:1"):
         """
@@ -634,324 +881,223 @@ class FreepikVideoGenerator:
             "ratio": ratio
         }
         
+        # Browser đã được giữ ấm bằng start() → dùng lại page hiện có
+        if self.is_warm:
+            return self._text_to_video_on_page(self.page, prompt, cookie_string,
+                                               duration, ratio, session_metadata)
+        
+        from playwright.sync_api import sync_playwright
+        
         with sync_playwright() as p:
-            # Khởi động trình duyệt
-            browser = p.firefox.launch(headless=self.headless)
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            )
+            browser, context = self._launch_browser(p)
             page = context.new_page()
             
             try:
-                # Thiết lập cookie nếu có
-                if cookie_string:
-                    cookies = self.parse_cookies(cookie_string)
-                    self.set_cookies(page, cookies)
-                
-                # Đi đến trang Pikaso Video
-                print("🌐 Đang mở trang Freepik Pikaso Video...")
-                page.goto("https://www.freepik.com/pikaso/ai-video-generator", 
-                         wait_until="networkidle", timeout=30000)
-                
-                # Chờ và tìm ô nhập prompt
-                print("🔍 Tìm ô nhập prompt...")
-                
-                # Danh sách các selector có thể có
-                potential_selectors = [
-                    "textarea[placeholder*='Describe']",
-                    "textarea[placeholder*='describe']", 
-                    "textarea[placeholder*='prompt']",
-                    "textarea[placeholder*='Prompt']",
-                    "textarea[data-testid*='prompt']",
-                    "textarea[data-testid*='input']",
-                    "[contenteditable='true']",
-                    "textarea",
-                    "input[type='text']",
-                    "[role='textbox']",
-                    ".prompt-input",
-                    "#prompt",
-                    "#prompt-input",
-                    ".text-input",
-                    "[name='prompt']",
-                    "[placeholder*='Enter']",
-                    "[placeholder*='Type']"
-                ]
-                
-                prompt_selector = None
-                found = False
-                
-                # Thử từng selector
-                for selector in potential_selectors:
-                    try:
-                        page.wait_for_selector(selector, timeout=2000)
-                        
-                        # Kiểm tra xem element có thể nhập được không
-                        element = page.query_selector(selector)
-                        if element and element.is_enabled() and element.is_visible():
-                            prompt_selector = selector
-                            found = True
-                            print(f"✓ Tìm thấy ô prompt với selector: {selector}")
-                            break
-                    except:
-                        continue
-                
-                if not found:
-                    # Debug: In ra tất cả các element có thể là input
-                    print("🔍 Debug: Tìm tất cả input elements...")
-                    try:
-                        all_inputs = page.query_selector_all("input, textarea, [contenteditable], [role='textbox']")
-                        print(f"Tìm thấy {len(all_inputs)} input elements:")
-                        for i, inp in enumerate(all_inputs[:5]):  # Chỉ in 5 cái đầu
-                            tag = inp.evaluate("el => el.tagName")
-                            placeholder = inp.get_attribute("placeholder") or ""
-                            data_testid = inp.get_attribute("data-testid") or ""
-                            role = inp.get_attribute("role") or ""
-                            print(f"  {i+1}. <{tag}> placeholder='{placeholder}' data-testid='{data_testid}' role='{role}'")
-                    except Exception as e:
-                        print(f"Debug error: {e}")
+                return self._text_to_video_on_page(page, prompt, cookie_string,
+                                                   duration, ratio, session_metadata)
+            finally:
+                browser.close()
+                self._applied_cookie_string = None
+
+    def _text_to_video_on_page(self, page: "Page", prompt: str, cookie_string: Optional[str],
+                               duration: str, ratio: str, session_metadata: dict) -> Optional[str]:
+        """
+        Chạy quy trình text-to-video trên một page đã mở sẵn
+        
+        Returns:
+            str: Đường dẫn file video đã tải về, None nếu thất bại
+        """
+        try:
+            # Thiết lập cookie nếu có (bỏ qua nếu context warm đã có cookie này)
+            if cookie_string and cookie_string != self._applied_cookie_string:
+                cookies = self.parse_cookies(cookie_string)
+                self.set_cookies(page, cookies)
+                self._applied_cookie_string = cookie_string
+            
+            # Đi đến trang Pikaso Video
+            print("🌐 Đang mở trang Freepik Pikaso Video...")
+            self.presets.navigate(page, "video", self.VIDEO_GENERATOR_URL,
+                                  self._video_settings(duration, ratio),
+                                  wait_until="networkidle", timeout=30000)
+            
+            # Chờ và tìm ô nhập prompt
+            print("🔍 Tìm ô nhập prompt...")
+            
+            # Danh sách các selector có thể có
+            potential_selectors = [
+                "textarea[placeholder*='Describe']",
+                "textarea[placeholder*='describe']", 
+                "textarea[placeholder*='prompt']",
+                "textarea[placeholder*='Prompt']",
+                "textarea[data-testid*='prompt']",
+                "textarea[data-testid*='input']",
+                "[contenteditable='true']",
+                "textarea",
+                "input[type='text']",
+                "[role='textbox']",
+                ".prompt-input",
+                "#prompt",
+                "#prompt-input",
+                ".text-input",
+                "[name='prompt']",
+                "[placeholder*='Enter']",
+                "[placeholder*='Type']"
+            ]
+            
+            prompt_selector = None
+            found = False
+            
+            # Thử từng selector
+            for selector in potential_selectors:
+                try:
+                    page.wait_for_selector(selector, timeout=2000)
                     
-                    raise Exception("Không tìm thấy ô nhập prompt")
+                    # Kiểm tra xem element có thể nhập được không
+                    element = page.query_selector(selector)
+                    if element and element.is_enabled() and element.is_visible():
+                        prompt_selector = selector
+                        found = True
+                        print(f"✓ Tìm thấy ô prompt với selector: {selector}")
+                        break
+                except:
+                    continue
+            
+            if not found:
+                # Debug: In ra tất cả các element có thể là input
+                print("🔍 Debug: Tìm tất cả input elements...")
+                try:
+                    all_inputs = page.query_selector_all("input, textarea, [contenteditable], [role='textbox']")
+                    print(f"Tìm thấy {len(all_inputs)} input elements:")
+                    for i, inp in enumerate(all_inputs[:5]):  # Chỉ in 5 cái đầu
+                        tag = inp.evaluate("el => el.tagName")
+                        placeholder = inp.get_attribute("placeholder") or ""
+                        data_testid = inp.get_attribute("data-testid") or ""
+                        role = inp.get_attribute("role") or ""
+                        print(f"  {i+1}. <{tag}> placeholder='{placeholder}' data-testid='{data_testid}' role='{role}'")
+                except Exception as e:
+                    print(f"Debug error: {e}")
                 
-                # Nhập prompt
-                print("✍️ Đang nhập prompt...")
+                raise Exception("Không tìm thấy ô nhập prompt")
+            
+            # Nhập prompt
+            print("✍️ Đang nhập prompt...")
+            
+            # Thử nhiều cách nhập text
+            try:
+                # Cách 1: Clear và fill
+                page.click(prompt_selector)
+                page.fill(prompt_selector, "")  # Clear trước
+                page.fill(prompt_selector, prompt)
                 
-                # Thử nhiều cách nhập text
-                try:
-                    # Cách 1: Clear và fill
+                # Kiểm tra xem text đã được nhập chưa
+                current_value = page.input_value(prompt_selector) if page.query_selector(prompt_selector).get_attribute("value") is not None else page.text_content(prompt_selector)
+                
+                if not current_value or len(current_value.strip()) == 0:
+                    print("⚠️ Cách 1 không thành công, thử cách 2...")
+                    # Cách 2: Type từng ký tự
                     page.click(prompt_selector)
-                    page.fill(prompt_selector, "")  # Clear trước
-                    page.fill(prompt_selector, prompt)
+                    page.keyboard.press("Control+A")  # Select all
+                    page.keyboard.press("Delete")     # Delete
+                    page.type(prompt_selector, prompt, delay=50)
                     
-                    # Kiểm tra xem text đã được nhập chưa
                     current_value = page.input_value(prompt_selector) if page.query_selector(prompt_selector).get_attribute("value") is not None else page.text_content(prompt_selector)
                     
                     if not current_value or len(current_value.strip()) == 0:
-                        print("⚠️ Cách 1 không thành công, thử cách 2...")
-                        # Cách 2: Type từng ký tự
-                        page.click(prompt_selector)
-                        page.keyboard.press("Control+A")  # Select all
-                        page.keyboard.press("Delete")     # Delete
-                        page.type(prompt_selector, prompt, delay=50)
+                        print("⚠️ Cách 2 không thành công, thử cách 3...")
+                        # Cách 3: Sử dụng JavaScript
+                        page.evaluate(f"""
+                            const element = document.querySelector('{prompt_selector}');
+                            if (element) {{
+                                element.value = `{prompt}`;
+                                element.textContent = `{prompt}`;
+                                element.innerHTML = `{prompt}`;
+                                
+                                // Trigger events
+                                element.dispatchEvent(new Event('input', {{ bubbles: true }}));
+                                element.dispatchEvent(new Event('change', {{ bubbles: true }}));
+                            }}
+                        """)
                         
+                        # Kiểm tra lại
                         current_value = page.input_value(prompt_selector) if page.query_selector(prompt_selector).get_attribute("value") is not None else page.text_content(prompt_selector)
                         
                         if not current_value or len(current_value.strip()) == 0:
-                            print("⚠️ Cách 2 không thành công, thử cách 3...")
-                            # Cách 3: Sử dụng JavaScript
-                            page.evaluate(f"""
-                                const element = document.querySelector('{prompt_selector}');
-                                if (element) {{
-                                    element.value = `{prompt}`;
-                                    element.textContent = `{prompt}`;
-                                    element.innerHTML = `{prompt}`;
-                                    
-                                    // Trigger events
-                                    element.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                                    element.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                                }}
-                            """)
-                            
-                            # Kiểm tra lại
-                            current_value = page.input_value(prompt_selector) if page.query_selector(prompt_selector).get_attribute("value") is not None else page.text_content(prompt_selector)
-                            
-                            if not current_value or len(current_value.strip()) == 0:
-                                print("❌ Không thể nhập prompt bằng mọi cách!")
-                                raise Exception("Không thể nhập prompt vào ô input")
-                    
-                    print(f"✅ Đã nhập prompt thành công: {current_value[:50]}...")
-                    
-                except Exception as e:
-                    print(f"❌ Lỗi khi nhập prompt: {e}")
-                    raise
-                
-                # Chọn model Kling Master 2.1
-                print("⚙️ Đang chọn model Kling Master 2.1...")
-                try:
-                    # Tìm và click vào dropdown model
-                    model_selectors = [
-                        "[data-testid*='model']",
-                        "button[aria-label*='model']",
-                        ".model-selector",
-                        "select"
-                    ]
-                    
-                    for selector in model_selectors:
-                        try:
-                            page.click(selector, timeout=3000)
-                            time.sleep(1)
-                            
-                            # Tìm và chọn Kling Master 2.1
-                            kling_selectors = [
-                                "text=Kling Master 2.1",
-                                "[data-value*='kling']",
-                                "option[value*='kling']"
-                            ]
-                            
-                            for kling_selector in kling_selectors:
-                                try:
-                                    page.click(kling_selector, timeout=2000)
-                                    print("✓ Đã chọn model Kling Master 2.1")
-                                    break
-                                except:
-                                    continue
-                            break
-                        except:
-                            continue
-                            
-                except Exception as e:
-                    print(f"⚠️ Không thể chọn model: {e}")
-                    print("📝 Sử dụng model mặc định")
-                
-                # Chọn thời lượng video
-                print(f"⏱️ Đang chọn thời lượng: {duration}")
-                try:
-                    duration_selectors = [
-                        f"button:has-text('{duration}')",
-                        f"[data-value='{duration}']",
-                        f".duration-{duration}"
-                    ]
-                    
-                    for selector in duration_selectors:
-                        try:
-                            page.click(selector, timeout=3000)
-                            print(f"✓ Đã chọn thời lượng {duration}")
-                            break
-                        except:
-                            continue
-                except Exception as e:
-                    print(f"⚠️ Không thể chọn thời lượng: {e}")
-                
-                # Chọn tỷ lệ khung hình
-                print(f"📏 Đang chọn tỷ lệ: {ratio}")
-                try:
-                    ratio_selectors = [
-                        f"button:has-text('{ratio}')",
-                        f"[data-value='{ratio}']",
-                        f".ratio-{ratio.replace(':', 'x')}"
-                    ]
-                    
-                    for selector in ratio_selectors:
-                        try:
-                            page.click(selector, timeout=3000)
-                            print(f"✓ Đã chọn tỷ lệ {ratio}")
-                            break
-                        except:
-                            continue
-                except Exception as e:
-                    print(f"⚠️ Không thể chọn tỷ lệ: {e}")
-                
-                # Tìm và click nút Generate
-                print("🚀 Đang bắt đầu sinh video...")
-                generate_selectors = [
-                    "button[data-testid*='generate']",
-                    "button:has-text('Generate')",
-                    "button:has-text('Create')", 
-                    ".generate-btn",
-                    "input[type='submit']"
-                ]
-                
-                generated = False
-                for selector in generate_selectors:
-                    try:
-                        page.click(selector, timeout=3000)
-                        print("✓ Đã click nút sinh video")
-                        generated = True
-                        break
-                    except:
-                        continue
-                
-                if not generated:
-                    raise Exception("Không tìm thấy nút Generate")
-                
-                # Chờ video được sinh ra
-                print("⏳ Đang chờ video được sinh ra...")
+                            print("❌ Không thể nhập prompt bằng mọi cách!")
+                            raise Exception("Không thể nhập prompt vào ô input")
                 
-                # Đợi kết quả trong 180 giây (video mất nhiều thời gian hơn ảnh)
-                result_found = False
-                for i in range(180):
-                    try:
-                        # Tìm video kết quả hoặc nút download
-                        result_selectors = [
-                            "video[src*='generated']",
-                            "button:has-text('Download')",
-                            ".result-video",
-                            ".generated-video",
-                            "[data-testid*='result'] video",
-                            ".download-btn"
-                        ]
-                        
-                        for selector in result_selectors:
-                            try:
-                                page.wait_for_selector(selector, timeout=2000)
-                                print("✅ Video đã được sinh ra!")
-                                result_found = True
-                                break
-                            except:
-                                continue
-                        
-                        if result_found:
-                            break
-                            
-                        time.sleep(1)
-                        print(f"⏳ Đang chờ... ({i+1}/180s)")
-                        
-                    except:
-                        time.sleep(1)
-                
-                if not result_found:
-                    raise Exception("Timeout: Video không được sinh ra sau 180 giây")
-                
-                # Tải video về session folder
-                print("💾 Đang tải video về...")
-                
-                # Tạo tên file video với timestamp
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"video_output_{timestamp}.mp4"
-                filepath = os.path.join(self.current_session_dir, filename)
-                
-                # Tìm link download
-                download_selectors = [
-                    "a[download]",
-                    "button:has-text('Download')",
-                    ".download-btn"
-                ]
-                
-                downloaded = False
-                for selector in download_selectors:
-                    try:
-                        with page.expect_download() as download_info:
-                            page.click(selector, timeout=5000)
-                        download = download_info.value
-                        download.save_as(filepath)
-                        downloaded = True
-                        break
-                    except:
-                        continue
+                print(f"✅ Đã nhập prompt thành công: {current_value[:50]}...")
                 
-                if downloaded:
-                    # Lưu metadata thành công
-                    session_metadata["output_video"] = os.path.basename(filepath)
-                    session_metadata["status"] = "completed"
-                    self._save_session_metadata(session_metadata)
-                    
-                    print(f"✅ Đã lưu video: {filepath}")
-                    print(f"📁 Session folder: {self.current_session_dir}")
-                    return filepath
-                else:
-                    # Lưu metadata thất bại
-                    session_metadata["status"] = "failed"
-                    session_metadata["error"] = "Download failed"
-                    self._save_session_metadata(session_metadata)
-                    raise Exception("Không thể tải video về")
-                    
             except Exception as e:
-                # Lưu metadata lỗi
-                session_metadata["status"] = "error"
-                session_metadata["error"] = str(e)
+                print(f"❌ Lỗi khi nhập prompt: {e}")
+                raise
+            
+            # Áp model Kling 2.1 Master + duration + ratio (một probe xác minh, fallback UI)
+            print(f"⚙️ Thiết lập model: {self.VIDEO_MODEL}, duration: {duration}, ratio: {ratio}")
+            self.presets.ensure(page, "video", self._video_settings(duration, ratio))
+            
+            # Bắt đầu nghe status API trước khi click Generate để không lỡ response đầu tiên
+            tracker = VideoJobTracker(page, timeout_seconds=self.VIDEO_TIMEOUT_SECONDS)
+            tracker.start()
+            
+            # Tìm và click nút Generate
+            print("🚀 Đang bắt đầu sinh video...")
+            generate_selectors = [
+                "button[data-testid*='generate']",
+                "button:has-text('Generate')",
+                "button:has-text('Create')", 
+                ".generate-btn",
+                "input[type='submit']"
+            ]
+            
+            generated = False
+            for selector in generate_selectors:
+                try:
+                    tracker.click_generate(lambda: page.click(selector, timeout=3000))
+                    print("✓ Đã click nút sinh video")
+                    generated = True
+                    break
+                except:
+                    continue
+            
+            if not generated:
+                tracker.stop()
+                raise Exception("Không tìm thấy nút Generate")
+            
+            # Chờ video được sinh ra (theo tiến độ từ status API, deadline thật)
+            print("⏳ Đang chờ video được sinh ra...")
+            result_found = self._wait_for_video_generation(tracker)
+            session_metadata["generation"] = tracker.summary()
+            
+            if not result_found:
+                raise Exception(tracker.error or f"Timeout: Video không được sinh ra sau {self.VIDEO_TIMEOUT_SECONDS} giây")
+            
+            # Tải video về session folder
+            print("💾 Đang tải video về...")
+            filepath = self._download_video_to_session(page, tracker)
+            downloaded = filepath is not None
+            
+            if downloaded:
+                # Lưu metadata thành công
+                session_metadata["output_video"] = os.path.basename(filepath)
+                session_metadata["status"] = "completed"
                 self._save_session_metadata(session_metadata)
                 
-                print(f"❌ Lỗi khi sinh video: {e}")
-                return None
+                print(f"✅ Đã lưu video: {filepath}")
+                print(f"📁 Session folder: {self.current_session_dir}")
+                return filepath
+            else:
+                # Lưu metadata thất bại
+                session_metadata["status"] = "failed"
+                session_metadata["error"] = "Download failed"
+                self._save_session_metadata(session_metadata)
+                raise Exception("Không thể tải video về")
                 
-            finally:
-                browser.close() 
\ No newline at end of file
+        except Exception as e:
+            # Lưu metadata lỗi
+            session_metadata["status"] = "error"
+            session_metadata["error"] = str(e)
+            self._save_session_metadata(session_metadata)
+            
+            print(f"❌ Lỗi khi sinh video: {e}")
+            return None
+            
@@ -0,0 +1,182 @@
+"""
+Sổ credits của batch: giới hạn ngân sách, đo credits thực tế và dừng sạch khi hết
+
+Trước mỗi job, worker giữ chỗ (reserve) số credits ước tính của job; job nào làm tổng
+đã tiêu + đang giữ vượt giới hạn (min của credit_budget và số dư đọc lúc pre-flight) thì
+không được chạy và batch dừng lại (các job còn lại được ghi vào checkpoint để --resume).
+
+Ước tính ban đầu lấy từ BatchProcessor.prompt_credits. Cứ credit_check_every job, sổ
+đọc lại số dư (một request, xem preflight.read_credit_balance): phần chênh lệch so với
+lần đọc trước được chia cho các job vừa xong theo tỉ lệ ước tính, và hệ số rate (thực tế /
+ước tính) được hiệu chỉnh cho các job sau. Khi chạy song song, credits của job đang chạy
+dở có thể bị tính cho job vừa xong; tổng số vẫn đúng với số dư.
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from prompt_job import PromptJob
+from resource_autoscaler import DispatchStopped
+
+DEFAULT_CHECK_EVERY = 5
+MIN_RATE = 0.1
+MAX_RATE = 10.0
+
+
+class BudgetExhausted(DispatchStopped):
+    """Không còn đủ credits (ngân sách hoặc số dư) cho job kế tiếp"""
+
+
+class CreditLedger:
+    """Theo dõi credits đã tiêu / đang giữ chỗ của các job trong một batch (an toàn giữa các thread)"""
+
+    def __init__(self, cost: Callable[[PromptJob], int], budget: Optional[int] = None,
+                 balance: Optional[int] = None,
+                 balance_reader: Optional[Callable[[], Optional[int]]] = None,
+                 check_every: int = DEFAULT_CHECK_EVERY):
+        """
+        Args:
+            cost: Credits ước tính của một job (chưa hiệu chỉnh)
+            budget: Số credits tối đa batch được tiêu (None / 0 = không giới hạn ngoài số dư)
+            balance: Số dư đọc được trước khi chạy (None = không biết, không đo thực tế)
+            balance_reader: Hàm đọc lại số dư hiện tại (None nếu lỗi / không đọc được)
+            check_every: Đọc lại số dư sau mỗi N job xong (0 = chỉ đọc khi kết thúc)
+        """
+        self.cost = cost
+        self.budget = budget if budget and budget > 0 else None
+        self.start_balance = balance
+        self.balance = balance
+        self.balance_reader = balance_reader if balance is not None else None
+        self.check_every = max(0, check_every)
+        self.rate = 1.0
+        self.spent = 0.0
+        self.reserved = 0.0
+        self.measured = False
+        self.exhausted = False
+        self.stop_reason: Optional[str] = None
+        self.entries: List[Dict[str, Any]] = []
+        self._unmeasured: List[Dict[str, Any]] = []
+        self._reservations: Dict[int, float] = {}
+        self._settled_since_check = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> Optional[float]:
+        """Giới hạn credits của batch (nhỏ hơn giữa ngân sách và số dư ban đầu)"""
+        limits = [value for value in (self.budget, self.start_balance) if value is not None]
+        return min(limits) if limits else None
+
+    @property
+    def remaining(self) -> Optional[float]:
+        limit = self.limit
+        return None if limit is None else limit - self.spent - self.reserved
+
+    def estimate(self, job: PromptJob) -> float:
+        """Credits dự kiến của job theo hệ số đã hiệu chỉnh"""
+        return self.cost(job) * self.rate
+
+    def reserve(self, *jobs: Optional[PromptJob]) -> bool:
+        """
+        Giữ chỗ credits cho các job trước khi chạy (cả nhóm hoặc không job nào)
+
+        Job đã được giữ chỗ từ trước (vd. video cùng cặp với ảnh) được bỏ qua.
+        False = hết ngân sách: batch dừng cấp phát job mới.
+        """
+        with self._lock:
+            jobs = [job for job in jobs if job is not None and id(job) not in self._reservations]
+            if not jobs:
+                return True
+            if self.exhausted:
+                return False
+            amounts = [self.estimate(job) for job in jobs]
+            remaining = self.remaining
+            if remaining is not None and sum(amounts) > remaining:
+                self.exhausted = True
+                self.stop_reason = (f"hết credits: {jobs[0].prompt_id or 'job'} cần ~{sum(amounts):.0f}, "
+                                    f"còn ~{max(0.0, remaining):.0f} / giới hạn {self.limit:.0f}")
+                print(f"🛑 Dừng batch vì {self.stop_reason}")
+                return False
+            for job, amount in zip(jobs, amounts):
+                self._reservations[id(job)] = amount
+            self.reserved += sum(amounts)
+            return True
+
+    def settle(self, job: PromptJob, completed: float = 1.0) -> None:
+        """
+        Ghi nhận job đã chạy xong và trả lại phần giữ chỗ
+
+        Args:
+            completed: Phần đã hoàn thành (1 / True = thành công, 0 = lỗi, vd. 2/3 biến thể video)
+        """
+        with self._lock:
+            amount = self._reservations.pop(id(job), 0.0)
+            self.reserved -= amount
+            charged = amount * max(0.0, min(1.0, float(completed)))
+            entry = {'prompt_id': job.prompt_id, 'media': job.media.value,
+                     'estimated': amount, 'credits': charged, 'measured': False}
+            self.entries.append(entry)
+            self._unmeasured.append(entry)
+            self.spent += charged
+            self._settled_since_check += 1
+            check = bool(self.balance_reader and self.check_every
+                         and self._settled_since_check >= self.check_every)
+            if check:
+                self._settled_since_check = 0
+        if check:
+            self.reconcile()
+
+    def reconcile(self) -> Optional[int]:
+        """Đọc lại số dư, chia credits thực tế cho các job chưa đo và hiệu chỉnh rate"""
+        if not self.balance_reader:
+            return None
+        try:
+            reading = self.balance_reader()
+        except Exception as e:
+            print(f"⚠️ Lỗi đọc số dư credits: {e}")
+            reading = None
+        if reading is None:
+            return None
+
+        with self._lock:
+            self.balance = reading
+            measured = float(self.start_balance - reading)
+            estimated = sum(entry['credits'] for entry in self._unmeasured)
+            delta = max(0.0, measured - (self.spent - estimated))
+            if estimated > 0 and delta == 0:
+                # Số dư chưa cập nhật kịp: giữ ước tính (thận trọng), đo lại lần sau
+                print(f"💳 Số dư {reading} credits chưa phản ánh các job vừa xong, giữ ước tính")
+                return reading
+            if estimated > 0:
+                scale = delta / estimated
+                self.rate = max(MIN_RATE, min(MAX_RATE, self.rate * scale))
+                for entry in self._unmeasured:
+                    entry['credits'] *= scale
+            elif self._unmeasured and delta > 0:
+                # Job lỗi vẫn bị trừ credits: chia đều cho các job vừa xong
+                for entry in self._unmeasured:
+                    entry['credits'] = delta / len(self._unmeasured)
+            for entry in self._unmeasured:
+                entry['measured'] = True
+            self._unmeasured = []
+            self.spent = measured
+            self.measured = True
+
+        print(f"💳 Số dư {reading} credits, batch đã tiêu {measured:.0f} (thực tế/ước tính x{self.rate:.2f})")
+        return reading
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Tóm tắt cho báo cáo / checkpoint (credits làm tròn)"""
+        return {
+            'budget': self.budget,
+            'start_balance': self.start_balance,
+            'balance': self.balance,
+            'spent': round(self.spent),
+            'measured': self.measured,
+            'rate': round(self.rate, 2),
+            'stopped': self.stop_reason,
+            'jobs': [
+                {'prompt_id': entry['prompt_id'], 'type': entry['media'],
+                 'credits': round(entry['credits']), 'measured': entry['measured']}
+                for entry in self.entries
+            ]
+        }
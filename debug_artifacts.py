@@ -0,0 +1,214 @@
+"""
+Debug artifacts cho browser automation
+
+Mặc định TẮT (kể cả khi chạy batch): đường chạy bình thường không chụp screenshot nào.
+Khi bật (`python main.py --debug ...` hoặc debug_mode=true trong config_template.txt):
+- Ghi ring buffer các snapshot DOM nhẹ (URL, tiêu đề, số phần tử chính, đoạn text) ở mỗi bước
+- Ghi Playwright trace theo từng job, chỉ lưu ra file khi job lỗi
+- Screenshot chỉ chụp khi được yêu cầu, phần ghi file chạy ở thread nền
+"""
+
+import os
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+DEBUG_ENV_VAR = "FAZZYTOOL_DEBUG"
+DEFAULT_RING_SIZE = 20
+
+# Snapshot nhẹ: chỉ đọc vài thuộc tính DOM, không serialize cả trang
+SNAPSHOT_JS = """
+() => {
+    const visible = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0;
+    };
+    const active = document.activeElement;
+    return {
+        url: location.href,
+        title: document.title,
+        ready_state: document.readyState,
+        images: document.querySelectorAll('img').length,
+        canvases: document.querySelectorAll('canvas').length,
+        inputs: document.querySelectorAll('textarea, input, [contenteditable="true"]').length,
+        dialogs: Array.from(document.querySelectorAll('[role="dialog"], [aria-modal="true"], .modal')).filter(visible).length,
+        generate_button: !!document.querySelector("button[data-cy='generate-button']"),
+        active_element: active ? (active.tagName + (active.id ? '#' + active.id : '')) : null,
+        text: (document.body ? document.body.innerText : '').slice(0, 500)
+    };
+}
+"""
+
+
+def is_debug_enabled() -> bool:
+    """Bật debug khi có biến môi trường FAZZYTOOL_DEBUG=1 hoặc debug_mode=true trong config"""
+    if os.environ.get(DEBUG_ENV_VAR, "").lower() in ("1", "true", "yes"):
+        return True
+
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip().lower()
+                    if line.replace(' ', '') == 'debug_mode=true':
+                        return True
+    except Exception:
+        pass
+
+    return False
+
+
+class DebugRecorder:
+    """Thu thập artifact debug cho một generator; mọi method đều an toàn khi bị tắt"""
+
+    def __init__(self, output_dir: str = "output", enabled: Optional[bool] = None,
+                 ring_size: int = DEFAULT_RING_SIZE):
+        self.enabled = is_debug_enabled() if enabled is None else enabled
+        self.debug_dir = os.path.join(output_dir, "debug")
+        self.snapshots = deque(maxlen=ring_size)
+        self.job_label = None
+        self._context = None
+        self._chunk_open = False
+        self._writer = None
+
+    def attach(self, context) -> None:
+        """Bắt đầu Playwright tracing cho context (chỉ khi debug bật)"""
+        if not self.enabled:
+            return
+
+        try:
+            context.tracing.start(snapshots=True, screenshots=False, sources=False)
+            self._context = context
+        except Exception as e:
+            print(f"⚠️ Không thể bật Playwright trace: {e}")
+
+    def detach(self) -> None:
+        """Dừng tracing trước khi đóng context, bỏ trace của job dở dang"""
+        if not self._context:
+            return
+
+        try:
+            self._context.tracing.stop()
+        except Exception:
+            pass
+        self._context = None
+        self._chunk_open = False
+
+    def begin_job(self, label: str) -> None:
+        """Bắt đầu job mới: xóa ring buffer, mở trace chunk riêng"""
+        if not self.enabled:
+            return
+
+        self.job_label = label
+        self.snapshots.clear()
+        if self._context:
+            try:
+                if self._chunk_open:
+                    self._context.tracing.stop_chunk()
+                self._context.tracing.start_chunk(title=label[:80])
+                self._chunk_open = True
+            except Exception as e:
+                print(f"⚠️ Không thể mở trace chunk: {e}")
+
+    def end_job(self) -> None:
+        """Job thành công: bỏ trace chunk, không ghi gì ra đĩa"""
+        if self._context and self._chunk_open:
+            try:
+                self._context.tracing.stop_chunk()
+            except Exception:
+                pass
+        self._chunk_open = False
+
+    def snapshot(self, page, step: str) -> None:
+        """Ghi một snapshot DOM nhẹ vào ring buffer"""
+        if not self.enabled:
+            return
+
+        entry = {"step": step, "time": datetime.now().isoformat(timespec="milliseconds")}
+        try:
+            entry.update(page.evaluate(SNAPSHOT_JS))
+        except Exception as e:
+            entry["error"] = str(e)
+        self.snapshots.append(entry)
+
+    def screenshot(self, page, name: str) -> None:
+        """Chụp screenshot theo yêu cầu; ghi file ở thread nền để không chặn luồng chính"""
+        if not self.enabled:
+            return
+
+        try:
+            data = page.screenshot(type="jpeg", quality=70)
+        except Exception as e:
+            print(f"⚠️ Không thể chụp screenshot {name}: {e}")
+            return
+
+        filepath = os.path.join(self.debug_dir, f"{name}_{int(time.time())}.jpg")
+        self._submit_write(filepath, data)
+        print(f"📸 Screenshot debug: {filepath}")
+
+    def dump_failure(self, page, reason: str) -> Optional[str]:
+        """
+        Ghi artifact khi job lỗi: ring buffer snapshot, trace chunk và một screenshot.
+        Khi debug tắt chỉ in lý do, không chạm vào đĩa.
+
+        Returns:
+            Thư mục chứa artifact, None nếu debug tắt
+        """
+        if not self.enabled:
+            print("💡 Chạy lại với --debug hoặc debug_mode=true để lưu snapshot/trace khi lỗi")
+            return None
+
+        failure_dir = os.path.join(self.debug_dir, f"failure_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        os.makedirs(failure_dir, exist_ok=True)
+
+        if page is not None:
+            self.snapshot(page, "failure")
+
+        report: Dict[str, Any] = {
+            "job": self.job_label,
+            "reason": reason,
+            "snapshots": list(self.snapshots)
+        }
+        self._submit_write(os.path.join(failure_dir, "snapshots.json"),
+                           json.dumps(report, ensure_ascii=False, indent=2).encode("utf-8"))
+
+        if self._context and self._chunk_open:
+            try:
+                self._context.tracing.stop_chunk(path=os.path.join(failure_dir, "trace.zip"))
+            except Exception as e:
+                print(f"⚠️ Không thể lưu trace: {e}")
+            self._chunk_open = False
+
+        if page is not None:
+            try:
+                self._submit_write(os.path.join(failure_dir, "page.png"), page.screenshot())
+            except Exception:
+                pass
+
+        print(f"🧾 Đã lưu debug artifact: {failure_dir}")
+        print(f"   Xem trace: playwright show-trace {os.path.join(failure_dir, 'trace.zip')}")
+        return failure_dir
+
+    def flush(self) -> None:
+        """Chờ các file đang ghi ở thread nền hoàn tất"""
+        if self._writer:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    def _submit_write(self, filepath: str, data: bytes) -> None:
+        """Đưa việc ghi file sang thread nền"""
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fazzy-debug")
+        self._writer.submit(self._write_file, filepath, data)
+
+    @staticmethod
+    def _write_file(filepath: str, data: bytes) -> None:
+        try:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with open(filepath, 'wb') as f:
+                f.write(data)
+        except Exception as e:
+            print(f"⚠️ Lỗi ghi debug artifact {filepath}: {e}")
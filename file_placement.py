@@ -0,0 +1,166 @@
+"""
+Đặt file vào session folder mà không nhân đôi dữ liệu, và ghi file đầu ra an toàn
+
+Ảnh đầu vào không còn bị copy vào từng session: thử reflink (Btrfs/XFS, chia sẻ block,
+ghi đè bản này không ảnh hưởng bản kia), rồi hard link, và chỉ copy khi nguồn nằm ở ổ
+khác. Nếu hệ thống file không hỗ trợ link thì chỉ ghi tham chiếu tới file gốc vào
+session_info.json. File đầu ra (video, ảnh, metadata) được ghi vào file tạm cùng thư mục
+rồi os.replace, nên không bao giờ thấy file dở dang.
+
+Chế độ chọn qua input_placement trong config_template.txt: auto | reflink | hardlink | reference | copy
+"""
+
+import os
+import json
+import errno
+import shutil
+import secrets
+import threading
+from typing import Any, Optional, Tuple
+
+PLACEMENT_MODES = ("auto", "reflink", "hardlink", "reference", "copy")
+
+# ioctl FICLONE của Linux (linux/fs.h)
+FICLONE = 0x40049409
+
+
+def load_placement_mode() -> str:
+    """Đọc input_placement từ config_template.txt (mặc định: auto)"""
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip()
+                    if '=' not in line:
+                        continue
+                    key, value = [part.strip() for part in line.split('=', 1)]
+                    if key.lower() == 'input_placement' and value.lower() in PLACEMENT_MODES:
+                        return value.lower()
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc input_placement, dùng auto: {e}")
+    return "auto"
+
+
+def place_file(source_path: str, dest_path: str, mode: str = "auto") -> Tuple[str, str]:
+    """
+    Đặt source_path vào dest_path theo chế độ đã chọn.
+
+    Returns:
+        (đường dẫn nên dùng, phương pháp đã dùng: reflink | hardlink | copy | reference)
+        Với reference, đường dẫn trả về là file gốc và dest_path không được tạo.
+    """
+    if mode == "reference":
+        return os.path.abspath(source_path), "reference"
+    if mode == "copy":
+        return _copy(source_path, dest_path), "copy"
+
+    same_device = _same_device(source_path, os.path.dirname(dest_path) or ".")
+    if not same_device:
+        # Khác ổ: không link được, copy là cách duy nhất còn giữ được file trong session
+        return _copy(source_path, dest_path), "copy"
+
+    if mode in ("auto", "reflink") and _reflink(source_path, dest_path):
+        return dest_path, "reflink"
+
+    if mode in ("auto", "hardlink"):
+        try:
+            _remove_existing(dest_path)
+            os.link(source_path, dest_path)
+            return dest_path, "hardlink"
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                return _copy(source_path, dest_path), "copy"
+            print(f"⚠️ Không tạo được hard link ({e}), chỉ ghi tham chiếu")
+
+    return os.path.abspath(source_path), "reference"
+
+
+def atomic_write_bytes(filepath: str, data: bytes) -> None:
+    """Ghi bytes vào file tạm cùng thư mục rồi os.replace sang tên thật"""
+    tmp_path = _tmp_path(filepath)
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+    except Exception:
+        _discard(tmp_path)
+        raise
+
+
+def atomic_write_json(filepath: str, obj: Any, **dump_kwargs) -> None:
+    """json.dump an toàn: người đọc chỉ thấy bản cũ hoặc bản mới hoàn chỉnh"""
+    dump_kwargs.setdefault("ensure_ascii", False)
+    dump_kwargs.setdefault("indent", 2)
+    atomic_write_bytes(filepath, json.dumps(obj, **dump_kwargs).encode("utf-8"))
+
+
+def atomic_save_download(download, filepath: str) -> None:
+    """Lưu Playwright Download qua file tạm rồi os.replace"""
+    tmp_path = _tmp_path(filepath)
+    try:
+        download.save_as(tmp_path)
+        os.replace(tmp_path, filepath)
+    except Exception:
+        _discard(tmp_path)
+        raise
+
+
+def _reflink(source_path: str, dest_path: str) -> bool:
+    """Clone block bằng FICLONE (chỉ Linux, chỉ trên Btrfs/XFS/...); False nếu không hỗ trợ"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    tmp_path = _tmp_path(dest_path)
+    try:
+        with open(source_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+        return True
+    except OSError:
+        _discard(tmp_path)
+        return False
+
+
+def _copy(source_path: str, dest_path: str) -> str:
+    tmp_path = _tmp_path(dest_path)
+    try:
+        shutil.copy2(source_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    except Exception:
+        _discard(tmp_path)
+        raise
+    return dest_path
+
+
+def _same_device(source_path: str, dest_dir: str) -> bool:
+    try:
+        return os.stat(source_path).st_dev == os.stat(dest_dir).st_dev
+    except OSError:
+        return False
+
+
+def _remove_existing(path: str) -> None:
+    if os.path.lexists(path):
+        os.remove(path)
+
+
+def _tmp_path(filepath: str) -> str:
+    """
+    Tên file tạm riêng cho mỗi lần ghi: pid + thread + hậu tố ngẫu nhiên, nên nhiều process /
+    thread cùng ghi một đích không dùng chung file tạm. Không dùng mkstemp vì file 0600 của nó
+    sẽ mang quyền đó sang file thật sau os.replace.
+    """
+    directory, name = os.path.split(filepath)
+    suffix = f"{os.getpid()}.{threading.get_ident()}.{secrets.token_hex(4)}"
+    return os.path.join(directory, f".{name}.{suffix}.tmp")
+
+
+def _discard(path: Optional[str]) -> None:
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,391 @@
+"""
+Preset engine: áp model / tỉ lệ / thời lượng cho Pikaso trong một lần thay vì dò từng selector
+
+Thứ tự thử (phương pháp chạy được sẽ được cache theo phiên bản trang):
+1. local_storage: seed lại app-state đã chụp được từ lần trước bằng add_init_script trước khi goto
+2. url_params: thêm tham số preset vào URL khi điều hướng
+3. ui: fallback dò selector trên UI như trước; thành công thì chụp app-state trong localStorage
+   để lần sau dùng phương pháp 1 (chỉ các key cài đặt generator được cho phép, không bao
+   giờ chụp key khác vì có thể chứa token đăng nhập)
+
+Tên key localStorage và tên tham số URL mặc định là phỏng đoán, chưa đối chiếu với bundle của
+Pikaso: đoán sai thì hai cách đầu chỉ không có tác dụng (probe báo thiếu → fallback UI) và cache
+ghi nhận để lần sau bỏ qua. Sửa lại bằng preset_storage_keys / preset_url_params trong
+config_template.txt khi đã xác định được tên thật.
+
+Sau mỗi cách chỉ chạy đúng một probe (một lần evaluate) để xác minh trạng thái.
+Cache lưu ở .fazzytool/presets.json, tự bỏ khi Pikaso deploy phiên bản mới; nhiều engine (nhiều
+worker / process) cùng ghi thì đọc lại và gộp theo tool dưới khóa trước khi ghi.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Callable, Tuple, TYPE_CHECKING
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl
+
+from file_placement import atomic_write_json
+
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
+
+PRESET_CACHE_FILE = os.path.join(".fazzytool", "presets.json")
+# Khóa giữa các thread trong process; giữa các process dùng file khóa cạnh cache
+_CACHE_LOCK = threading.Lock()
+
+# Tên tham số URL cho từng trường preset (phỏng đoán, đổi bằng preset_url_params)
+URL_PARAM_NAMES = {
+    "model": "model",
+    "duration": "duration",
+    "ratio": "aspect_ratio"
+}
+
+# Phiên bản trang: build id của app (đổi sau mỗi lần Pikaso deploy)
+PAGE_VERSION_JS = """
+() => {
+    const next = window.__NEXT_DATA__ && window.__NEXT_DATA__.buildId;
+    if (next) return 'next:' + next;
+    const meta = document.querySelector('meta[name="version"], meta[name="build-version"], meta[name="app-version"]');
+    if (meta && meta.content) return 'meta:' + meta.content;
+    const script = Array.from(document.scripts).map(s => s.src)
+        .find(src => /\\/(_next|assets|static)\\//.test(src));
+    return script ? 'script:' + script.split('/').slice(-2).join('/') : 'unknown';
+}
+"""
+
+# Probe duy nhất: trường nào trong preset đang được chọn trên UI
+VERIFY_JS = """
+(fields) => {
+    const norm = t => (t || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    const isActive = el => {
+        if (['aria-pressed', 'aria-selected', 'aria-checked'].some(a => el.getAttribute(a) === 'true')) return true;
+        if (['active', 'on', 'checked'].includes(el.getAttribute('data-state'))) return true;
+        return /\\b(active|selected|checked)\\b/i.test(typeof el.className === 'string' ? el.className : '');
+    };
+    const controls = Array.from(document.querySelectorAll(
+        'button, select, [role="option"], [role="radio"], [role="tab"], [role="combobox"]'
+    ));
+    const result = {};
+    for (const [field, value] of Object.entries(fields)) {
+        const target = norm(value);
+        if (field === 'model') {
+            result[field] = controls.some(el => {
+                if (el.tagName === 'SELECT') {
+                    return norm(el.selectedOptions[0] && el.selectedOptions[0].textContent).includes(target);
+                }
+                const opensMenu = el.getAttribute('role') === 'combobox' || el.hasAttribute('aria-haspopup');
+                return norm(el.textContent).includes(target) && (opensMenu || isActive(el));
+            });
+        } else {
+            result[field] = controls.some(el => norm(el.textContent) === target && isActive(el));
+        }
+    }
+    return result;
+}
+"""
+
+# Key localStorage chứa cài đặt generator của Pikaso (model / tỉ lệ / thời lượng) được phép chụp
+# và seed lại; các key khác (token, session, tracking) không bao giờ được ghi vào cache.
+# Phỏng đoán, đổi bằng preset_storage_keys
+STORAGE_KEYS = (
+    "pikaso-settings",
+    "pikaso-image-settings",
+    "pikaso-video-settings",
+    "pikaso:image-generator",
+    "pikaso:video-generator"
+)
+
+# Chụp các key được phép có chứa giá trị preset (app-state của Pikaso)
+CAPTURE_STORAGE_JS = """
+(args) => {
+    const needles = args.values.map(v => String(v).toLowerCase());
+    const state = {};
+    for (const key of args.keys) {
+        const value = localStorage.getItem(key);
+        if (!value || value.length >= 20000) continue;
+        const lower = value.toLowerCase();
+        if (needles.some(n => lower.includes(n))) state[key] = value;
+    }
+    return state;
+}
+"""
+
+SEED_STORAGE_JS = """
+(state => {
+    try {
+        for (const [key, value] of Object.entries(state)) localStorage.setItem(key, value);
+    } catch (e) {}
+})(%s)
+"""
+
+# Selector cho fallback UI (giữ nguyên các selector đã dùng trong browser_video.py)
+MODEL_MENU_SELECTORS = [
+    "button:has-text('Model')",
+    "[data-testid*='model']",
+    "button[aria-label*='model']",
+    ".model-selector",
+    ".model-dropdown",
+    "select",
+    "[role='combobox']"
+]
+
+
+def load_preset_config() -> Tuple[Tuple[str, ...], Dict[str, str]]:
+    """
+    Đọc preset_storage_keys (danh sách key, phân cách bằng dấu phẩy) và preset_url_params
+    (dạng model:model, duration:duration, ratio:aspect_ratio) từ config_template.txt.
+    Để trống hoặc lỗi thì dùng STORAGE_KEYS / URL_PARAM_NAMES.
+    """
+    storage_keys, url_params = STORAGE_KEYS, dict(URL_PARAM_NAMES)
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip()
+                    if '=' not in line:
+                        continue
+                    key, value = [part.strip() for part in line.split('=', 1)]
+                    key = key.lower()
+                    if key == 'preset_storage_keys' and value:
+                        storage_keys = tuple(k.strip() for k in value.split(',') if k.strip())
+                    elif key == 'preset_url_params' and value:
+                        parsed = {}
+                        for pair in value.split(','):
+                            field, _, name = pair.partition(':')
+                            if field.strip() in URL_PARAM_NAMES and name.strip():
+                                parsed[field.strip()] = name.strip()
+                        url_params = parsed
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc cấu hình preset, dùng mặc định: {e}")
+    return storage_keys, url_params
+
+
+@contextmanager
+def _locked_cache(cache_file: str):
+    """Khóa ghi cache preset: threading.Lock trong process + flock/msvcrt trên file .lock"""
+    with _CACHE_LOCK:
+        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+        with open(cache_file + ".lock", "a+") as handle:
+            try:
+                import fcntl
+            except ImportError:
+                import msvcrt
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+                return
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+class PresetEngine:
+    """Áp preset model/tỉ lệ/thời lượng cho một tool của Pikaso ("video", "image")"""
+
+    def __init__(self, cache_file: str = PRESET_CACHE_FILE):
+        self.cache_file = cache_file
+        self.storage_keys, self.url_param_names = load_preset_config()
+        self.cache = self._load_cache()
+        self._seeded = set()
+        self._navigated_with_params = set()
+
+    def build_url(self, tool: str, base_url: str, settings: Dict[str, str]) -> str:
+        """URL điều hướng: thêm tham số preset trừ khi cache biết phiên bản hiện tại không nhận"""
+        entry = self.cache.get(tool, {})
+        if not settings or entry.get("url_params_failed"):
+            self._navigated_with_params.discard(tool)
+            return base_url
+
+        parts = urlsplit(base_url)
+        query = dict(parse_qsl(parts.query))
+        for field, value in settings.items():
+            if field in self.url_param_names:
+                query[self.url_param_names[field]] = self._param_value(field, value)
+        self._navigated_with_params.add(tool)
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+    def prepare(self, page: "Page", tool: str) -> None:
+        """Gọi TRƯỚC khi goto: seed app-state đã cache vào localStorage bằng add_init_script"""
+        entry = self.cache.get(tool, {})
+        storage = entry.get("storage")
+        key = (id(page), tool)
+        if entry.get("method") != "local_storage" or not storage or key in self._seeded:
+            return
+
+        try:
+            page.add_init_script(SEED_STORAGE_JS % json.dumps(storage))
+            self._seeded.add(key)
+        except Exception as e:
+            print(f"⚠️ Không thể seed preset vào localStorage: {e}")
+
+    def navigate(self, page: "Page", tool: str, base_url: str, settings: Dict[str, str], **goto_kwargs) -> None:
+        """prepare() + goto() tới URL đã gắn preset"""
+        self.prepare(page, tool)
+        page.goto(self.build_url(tool, base_url, settings), **goto_kwargs)
+
+    def ensure(self, page: "Page", tool: str, settings: Dict[str, str],
+               ui_fallback: Optional[Callable[["Page", Dict[str, str]], None]] = None) -> bool:
+        """
+        Xác minh preset bằng một probe; trường nào chưa đúng thì mới fallback UI.
+        Ghi cache phương pháp chạy được theo phiên bản trang.
+
+        Returns:
+            True nếu mọi trường preset đã được áp
+        """
+        if not settings:
+            return True
+
+        start = time.time()
+        version = self.page_version(page)
+        entry = self.cache.get(tool, {})
+        if entry.get("version") != version:
+            if entry:
+                print(f"🔄 Pikaso đổi phiên bản ({entry.get('version')} → {version}), dò lại preset")
+            entry = {"version": version}
+
+        missing = self._missing_fields(page, settings)
+        if not missing:
+            method = entry.get("method") or ("url_params" if tool in self._navigated_with_params else "ui")
+            print(f"⚡ Preset {tool} đã áp sẵn ({method}) trong {time.time() - start:.1f}s")
+            if entry.get("method") != method:
+                entry["method"] = method
+                self._save_entry(tool, entry)
+            return True
+
+        if tool in self._navigated_with_params and len(missing) == len(settings):
+            # URL params không có tác dụng ở phiên bản này → lần sau khỏi gắn
+            entry["url_params_failed"] = True
+
+        print(f"⚙️ Preset {tool}: cần chọn qua UI {', '.join(missing)}")
+        (ui_fallback or self.apply_ui)(page, {field: settings[field] for field in missing})
+
+        still_missing = self._missing_fields(page, settings)
+        if still_missing:
+            print(f"⚠️ Preset {tool}: chưa xác minh được {', '.join(still_missing)}")
+            self._save_entry(tool, entry)
+            return False
+
+        # Chụp app-state để lần sau seed thẳng bằng add_init_script
+        storage = self._capture_storage(page, settings)
+        if storage:
+            entry.update({"method": "local_storage", "storage": storage})
+        else:
+            entry["method"] = "ui"
+        self._save_entry(tool, entry)
+        print(f"✅ Preset {tool} đã áp trong {time.time() - start:.1f}s (lần sau dùng: {entry['method']})")
+        return True
+
+    def apply_ui(self, page: "Page", settings: Dict[str, str]) -> None:
+        """Fallback dò UI: model qua menu dropdown, thời lượng / tỉ lệ qua nút chọn hoặc <select>"""
+        for field, value in settings.items():
+            try:
+                if field == "model":
+                    self._select_model_ui(page, value)
+                    continue
+                option = page.query_selector(f"button:has-text('{value}')") or \
+                    page.query_selector(f"[data-value='{value}']")
+                if option:
+                    option.click()
+                    print(f"✓ Đã chọn {field}: {value}")
+                    continue
+                # <option> không click được, chọn qua <select> chứa nó
+                select = page.query_selector(f"select:has(option[value='{value}'])")
+                if select:
+                    select.select_option(value=value)
+                    print(f"✓ Đã chọn {field}: {value}")
+            except Exception as e:
+                print(f"⚠️ Không thể chọn {field}={value}: {e}")
+
+    def page_version(self, page: "Page") -> str:
+        try:
+            return page.evaluate(PAGE_VERSION_JS)
+        except Exception:
+            return "unknown"
+
+    def _select_model_ui(self, page: "Page", model: str) -> None:
+        slug = self._param_value("model", model)
+        option_selectors = [
+            f"text={model}",
+            f"[role='option']:has-text('{model}')",
+            f"li:has-text('{model}')",
+            f"[data-value*='{slug}']",
+            f"option[value*='{slug}']"
+        ]
+        
+        for selector in MODEL_MENU_SELECTORS:
+            menu = page.query_selector(selector)
+            if not menu:
+                continue
+            if menu.evaluate("el => el.tagName") == "SELECT":
+                option = menu.query_selector(f"option[value*='{slug}']")
+                if option:
+                    menu.select_option(value=option.get_attribute("value"))
+                    print(f"✓ Đã chọn model: {model}")
+                    return
+                continue
+            menu.click()
+            page.wait_for_timeout(500)
+            for option_selector in option_selectors:
+                option = page.query_selector(option_selector)
+                if option and option.is_visible():
+                    option.click()
+                    print(f"✓ Đã chọn model: {model}")
+                    return
+            page.keyboard.press("Escape")
+        print(f"⚠️ Không tìm thấy model {model}, dùng model mặc định")
+
+    def _missing_fields(self, page: "Page", settings: Dict[str, str]) -> List[str]:
+        try:
+            state = page.evaluate(VERIFY_JS, settings)
+        except Exception:
+            return list(settings)
+        return [field for field in settings if not state.get(field)]
+
+    def _capture_storage(self, page: "Page", settings: Dict[str, str]) -> Dict[str, str]:
+        try:
+            return page.evaluate(CAPTURE_STORAGE_JS, {"keys": list(self.storage_keys), "values": list(settings.values())})
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _param_value(field: str, value: str) -> str:
+        if field == "model":
+            return value.lower().replace(".", "-").replace(" ", "-")
+        if field == "duration":
+            return value.rstrip("s")
+        return value
+
+    def _load_cache(self) -> Dict:
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, "r", encoding="utf-8") as f:
+                    cache = json.load(f)
+                # Bỏ các key localStorage ngoài danh sách cho phép mà bản cũ đã lỡ chụp
+                for entry in cache.values():
+                    if isinstance(entry, dict) and isinstance(entry.get("storage"), dict):
+                        entry["storage"] = {k: v for k, v in entry["storage"].items()
+                                            if k in self.storage_keys}
+                return cache
+        except Exception as e:
+            print(f"⚠️ Không đọc được cache preset: {e}")
+        return {}
+
+    def _save_entry(self, tool: str, entry: Dict) -> None:
+        """Đọc lại cache trên đĩa dưới khóa rồi chỉ thay entry của tool này (giữ entry engine khác vừa ghi)"""
+        self.cache[tool] = entry
+        try:
+            with _locked_cache(self.cache_file):
+                merged = self._load_cache()
+                merged[tool] = entry
+                atomic_write_json(self.cache_file, merged)
+            self.cache = merged
+        except Exception as e:
+            print(f"⚠️ Không ghi được cache preset: {e}")
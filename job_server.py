@@ -0,0 +1,535 @@
+"""
+Daemon giữ browser ấm (warm) và nhận job qua HTTP API cục bộ.
+
+Chạy bằng `python main.py serve`. Các lệnh `image`/`video` với `--via-server`
+chỉ gửi job tới daemon và theo dõi tiến trình, không tự khởi động browser.
+
+API (chỉ lắng nghe trên localhost; API không có xác thực nên địa chỉ khác loopback
+phải bật rõ bằng `serve --allow-remote`):
+    GET  /health                  Trạng thái daemon
+    POST /jobs                    Gửi job {"type": "image"|"video", "params": {...}}
+    GET  /jobs/<id>               Trạng thái job
+    GET  /jobs/<id>/events?since= Stream tiến trình (NDJSON) tới khi job kết thúc
+    GET  /jobs/<id>/result        Kết quả job (409 nếu chưa xong)
+
+Job đã xong được giữ FINISHED_JOB_TTL_SECONDS để client lấy kết quả, và tối đa
+MAX_FINISHED_JOBS job; cũ hơn thì bị xóa khỏi bộ nhớ (GET trả về 404).
+"""
+
+import os
+import sys
+import json
+import ipaddress
+import time
+import uuid
+import queue
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Iterator, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import request as urllib_request
+from urllib import error as urllib_error
+from urllib.parse import urlparse, parse_qs
+
+SERVER_STATE_FILE = os.path.join(".fazzytool", "server.json")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+JOB_TYPES = ("image", "video")
+
+# Giữ job đã xong trong bộ nhớ để client đọc kết quả, không để daemon chạy lâu phình mãi
+FINISHED_JOB_TTL_SECONDS = 3600
+MAX_FINISHED_JOBS = 200
+
+
+def is_loopback_host(host: str) -> bool:
+    """host chỉ nhận kết nối từ chính máy này (localhost, 127.0.0.0/8, ::1)"""
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+
+class ServerJob:
+    """Một job trong hàng đợi của daemon cùng log tiến trình của nó."""
+
+    def __init__(self, job_type: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.type = job_type
+        self.params = params
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.finished_monotonic: Optional[float] = None
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("success", "failed")
+
+    def add_event(self, message: str):
+        with self.changed:
+            self.events.append({"seq": len(self.events), "time": time.time(), "message": message})
+            self.changed.notify_all()
+
+    def set_status(self, status: str):
+        with self.changed:
+            self.status = status
+            if status == "running":
+                self.started_at = datetime.now().isoformat()
+            elif self.finished:
+                self.finished_at = datetime.now().isoformat()
+                self.finished_monotonic = time.monotonic()
+            self.changed.notify_all()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "params": self.params,
+            "result": self.result,
+            "error": self.error,
+            "event_count": len(self.events),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class _JobOutputRouter:
+    """
+    Thay cho sys.stdout trong daemon: vẫn in ra terminal, đồng thời chuyển
+    từng dòng do worker thread in ra thành event của job đang chạy.
+    """
+
+    def __init__(self, original):
+        self.original = original
+        self.local = threading.local()
+
+    def bind(self, job: Optional[ServerJob]):
+        self.local.job = job
+        self.local.buffer = ""
+
+    def write(self, text: str) -> int:
+        self.original.write(text)
+        job = getattr(self.local, "job", None)
+        if job is not None:
+            self.local.buffer += text
+            while "\n" in self.local.buffer:
+                line, self.local.buffer = self.local.buffer.split("\n", 1)
+                if line.strip():
+                    job.add_event(line)
+        return len(text)
+
+    def flush(self):
+        self.original.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.original, name)
+
+
+class JobServer:
+    """Daemon giữ FreepikImageGenerator/FreepikVideoGenerator ấm và xử lý job tuần tự."""
+
+    def __init__(self, cookies: List[Dict], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 headless: bool = True, output_dir: str = "output", allow_remote: bool = False):
+        if not is_loopback_host(host) and not allow_remote:
+            raise ValueError(f"Daemon chỉ lắng nghe trên localhost (host={host}); API không có xác thực")
+        self.cookie_string = json.dumps(cookies) if cookies else None
+        self.host = host
+        self.port = port
+        self.headless = headless
+        self.output_dir = output_dir
+
+        self.jobs: Dict[str, ServerJob] = {}
+        self._jobs_lock = threading.Lock()
+        self.job_queue: "queue.Queue[Optional[ServerJob]]" = queue.Queue()
+        self.image_generator = None
+        self.video_generator = None
+        # Tái khởi động page/browser warm theo số job, thời gian chạy và bộ nhớ
+        self.recyclers: Dict[str, Any] = {}
+        self._used_recyclers: set = set()
+
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._worker: Optional[threading.Thread] = None
+        self._router: Optional[_JobOutputRouter] = None
+
+    # ------------------------------------------------------------------
+    # Vòng đời daemon
+    # ------------------------------------------------------------------
+
+    def serve_forever(self):
+        """Khởi động HTTP server + worker, chạy tới khi Ctrl+C"""
+        self._router = _JobOutputRouter(sys.stdout)
+        sys.stdout = self._router
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+
+        self._worker = threading.Thread(target=self._worker_loop, name="fazzy-worker", daemon=True)
+        self._worker.start()
+        self._write_state_file()
+
+        print(f"🛰️ FazzyTool daemon đang lắng nghe tại http://{self.host}:{self.port}")
+        print(f"📄 State file: {SERVER_STATE_FILE}")
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\n🛑 Đang dừng daemon...")
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Dừng worker, đóng browser và xóa state file"""
+        if self._httpd:
+            self._httpd.server_close()
+        self.job_queue.put(None)
+        if self._worker and self._worker.is_alive():
+            self._worker.join(timeout=30)
+        self._remove_state_file()
+        if self._router:
+            sys.stdout = self._router.original
+            self._router = None
+
+    def _write_state_file(self):
+        os.makedirs(os.path.dirname(SERVER_STATE_FILE), exist_ok=True)
+        state = {
+            "host": self.host,
+            "port": self.port,
+            "pid": os.getpid(),
+            "started_at": datetime.now().isoformat()
+        }
+        with open(SERVER_STATE_FILE, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+
+    def _remove_state_file(self):
+        try:
+            if os.path.exists(SERVER_STATE_FILE):
+                os.remove(SERVER_STATE_FILE)
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Worker: mọi thao tác Playwright chạy trên thread này
+    # ------------------------------------------------------------------
+
+    def submit(self, job_type: str, params: Dict[str, Any]) -> ServerJob:
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Loại job không hỗ trợ: {job_type}")
+        job = ServerJob(job_type, params)
+        with self._jobs_lock:
+            self._evict_finished_jobs()
+            self.jobs[job.id] = job
+        self.job_queue.put(job)
+        return job
+
+    def _evict_finished_jobs(self):
+        """Xóa job đã xong quá FINISHED_JOB_TTL_SECONDS, và job xong cũ nhất khi vượt MAX_FINISHED_JOBS"""
+        now = time.monotonic()
+        finished = sorted((job for job in self.jobs.values() if job.finished_monotonic is not None),
+                          key=lambda job: job.finished_monotonic)
+        expired = [job for job in finished if now - job.finished_monotonic > FINISHED_JOB_TTL_SECONDS]
+        kept = finished[len(expired):]
+        expired += kept[:max(0, len(kept) - MAX_FINISHED_JOBS)]
+        for job in expired:
+            del self.jobs[job.id]
+
+    def _worker_loop(self):
+        try:
+            while True:
+                job = self.job_queue.get()
+                if job is None:
+                    break
+                self._run_job(job)
+        finally:
+            for generator in (self.image_generator, self.video_generator):
+                if generator is not None:
+                    generator.close()
+
+    def _run_job(self, job: ServerJob):
+        if self._router:
+            self._router.bind(job)
+        job.set_status("running")
+        try:
+            if job.type == "image":
+                job.result = self._run_image_job(job.params)
+            else:
+                job.result = self._run_video_job(job.params)
+
+            # Ghi error trước set_status: client poll thấy "failed" thì đã có lý do
+            if not job.result.get("files"):
+                job.error = "Không có file nào được tạo"
+            job.set_status("success" if job.result.get("files") else "failed")
+        except Exception as e:
+            job.error = str(e)
+            print(f"❌ Job {job.id} lỗi: {e}")
+            job.set_status("failed")
+        finally:
+            self._recycle_after_job()
+            if self._router:
+                self._router.bind(None)
+
+    def _recycle_after_job(self):
+        """Job đã xong hẳn (không còn thao tác trên page) → kiểm tra ngưỡng recycle"""
+        for name in self._used_recyclers:
+            try:
+                self.recyclers[name].after_job()
+            except Exception as e:
+                print(f"⚠️ Lỗi recycle browser {name}: {e}")
+        self._used_recyclers.clear()
+
+    def _warm_generator(self, name: str, generator):
+        from browser_recycling import BrowserRecycler
+        if name not in self.recyclers:
+            self.recyclers[name] = BrowserRecycler(generator, name=name)
+        self._used_recyclers.add(name)
+        return self.recyclers[name].ensure_started()
+
+    def _get_image_generator(self):
+        if self.image_generator is None:
+            from browser_image import FreepikImageGenerator
+            self.image_generator = FreepikImageGenerator(headless=self.headless, output_dir=self.output_dir)
+        return self._warm_generator("image", self.image_generator)
+
+    def _get_video_generator(self):
+        if self.video_generator is None:
+            from browser_video import FreepikVideoGenerator
+            self.video_generator = FreepikVideoGenerator(headless=self.headless, output_dir=self.output_dir)
+            self.video_generator.next_job_settings = self._next_video_settings
+        return self._warm_generator("video", self.video_generator)
+
+    def _next_video_settings(self) -> Optional[Tuple[str, str]]:
+        """(duration, ratio) của job kế tiếp trong hàng đợi nếu là job video, để chuẩn bị page trước"""
+        with self.job_queue.mutex:
+            upcoming = self.job_queue.queue[0] if self.job_queue.queue else None
+        if upcoming is None or upcoming.type != "video":
+            return None
+        return upcoming.params.get("duration", "5s"), upcoming.params.get("ratio", "1:1")
+
+    def _run_image_job(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        generator = self._get_image_generator()
+        files = generator.generate_image(
+            prompt=params["content"],
+            cookie_string=self.cookie_string,
+            num_images=params.get("num_images", 4),
+            download_count=params.get("download_count"),
+            filename_prefix=params.get("filename_prefix")
+        )
+        return {"files": files or []}
+
+    def _run_video_job(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        image_path = params.get("image_path")
+        source_images = []
+
+        if not image_path:
+            # Text-to-video giống CLI: tạo ảnh trước rồi chuyển thành video
+            print("⚠️ Text-to-video: Tạo ảnh trước rồi chuyển thành video...")
+            image_result = self._run_image_job({
+                "content": params["content"],
+                "num_images": 1,
+                "download_count": 1,
+                "filename_prefix": "temp_for_video"
+            })
+            source_images = image_result["files"]
+            if not source_images:
+                return {"files": []}
+            image_path = source_images[0]
+
+        generator = self._get_video_generator()
+        video_path = generator.generate_video_from_image(
+            image_path=image_path,
+            prompt=params["content"],
+            cookie_string=self.cookie_string,
+            duration=params.get("duration", "5s"),
+            ratio=params.get("ratio", "1:1")
+        )
+        return {"files": [video_path] if video_path else [], "source_images": source_images}
+
+    # ------------------------------------------------------------------
+    # HTTP API
+    # ------------------------------------------------------------------
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                # Không in access log vào stdout (sẽ lẫn vào log job)
+                pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any]):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _get_job(self, job_id: str) -> Optional[ServerJob]:
+                job = server.jobs.get(job_id)
+                if job is None:
+                    self._send_json(404, {"error": f"Không tìm thấy job {job_id}"})
+                return job
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = [p for p in url.path.split("/") if p]
+
+                if parts == ["health"]:
+                    self._send_json(200, {
+                        "status": "ok",
+                        "pid": os.getpid(),
+                        "queued": server.job_queue.qsize(),
+                        "image_warm": bool(server.image_generator and server.image_generator.is_warm),
+                        "video_warm": bool(server.video_generator and server.video_generator.is_warm),
+                        "recycling": {name: r.stats() for name, r in server.recyclers.items()},
+                        "prewarm": ({"hits": server.video_generator.prewarmer.hits,
+                                     "misses": server.video_generator.prewarmer.misses}
+                                    if server.video_generator else None)
+                    })
+                    return
+
+                if len(parts) >= 2 and parts[0] == "jobs":
+                    job = self._get_job(parts[1])
+                    if job is None:
+                        return
+                    if len(parts) == 2:
+                        self._send_json(200, job.to_dict())
+                    elif parts[2] == "result":
+                        if not job.finished:
+                            self._send_json(409, {"error": "Job chưa hoàn thành", "status": job.status})
+                        else:
+                            self._send_json(200, {"id": job.id, "status": job.status,
+                                                  "result": job.result, "error": job.error})
+                    elif parts[2] == "events":
+                        try:
+                            since = int(parse_qs(url.query).get("since", ["0"])[0])
+                            if since < 0:
+                                raise ValueError
+                        except ValueError:
+                            self._send_json(400, {"error": "since phải là số nguyên không âm"})
+                            return
+                        self._stream_events(job, since)
+                    else:
+                        self._send_json(404, {"error": "Endpoint không tồn tại"})
+                    return
+
+                self._send_json(404, {"error": "Endpoint không tồn tại"})
+
+            def do_POST(self):
+                parts = [p for p in urlparse(self.path).path.split("/") if p]
+                if parts != ["jobs"]:
+                    self._send_json(404, {"error": "Endpoint không tồn tại"})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                    if not isinstance(payload, dict):
+                        raise ValueError("Body phải là JSON object")
+                    params = payload.get("params", {})
+                    if not isinstance(params, dict):
+                        raise ValueError("params phải là JSON object")
+                    if not params.get("content"):
+                        raise ValueError("Thiếu params.content")
+                    job = server.submit(payload.get("type", ""), params)
+                except (ValueError, json.JSONDecodeError) as e:
+                    self._send_json(400, {"error": str(e)})
+                    return
+                self._send_json(202, {"id": job.id, "status": job.status})
+
+            def _stream_events(self, job: ServerJob, since: int):
+                """Stream NDJSON, mỗi dòng một event; kết thúc bằng dòng trạng thái cuối"""
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                cursor = since
+                try:
+                    while True:
+                        with job.changed:
+                            if cursor >= len(job.events) and not job.finished:
+                                job.changed.wait(timeout=15)
+                            pending = job.events[cursor:]
+                            done = job.finished and cursor + len(pending) >= len(job.events)
+                        for event in pending:
+                            self.wfile.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+                        cursor += len(pending)
+                        self.wfile.flush()
+                        if done:
+                            final = {"final": True, "status": job.status}
+                            self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+                            break
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+
+class JobClient:
+    """Client mỏng cho CLI: gửi job tới daemon và theo dõi tiến trình."""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.base_url = f"http://{host}:{port}"
+
+    @classmethod
+    def from_state_file(cls, state_file: str = SERVER_STATE_FILE) -> Optional["JobClient"]:
+        """Tạo client từ state file của daemon, None nếu daemon không chạy"""
+        try:
+            with open(state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            client = cls(state["host"], state["port"])
+            if client.health():
+                return client
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _request(self, method: str, path: str, payload: Optional[Dict] = None, timeout: float = 10):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib_request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        return urllib_request.urlopen(req, timeout=timeout)
+
+    def health(self) -> Optional[Dict[str, Any]]:
+        try:
+            with self._request("GET", "/health", timeout=2) as resp:
+                return json.loads(resp.read())
+        except (urllib_error.URLError, OSError, ValueError):
+            return None
+
+    def submit(self, job_type: str, params: Dict[str, Any]) -> str:
+        with self._request("POST", "/jobs", {"type": job_type, "params": params}) as resp:
+            return json.loads(resp.read())["id"]
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        with self._request("GET", f"/jobs/{job_id}") as resp:
+            return json.loads(resp.read())
+
+    def stream_events(self, job_id: str, since: int = 0) -> Iterator[Dict[str, Any]]:
+        """Đọc stream event cho tới khi job kết thúc"""
+        with self._request("GET", f"/jobs/{job_id}/events?since={since}", timeout=None) as resp:
+            for line in resp:
+                if line.strip():
+                    yield json.loads(line)
+
+    def result(self, job_id: str) -> Dict[str, Any]:
+        with self._request("GET", f"/jobs/{job_id}/result") as resp:
+            return json.loads(resp.read())
+
+    def run(self, job_type: str, params: Dict[str, Any], echo: bool = True) -> Dict[str, Any]:
+        """Gửi job, in tiến trình ra terminal và trả về kết quả cuối"""
+        job_id = self.submit(job_type, params)
+        if echo:
+            print(f"🛰️ Đã gửi job {job_id} tới daemon {self.base_url}")
+        for event in self.stream_events(job_id):
+            if echo and "message" in event:
+                print(f"   {event['message']}")
+        return self.result(job_id)
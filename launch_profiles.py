@@ -0,0 +1,212 @@
+"""
+Profile khởi động browser có tên: cờ Chromium, pref Firefox và viewport dùng chung cho mọi generator
+
+Khi nhiều page chạy trong cùng một browser (pipeline, handoff, autoscale), các tab nền bị
+trình duyệt hãm timer / hạ ưu tiên renderer nên lần sinh ở tab đó đứng lại. Mọi profile
+đều tắt cơ chế này; profile lean-headless còn bỏ extension, dịch vụ nền, GPU compositing
+(an toàn khi chạy ẩn) và dùng viewport nhỏ hơn để giảm bộ nhớ.
+
+- lean-headless: chạy ẩn, tối giản cho batch / daemon
+- debug-headful: hiển thị cửa sổ 1920x1080, giữ GPU để quan sát / debug
+- auto (mặc định): lean-headless khi chạy ẩn, debug-headful khi --show-browser
+
+Chọn qua launch_profile trong config_template.txt. Profile đặt tên cụ thể sẽ quyết định
+luôn chế độ ẩn/hiện; auto thì theo cờ --show-browser / --headless.
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Chống hãm tab nền: cần cho mọi profile khi chạy nhiều page trong một browser
+_NO_THROTTLE_ARGS = [
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-features=CalculateNativeWinOcclusion,IntensiveWakeUpThrottling",
+]
+
+_NO_THROTTLE_PREFS = {
+    "dom.min_background_timeout_value": 4,
+    "dom.timeout.enable_budget_timer_throttling": False,
+    "dom.webdriver.enabled": False,
+}
+
+LAUNCH_PROFILES: Dict[str, Dict[str, Any]] = {
+    "lean-headless": {
+        "headless": True,
+        "viewport": {"width": 1280, "height": 800},
+        "chromium_args": _NO_THROTTLE_ARGS + [
+            "--disable-blink-features=AutomationControlled",
+            "--disable-extensions",
+            "--disable-component-extensions-with-background-pages",
+            "--disable-background-networking",
+            "--disable-default-apps",
+            "--disable-sync",
+            "--no-first-run",
+            "--mute-audio",
+            "--no-sandbox",
+            "--disable-dev-shm-usage",
+            "--disable-gpu",
+            "--disable-gpu-compositing",
+            "--window-size=1280,800",
+        ],
+        "firefox_prefs": dict(_NO_THROTTLE_PREFS, **{
+            "extensions.update.enabled": False,
+            "app.update.enabled": False,
+            "browser.shell.checkDefaultBrowser": False,
+            "layers.acceleration.disabled": True,
+            "media.autoplay.default": 5,
+        }),
+    },
+    "debug-headful": {
+        "headless": False,
+        "viewport": {"width": 1920, "height": 1080},
+        "chromium_args": _NO_THROTTLE_ARGS + [
+            "--disable-blink-features=AutomationControlled",
+            "--disable-extensions",
+            "--no-sandbox",
+            "--disable-dev-shm-usage",
+            "--window-size=1920,1080",
+        ],
+        "firefox_prefs": dict(_NO_THROTTLE_PREFS),
+    },
+}
+
+
+def load_launch_profile_name() -> str:
+    """Đọc launch_profile từ config_template.txt (auto | lean-headless | debug-headful)"""
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip()
+                    if '=' not in line:
+                        continue
+                    key, value = [part.strip() for part in line.split('=', 1)]
+                    if key.lower() == 'launch_profile' and value:
+                        value = value.lower()
+                        if value == 'auto' or value in LAUNCH_PROFILES:
+                            return value
+                        print(f"⚠️ launch_profile không hợp lệ: {value}, dùng auto")
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc launch_profile, dùng auto: {e}")
+    return "auto"
+
+
+def resolve_launch_profile(headless: bool, name: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """Tên + cấu hình profile sẽ dùng; auto chọn theo headless"""
+    name = name or load_launch_profile_name()
+    if name == "auto":
+        name = "lean-headless" if headless else "debug-headful"
+    return name, LAUNCH_PROFILES[name]
+
+
+def launch_browser(playwright, browser_type: str, profile: Dict[str, Any]):
+    """Mở Chromium ("chrome") hoặc Firefox với cờ / pref của profile"""
+    if browser_type == "chrome":
+        return playwright.chromium.launch(headless=profile["headless"], args=list(profile["chromium_args"]))
+    return playwright.firefox.launch(
+        headless=profile["headless"],
+        args=["--no-sandbox", "--disable-dev-shm-usage"],
+        firefox_user_prefs=dict(profile["firefox_prefs"])
+    )
+
+
+def context_options(profile: Dict[str, Any], **overrides) -> Dict[str, Any]:
+    """Tham số new_context() theo profile (user_agent, ... truyền qua overrides)"""
+    options = {"viewport": dict(profile["viewport"]), "ignore_https_errors": True}
+    options.update(overrides)
+    return options
+
+
+def open_browser(playwright, browser_type: str, profile: Dict[str, Any], kind: str, **overrides):
+    """
+    Mở browser + context cho một generator, theo thứ tự ưu tiên:
+    browser server chung đang chạy → profile lưu cache trên đĩa (persistent_profile=true) → launch mới.
+
+    Args:
+        kind: Loại worker ("image", "video"), dùng để chia slot profile trên đĩa
+
+    Returns:
+        Tuple (browser, context); browser.close() luôn dọn đúng tài nguyên đã mở
+    """
+    from browser_server import connect_shared_browser
+    from browser_recycling import register_driver
+    from persistent_profiles import load_persistent_settings, open_persistent_browser
+
+    # Autoscaler chỉ đo bộ nhớ dưới các driver đã đăng ký
+    register_driver(playwright)
+    options = context_options(profile, **overrides)
+    browser = connect_shared_browser(playwright)
+    if browser is None and load_persistent_settings()['persistent_profile']:
+        try:
+            browser = open_persistent_browser(playwright, browser_type, profile, kind, **options)
+            return browser, browser.context
+        except Exception as e:
+            print(f"⚠️ Không mở được profile lưu cache, dùng context mới: {e}")
+
+    browser = browser or launch_browser(playwright, browser_type, profile)
+    return browser, browser.new_context(**options)
+
+
+def benchmark_profiles(browser_type: str, url: str, runs: int = 3,
+                       profiles: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Đo thời gian khởi động, thời gian điều hướng tới url và bộ nhớ (PSS/RSS của cây tiến trình
+    browser) cho từng profile. Mỗi lần đo dùng một browser mới.
+
+    Returns:
+        [{'profile', 'launch_ms', 'navigation_ms', 'memory_mb', 'errors'}] (trung vị qua các lần chạy)
+    """
+    from playwright.sync_api import sync_playwright
+    from browser_recycling import child_pids, tree_memory_bytes
+
+    results = []
+    with sync_playwright() as p:
+        for name in profiles or list(LAUNCH_PROFILES):
+            profile = LAUNCH_PROFILES[name]
+            launch_ms, navigation_ms, memory_mb = [], [], []
+            errors = 0
+            for _ in range(runs):
+                browser = None
+                try:
+                    started = time.perf_counter()
+                    browser = launch_browser(p, browser_type, profile)
+                    page = browser.new_context(**context_options(profile)).new_page()
+                    launch_ms.append((time.perf_counter() - started) * 1000)
+
+                    started = time.perf_counter()
+                    page.goto(url, wait_until="domcontentloaded", timeout=60000)
+                    navigation_ms.append((time.perf_counter() - started) * 1000)
+
+                    # Browser là con của driver Playwright (con của tiến trình này); browser lần trước đã đóng
+                    browser_pids = set()
+                    for driver_pid in child_pids(os.getpid()):
+                        browser_pids |= child_pids(driver_pid)
+                    memory = tree_memory_bytes(browser_pids)
+                    if memory:
+                        memory_mb.append(memory / 1048576)
+                except Exception as e:
+                    errors += 1
+                    print(f"⚠️ {name}: {e}")
+                finally:
+                    if browser:
+                        browser.close()
+
+            results.append({
+                'profile': name,
+                'launch_ms': _median(launch_ms),
+                'navigation_ms': _median(navigation_ms),
+                'memory_mb': _median(memory_mb),
+                'errors': errors
+            })
+    return results
+
+
+def _median(values: List[float]) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
@@ -12,15 +12,23 @@ import json
 import click
 import traceback
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Iterable, Optional, List, TYPE_CHECKING
 from datetime import datetime
 from dotenv import load_dotenv
 
-from prompt_loader import PromptLoader
-from gemini_prompt import GeminiPromptGenerator
-from browser_image import FreepikImageGenerator
-from browser_video import FreepikVideoGenerator
-from batch_processor import BatchProcessor
+from prompt_job import PromptJob, JobResult, BatchJob
+
+if TYPE_CHECKING:
+    from credit_ledger import CreditLedger
+
+# Các module nặng (Playwright, google.generativeai, python-docx) được import
+# trễ bên trong từng command để `--help`, `setup`, `sessions`, `batch --dry-run`
+# khởi động nhanh. Xem measure_import_time() và lệnh `test`.
+
+# Ngân sách thời gian import main.py (ms) và các module nặng không được import khi khởi động
+STARTUP_IMPORT_BUDGET_MS = 300
+HEAVY_STARTUP_MODULES = ('playwright', 'google.generativeai', 'docx', 'browser_image',
+                         'browser_video', 'gemini_prompt')
 
 # Global configuration cho AI generation
 AI_GENERATION_CONFIG = {
@@ -85,6 +93,40 @@ def create_output_dir():
     os.makedirs(output_dir, exist_ok=True)
     return output_dir
 
+def measure_import_time(module: str = "main") -> Dict[str, Any]:
+    """
+    Đo thời gian import một module bằng `python -X importtime` trong process riêng
+    
+    Returns:
+        Dict gồm cumulative_ms của module và danh sách module nặng bị import theo
+    """
+    import subprocess
+    
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    
+    cumulative_us = {}
+    for line in proc.stderr.splitlines():
+        # Định dạng: "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        cumulative_us[parts[2].strip()] = int(parts[1].strip())
+    
+    heavy = [name for name in cumulative_us
+             if any(name == h or name.startswith(h + ".") for h in HEAVY_STARTUP_MODULES)]
+    return {
+        "ok": proc.returncode == 0,
+        "cumulative_ms": cumulative_us.get(module, 0) / 1000,
+        "heavy_modules": heavy,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 and proc.stderr.strip() else None
+    }
+
+
 def load_cookie_from_template():
     """Load cookie từ cookie_template.txt"""
     try:
@@ -130,11 +172,11 @@ def load_cookie_from_template():
                     print(f"🔍 Debug: Returning {len(cookies)} processed cookies")
                     return cookies
                 else:
-                    print(f"🔍 Debug: Cookie JSON invalid or empty")
+                    print("🔍 Debug: Cookie JSON invalid or empty")
             else:
-                print(f"🔍 Debug: Markers not found in template")
+                print("🔍 Debug: Markers not found in template")
         else:
-            print(f"🔍 Debug: cookie_template.txt not found")
+            print("🔍 Debug: cookie_template.txt not found")
         return []
     except Exception as e:
         print(f"⚠️ Lỗi khi load cookie: {e}")
@@ -144,6 +186,8 @@ def load_cookie_from_template():
 def process_single_image(prompt_item: Dict, show_browser: bool, cookies: List[Dict]) -> Optional[str]:
     """Xử lý một prompt image đơn lẻ với cải tiến mới"""
     try:
+        from browser_image import FreepikImageGenerator
+        
         generator = FreepikImageGenerator(headless=not show_browser)
         
         # Lấy thông tin từ prompt_item
@@ -176,10 +220,18 @@ def process_single_image(prompt_item: Dict, show_browser: bool, cookies: List[Di
         return None
 
 
-def process_single_image_batch(prompt_item: Dict, show_browser: bool, cookies: List[Dict]) -> List[str]:
-    """Xử lý một prompt image và trả về list tất cả ảnh đã tải"""
+def process_single_image_batch(prompt_item: Dict, show_browser: bool, cookies: List[Dict],
+                               generator=None) -> List[str]:
+    """
+    Xử lý một prompt image và trả về list tất cả ảnh đã tải
+    
+    Args:
+        generator: FreepikImageGenerator đã warm để dùng lại (người gọi tự close()), None = mở browser mới
+    """
     try:
-        generator = FreepikImageGenerator(headless=not show_browser)
+        from browser_image import FreepikImageGenerator
+        
+        generator = generator or FreepikImageGenerator(headless=not show_browser)
         
         prompt = prompt_item.get('content', '')
         num_images = prompt_item.get('num_images', 4)
@@ -206,6 +258,120 @@ def process_single_image_batch(prompt_item: Dict, show_browser: bool, cookies: L
         return []
 
 
+def process_image_prompts_pipelined(prompt_items: Iterable[Dict], show_browser: bool, cookies: List[Dict],
+                                    pipeline_depth: int, total: Optional[int] = None) -> List[List[str]]:
+    """
+    Sinh ảnh cho nhiều prompt trên một page, gửi chồng tối đa pipeline_depth prompt cùng lúc
+
+    prompt_items có thể là generator (prompt chỉ được lấy khi tới lượt gửi); kết quả gồm
+    file của các prompt đã lấy, theo thứ tự (lỗi giữa chừng thì có thể ngắn hơn).
+    """
+    try:
+        from browser_image import FreepikImageGenerator
+        
+        generator = FreepikImageGenerator(headless=not show_browser)
+        cookie_string = json.dumps(cookies) if cookies else None
+        
+        return generator.generate_images_pipelined(
+            prompt_items,
+            cookie_string=cookie_string,
+            max_in_flight=pipeline_depth,
+            total=total
+        )
+        
+    except Exception as e:
+        print(f"❌ Lỗi pipeline image: {e}")
+        return []
+
+
+def process_image_video_handoff(image_prompts: Iterable["PromptJob"], video_prompts: List["PromptJob"], show_browser: bool,
+                                cookies: List[Dict], total: Optional[int] = None) -> List["JobResult"]:
+    """
+    Ảnh → video ngay trong Pikaso: ảnh vừa sinh được chuyển sang Image-to-Video bằng nút Animate,
+    file ảnh chỉ được lưu trữ ở nền. Cặp nào không chuyển được thì quay về download + upload như cũ.
+
+    image_prompts có thể là generator (prompt ảnh chỉ được lấy khi tới lượt); ảnh thứ i ghép với
+    video_prompts[i]. Video không có ảnh ghép không được xử lý ở đây.
+    """
+    from browser_image import FreepikImageGenerator
+    from browser_video import FreepikVideoGenerator
+    from prompt_job import MediaType
+
+    results = []
+    output_dir = create_output_dir()
+    cookie_string = json.dumps(cookies) if cookies else None
+    image_generator = FreepikImageGenerator(headless=not show_browser)
+    video_generator = FreepikVideoGenerator(headless=not show_browser, output_dir=output_dir)
+    
+    # Browser ảnh được giữ ấm suốt batch → tái khởi động định kỳ để không phình bộ nhớ
+    from browser_recycling import BrowserRecycler
+    recycler = BrowserRecycler(image_generator, name="image")
+
+    try:
+        of_total = f"/{total}" if total is not None else ""
+        for i, image_item in enumerate(image_prompts, 1):
+            recycler.ensure_started()
+            video_item = video_prompts[i - 1] if i <= len(video_prompts) else None
+            print(f"\n{Colors.BLUE}[Ảnh → Video {i}{of_total}] {image_item.content[:50]}...{Colors.ENDC}")
+
+            image_done = False
+            try:
+                generated = image_generator.generate_image_for_handoff(
+                    image_item.content,
+                    cookie_string=cookie_string,
+                    num_images=image_item.num_images,
+                    download_count=image_item.download_count,
+                    filename_prefix=image_item.filename_prefix
+                )
+                if not generated['ready']:
+                    results.append(JobResult.failed(image_item, MediaType.IMAGE))
+                    if video_item:
+                        results.append(JobResult.failed(video_item, MediaType.VIDEO, 'No corresponding image'))
+                    continue
+
+                results.append(JobResult.succeeded(image_item, MediaType.IMAGE, generated['archive']))
+                image_done = True
+                image_path = generated['archive'][0]
+                if not video_item:
+                    continue
+
+                video_page = image_generator.handoff_to_video()
+                if video_page:
+                    video_path = video_generator.generate_video_on_page(
+                        video_page, video_item.content, duration=video_item.duration, ratio=video_item.ratio,
+                        source_image=image_path
+                    )
+                    if video_page is not image_generator.page:
+                        video_page.close()
+                else:
+                    print(f"{Colors.WARNING}↩️ Không chuyển thẳng được, tải ảnh rồi upload như cũ{Colors.ENDC}")
+                    image_generator.wait_for_archive()
+                    video_path = process_single_video_from_image(video_item.as_item(), image_path, show_browser, cookies)
+
+                if video_path:
+                    results.append(JobResult.succeeded(video_item, MediaType.VIDEO, [video_path], source_image=image_path))
+                else:
+                    results.append(JobResult.failed(video_item, MediaType.VIDEO))
+
+            except Exception as e:
+                print(f"{Colors.FAIL}Lỗi ảnh → video {i}: {str(e)}{Colors.ENDC}")
+                if not image_done:
+                    results.append(JobResult.failed(image_item, MediaType.IMAGE, str(e)))
+                    if video_item:
+                        results.append(JobResult.failed(video_item, MediaType.VIDEO, 'No corresponding image'))
+                elif video_item:
+                    results.append(JobResult.failed(video_item, MediaType.VIDEO, str(e)))
+
+            finally:
+                # Cả job lỗi cũng tính vào ngưỡng recycle (số job, bộ nhớ)
+                recycler.after_job()
+
+    finally:
+        image_generator.close()
+
+    return results
+
+
 def process_single_video_from_image(prompt_item: Dict, image_path: str, show_browser: bool, cookies: List[Dict]) -> Optional[str]:
     """Xử lý tạo một video từ ảnh và prompt item"""
     try:
@@ -235,74 +401,99 @@ def process_single_video_from_image(prompt_item: Dict, image_path: str, show_bro
         return None
 
 
+def parse_video_variants(specs: List[str]) -> List[Dict[str, str]]:
+    """Đọc các biến thể dạng "duration:ratio" (vd. 5s:16:9) thành [{'duration', 'ratio'}]"""
+    variants = []
+    for spec in specs:
+        spec = spec.strip()
+        if not spec:
+            continue
+        duration, _, ratio = spec.partition(':')
+        if duration not in ('5s', '10s') or ratio not in ('1:1', '16:9', '9:16'):
+            print(f"{Colors.WARNING}⚠️ Bỏ qua biến thể không hợp lệ: {spec} (dạng 5s:16:9){Colors.ENDC}")
+            continue
+        variants.append({'duration': duration, 'ratio': ratio})
+    return variants
+
+
+def process_video_variants_from_image(prompt_item: Dict, image_path: str, variants: List[Dict[str, str]],
+                                      show_browser: bool, cookies: List[Dict]) -> List[Optional[str]]:
+    """Upload ảnh một lần rồi sinh mọi biến thể (duration, ratio) với prompt của prompt item"""
+    try:
+        from browser_video import FreepikVideoGenerator
+        
+        output_dir = create_output_dir()
+        video_generator = FreepikVideoGenerator(headless=(not show_browser), output_dir=output_dir)
+        cookie_string = json.dumps(cookies) if cookies else None
+        
+        return video_generator.generate_video_variants(
+            image_path,
+            [dict(variant, prompt=prompt_item['content']) for variant in variants],
+            cookie_string=cookie_string
+        )
+        
+    except Exception as e:
+        print(f"❌ Lỗi tạo biến thể video: {e}")
+        return [None] * len(variants)
+
+
+def video_variant_results(job: "PromptJob", image_path: str, variants: List[Dict[str, str]],
+                          show_browser: bool, cookies: List[Dict]) -> List["JobResult"]:
+    """Kết quả batch cho từng biến thể video của một ảnh (cùng định dạng với video đơn)"""
+    from prompt_job import MediaType
+    
+    results = []
+    video_paths = process_video_variants_from_image(job.as_item(), image_path, variants, show_browser, cookies)
+    for variant, video_path in zip(variants, video_paths):
+        label = f"{variant['duration']} {variant['ratio']}"
+        if video_path:
+            results.append(JobResult.succeeded(job, MediaType.VIDEO, [video_path], variant=label, source_image=image_path))
+        else:
+            results.append(JobResult.failed(job, MediaType.VIDEO, variant=label))
+    return results
+
+
+def video_prompt_results(job: "PromptJob", image_path: Optional[str], variants: List[Dict[str, str]],
+                         show_browser: bool, cookies: List[Dict]) -> List["JobResult"]:
+    """Kết quả batch cho một video prompt: mọi biến thể, một video, hoặc lỗi khi thiếu ảnh"""
+    from prompt_job import MediaType
+    
+    if not image_path:
+        return [JobResult.failed(job, MediaType.VIDEO, 'No corresponding image')]
+    if variants:
+        return video_variant_results(job, image_path, variants, show_browser, cookies)
+
+    video_path = process_single_video_from_image(job.as_item(), image_path, show_browser, cookies)
+    if video_path:
+        return [JobResult.succeeded(job, MediaType.VIDEO, [video_path], source_image=image_path)]
+    return [JobResult.failed(job, MediaType.VIDEO)]
+
+
+def run_job_via_server(job_type: str, params: Dict) -> Optional[List[str]]:
+    """Gửi job tới daemon `main.py serve`, trả về danh sách file hoặc None nếu daemon không chạy"""
+    from job_server import JobClient
+    
+    client = JobClient.from_state_file()
+    if not client:
+        print(f"{Colors.WARNING}⚠️ Không tìm thấy daemon đang chạy, chuyển sang chạy trực tiếp...{Colors.ENDC}")
+        return None
+    
+    response = client.run(job_type, params)
+    if response.get('error'):
+        print(f"{Colors.FAIL}❌ Daemon báo lỗi: {response['error']}{Colors.ENDC}")
+    return (response.get('result') or {}).get('files', [])
+
+
 def process_file_prompt(file_path: str, generate_image: bool, generate_video: bool, show_browser: bool):
     """Xử lý prompt từ file"""
     try:
+        from prompt_loader import PromptLoader
+        
         print(f"{Colors.BLUE}Đang đọc prompt từ file: {file_path}{Colors.ENDC}")
         prompt_data = PromptLoader.load_prompt(file_path)
         
-        output_dir = create_output_dir()
-        results = {}
-        
-        # Sinh ảnh nếu được yêu cầu
-        if generate_image:
-            image_prompt = prompt_data.get("image_prompt", "")
-            print(f"{Colors.GREEN}Đang sinh ảnh với prompt: {image_prompt[:50]}...{Colors.ENDC}")
-            print(f"🎨 Bắt đầu sinh 4 ảnh, tải về 4 ảnh")
-            print(f"📝 Prompt: {image_prompt}")
-            
-            # Load cookie từ template
-            cookies = load_cookie_from_template()
-            
-            # Tạo prompt item format mới
-            prompt_item = {
-                'content': image_prompt,
-                'num_images': 4,
-                'download_count': 4,
-                'filename_prefix': 'sample'
-            }
-            
-            # Sử dụng process_single_image_batch
-            downloaded_files = process_single_image_batch(prompt_item, show_browser, cookies)
-            
-            if downloaded_files:
-                results["image_paths"] = downloaded_files
-                results["image_path"] = downloaded_files[0]  # Để tương thích code cũ
-        
-        # Sinh video nếu được yêu cầu
-        if generate_video:
-            video_prompt = prompt_data.get("video_prompt", "")
-            video_duration = prompt_data.get("video_duration", "5s")
-            video_ratio = prompt_data.get("video_ratio", "1:1")
-            
-            print(f"{Colors.GREEN}Đang sinh video với prompt: {video_prompt[:50]}...{Colors.ENDC}")
-            print(f"{Colors.GREEN}Thời lượng: {video_duration}, Tỷ lệ: {video_ratio}{Colors.ENDC}")
-            
-            # Load cookies
-            cookies = load_cookie_from_template()
-            cookie_string = json.dumps(cookies) if cookies else None
-            
-            video_generator = FreepikVideoGenerator(headless=(not show_browser), output_dir=output_dir)
-            video_path = video_generator.generate_video(
-                video_prompt, 
-                duration=video_duration,
-                ratio=video_ratio,
-                cookie_string=cookie_string
-            )
-            
-            if video_path:
-                results["video_path"] = video_path
-        
-        # Hiển thị kết quả
-        print(f"\n{Colors.BLUE}{Colors.BOLD}KẾT QUẢ:{Colors.ENDC}")
-        if "image_path" in results:
-            print(f"{Colors.GREEN}✓ Ảnh được lưu tại: {results['image_path']}{Colors.ENDC}")
-        if "video_path" in results:
-            print(f"{Colors.GREEN}✓ Video được lưu tại: {results['video_path']}{Colors.ENDC}")
-        
-        if not results:
-            print(f"{Colors.WARNING}Không có kết quả nào được tạo.{Colors.ENDC}")
-            
+        job = PromptJob.from_prompt_data(prompt_data, num_images=4, download_count=4, filename_prefix='sample')
+        process_prompt_job(job, generate_image, generate_video, show_browser)
         return True
         
     except Exception as e:
@@ -312,8 +503,190 @@ def process_file_prompt(file_path: str, generate_image: bool, generate_video: bo
         return False
 
 
+def process_prompt_job(job: "PromptJob", generate_image: bool, generate_video: bool, show_browser: bool,
+                       cookies: Optional[List[Dict]] = None) -> Dict[str, Any]:
+    """
+    Sinh ảnh / video cho một PromptJob trong bộ nhớ (không qua file tạm)
+    
+    Args:
+        cookies: Cookie đã nạp sẵn (None = đọc cookie_template.txt một lần)
+        
+    Returns:
+        Dict kết quả: image_paths / image_path / video_path (rỗng nếu không tạo được gì)
+    """
+    if cookies is None:
+        cookies = load_cookie_from_template()
+    
+    output_dir = create_output_dir()
+    results = {}
+    
+    # Sinh ảnh nếu được yêu cầu
+    if generate_image:
+        download_count = job.num_images if job.download_count is None else job.download_count
+        print(f"{Colors.GREEN}Đang sinh ảnh với prompt: {job.content[:50]}...{Colors.ENDC}")
+        print(f"🎨 Bắt đầu sinh {job.num_images} ảnh, tải về {download_count} ảnh")
+        print(f"📝 Prompt: {job.content}")
+        
+        downloaded_files = process_single_image_batch(job.as_item(), show_browser, cookies)
+        
+        if downloaded_files:
+            results["image_paths"] = downloaded_files
+            results["image_path"] = downloaded_files[0]  # Để tương thích code cũ
+    
+    # Sinh video nếu được yêu cầu
+    if generate_video:
+        print(f"{Colors.GREEN}Đang sinh video với prompt: {job.video_text[:50]}...{Colors.ENDC}")
+        print(f"{Colors.GREEN}Thời lượng: {job.duration}, Tỷ lệ: {job.ratio}{Colors.ENDC}")
+        
+        cookie_string = json.dumps(cookies) if cookies else None
+        
+        from browser_video import FreepikVideoGenerator
+        
+        video_generator = FreepikVideoGenerator(headless=(not show_browser), output_dir=output_dir)
+        video_path = video_generator.generate_video(
+            job.video_text, 
+            duration=job.duration,
+            ratio=job.ratio,
+            cookie_string=cookie_string
+        )
+        
+        if video_path:
+            results["video_path"] = video_path
+    
+    # Hiển thị kết quả
+    print(f"\n{Colors.BLUE}{Colors.BOLD}KẾT QUẢ:{Colors.ENDC}")
+    if "image_path" in results:
+        print(f"{Colors.GREEN}✓ Ảnh được lưu tại: {results['image_path']}{Colors.ENDC}")
+    if "video_path" in results:
+        print(f"{Colors.GREEN}✓ Video được lưu tại: {results['video_path']}{Colors.ENDC}")
+    
+    if not results:
+        print(f"{Colors.WARNING}Không có kết quả nào được tạo.{Colors.ENDC}")
+        
+    return results
+
+
+def process_spec_batch(batch_job: "BatchJob", ledger: "CreditLedger", autoscaler, show_browser: bool) -> List["JobResult"]:
+    """
+    Chạy batch spec (batch_config.json) qua hàng đợi ưu tiên: priority nhỏ chạy trước, prompt file
+    được đọc qua PromptLoader lúc tới lượt, job không ra kết quả nào được thử lại tối đa max_retries lần
+    """
+    import dataclasses
+    from batch_scheduler import PriorityScheduler, run_prioritized
+    from credit_ledger import BudgetExhausted
+    from prompt_job import MediaType
+    from resource_autoscaler import DispatchStopped
+    
+    config = batch_job.config
+    cookies = batch_job.cookies
+    workflow = batch_job.workflow
+    media = MediaType.VIDEO if workflow == 'video_text_to_video' else MediaType.IMAGE
+    video_variants = parse_video_variants(config.get('video_variants', []))
+    scheduler = PriorityScheduler(batch_job.prompts, max_retries=config.get('max_retries', 0))
+    print(f"{Colors.BLUE}📋 Batch spec: {len(scheduler)} prompt theo priority, "
+          f"thử lại tối đa {scheduler.max_retries} lần{Colors.ENDC}")
+    
+    def run_job(job):
+        if not ledger.reserve(job):
+            raise BudgetExhausted(ledger.stop_reason)
+        print(f"\n{Colors.BLUE}[P{job.priority}] {job.prompt_id}: {job.content[:50]}...{Colors.ENDC}")
+        job_results = []
+        try:
+            if workflow == 'video_text_to_video':
+                video_path = process_prompt_job(job, False, True, show_browser, cookies).get('video_path')
+                job_results.append(JobResult.succeeded(job, MediaType.VIDEO, [video_path]) if video_path
+                                   else JobResult.failed(job, MediaType.VIDEO))
+            else:
+                image_files = process_single_image_batch(job.as_item(), show_browser, cookies)
+                image_path = image_files[0] if image_files else None
+                job_results.append(JobResult.succeeded(job, MediaType.IMAGE, image_files) if image_files
+                                   else JobResult.failed(job, MediaType.IMAGE))
+                if workflow == 'image_then_video':
+                    # Video ghi cùng job với ảnh để báo cáo / checkpoint coi cả cặp là một prompt
+                    video_results = video_prompt_results(job.as_video(), image_path, video_variants, show_browser, cookies)
+                    job_results.extend(dataclasses.replace(result, job=job) for result in video_results)
+        finally:
+            ledger.settle(job, sum(r.ok for r in job_results) / len(job_results) if job_results else 0)
+        return job_results
+    
+    outcomes = run_prioritized(
+        scheduler, run_job, autoscaler, config['delay_between_requests'],
+        failed=lambda job_results: not any(r.ok for r in job_results),
+        should_stop=lambda: ledger.exhausted
+    )
+    
+    results = []
+    for job, job_results, error in outcomes:
+        if error is None:
+            results.extend(job_results)
+        elif isinstance(error, DispatchStopped):
+            results.append(JobResult.skipped(job, media, str(error)))
+        else:
+            print(f"{Colors.FAIL}Lỗi xử lý prompt {job.prompt_id}: {str(error)}{Colors.ENDC}")
+            results.append(JobResult.failed(job, media, str(error)))
+    
+    if scheduler.retried:
+        print(f"{Colors.BLUE}🔁 Đã thử lại {scheduler.retried} lần{Colors.ENDC}")
+    return results
+
+def start_ai_warmup(generate_image: bool, generate_video: bool, show_browser: bool,
+                    cookies: List[Dict]) -> Dict[str, Any]:
+    """
+    Khởi động trước generator sẽ chạy đầu tiên trong lúc Gemini đang sinh prompt:
+    sinh ảnh → mở sẵn AI Image Generator tới ô prompt; chỉ sinh video → khởi động browser video
+    (trang video cần duration/ratio do Gemini trả về nên vẫn mở sau).
+    
+    Returns:
+        {'image': generator hoặc None, 'video': generator hoặc None}; người gọi close() các generator này
+    """
+    import time
+    
+    warm = {'image': None, 'video': None}
+    cookie_string = json.dumps(cookies) if cookies else None
+    started = time.time()
+    
+    try:
+        if generate_image:
+            from browser_image import FreepikImageGenerator
+            
+            warm['image'] = FreepikImageGenerator(headless=not show_browser)
+            warm['image'].prepare_generator_page(cookie_string)
+        elif generate_video:
+            from browser_video import FreepikVideoGenerator
+            
+            warm['video'] = FreepikVideoGenerator(headless=not show_browser)
+            warm['video'].start()
+        print(f"🔥 Browser khởi động xong trong {time.time() - started:.1f}s (song song với Gemini)")
+    except Exception as e:
+        print(f"{Colors.WARNING}⚠️ Không khởi động trước được browser ({e}), sẽ mở khi có prompt{Colors.ENDC}")
+        close_ai_warmup(warm)
+    
+    return warm
+
+
+def close_ai_warmup(warm: Dict[str, Any]) -> None:
+    """Đóng các generator đã khởi động trước bởi start_ai_warmup"""
+    for kind in ('image', 'video'):
+        generator = warm.get(kind)
+        warm[kind] = None
+        if generator is None:
+            continue
+        try:
+            generator.close()
+        except Exception as e:
+            print(f"⚠️ Lỗi đóng browser {kind}: {e}")
+
+
 def process_ai_prompt(topic: str, generate_image: bool, generate_video: bool, show_browser: bool):
-    """Xử lý prompt AI với cải tiến lưu file và fallback options"""
+    """
+    Xử lý prompt AI với cải tiến lưu file và fallback options.
+    Gemini chạy ở thread nền trong lúc browser khởi động và mở sẵn trang ở thread chính;
+    prompt được đưa vào page đã warm ngay khi Gemini trả về.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    warm = {'image': None, 'video': None}
+    gemini_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gemini")
     try:
         # Khởi tạo Gemini generator với thư mục prompts
         print(f"🔮 Đang sinh prompt AI từ chủ đề: {topic}")
@@ -326,20 +699,30 @@ def process_ai_prompt(topic: str, generate_image: bool, generate_video: bool, sh
             print(f"{Colors.WARNING}💡 Giải pháp thay thế:{Colors.ENDC}")
             print(f"{Colors.GREEN}1. Lấy API key mới tại: https://makersuite.google.com/app/apikey{Colors.ENDC}")
             print(f"{Colors.GREEN}2. Hoặc sử dụng prompt thủ công:{Colors.ENDC}")
-            print(f"   python main.py file --file sample_prompts.json")
+            print("   python main.py file --file sample_prompts.json")
             return False
         
+        # Load cookies (cần ngay để browser đăng nhập trong lúc chờ Gemini)
+        cookies = load_cookie_from_template()
+        
         try:
+            from gemini_prompt import GeminiPromptGenerator
+            
             gemini_generator = GeminiPromptGenerator(output_dir="prompts")
             
-            # Sinh prompt với tự động lưu file
-            prompt_data = gemini_generator.generate_prompt(topic, save_to_file=True)
+            # Sinh prompt với tự động lưu file (thread nền), đồng thời khởi động browser
+            gemini_future = gemini_pool.submit(gemini_generator.generate_prompt, topic, save_to_file=True)
+            warm = start_ai_warmup(generate_image, generate_video, show_browser, cookies)
+            
+            if not gemini_future.done():
+                print("⏳ Browser đã sẵn sàng, chờ Gemini trả prompt...")
+            prompt_data = gemini_future.result()
             
             if not prompt_data:
                 print("❌ Không thể sinh prompt từ AI")
                 return False
             
-            print(f"✅ Đã sinh prompt AI thành công!")
+            print("✅ Đã sinh prompt AI thành công!")
             print(f"📁 File prompt: {prompt_data.get('file_path', 'Unknown')}")
             print(f"🎨 Image prompt: {prompt_data['image_prompt'][:100]}...")
             print(f"🎬 Video prompt: {prompt_data['video_prompt'][:100]}...")
@@ -353,11 +736,11 @@ def process_ai_prompt(topic: str, generate_image: bool, generate_video: bool, sh
                 print(f"\n{Colors.WARNING}🔥 GEMINI API ĐÃ HẾT QUOTA MIỄN PHÍ!{Colors.ENDC}")
                 print(f"{Colors.BLUE}💡 CÁC GIẢI PHÁP THAY THẾ:{Colors.ENDC}")
                 print(f"{Colors.GREEN}1. 🔑 Tạo API key mới:{Colors.ENDC}")
-                print(f"   - Truy cập: https://makersuite.google.com/app/apikey")
-                print(f"   - Tạo project mới hoặc dùng Google account khác")
-                print(f"   - Copy key mới vào file .env")
+                print("   - Truy cập: https://makersuite.google.com/app/apikey")
+                print("   - Tạo project mới hoặc dùng Google account khác")
+                print("   - Copy key mới vào file .env")
                 print(f"\n{Colors.GREEN}2. 📝 Sử dụng prompt có sẵn:{Colors.ENDC}")
-                print(f"   python main.py file --file sample_prompts.json")
+                print("   python main.py file --file sample_prompts.json")
                 print(f"\n{Colors.GREEN}3. 📋 Tạo prompt thủ công:{Colors.ENDC}")
                 
                 # Tạo prompt thủ công ngay lập tức
@@ -371,16 +754,13 @@ def process_ai_prompt(topic: str, generate_image: bool, generate_video: bool, sh
             elif "api" in error_msg.lower() and "key" in error_msg.lower():
                 print(f"\n{Colors.FAIL}🔑 API Key không hợp lệ!{Colors.ENDC}")
                 print(f"{Colors.BLUE}💡 Hướng dẫn fix:{Colors.ENDC}")
-                print(f"1. Kiểm tra GEMINI_API_KEY trong file .env")
-                print(f"2. Tạo key mới tại: https://makersuite.google.com/app/apikey")
+                print("1. Kiểm tra GEMINI_API_KEY trong file .env")
+                print("2. Tạo key mới tại: https://makersuite.google.com/app/apikey")
                 return False
             else:
                 print(f"\n{Colors.FAIL}❌ Lỗi không xác định: {error_msg}{Colors.ENDC}")
                 return False
         
-        # Load cookies
-        cookies = load_cookie_from_template()
-        
         success_count = 0
         
         # Xử lý sinh ảnh
@@ -397,7 +777,8 @@ def process_ai_prompt(topic: str, generate_image: bool, generate_video: bool, sh
                     'filename_prefix': f"{prompt_data.get('prompt_id', 'ai_generated')}_img"
                 }
                 
-                downloaded_images = process_single_image_batch(image_prompt_item, show_browser, cookies)
+                downloaded_images = process_single_image_batch(image_prompt_item, show_browser, cookies,
+                                                               generator=warm['image'])
                 
                 if downloaded_images:
                     success_count += 1
@@ -409,13 +790,19 @@ def process_ai_prompt(topic: str, generate_image: bool, generate_video: bool, sh
                     
             except Exception as e:
                 print(f"{Colors.FAIL}❌ Lỗi sinh ảnh: {e}{Colors.ENDC}")
+            finally:
+                # Bước video không dùng browser ảnh → đóng sớm để nhả RAM
+                close_ai_warmup({'image': warm['image']})
+                warm['image'] = None
         
         # Xử lý sinh video (giữ nguyên logic cũ)
         if generate_video:
             try:
                 print(f"\n{Colors.BLUE}🎬 Bắt đầu sinh video...{Colors.ENDC}")
                 
-                video_generator = FreepikVideoGenerator(headless=not show_browser)
+                from browser_video import FreepikVideoGenerator
+                
+                video_generator = warm['video'] or FreepikVideoGenerator(headless=not show_browser)
                 cookie_string = json.dumps(cookies) if cookies else None
                 
                 video_path = video_generator.generate_video(
@@ -439,6 +826,9 @@ def process_ai_prompt(topic: str, generate_image: bool, generate_video: bool, sh
     except Exception as e:
         print(f"{Colors.FAIL}❌ Lỗi xử lý AI prompt: {e}{Colors.ENDC}")
         return False
+    finally:
+        gemini_pool.shutdown(wait=False)
+        close_ai_warmup(warm)
 
 def create_manual_prompt(topic: str) -> Optional[Dict[str, Any]]:
     """Tạo prompt thủ công khi Gemini API không hoạt động"""
@@ -520,10 +910,15 @@ def create_manual_prompt(topic: str) -> Optional[Dict[str, Any]]:
 
 
 @click.group()
-def cli():
+@click.option('--debug', is_flag=True, help='Lưu snapshot DOM, Playwright trace và screenshot khi job lỗi')
+def cli(debug):
     """FAZZYTOOL - Công cụ tự động sinh ảnh và video AI từ Freepik Pikaso"""
     print_banner()
     
+    if debug:
+        # Generator đọc biến môi trường này qua debug_artifacts.is_debug_enabled()
+        os.environ['FAZZYTOOL_DEBUG'] = '1'
+    
     # Kiểm tra môi trường
     if not validate_environment():
         sys.exit(1)
@@ -603,6 +998,8 @@ def ai_batch(topics, file, start_index):
     try:
         print(f"{Colors.BLUE}🚀 Bắt đầu sinh {len(topic_list)} prompt AI...{Colors.ENDC}")
         
+        from gemini_prompt import GeminiPromptGenerator
+        
         gemini_generator = GeminiPromptGenerator(output_dir="prompts")
         results = gemini_generator.generate_batch_prompts(topic_list, start_index)
         
@@ -622,11 +1019,26 @@ def ai_batch(topics, file, start_index):
 @cli.command()
 @click.option('--show-browser/--headless', default=False, help='Hiển thị trình duyệt (mặc định: False)')
 @click.option('--dry-run', is_flag=True, help='Chỉ xem thông tin batch mà không thực thi')
-def batch(show_browser, dry_run):
+@click.option('--skip-preflight', is_flag=True, help='Bỏ qua kiểm tra cookie / credits trước khi chạy')
+@click.option('--budget', type=int, default=None, help='Số credits tối đa batch được tiêu (ghi đè credit_budget)')
+@click.option('--resume', is_flag=True, help='Chạy tiếp các prompt còn lại từ checkpoint của batch trước')
+@click.option('--spec', type=str, default=None, help='Batch spec JSON (vd. batch_config.json) thay cho prompts_template.txt')
+def batch(show_browser, dry_run, skip_preflight, budget, resume, spec):
     """Xử lý hàng loạt từ file template"""
+    prefetcher = None
     try:
+        from batch_processor import BatchProcessor
+        
         processor = BatchProcessor()
-        batch_job = processor.create_batch_job()
+        batch_job = processor.load_batch_spec(spec) if spec else processor.create_batch_job()
+        if batch_job is None:
+            return
+        if resume:
+            batch_job = processor.resume_batch_job(batch_job)
+            if batch_job is None:
+                return
+        if budget is not None:
+            batch_job.config['credit_budget'] = max(0, budget)
         
         # Hiển thị tóm tắt batch
         is_valid = processor.print_batch_summary(batch_job)
@@ -634,6 +1046,26 @@ def batch(show_browser, dry_run):
         if not is_valid:
             print(f"\n{Colors.FAIL}❌ Batch job không hợp lệ. Vui lòng kiểm tra các file template.{Colors.ENDC}")
             return
+        
+        # Pre-flight: cookie còn hạn, phiên đăng nhập và credits trước khi mở browser
+        # (--dry-run chỉ kiểm tra hạn cookie, không gửi request)
+        balance = None
+        if not skip_preflight:
+            from preflight import run_preflight
+            preflight = run_preflight(batch_job.cookies, processor.estimate_credits(batch_job), remote=not dry_run)
+            if not preflight['ok']:
+                print(f"\n{Colors.FAIL}❌ Pre-flight thất bại: cookie không còn dùng được. Lấy cookie mới vào cookie_template.txt rồi chạy lại.{Colors.ENDC}")
+                return
+            balance = preflight['credits']
+        
+        # Không đủ credits cho cả batch: chạy nhóm rẻ trước, dừng ở giới hạn và lưu checkpoint
+        credit_budget = batch_job.config.get('credit_budget', 0)
+        credit_limits = [value for value in (credit_budget or None, balance) if value is not None]
+        estimated_credits = processor.estimate_credits(batch_job)
+        if credit_limits and estimated_credits > min(credit_limits):
+            batch_job = processor.order_for_budget(batch_job)
+            print(f"{Colors.WARNING}💳 Batch cần ~{estimated_credits} credits, giới hạn {min(credit_limits)}: "
+                  f"chạy job rẻ trước, dừng khi hết credits và lưu checkpoint để --resume{Colors.ENDC}")
             
         if dry_run:
             print(f"\n{Colors.BLUE}🔍 DRY RUN - Chỉ xem thông tin, không thực thi{Colors.ENDC}")
@@ -649,154 +1081,293 @@ def batch(show_browser, dry_run):
             
         # Thực thi batch theo workflow
         print(f"\n{Colors.GREEN}🚀 Bắt đầu xử lý batch...{Colors.ENDC}")
-        results = []
-        workflow = batch_job.get('workflow', 'unknown')
-        
-        if workflow == 'image_then_video':
+        results: List["JobResult"] = []
+        workflow = batch_job.workflow
+        config = batch_job.config
+        cookies = batch_job.cookies
+
+        # Số browser chạy song song tự co giãn theo RAM/CPU, tối đa max_concurrent
+        from resource_autoscaler import BrowserAutoscaler, run_autoscaled
+        autoscaler = BrowserAutoscaler.from_config(config)
+        delay = config['delay_between_requests']
+
+        # Gemini mở rộng trước các PROMPT_IDEA (ai_idea) trong lúc browser worker sinh ảnh
+        from prompt_prefetch import PromptPrefetcher
+        from prompt_job import JobStatus, MediaType
+        prefetch_depth = config.get('ai_prefetch_depth', 3)
+
+        # Sổ credits: giữ chỗ trước mỗi job, đo lại số dư định kỳ, dừng cấp phát khi hết ngân sách
+        from credit_ledger import BudgetExhausted, CreditLedger
+        from preflight import read_credit_balance
+        from resource_autoscaler import DispatchStopped
+        from itertools import takewhile
+        ledger = CreditLedger(
+            processor.credit_cost(batch_job),
+            budget=config.get('credit_budget', 0),
+            balance=balance,
+            balance_reader=lambda: read_credit_balance(cookies),
+            check_every=config.get('credit_check_every', 5)
+        )
+
+        def error_result(job, media, error):
+            """Kết quả cho item lỗi: bị bỏ qua vì batch dừng (hết credits) hoặc thất bại thật"""
+            if isinstance(error, DispatchStopped):
+                return JobResult.skipped(job, media, str(error))
+            return JobResult.failed(job, media, str(error))
+
+        def settle_results(jobs, job_results):
+            """Ghi vào sổ credits phần hoàn thành của từng job theo kết quả trả về"""
+            outcomes = {}
+            for result in job_results:
+                outcomes.setdefault(id(result.job), []).append(result.ok)
+            for job in jobs:
+                own = outcomes.get(id(job), [])
+                ledger.settle(job, sum(own) / len(own) if own else 0)
+
+        if batch_job.spec_file:
+            # Batch spec: hàng đợi ưu tiên, concurrency / retry lấy từ file spec
+            results.extend(process_spec_batch(batch_job, ledger, autoscaler, show_browser))
+
+        elif workflow == 'image_then_video':
             # Workflow: Tạo ảnh trước, sau đó dùng ảnh để tạo video
             print(f"{Colors.BLUE}📋 Workflow: Tạo ảnh trước → Dùng ảnh tạo video{Colors.ENDC}")
             
             # Bước 1: Tạo tất cả ảnh
             created_images = []
-            for i, prompt_item in enumerate(batch_job['image_prompts'], 1):
-                print(f"\n{Colors.BLUE}[Ảnh {i}/{len(batch_job['image_prompts'])}] {prompt_item['content'][:50]}...{Colors.ENDC}")
-                
-                try:
-                    image_path = process_single_image(prompt_item, show_browser, batch_job['cookies'])
-                    if image_path:
-                        created_images.append(image_path)
-                        results.append({'prompt': prompt_item['content'], 'type': 'image', 'status': 'success', 'path': image_path})
+            pipeline_depth = config.get('pipeline_depth', 1)
+            video_handoff = config.get('video_handoff', False)
+            image_prompts = batch_job.image_prompts if pipeline_depth <= 1 and not video_handoff else []
+            video_prompts = batch_job.video_prompts if not video_handoff else []
+            prefetcher = PromptPrefetcher(batch_job.image_prompts, prefetch_depth,
+                                          fallback=create_manual_prompt).start()
+
+            def reserve_pair(index, job):
+                """Giữ chỗ credits cho ảnh cùng video ghép với nó để cặp không bị cắt giữa chừng"""
+                paired = batch_job.video_prompts[index] if index < len(batch_job.video_prompts) else None
+                return ledger.reserve(job, paired)
+
+            # Handoff / pipeline lấy prompt từ prefetch ngay lúc tới lượt (không chờ Gemini mở rộng
+            # hết cả batch); mỗi prompt giữ chỗ credits khi được lấy, hết credits thì dừng lấy
+            runnable = []
+
+            def runnable_prompts():
+                for index in range(len(batch_job.image_prompts)):
+                    job = prefetcher.get(index, keep_original=True)
+                    if not reserve_pair(index, job):
+                        return
+                    runnable.append(job)
+                    yield job
+
+            def not_run(jobs, media):
+                """Prompt không được lấy: bỏ qua vì hết credits, hoặc lỗi vì handoff / pipeline dừng giữa chừng"""
+                for job in jobs:
+                    if ledger.exhausted:
+                        results.append(JobResult.skipped(job, media, ledger.stop_reason))
                     else:
-                        results.append({'prompt': prompt_item['content'], 'type': 'image', 'status': 'failed'})
-                        
-                    # Delay
-                    if i < len(batch_job['image_prompts']):
-                        delay = batch_job['config']['delay_between_requests']
-                        print(f"{Colors.BLUE}Chờ {delay}s...{Colors.ENDC}")
-                        import time
-                        time.sleep(delay)
-                        
-                except Exception as e:
-                    print(f"{Colors.FAIL}Lỗi tạo ảnh {i}: {str(e)}{Colors.ENDC}")
-                    results.append({'prompt': prompt_item['content'], 'type': 'image', 'status': 'failed', 'error': str(e)})
+                        results.append(JobResult.failed(job, media, 'Không được chạy'))
+
+            total_images = len(batch_job.image_prompts)
+            if video_handoff:
+                print(f"{Colors.BLUE}🔗 Handoff: chuyển ảnh vừa sinh thẳng sang Image-to-Video trong Pikaso{Colors.ENDC}")
+                handoff_results = process_image_video_handoff(runnable_prompts(), batch_job.video_prompts,
+                                                              show_browser, cookies, total=total_images)
+                settle_results(runnable + batch_job.video_prompts[:len(runnable)], handoff_results)
+                results.extend(handoff_results)
+                not_run(batch_job.image_prompts[len(runnable):], MediaType.IMAGE)
+                not_run(batch_job.video_prompts[len(runnable):total_images], MediaType.VIDEO)
+                for job in batch_job.video_prompts[total_images:]:
+                    results.append(JobResult.failed(job, MediaType.VIDEO, 'No corresponding image'))
+            elif pipeline_depth > 1:
+                print(f"{Colors.BLUE}⚡ Pipeline: gửi chồng tối đa {pipeline_depth} prompt ảnh trên một trang{Colors.ENDC}")
+                pipelined_files = process_image_prompts_pipelined(
+                    (job.as_item() for job in runnable_prompts()), show_browser, cookies, pipeline_depth,
+                    total=total_images
+                )
+                pipelined_files += [[] for _ in range(len(runnable) - len(pipelined_files))]
+                for job, files in zip(runnable, pipelined_files):
+                    ledger.settle(job, bool(files))
+                    # created_images giữ đúng vị trí của prompt ảnh (None = lỗi) để video ghép đúng ảnh
+                    created_images.append(files[0] if files else None)
+                    if files:
+                        results.append(JobResult.succeeded(job, MediaType.IMAGE, files))
+                    else:
+                        results.append(JobResult.failed(job, MediaType.IMAGE))
+                not_run(batch_job.image_prompts[len(runnable):], MediaType.IMAGE)
             
-            # Bước 2: Dùng ảnh vừa tạo để tạo video
-            for i, prompt_item in enumerate(batch_job['video_prompts'], 1):
-                print(f"\n{Colors.BLUE}[Video {i}/{len(batch_job['video_prompts'])}] {prompt_item['content'][:50]}...{Colors.ENDC}")
-                
+            def make_image(index, job):
+                job = prefetcher.get(index)
+                if not reserve_pair(index, job):
+                    raise BudgetExhausted(ledger.stop_reason)
+                print(f"\n{Colors.BLUE}[Ảnh {index + 1}/{len(batch_job.image_prompts)}] {job.content[:50]}...{Colors.ENDC}")
+                image_path = None
                 try:
-                    if i <= len(created_images):
-                        image_path = created_images[i-1]
-                        video_path = process_single_video_from_image(prompt_item, image_path, show_browser, batch_job['cookies'])
-                        if video_path:
-                            results.append({'prompt': prompt_item['content'], 'type': 'video', 'status': 'success', 'path': video_path, 'source_image': image_path})
-                        else:
-                            results.append({'prompt': prompt_item['content'], 'type': 'video', 'status': 'failed'})
-                    else:
-                        print(f"{Colors.WARNING}Không có ảnh tương ứng cho video prompt {i}{Colors.ENDC}")
-                        results.append({'prompt': prompt_item['content'], 'type': 'video', 'status': 'failed', 'error': 'No corresponding image'})
-                        
-                    # Delay
-                    if i < len(batch_job['video_prompts']):
-                        delay = batch_job['config']['delay_between_requests']
-                        print(f"{Colors.BLUE}Chờ {delay}s...{Colors.ENDC}")
-                        import time
-                        time.sleep(delay)
-                        
-                except Exception as e:
-                    print(f"{Colors.FAIL}Lỗi tạo video {i}: {str(e)}{Colors.ENDC}")
-                    results.append({'prompt': prompt_item['content'], 'type': 'video', 'status': 'failed', 'error': str(e)})
-                    
+                    image_path = process_single_image(job.as_item(), show_browser, cookies)
+                finally:
+                    ledger.settle(job, bool(image_path))
+                return job, image_path
+
+            image_outcomes = run_autoscaled(image_prompts, make_image, autoscaler, delay,
+                                            should_stop=lambda: ledger.exhausted)
+            for i, (job, (outcome, error)) in enumerate(zip(image_prompts, image_outcomes), 1):
+                if error:
+                    if not isinstance(error, DispatchStopped):
+                        print(f"{Colors.FAIL}Lỗi tạo ảnh {i}: {str(error)}{Colors.ENDC}")
+                    results.append(error_result(job, MediaType.IMAGE, error))
+                    created_images.append(None)
+                    continue
+                job, image_path = outcome
+                created_images.append(image_path)
+                if image_path:
+                    results.append(JobResult.succeeded(job, MediaType.IMAGE, [image_path]))
+                else:
+                    results.append(JobResult.failed(job, MediaType.IMAGE))
+
+            # Bước 2: Dùng ảnh vừa tạo để tạo video (mỗi ảnh upload một lần cho mọi biến thể)
+            video_variants = parse_video_variants(config.get('video_variants', []))
+
+            # Video đã được giữ chỗ cùng ảnh của nó; video không có cặp chỉ chạy khi còn credits
+            runnable_videos = list(takewhile(ledger.reserve, video_prompts))
+            for job in video_prompts[len(runnable_videos):]:
+                results.append(JobResult.skipped(job, MediaType.VIDEO, ledger.stop_reason))
+
+            def make_video(index, job):
+                print(f"\n{Colors.BLUE}[Video {index + 1}/{len(video_prompts)}] {job.content[:50]}...{Colors.ENDC}")
+                image_path = created_images[index] if index < len(created_images) else None
+                if not image_path:
+                    print(f"{Colors.WARNING}Không có ảnh tương ứng cho video prompt {index + 1}{Colors.ENDC}")
+                video_results = []
+                try:
+                    video_results = video_prompt_results(job, image_path, video_variants, show_browser, cookies)
+                finally:
+                    settle_results([job], video_results)
+                return video_results
+
+            video_outcomes = run_autoscaled(runnable_videos, make_video, autoscaler, delay)
+            for i, (job, (video_results, error)) in enumerate(zip(runnable_videos, video_outcomes), 1):
+                if error:
+                    print(f"{Colors.FAIL}Lỗi tạo video {i}: {str(error)}{Colors.ENDC}")
+                    results.append(JobResult.failed(job, MediaType.VIDEO, str(error)))
+                else:
+                    results.extend(video_results)
+
         elif workflow == 'video_from_existing_images':
             # Workflow: Dùng ảnh có sẵn để tạo video
             print(f"{Colors.BLUE}📋 Workflow: Dùng ảnh có sẵn tạo video{Colors.ENDC}")
-            available_images = batch_job['available_images']
+            available_images = batch_job.available_images
             
-            for i, prompt_item in enumerate(batch_job['video_prompts'], 1):
-                print(f"\n{Colors.BLUE}[Video {i}/{len(batch_job['video_prompts'])}] {prompt_item['content'][:50]}...{Colors.ENDC}")
-                
+            video_variants = parse_video_variants(config.get('video_variants', []))
+            # Fan-out nhiều tỉ lệ dùng chung một lần upload → không cắt ảnh theo tỉ lệ
+            variant_ratios = {variant['ratio'] for variant in video_variants}
+            variant_ratio = variant_ratios.pop() if len(variant_ratios) == 1 else None
+            
+            # Thu nhỏ / nén trước các ảnh sẽ upload trong lúc browser xử lý từng video
+            from upload_optimizer import UploadOptimizer
+            upload_optimizer = UploadOptimizer()
+            for job, image_path in zip(batch_job.video_prompts, available_images):
+                ratio = variant_ratio if video_variants else job.ratio
+                upload_optimizer.submit(image_path, ratio)
+            
+            def make_video(index, job):
+                if not ledger.reserve(job):
+                    raise BudgetExhausted(ledger.stop_reason)
+                print(f"\n{Colors.BLUE}[Video {index + 1}/{len(batch_job.video_prompts)}] {job.content[:50]}...{Colors.ENDC}")
+                image_path = available_images[index] if index < len(available_images) else None
+                if image_path:
+                    print(f"📸 Sử dụng ảnh: {os.path.basename(image_path)}")
+                else:
+                    print(f"{Colors.WARNING}Không có ảnh tương ứng cho video prompt {index + 1}{Colors.ENDC}")
+                video_results = []
                 try:
-                    if i <= len(available_images):
-                        image_path = available_images[i-1]
-                        print(f"📸 Sử dụng ảnh: {os.path.basename(image_path)}")
-                        video_path = process_single_video_from_image(prompt_item, image_path, show_browser, batch_job['cookies'])
-                        if video_path:
-                            results.append({'prompt': prompt_item['content'], 'type': 'video', 'status': 'success', 'path': video_path, 'source_image': image_path})
-                        else:
-                            results.append({'prompt': prompt_item['content'], 'type': 'video', 'status': 'failed'})
-                    else:
-                        print(f"{Colors.WARNING}Không có ảnh tương ứng cho video prompt {i}{Colors.ENDC}")
-                        results.append({'prompt': prompt_item['content'], 'type': 'video', 'status': 'failed', 'error': 'No corresponding image'})
-                        
-                    # Delay
-                    if i < len(batch_job['video_prompts']):
-                        delay = batch_job['config']['delay_between_requests']
-                        print(f"{Colors.BLUE}Chờ {delay}s...{Colors.ENDC}")
-                        import time
-                        time.sleep(delay)
-                        
-                except Exception as e:
-                    print(f"{Colors.FAIL}Lỗi tạo video {i}: {str(e)}{Colors.ENDC}")
-                    results.append({'prompt': prompt_item['content'], 'type': 'video', 'status': 'failed', 'error': str(e)})
-                    
+                    video_results = video_prompt_results(job, image_path, video_variants, show_browser, cookies)
+                finally:
+                    settle_results([job], video_results)
+                return video_results
+
+            video_outcomes = run_autoscaled(batch_job.video_prompts, make_video, autoscaler, delay,
+                                            should_stop=lambda: ledger.exhausted)
+            for i, (job, (video_results, error)) in enumerate(zip(batch_job.video_prompts, video_outcomes), 1):
+                if error:
+                    if not isinstance(error, DispatchStopped):
+                        print(f"{Colors.FAIL}Lỗi tạo video {i}: {str(error)}{Colors.ENDC}")
+                    results.append(error_result(job, MediaType.VIDEO, error))
+                else:
+                    results.extend(video_results)
+
         else:
             # Workflow cũ: xử lý từng prompt một
-            for i, prompt_item in enumerate(batch_job['prompts'], 1):
-                print(f"\n{Colors.BLUE}[{i}/{batch_job['total_items']}] Đang xử lý prompt: {prompt_item['content'][:50]}...{Colors.ENDC}")
+            prefetcher = PromptPrefetcher(batch_job.prompts, prefetch_depth,
+                                          fallback=create_manual_prompt).start()
+            for i, job in enumerate(batch_job.prompts, 1):
+                print(f"\n{Colors.BLUE}[{i}/{batch_job.total_items}] Đang xử lý prompt: {job.content[:50]}...{Colors.ENDC}")
+                
+                if ledger.exhausted:
+                    results.append(JobResult.skipped(job, MediaType.IMAGE, ledger.stop_reason))
+                    continue
                 
                 try:
-                    result = {'prompt': prompt_item['content'], 'status': 'processing'}
+                    # Ý tưởng AI: prompt chi tiết đã được Gemini mở rộng trước (prefetch)
+                    if job.use_ai:
+                        job = prefetcher.get(i - 1)
                     
-                    # Xử lý theo loại prompt
-                    if prompt_item.get('use_ai', False):
-                        # Sử dụng AI để sinh prompt chi tiết
-                        success = process_ai_prompt(prompt_item['content'], True, False, show_browser)
-                    else:
-                        # Sử dụng prompt trực tiếp
-                        temp_prompt_file = f"temp_prompt_{i}.json"
-                        with open(temp_prompt_file, 'w', encoding='utf-8') as f:
-                            json.dump({
-                                'image_prompt': prompt_item['content'],
-                                'video_prompt': prompt_item['content'],
-                                'video_duration': '5s',
-                                'video_ratio': '1:1'
-                            }, f, ensure_ascii=False, indent=2)
-                        
-                        success = process_file_prompt(temp_prompt_file, True, False, show_browser)
-                        
-                        # Xóa file tạm
-                        if os.path.exists(temp_prompt_file):
-                            os.remove(temp_prompt_file)
+                    if not ledger.reserve(job):
+                        results.append(JobResult.skipped(job, MediaType.IMAGE, ledger.stop_reason))
+                        continue
                     
-                    result['status'] = 'success' if success else 'failed'
-                    results.append(result)
+                    # Job trong bộ nhớ, dùng cookie đã nạp của batch (không ghi file tạm)
+                    outcome = None
+                    try:
+                        outcome = process_prompt_job(job, True, False, show_browser, cookies)
+                    finally:
+                        ledger.settle(job, bool(outcome))
+                    if outcome:
+                        results.append(JobResult.succeeded(job, MediaType.IMAGE, outcome.get('image_paths', [])))
+                    else:
+                        results.append(JobResult.failed(job, MediaType.IMAGE))
                     
                     # Delay giữa các request
-                    if i < batch_job['total_items']:
-                        delay = batch_job['config']['delay_between_requests']
+                    if i < batch_job.total_items:
                         print(f"{Colors.BLUE}Chờ {delay}s trước khi xử lý tiếp...{Colors.ENDC}")
                         import time
                         time.sleep(delay)
                         
                 except Exception as e:
                     print(f"{Colors.FAIL}Lỗi xử lý prompt {i}: {str(e)}{Colors.ENDC}")
-                    results.append({'prompt': prompt_item['content'], 'status': 'failed', 'error': str(e)})
+                    results.append(JobResult.failed(job, MediaType.IMAGE, str(e)))
+        
+        # Đo số dư lần cuối để báo cáo ghi credits thực tế của từng job
+        ledger.reconcile()
         
         # Lưu báo cáo
-        processor.save_batch_report(results, batch_job)
+        batch_job.status = JobStatus.SUCCESS if results and all(r.ok for r in results) else JobStatus.FAILED
+        processor.save_batch_report(results, batch_job, ledger)
+        
+        # Dừng vì hết credits (hoặc đang chạy tiếp): lưu các prompt còn lại để --resume
+        if ledger.exhausted or resume:
+            processor.save_checkpoint(batch_job, results, ledger)
         
         # Tóm tắt kết quả
-        success_count = len([r for r in results if r['status'] == 'success'])
-        failed_count = len([r for r in results if r['status'] == 'failed'])
+        success_count = sum(1 for r in results if r.ok)
+        skipped_count = sum(1 for r in results if r.status is JobStatus.SKIPPED)
+        failed_count = len(results) - success_count - skipped_count
         
-        print(f"\n{Colors.GREEN}{Colors.BOLD}✅ BATCH HOÀN THÀNH{Colors.ENDC}")
+        if ledger.exhausted:
+            print(f"\n{Colors.WARNING}{Colors.BOLD}🛑 BATCH DỪNG: {ledger.stop_reason}{Colors.ENDC}")
+        else:
+            print(f"\n{Colors.GREEN}{Colors.BOLD}✅ BATCH HOÀN THÀNH{Colors.ENDC}")
         print(f"{Colors.GREEN}Thành công: {success_count}/{len(results)}{Colors.ENDC}")
         print(f"{Colors.FAIL}Thất bại: {failed_count}/{len(results)}{Colors.ENDC}")
+        if skipped_count:
+            print(f"{Colors.WARNING}Bỏ qua (hết credits): {skipped_count}/{len(results)}{Colors.ENDC}")
+        print(f"{Colors.BLUE}💳 Credits đã tiêu: ~{ledger.spent:.0f}"
+              f"{' (đo từ số dư)' if ledger.measured else ' (ước tính)'}{Colors.ENDC}")
         
     except Exception as e:
         print(f"{Colors.FAIL}Lỗi batch processing: {str(e)}{Colors.ENDC}")
         if "--debug" in sys.argv:
             traceback.print_exc()
+    finally:
+        if prefetcher:
+            prefetcher.close()
 
 
 @cli.command()
@@ -848,13 +1419,13 @@ def test():
     # Check .env
     load_dotenv()
     if os.path.exists('.env'):
-        print(f"  ✅ File .env: Tồn tại")
+        print("  ✅ File .env: Tồn tại")
         gemini_key = os.getenv('GEMINI_API_KEY')
         freepik_cookie = os.getenv('FREEPIK_COOKIE')
         print(f"  {'✅' if gemini_key else '❌'} GEMINI_API_KEY: {'Có' if gemini_key else 'Thiếu'}")
         print(f"  {'✅' if freepik_cookie else '❌'} FREEPIK_COOKIE: {'Có' if freepik_cookie else 'Thiếu'}")
     else:
-        print(f"  ❌ File .env: Không tồn tại")
+        print("  ❌ File .env: Không tồn tại")
     
     # Check cookie template
     cookies = load_cookie_from_template()
@@ -874,10 +1445,10 @@ def test():
     try:
         test_prompt = create_manual_prompt("test mèo dễ thương")
         if test_prompt:
-            print(f"  ✅ Tạo prompt thủ công: Thành công")
+            print("  ✅ Tạo prompt thủ công: Thành công")
             print(f"  📁 File: {test_prompt.get('file_path', 'N/A')}")
         else:
-            print(f"  ❌ Tạo prompt thủ công: Thất bại")
+            print("  ❌ Tạo prompt thủ công: Thất bại")
     except Exception as e:
         print(f"  ❌ Lỗi: {e}")
     
@@ -898,12 +1469,26 @@ def test():
         except ImportError:
             print(f"  ❌ {description}: Thiếu")
     
+    # Test 5: Ngân sách thời gian khởi động CLI
+    print(f"\n{Colors.BLUE}5. Kiểm tra thời gian khởi động (python -X importtime):{Colors.ENDC}")
+    startup = measure_import_time("main")
+    if not startup['ok']:
+        print(f"  ❌ Không import được main.py: {startup['error']}")
+    else:
+        within_budget = startup['cumulative_ms'] <= STARTUP_IMPORT_BUDGET_MS
+        print(f"  {'✅' if within_budget else '❌'} Import main.py: {startup['cumulative_ms']:.0f}ms "
+              f"(ngân sách {STARTUP_IMPORT_BUDGET_MS}ms)")
+        if startup['heavy_modules']:
+            print(f"  ❌ Module nặng bị import khi khởi động: {', '.join(startup['heavy_modules'][:5])}")
+        else:
+            print("  ✅ Không import Playwright/Gemini/python-docx khi khởi động")
+    
     print(f"\n{Colors.GREEN}🏁 Test hoàn thành!{Colors.ENDC}")
     print(f"\n{Colors.BLUE}💡 Hướng dẫn sử dụng:{Colors.ENDC}")
-    print(f"  • Test với prompt có sẵn: python main.py file --file sample_prompts.json")
-    print(f"  • Tạo prompt từ AI: python main.py ai --topic 'mèo dễ thương'")
-    print(f"  • Xử lý batch: python main.py batch")
-    print(f"  • Xem help: python main.py --help")
+    print("  • Test với prompt có sẵn: python main.py file --file sample_prompts.json")
+    print("  • Tạo prompt từ AI: python main.py ai --topic 'mèo dễ thương'")
+    print("  • Xử lý batch: python main.py batch")
+    print("  • Xem help: python main.py --help")
 
 
 @cli.command()
@@ -1143,7 +1728,7 @@ def debug_cookie(prompt, show_browser):
                 print(f"  ✅ Cookies: {len(cookies)} cookies đã set")
                 print(f"  ✅ Input field: {'Tìm thấy' if found_selector else 'KHÔNG TÌM THẤY'}")
                 print(f"  ✅ Generate button: {'Tìm thấy' if generate_found else 'KHÔNG TÌM THẤY'}")
-                print(f"  📁 Screenshots: debug_*.png")
+                print("  📁 Screenshots: debug_*.png")
                 
                 if show_browser:
                     input(f"\n{Colors.WARNING}⏸️ Nhấn Enter để đóng browser...{Colors.ENDC}")
@@ -1172,7 +1757,8 @@ def debug_cookie(prompt, show_browser):
 @click.option('--download-count', default=None, type=int, help='Số lượng ảnh tải về (mặc định: tất cả)')
 @click.option('--filename-prefix', type=str, help='Tiền tố tên file ảnh')
 @click.option('--show-browser/--headless', default=False, help='Hiển thị trình duyệt (mặc định: False)')
-def image(file, topic, prompt, num_images, download_count, filename_prefix, show_browser):
+@click.option('--via-server', is_flag=True, help='Gửi job tới daemon `serve` đang chạy thay vì tự mở browser')
+def image(file, topic, prompt, num_images, download_count, filename_prefix, show_browser, via_server):
     """CHỈ TẠO ẢNH - Sinh ảnh từ prompt, file hoặc AI"""
     print(f"{Colors.GREEN}{Colors.BOLD}🎨 CHẾ ĐỘ TẠO ẢNH{Colors.ENDC}")
     
@@ -1180,9 +1766,9 @@ def image(file, topic, prompt, num_images, download_count, filename_prefix, show
     input_count = sum([bool(file), bool(topic), bool(prompt)])
     if input_count == 0:
         print(f"{Colors.FAIL}❌ Vui lòng cung cấp một trong các tùy chọn:{Colors.ENDC}")
-        print(f"   --file: Đường dẫn file prompt")
-        print(f"   --topic: Chủ đề tiếng Việt (dùng AI)")
-        print(f"   --prompt: Prompt trực tiếp tiếng Anh")
+        print("   --file: Đường dẫn file prompt")
+        print("   --topic: Chủ đề tiếng Việt (dùng AI)")
+        print("   --prompt: Prompt trực tiếp tiếng Anh")
         sys.exit(1)
         
     if input_count > 1:
@@ -1209,6 +1795,8 @@ def image(file, topic, prompt, num_images, download_count, filename_prefix, show
                 print(f"{Colors.FAIL}❌ Không tìm thấy file: {file}{Colors.ENDC}")
                 sys.exit(1)
                 
+            from prompt_loader import PromptLoader
+            
             loader = PromptLoader()
             file_data = loader.load_prompt(file)
             prompt_item['content'] = file_data.get('image_prompt', file_data.get('prompt', ''))
@@ -1218,6 +1806,8 @@ def image(file, topic, prompt, num_images, download_count, filename_prefix, show
             print(f"{Colors.BLUE}🤖 Đang sinh prompt AI từ chủ đề: {topic}{Colors.ENDC}")
             
             try:
+                from gemini_prompt import GeminiPromptGenerator
+                
                 gemini_generator = GeminiPromptGenerator()
                 ai_result = gemini_generator.generate_prompt(topic, save_to_file=True)
                 prompt_item['content'] = ai_result['image_prompt']
@@ -1249,7 +1839,9 @@ def image(file, topic, prompt, num_images, download_count, filename_prefix, show
         print(f"🎨 Sinh {num_images} ảnh, tải về {prompt_item['download_count']} ảnh")
         print(f"📝 Prompt: {prompt_item['content'][:100]}...")
         
-        downloaded_files = process_single_image_batch(prompt_item, show_browser, cookies)
+        downloaded_files = run_job_via_server('image', prompt_item) if via_server else None
+        if downloaded_files is None:
+            downloaded_files = process_single_image_batch(prompt_item, show_browser, cookies)
         
         if downloaded_files:
             print(f"{Colors.GREEN}{Colors.BOLD}✅ TẠO ẢNH THÀNH CÔNG!{Colors.ENDC}")
@@ -1274,7 +1866,8 @@ def image(file, topic, prompt, num_images, download_count, filename_prefix, show
 @click.option('--duration', default='5s', type=click.Choice(['5s', '10s']), help='Thời lượng video (mặc định: 5s)')
 @click.option('--ratio', default='16:9', type=click.Choice(['1:1', '16:9', '9:16']), help='Tỉ lệ khung hình (mặc định: 16:9)')
 @click.option('--show-browser/--headless', default=False, help='Hiển thị trình duyệt (mặc định: False)')
-def video(file, topic, prompt, image, duration, ratio, show_browser):
+@click.option('--via-server', is_flag=True, help='Gửi job tới daemon `serve` đang chạy thay vì tự mở browser')
+def video(file, topic, prompt, image, duration, ratio, show_browser, via_server):
     """CHỈ TẠO VIDEO - Sinh video từ prompt hoặc ảnh"""
     print(f"{Colors.GREEN}{Colors.BOLD}🎬 CHẾ ĐỘ TẠO VIDEO{Colors.ENDC}")
     
@@ -1282,10 +1875,10 @@ def video(file, topic, prompt, image, duration, ratio, show_browser):
     input_count = sum([bool(file), bool(topic), bool(prompt)])
     if input_count == 0 and not image:
         print(f"{Colors.FAIL}❌ Vui lòng cung cấp một trong các tùy chọn:{Colors.ENDC}")
-        print(f"   --file: Đường dẫn file prompt")
-        print(f"   --topic: Chủ đề tiếng Việt (dùng AI)")
-        print(f"   --prompt: Prompt trực tiếp tiếng Anh")
-        print(f"   --image: Đường dẫn ảnh (image-to-video)")
+        print("   --file: Đường dẫn file prompt")
+        print("   --topic: Chủ đề tiếng Việt (dùng AI)")
+        print("   --prompt: Prompt trực tiếp tiếng Anh")
+        print("   --image: Đường dẫn ảnh (image-to-video)")
         sys.exit(1)
         
     if input_count > 1:
@@ -1312,6 +1905,8 @@ def video(file, topic, prompt, image, duration, ratio, show_browser):
                 print(f"{Colors.FAIL}❌ Không tìm thấy file: {file}{Colors.ENDC}")
                 sys.exit(1)
                 
+            from prompt_loader import PromptLoader
+            
             loader = PromptLoader()
             file_data = loader.load_prompt(file)
             prompt_item['content'] = file_data.get('video_prompt', file_data.get('prompt', ''))
@@ -1325,6 +1920,8 @@ def video(file, topic, prompt, image, duration, ratio, show_browser):
             print(f"{Colors.BLUE}🤖 Đang sinh prompt AI từ chủ đề: {topic}{Colors.ENDC}")
             
             try:
+                from gemini_prompt import GeminiPromptGenerator
+                
                 gemini_generator = GeminiPromptGenerator()
                 ai_result = gemini_generator.generate_prompt(topic, save_to_file=True)
                 prompt_item['content'] = ai_result['video_prompt']
@@ -1366,7 +1963,15 @@ def video(file, topic, prompt, image, duration, ratio, show_browser):
         print(f"⏱️ Thời lượng: {prompt_item['duration']}")
         print(f"📐 Tỉ lệ: {prompt_item['ratio']}")
         
-        if image:
+        server_files = None
+        if via_server:
+            if image:
+                prompt_item['image_path'] = os.path.abspath(image)
+            server_files = run_job_via_server('video', prompt_item)
+        
+        if server_files is not None:
+            video_path = server_files[0] if server_files else None
+        elif image:
             print(f"🖼️ Từ ảnh: {os.path.basename(image)}")
             video_path = process_single_video_from_image(prompt_item, image, show_browser, cookies)
         else:
@@ -1408,8 +2013,9 @@ def video(file, topic, prompt, image, duration, ratio, show_browser):
 @click.option('--prompts-file', type=str, help='File chứa prompts cho video (mỗi dòng một prompt)')
 @click.option('--duration', default='5s', type=click.Choice(['5s', '10s']), help='Thời lượng video (mặc định: 5s)')
 @click.option('--ratio', default='16:9', type=click.Choice(['1:1', '16:9', '9:16']), help='Tỉ lệ khung hình (mặc định: 16:9)')
+@click.option('--variant', 'variants', multiple=True, help='Biến thể duration:ratio, lặp lại để fan-out một ảnh (vd. --variant 5s:16:9 --variant 10s:9:16)')
 @click.option('--show-browser/--headless', default=False, help='Hiển thị trình duyệt (mặc định: False)')
-def images_to_videos(images_dir, prompts_file, duration, ratio, show_browser):
+def images_to_videos(images_dir, prompts_file, duration, ratio, variants, show_browser):
     """TẠO VIDEO TỪ NHIỀU ẢNH - Chuyển đổi hàng loạt ảnh thành video"""
     print(f"{Colors.GREEN}{Colors.BOLD}🎬 CHẾ ĐỘ TẠO VIDEO TỪ ẢNH{Colors.ENDC}")
     
@@ -1445,6 +2051,19 @@ def images_to_videos(images_dir, prompts_file, duration, ratio, show_browser):
             print(f"{Colors.FAIL}❌ Không thể load cookie. Vui lòng cập nhật cookie_template.txt{Colors.ENDC}")
             sys.exit(1)
         
+        # Fan-out: mỗi ảnh upload một lần rồi sinh mọi biến thể trên cùng trang
+        video_variants = parse_video_variants(list(variants))
+        upload_ratio = ratio
+        if video_variants:
+            print(f"{Colors.BLUE}🎞️ Fan-out {len(video_variants)} biến thể mỗi ảnh: "
+                  f"{', '.join(v['duration'] + ' ' + v['ratio'] for v in video_variants)}{Colors.ENDC}")
+            variant_ratios = {variant['ratio'] for variant in video_variants}
+            upload_ratio = variant_ratios.pop() if len(variant_ratios) == 1 else None
+        
+        # Thu nhỏ / nén trước toàn bộ ảnh ở process pool, lúc upload chỉ còn lấy từ cache
+        from upload_optimizer import UploadOptimizer
+        UploadOptimizer().prepare_many([str(p) for p in image_files], upload_ratio)
+        
         # Xử lý từng ảnh
         successful_videos = []
         failed_videos = []
@@ -1466,6 +2085,15 @@ def images_to_videos(images_dir, prompts_file, duration, ratio, show_browser):
                     prompt_item['content'] = f'Video animation from image: {image_path.stem}'
                     print(f"📝 Prompt tự động: {prompt_item['content']}")
                 
+                if video_variants:
+                    video_paths = process_video_variants_from_image(prompt_item, str(image_path), video_variants,
+                                                                    show_browser, cookies)
+                    successful_videos.extend(path for path in video_paths if path)
+                    failed_videos.extend(f"{image_path} ({v['duration']} {v['ratio']})"
+                                         for v, path in zip(video_variants, video_paths) if not path)
+                    print(f"{Colors.GREEN}✅ {sum(1 for p in video_paths if p)}/{len(video_variants)} biến thể thành công{Colors.ENDC}")
+                    continue
+                
                 # Tạo video
                 video_path = process_single_video_from_image(prompt_item, str(image_path), show_browser, cookies)
                 
@@ -1506,5 +2134,117 @@ def images_to_videos(images_dir, prompts_file, duration, ratio, show_browser):
         sys.exit(1)
 
 
+@cli.command()
+@click.option('--host', default='127.0.0.1', help='Địa chỉ lắng nghe (mặc định: 127.0.0.1)')
+@click.option('--port', default=8765, type=int, help='Cổng lắng nghe (mặc định: 8765, 0 = tự chọn)')
+@click.option('--show-browser/--headless', default=False, help='Hiển thị trình duyệt (mặc định: False)')
+@click.option('--allow-remote', is_flag=True, default=False,
+              help='Cho phép --host khác localhost (API không có xác thực!)')
+def serve(host, port, show_browser, allow_remote):
+    """DAEMON - Giữ browser ấm và nhận job qua HTTP API cục bộ"""
+    print(f"{Colors.GREEN}{Colors.BOLD}🛰️ CHẾ ĐỘ DAEMON{Colors.ENDC}")
+    
+    from job_server import JobServer, is_loopback_host
+    
+    if not is_loopback_host(host):
+        if not allow_remote:
+            print(f"{Colors.FAIL}❌ --host {host} không phải localhost. API daemon không có xác thực; "
+                  f"thêm --allow-remote nếu thật sự muốn mở ra mạng{Colors.ENDC}")
+            sys.exit(1)
+        print(f"{Colors.WARNING}⚠️ Daemon lắng nghe trên {host}: ai truy cập được cổng {port} đều gửi được job "
+              f"bằng cookie Freepik của bạn{Colors.ENDC}")
+    
+    cookies = load_cookie_from_template()
+    if not cookies:
+        print(f"{Colors.FAIL}❌ Không thể load cookie. Vui lòng cập nhật cookie_template.txt{Colors.ENDC}")
+        sys.exit(1)
+    
+    server = JobServer(cookies, host=host, port=port, headless=not show_browser,
+                       output_dir=create_output_dir(), allow_remote=allow_remote)
+    print(f"{Colors.BLUE}💡 Dùng: python main.py image --prompt \"...\" --via-server{Colors.ENDC}")
+    server.serve_forever()
+
+
+@cli.command('browser-server')
+@click.argument('action', type=click.Choice(['start', 'stop', 'status']), default='status')
+@click.option('--show-browser/--headless', default=False, help='Hiển thị trình duyệt (mặc định: False)')
+def browser_server(action, show_browser):
+    """BROWSER CHUNG - Giữ một Chromium chạy nền để các lần chạy CLI sau kết nối lại"""
+    from browser_server import start_server, stop_server, read_server_state, BROWSER_SERVER_STATE_FILE
+
+    if action == 'start':
+        try:
+            start_server(headless=not show_browser)
+            print(f"{Colors.BLUE}💡 Các lệnh image/video/batch sẽ tự kết nối; dừng bằng: python main.py browser-server stop{Colors.ENDC}")
+        except Exception as e:
+            print(f"{Colors.FAIL}❌ Không khởi động được browser server: {e}{Colors.ENDC}")
+    elif action == 'stop':
+        if stop_server():
+            print(f"{Colors.GREEN}🛑 Đã dừng browser server{Colors.ENDC}")
+        else:
+            print(f"{Colors.WARNING}Không có browser server nào đang chạy{Colors.ENDC}")
+    else:
+        state = read_server_state()
+        if state:
+            print(f"{Colors.GREEN}✅ Đang chạy: pid {state['pid']}, profile {state['profile']}, từ {state['started_at']}{Colors.ENDC}")
+            print(f"   {state['ws_endpoint']}")
+        else:
+            print(f"{Colors.WARNING}Không có browser server nào đang chạy ({BROWSER_SERVER_STATE_FILE}){Colors.ENDC}")
+
+
+@cli.command('bench-launch')
+@click.option('--browser', 'browser_type', type=click.Choice(['chrome', 'firefox']), default='chrome', help='Browser cần đo (mặc định: chrome)')
+@click.option('--url', default='https://www.freepik.com/pikaso/ai-image-generator', help='Trang dùng để đo thời gian điều hướng')
+@click.option('--runs', default=3, type=int, help='Số lần đo mỗi profile (lấy trung vị)')
+@click.option('--profile', 'profiles', multiple=True, help='Chỉ đo profile này (lặp lại được, mặc định: tất cả)')
+def bench_launch(browser_type, url, runs, profiles):
+    """BENCHMARK - So sánh bộ nhớ và thời gian điều hướng giữa các launch profile"""
+    from launch_profiles import LAUNCH_PROFILES, benchmark_profiles
+
+    unknown = [name for name in profiles if name not in LAUNCH_PROFILES]
+    if unknown:
+        print(f"{Colors.FAIL}❌ Profile không tồn tại: {', '.join(unknown)} (có: {', '.join(LAUNCH_PROFILES)}){Colors.ENDC}")
+        return
+
+    print(f"{Colors.BLUE}⏱️ Đo {browser_type}: {runs} lần/profile → {url}{Colors.ENDC}")
+    results = benchmark_profiles(browser_type, url, runs=max(1, runs), profiles=list(profiles) or None)
+
+    def fmt(value, unit):
+        return f"{value:.0f}{unit}" if value is not None else "-"
+
+    print(f"\n{'Profile':<16}{'Khởi động':>12}{'Điều hướng':>12}{'Bộ nhớ':>10}{'Lỗi':>6}")
+    for row in results:
+        print(f"{row['profile']:<16}{fmt(row['launch_ms'], 'ms'):>12}{fmt(row['navigation_ms'], 'ms'):>12}"
+              f"{fmt(row['memory_mb'], 'MB'):>10}{row['errors']:>6}")
+
+
+@cli.command('bench-cache')
+@click.option('--browser', 'browser_type', type=click.Choice(['chrome', 'firefox']), default='chrome', help='Browser cần đo (mặc định: chrome)')
+@click.option('--url', default='https://www.freepik.com/pikaso/ai-image-generator', help='Trang dùng để đo thời gian điều hướng')
+@click.option('--runs', default=3, type=int, help='Số lần đo cho mỗi chế độ')
+def bench_cache(browser_type, url, runs):
+    """BENCHMARK - Điều hướng với profile mới (cold) so với profile đã lưu cache (warm)"""
+    from persistent_profiles import benchmark_cache
+
+    print(f"{Colors.BLUE}⏱️ Đo {browser_type}: {runs} lần cold / {runs} lần warm → {url}{Colors.ENDC}")
+    try:
+        results = benchmark_cache(browser_type, url, runs=max(1, runs))
+    except Exception as e:
+        print(f"{Colors.FAIL}❌ Lỗi benchmark: {e}{Colors.ENDC}")
+        return
+
+    print(f"\n{'Chế độ':<8}{'Điều hướng':>12}{'Tài nguyên':>12}{'Từ cache':>10}{'Tải về':>12}")
+    for mode in ('cold', 'warm'):
+        for row in results[mode]:
+            print(f"{mode:<8}{row['navigation_ms']:>10.0f}ms{row['resources']:>12}{row['cached']:>10}"
+                  f"{row['transferred_kb']:>10.0f}KB")
+
+    def average(mode):
+        return sum(row['navigation_ms'] for row in results[mode]) / len(results[mode])
+
+    cold, warm = average('cold'), average('warm')
+    print(f"\n{Colors.GREEN}Trung bình: cold {cold:.0f}ms → warm {warm:.0f}ms ({(cold - warm) / cold * 100:.0f}% nhanh hơn){Colors.ENDC}")
+
+
 if __name__ == "__main__":
     cli() 
\ No newline at end of file
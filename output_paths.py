@@ -0,0 +1,89 @@
+"""
+Cấp tên file / thư mục đầu ra không trùng, an toàn khi nhiều worker ghi chung một output/
+
+Tên cũ chỉ dựa vào timestamp theo giây (video_output_20240101_120000.mp4, ...) nên hai job
+trong cùng một giây ghi đè lên nhau. Tên mới vẫn giữ timestamp để dễ sắp xếp, thêm token
+<job id>-<số thứ tự>-<hash ngắn>, và được giữ chỗ nguyên tử trước khi ghi:
+- thư mục: os.mkdir (lỗi nếu đã tồn tại → lấy token mới)
+- file: tạo file rỗng bằng O_CREAT | O_EXCL; nội dung thật ghi qua file tạm rồi os.replace
+  (file_placement.atomic_write_*), file giữ chỗ không dùng tới thì release()
+"""
+
+import os
+import time
+import hashlib
+import threading
+from datetime import datetime
+from typing import Optional
+
+MAX_RESERVE_ATTEMPTS = 100
+
+
+class OutputAllocator:
+    """Sinh token tăng dần cho một job/tiến trình và giữ chỗ đường dẫn đầu ra"""
+
+    def __init__(self, job_id: Optional[str] = None):
+        self._job_id = job_id
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    @property
+    def job_id(self) -> str:
+        # Mặc định: pid dạng hex, đọc lại mỗi lần để worker fork từ tiến trình cha không trùng token
+        return self._job_id or f"{os.getpid():x}"
+
+    def next_token(self) -> str:
+        """<job id>-<số thứ tự>-<hash ngắn>, tăng đơn điệu trong một allocator"""
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        digest = hashlib.sha1(f"{self.job_id}:{sequence}:{time.time_ns()}".encode()).hexdigest()[:6]
+        return f"{self.job_id}-{sequence:04d}-{digest}"
+
+    def reserve_dir(self, parent: str, prefix: str) -> str:
+        """Tạo và trả về thư mục <prefix>_<timestamp>_<token> mới trong parent"""
+        os.makedirs(parent, exist_ok=True)
+        for _ in range(MAX_RESERVE_ATTEMPTS):
+            path = os.path.join(parent, self._name(prefix))
+            try:
+                os.mkdir(path)
+                return path
+            except FileExistsError:
+                continue
+        raise RuntimeError(f"Không giữ được thư mục đầu ra mới trong {parent}")
+
+    def reserve_file(self, directory: str, prefix: str, suffix: str = "") -> str:
+        """Giữ chỗ file <prefix>_<timestamp>_<token><suffix> bằng một file rỗng tạo với O_EXCL"""
+        os.makedirs(directory, exist_ok=True)
+        for _ in range(MAX_RESERVE_ATTEMPTS):
+            path = os.path.join(directory, self._name(prefix) + suffix)
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                return path
+            except FileExistsError:
+                continue
+        raise RuntimeError(f"Không giữ được file đầu ra mới trong {directory}")
+
+    def _name(self, prefix: str) -> str:
+        return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.next_token()}"
+
+
+def release(path: Optional[str]) -> None:
+    """Bỏ file giữ chỗ khi job không ghi được gì (chỉ xóa nếu file vẫn rỗng)"""
+    try:
+        if path and os.path.isfile(path) and os.path.getsize(path) == 0:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+# Allocator mặc định của tiến trình
+_default_allocator = OutputAllocator()
+
+
+def reserve_dir(parent: str, prefix: str) -> str:
+    return _default_allocator.reserve_dir(parent, prefix)
+
+
+def reserve_file(directory: str, prefix: str, suffix: str = "") -> str:
+    return _default_allocator.reserve_file(directory, prefix, suffix)
@@ -0,0 +1,120 @@
+"""
+Chuẩn bị trước (speculative) page cho job video kế tiếp trong lúc job hiện tại đang sinh
+
+Với generator warm, mỗi job vẫn phải điều hướng, dọn popup, chọn chế độ và áp preset
+model/tỉ lệ/thời lượng trước khi nhập prompt. Khi scheduler biết job kế tiếp (expect),
+generator mở một page phụ trong cùng context và chuẩn bị sẵn ngay sau khi click Generate,
+xen giữa các lượt poll của VideoJobTracker.wait() (cùng thread Playwright; event response
+của job đang sinh vẫn được xử lý trong các lệnh của page phụ). Job sau lấy page này (take)
+và nhập prompt ngay. Page phụ quá prewarm_ttl_seconds hoặc chuẩn bị cho thiết lập khác thì
+bị bỏ.
+
+Chỉ daemon (job_server) gán next_job_settings, nên chỉ job image-to-video của daemon được
+chuẩn bị trước; batch không dùng pre-warm, text-to-video không lấy page chuẩn bị trước.
+"""
+
+import os
+import time
+from typing import Any, Callable, Hashable, Optional
+
+DEFAULT_PREWARM_TTL_SECONDS = 120
+
+
+def load_prewarm_ttl() -> int:
+    """Đọc prewarm_ttl_seconds từ config_template.txt (0 = tắt pre-warm)"""
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip()
+                    if '=' not in line:
+                        continue
+                    key, value = [part.strip() for part in line.split('=', 1)]
+                    if key.lower() == 'prewarm_ttl_seconds' and value:
+                        return max(0, int(value))
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc prewarm_ttl_seconds, dùng mặc định: {e}")
+    return DEFAULT_PREWARM_TTL_SECONDS
+
+
+class PagePrewarmer:
+    """Giữ tối đa một page phụ đã chuẩn bị sẵn cho một thiết lập (key) của job kế tiếp"""
+
+    def __init__(self, name: str, ttl_seconds: Optional[int] = None):
+        self.name = name
+        self.ttl_seconds = load_prewarm_ttl() if ttl_seconds is None else ttl_seconds
+        self.expected_key: Optional[Hashable] = None
+        self.hits = 0
+        self.misses = 0
+        self._page: Any = None
+        self._key: Optional[Hashable] = None
+        self._ready_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def expect(self, key: Optional[Hashable]) -> None:
+        """Scheduler báo thiết lập của job kế tiếp (None = không có job nào đang chờ)"""
+        self.expected_key = key
+        if key is None or (self._page is not None and key != self._key):
+            self.discard()
+
+    def prepare(self, context, prepare_page: Callable[[Any, Hashable], None]) -> None:
+        """
+        Mở và chuẩn bị page phụ cho expected_key (gọi trong lúc job hiện tại đang sinh).
+        Lỗi khi chuẩn bị chỉ làm mất page phụ, không ảnh hưởng job đang chạy.
+        """
+        key = self.expected_key
+        if not self.enabled or key is None or context is None:
+            return
+        if self._page is not None and self._key == key and self._fresh():
+            return
+
+        self.discard()
+        print(f"🔮 Chuẩn bị trước page {self.name} cho job kế tiếp: {key}")
+        started = time.monotonic()
+        page = None
+        try:
+            page = context.new_page()
+            prepare_page(page, key)
+            self._page, self._key, self._ready_at = page, key, time.monotonic()
+            print(f"🔮 Page {self.name} kế tiếp sẵn sàng sau {self._ready_at - started:.1f}s")
+        except Exception as e:
+            print(f"⚠️ Bỏ page chuẩn bị trước ({e})")
+            _close_quietly(page)
+
+    def take(self, key: Hashable):
+        """Lấy page đã chuẩn bị cho key nếu còn hạn, None nếu không có (→ chuẩn bị như bình thường)"""
+        page = self._page
+        if page is None:
+            return None
+
+        usable = self._key == key and self._fresh() and not page.is_closed()
+        self._page = None
+        self._key = None
+        if not usable:
+            self.misses += 1
+            _close_quietly(page)
+            return None
+
+        self.hits += 1
+        print(f"⚡ Dùng page {self.name} đã chuẩn bị trước ({time.monotonic() - self._ready_at:.0f}s trước)")
+        return page
+
+    def discard(self) -> None:
+        if self._page is not None:
+            _close_quietly(self._page)
+        self._page = None
+        self._key = None
+
+    def _fresh(self) -> bool:
+        return time.monotonic() - self._ready_at <= self.ttl_seconds
+
+
+def _close_quietly(page) -> None:
+    try:
+        if page is not None and not page.is_closed():
+            page.close()
+    except Exception:
+        pass
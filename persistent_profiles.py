@@ -0,0 +1,230 @@
+"""
+Profile browser lưu trên đĩa (launch_persistent_context) để giữ HTTP cache giữa các job và lần chạy
+
+Mỗi new_context() bắt đầu với cache rỗng nên mỗi job tải lại JS bundle, CSS, font của Pikaso.
+Khi bật persistent_profile=true, mỗi worker chạy trên một thư mục profile trong
+.fazzytool/profiles/<tài khoản>-<browser>-<loại>-<slot>; HTTP cache, service worker và
+localStorage được giữ lại cho lần sau.
+
+Một thư mục profile chỉ được một browser dùng tại một thời điểm: worker giữ khóa (flock /
+msvcrt) trên file .fazzytool.lock của slot, slot đang bị khóa thì lấy slot kế tiếp. Khóa tự
+nhả khi tiến trình chết, nên file khóa singleton do browser crash để lại được dọn trước khi mở.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional
+
+DEFAULT_PROFILE_ROOT = os.path.join(".fazzytool", "profiles")
+MAX_PROFILE_SLOTS = 16
+LOCK_FILE_NAME = ".fazzytool.lock"
+# File khóa của Chromium / Firefox; chỉ xóa khi đã giữ khóa của slot (không browser nào khác dùng)
+BROWSER_LOCK_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie", "parent.lock", ".parentlock", "lock")
+
+DEFAULT_PERSISTENT_SETTINGS = {
+    'persistent_profile': False,
+    'profile_account': 'default',
+    'profile_dir': DEFAULT_PROFILE_ROOT
+}
+
+
+def load_persistent_settings() -> Dict[str, Any]:
+    """Đọc persistent_profile / profile_account / profile_dir từ config_template.txt"""
+    settings = dict(DEFAULT_PERSISTENT_SETTINGS)
+
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip()
+                    if '=' not in line:
+                        continue
+                    key, value = [part.strip() for part in line.split('=', 1)]
+                    key = key.lower()
+                    if key == 'persistent_profile':
+                        settings['persistent_profile'] = value.lower() == 'true'
+                    elif key in ('profile_account', 'profile_dir') and value:
+                        settings[key] = value
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc cấu hình persistent profile, dùng mặc định: {e}")
+
+    return settings
+
+
+class ProfileLock:
+    """Khóa độc quyền một thư mục profile (nhả bằng release() hoặc khi tiến trình kết thúc)"""
+
+    def __init__(self, directory: str, handle):
+        self.directory = directory
+        self._handle = handle
+
+    @classmethod
+    def try_acquire(cls, directory: str) -> Optional["ProfileLock"]:
+        os.makedirs(directory, exist_ok=True)
+        handle = open(os.path.join(directory, LOCK_FILE_NAME), "a+")
+        try:
+            _lock_file(handle)
+        except OSError:
+            handle.close()
+            return None
+
+        handle.seek(0)
+        handle.truncate()
+        handle.write(f"{os.getpid()}\n")
+        handle.flush()
+        return cls(directory, handle)
+
+    def release(self) -> None:
+        if self._handle is None:
+            return
+        try:
+            _unlock_file(self._handle)
+        except OSError:
+            pass
+        self._handle.close()
+        self._handle = None
+
+
+def _lock_file(handle) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        return
+    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _unlock_file(handle) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def acquire_profile(kind: str, browser_type: str, settings: Optional[Dict[str, Any]] = None) -> ProfileLock:
+    """Giữ slot profile trống đầu tiên cho (tài khoản, browser, loại worker)"""
+    settings = settings or load_persistent_settings()
+    base = f"{settings['profile_account']}-{browser_type}-{kind}"
+    for slot in range(MAX_PROFILE_SLOTS):
+        lock = ProfileLock.try_acquire(os.path.join(settings['profile_dir'], f"{base}-{slot}"))
+        if lock:
+            return lock
+    raise RuntimeError(f"Cả {MAX_PROFILE_SLOTS} slot profile {base} đều đang được dùng")
+
+
+class PersistentBrowser:
+    """Thay cho Browser khi chạy persistent context: close() đóng context và nhả khóa profile"""
+
+    def __init__(self, context, lock: ProfileLock):
+        self.context = context
+        self.lock = lock
+
+    @property
+    def user_data_dir(self) -> str:
+        return self.lock.directory
+
+    def close(self) -> None:
+        try:
+            self.context.close()
+        finally:
+            self.lock.release()
+
+
+def launch_persistent(playwright, browser_type: str, profile: Dict[str, Any], user_data_dir: str, **context_options):
+    """launch_persistent_context với cờ / pref của launch profile"""
+    for name in BROWSER_LOCK_FILES:
+        path = os.path.join(user_data_dir, name)
+        if os.path.lexists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    if browser_type == "chrome":
+        return playwright.chromium.launch_persistent_context(
+            user_data_dir, headless=profile["headless"], args=list(profile["chromium_args"]), **context_options
+        )
+    return playwright.firefox.launch_persistent_context(
+        user_data_dir, headless=profile["headless"], args=["--no-sandbox", "--disable-dev-shm-usage"],
+        firefox_user_prefs=dict(profile["firefox_prefs"]), **context_options
+    )
+
+
+def open_persistent_browser(playwright, browser_type: str, profile: Dict[str, Any], kind: str,
+                            **context_options) -> PersistentBrowser:
+    """Giữ một slot profile và mở persistent context trên đó"""
+    lock = acquire_profile(kind, browser_type)
+    try:
+        context = launch_persistent(playwright, browser_type, profile, lock.directory, **context_options)
+    except Exception:
+        lock.release()
+        raise
+    print(f"💾 Profile lưu cache: {lock.directory}")
+    return PersistentBrowser(context, lock)
+
+
+# Thống kê tài nguyên của lần tải trang (transferSize = 0 nhưng có nội dung → lấy từ cache)
+_RESOURCE_STATS_JS = """() => {
+    const entries = performance.getEntriesByType('resource');
+    let cached = 0, transferred = 0;
+    for (const e of entries) {
+        if (e.transferSize === 0 && e.decodedBodySize > 0) cached++;
+        transferred += e.transferSize || 0;
+    }
+    return {total: entries.length, cached, transferred};
+}"""
+
+
+def benchmark_cache(browser_type: str, url: str, runs: int = 3, profile_name: str = "lean-headless") -> Dict[str, Any]:
+    """
+    So sánh điều hướng tới url với profile mới tinh (cold) và profile đã có cache (warm).
+    Mỗi lần đo khởi động browser mới; warm dùng lại một thư mục profile đã tải trang một lần.
+
+    Returns:
+        {'cold': [...], 'warm': [...]} mỗi phần tử {'navigation_ms', 'resources', 'cached', 'transferred_kb'}
+    """
+    from playwright.sync_api import sync_playwright
+    from launch_profiles import LAUNCH_PROFILES, context_options
+
+    profile = LAUNCH_PROFILES[profile_name]
+    results: Dict[str, List[Dict[str, Any]]] = {'cold': [], 'warm': []}
+    warm_dir = tempfile.mkdtemp(prefix="fazzytool-warm-")
+
+    def measure(p, user_data_dir: str) -> Dict[str, Any]:
+        context = launch_persistent(p, browser_type, profile, user_data_dir, **context_options(profile))
+        try:
+            page = context.pages[0] if context.pages else context.new_page()
+            started = time.perf_counter()
+            page.goto(url, wait_until="load", timeout=90000)
+            navigation_ms = (time.perf_counter() - started) * 1000
+            stats = page.evaluate(_RESOURCE_STATS_JS)
+            return {'navigation_ms': navigation_ms, 'resources': stats['total'],
+                    'cached': stats['cached'], 'transferred_kb': stats['transferred'] / 1024}
+        finally:
+            context.close()
+
+    try:
+        with sync_playwright() as p:
+            for _ in range(runs):
+                cold_dir = tempfile.mkdtemp(prefix="fazzytool-cold-")
+                try:
+                    results['cold'].append(measure(p, cold_dir))
+                finally:
+                    shutil.rmtree(cold_dir, ignore_errors=True)
+
+            # Lần đầu chỉ để nạp cache
+            measure(p, warm_dir)
+            for _ in range(runs):
+                results['warm'].append(measure(p, warm_dir))
+    finally:
+        shutil.rmtree(warm_dir, ignore_errors=True)
+
+    return results
@@ -0,0 +1,288 @@
+"""
+Kiểm tra trước khi chạy batch (pre-flight): cookie đăng nhập còn hạn và đủ credits
+
+Batch lớn trước đây chỉ phát hiện cookie hết hạn hoặc hết credits khi job đầu tiên đã mở
+browser và chờ Pikaso. Pre-flight chạy hai bước rẻ trước khi bắt đầu:
+
+1. Đọc hạn cookie ngay trong file (expirationDate của Firefox / expires của Playwright).
+   GR_REFRESH hết hạn (hoặc không có cả GR_REFRESH lẫn GR_TOKEN) = phiên đăng nhập đã mất.
+2. Một request có cookie qua APIRequestContext của Playwright (không mở browser) tới
+   preflight_url: bị chuyển về trang đăng nhập / 401 / 403 = chưa đăng nhập. Số credits chỉ
+   được đọc từ JSON của preflight_credits_url theo các đường dẫn khóa cố định
+   (preflight_credits_key), không đoán từ HTML của trang: số dư sai sẽ thành giới hạn cứng
+   của batch.
+
+Không cấu hình / không đọc được credits thì không chặn batch, chỉ báo để người dùng tự kiểm tra.
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_PREFLIGHT_URL = "https://www.freepik.com/pikaso/ai-image-generator"
+PREFLIGHT_TIMEOUT_MS = 15000
+
+# GR_TOKEN là access token ngắn hạn, site tự làm mới từ GR_REFRESH khi trang chạy JS
+ACCESS_COOKIE = "GR_TOKEN"
+REFRESH_COOKIE = "GR_REFRESH"
+
+LOGIN_URL_MARKERS = ("/login", "/log-in", "/signin", "/sign-in", "id.freepik.com")
+LOGGED_OUT_MARKERS = ("Log in", "Sign up")
+
+# Đường dẫn khóa (phân cách bằng dấu chấm) tới số credits còn lại trong JSON của preflight_credits_url
+CREDIT_KEY_PATHS = ("remaining_credits", "credits.remaining", "data.remaining_credits",
+                    "data.credits.remaining", "data.credits")
+
+
+def load_preflight_config() -> Dict[str, Any]:
+    """Đọc preflight_check / preflight_url / preflight_credits_url / preflight_credits_key từ config_template.txt"""
+    config = {
+        'preflight_check': True,
+        'preflight_url': DEFAULT_PREFLIGHT_URL,
+        'preflight_credits_url': '',
+        'preflight_credits_key': list(CREDIT_KEY_PATHS)
+    }
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip()
+                    if '=' not in line:
+                        continue
+                    key, value = [part.strip() for part in line.split('=', 1)]
+                    key = key.lower()
+                    if key == 'preflight_check' and value:
+                        config['preflight_check'] = value.lower() == 'true'
+                    elif key in ('preflight_url', 'preflight_credits_url') and value:
+                        config[key] = value
+                    elif key == 'preflight_credits_key' and value:
+                        config[key] = [path.strip() for path in value.split(',') if path.strip()]
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc cấu hình pre-flight, dùng mặc định: {e}")
+    return config
+
+
+def cookie_expiry(cookie: Dict[str, Any]) -> Optional[float]:
+    """Thời điểm hết hạn (epoch giây) của cookie, None nếu là session cookie"""
+    if cookie.get('session'):
+        return None
+    for key in ('expirationDate', 'expires'):
+        value = cookie.get(key)
+        if isinstance(value, (int, float)) and value > 0:
+            return float(value)
+    return None
+
+
+def check_cookie_expiry(cookies: List[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Kiểm tra hạn cookie đăng nhập ngay trong file, không cần mạng
+
+    Returns:
+        dict: ok (False = chắc chắn phải lấy cookie mới), messages, expires_in (giây còn lại của GR_REFRESH)
+    """
+    now = time.time() if now is None else now
+    by_name = {cookie.get('name'): cookie for cookie in cookies if isinstance(cookie, dict)}
+    result = {'ok': True, 'messages': [], 'expires_in': None}
+
+    if not by_name:
+        result['ok'] = False
+        result['messages'].append("Không có cookie nào")
+        return result
+
+    refresh = by_name.get(REFRESH_COOKIE)
+    access = by_name.get(ACCESS_COOKIE)
+    if refresh is None and access is None:
+        result['ok'] = False
+        result['messages'].append(f"Thiếu cookie đăng nhập {REFRESH_COOKIE} / {ACCESS_COOKIE}")
+        return result
+
+    if refresh is not None:
+        expires = cookie_expiry(refresh)
+        if expires is not None:
+            result['expires_in'] = expires - now
+            if expires <= now:
+                result['ok'] = False
+                result['messages'].append(f"{REFRESH_COOKIE} đã hết hạn lúc {_format_time(expires)}")
+            elif expires - now < 24 * 3600:
+                result['messages'].append(f"{REFRESH_COOKIE} sẽ hết hạn trong {(expires - now) / 3600:.1f} giờ")
+    elif access is not None:
+        expires = cookie_expiry(access)
+        if expires is not None and expires <= now:
+            result['ok'] = False
+            result['messages'].append(f"{ACCESS_COOKIE} đã hết hạn và không có {REFRESH_COOKIE} để làm mới")
+
+    if result['ok'] and access is not None and refresh is not None:
+        expires = cookie_expiry(access)
+        if expires is not None and expires <= now:
+            result['messages'].append(f"{ACCESS_COOKIE} đã hết hạn, Pikaso sẽ làm mới từ {REFRESH_COOKIE}")
+
+    return result
+
+
+def to_playwright_cookies(cookies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Cookie Firefox/Playwright → dạng storage_state của Playwright (đủ các trường bắt buộc)"""
+    same_site = {'lax': 'Lax', 'strict': 'Strict', 'none': 'None', 'no_restriction': 'None'}
+    converted = []
+    for cookie in cookies:
+        try:
+            converted.append({
+                'name': cookie['name'],
+                'value': cookie['value'],
+                'domain': cookie.get('domain', '.freepik.com'),
+                'path': cookie.get('path', '/'),
+                'expires': cookie_expiry(cookie) or -1,
+                'httpOnly': bool(cookie.get('httpOnly', False)),
+                'secure': bool(cookie.get('secure', False)),
+                'sameSite': same_site.get(str(cookie.get('sameSite', 'lax')).lower(), 'Lax')
+            })
+        except KeyError:
+            continue
+    return converted
+
+
+def check_session(cookies: List[Dict[str, Any]], url: str = DEFAULT_PREFLIGHT_URL,
+                  credits_url: str = "", credit_keys: Sequence[str] = CREDIT_KEY_PATHS,
+                  timeout_ms: int = PREFLIGHT_TIMEOUT_MS) -> Dict[str, Any]:
+    """
+    Một request có cookie (không mở browser) để xác nhận phiên đăng nhập, thêm một request
+    tới credits_url (nếu có) để đọc credits
+
+    Returns:
+        dict: authenticated (True / False / None = không xác định), credits (int hoặc None), detail
+    """
+    result = {'authenticated': None, 'credits': None, 'detail': ''}
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError as e:
+        result['detail'] = f"không có Playwright ({e})"
+        return result
+
+    try:
+        with sync_playwright() as p:
+            request = p.request.new_context(
+                storage_state={'cookies': to_playwright_cookies(cookies), 'origins': []},
+                timeout=timeout_ms
+            )
+            try:
+                response = request.get(url, max_redirects=5)
+                final_url = response.url.lower()
+                body = response.text() if response.ok else ""
+
+                if response.status in (401, 403) or any(marker in final_url for marker in LOGIN_URL_MARKERS):
+                    result['authenticated'] = False
+                    result['detail'] = f"HTTP {response.status} → {response.url}"
+                elif not response.ok:
+                    result['detail'] = f"HTTP {response.status}"
+                elif all(marker in body for marker in LOGGED_OUT_MARKERS):
+                    # Trang render sẵn nút Log in / Sign up: GR_TOKEN có thể chỉ hết hạn, để browser làm mới
+                    result['detail'] = "trang hiển thị nút đăng nhập (token có thể cần làm mới)"
+                else:
+                    result['authenticated'] = True
+
+                if credits_url and result['authenticated']:
+                    credits_response = request.get(credits_url, max_redirects=5)
+                    if credits_response.ok:
+                        result['credits'] = parse_credits(credits_response.text(), credit_keys)
+                    elif credits_response.status in (401, 403):
+                        result['authenticated'] = False
+                        result['detail'] = f"HTTP {credits_response.status} khi đọc credits"
+            finally:
+                request.dispose()
+    except Exception as e:
+        result['detail'] = str(e).strip().splitlines()[0] if str(e).strip() else repr(e)
+
+    return result
+
+
+def parse_credits(body: str, key_paths: Sequence[str] = CREDIT_KEY_PATHS) -> Optional[int]:
+    """Số credits còn lại trong JSON theo đường dẫn khóa đầu tiên có giá trị số, None nếu không có"""
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        return None
+    for path in key_paths:
+        value = data
+        for key in path.split('.'):
+            value = value.get(key) if isinstance(value, dict) else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+            return int(value)
+    return None
+
+
+def read_credit_balance(cookies: List[Dict[str, Any]], config: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """Số credits hiện tại (một request, không mở browser), None nếu không đọc được"""
+    config = config or load_preflight_config()
+    if not config.get('preflight_credits_url'):
+        return None
+    session = check_session(cookies, config.get('preflight_url') or DEFAULT_PREFLIGHT_URL,
+                            config['preflight_credits_url'],
+                            config.get('preflight_credits_key') or CREDIT_KEY_PATHS)
+    return session['credits']
+
+
+def run_preflight(cookies: List[Dict[str, Any]], required_credits: int, remote: bool = True,
+                  config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Chạy pre-flight cho một batch
+
+    Args:
+        required_credits: Credits ước tính của batch
+        remote: False = chỉ kiểm tra hạn cookie (vd. --dry-run)
+
+    Returns:
+        dict: ok (False = dừng batch), credits (số credits đọc được hoặc None),
+              enough_credits (False khi credits < required_credits), messages
+    """
+    config = config or load_preflight_config()
+    result = {'ok': True, 'credits': None, 'enough_credits': True, 'messages': []}
+    if not config.get('preflight_check', True):
+        return result
+
+    print("🛫 Pre-flight: kiểm tra cookie và credits...")
+    local = check_cookie_expiry(cookies)
+    result['messages'].extend(local['messages'])
+    for message in local['messages']:
+        print(f"   {'❌' if not local['ok'] else '⚠️'} {message}")
+    if not local['ok']:
+        result['ok'] = False
+        return result
+
+    if not remote:
+        print("   ✅ Cookie còn hạn (bỏ qua kiểm tra qua mạng)")
+        return result
+
+    started = time.monotonic()
+    session = check_session(cookies, config.get('preflight_url') or DEFAULT_PREFLIGHT_URL,
+                            config.get('preflight_credits_url', ''),
+                            config.get('preflight_credits_key') or CREDIT_KEY_PATHS)
+    elapsed = time.monotonic() - started
+
+    if session['authenticated'] is False:
+        result['ok'] = False
+        result['messages'].append(f"Phiên đăng nhập không hợp lệ: {session['detail']}")
+        print(f"   ❌ Phiên đăng nhập không hợp lệ ({session['detail']})")
+        return result
+
+    if session['authenticated'] is None:
+        result['messages'].append(f"Không xác nhận được phiên đăng nhập: {session['detail']}")
+        print(f"   ⚠️ Không xác nhận được phiên đăng nhập ({session['detail']}), vẫn tiếp tục")
+    else:
+        print(f"   ✅ Phiên đăng nhập hợp lệ ({elapsed:.1f}s)")
+
+    result['credits'] = session['credits']
+    if session['credits'] is None:
+        reason = "không đọc được từ preflight_credits_url" if config.get('preflight_credits_url') \
+            else "chưa cấu hình preflight_credits_url"
+        print(f"   ⚠️ Không biết số credits ({reason}), hãy tự kiểm tra (cần ~{required_credits})")
+    elif session['credits'] < required_credits:
+        result['enough_credits'] = False
+        print(f"   ⚠️ Credits còn {session['credits']}, batch cần ~{required_credits}")
+    else:
+        print(f"   ✅ Credits còn {session['credits']} (batch cần ~{required_credits})")
+
+    return result
+
+
+def _format_time(timestamp: float) -> str:
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp))
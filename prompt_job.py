@@ -0,0 +1,227 @@
+"""
+Mô hình job / kết quả gọn cho batch: PromptJob, JobResult, BatchJob
+
+Job được giữ trong bộ nhớ và chuyển thẳng xuống lớp generator (không ghi prompt ra file
+tạm). Các lớp dùng dataclass slots=True nên mỗi đối tượng không mang __dict__; loại
+prompt / media / trạng thái là enum (một đối tượng dùng chung cho mọi job). Chuỗi
+prompt chỉ được giữ một lần trong PromptJob, JobResult chỉ tham chiếu tới job.
+
+Khi ghi báo cáo, to_dict() chỉ ghi các trường khác mặc định; cookie và toàn bộ config
+không bao giờ được ghi ra.
+"""
+
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class PromptType(str, Enum):
+    """Nguồn của prompt trong prompts_template.txt (hoặc file prompt đơn)"""
+    AI_IDEA = "ai_idea"
+    DETAILED = "detailed"
+    JSON = "json"
+    FILE = "file"
+
+
+class MediaType(str, Enum):
+    IMAGE = "image"
+    VIDEO = "video"
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    SUCCESS = "success"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+
+@dataclass(slots=True)
+class PromptJob:
+    """Một prompt cần sinh: nội dung (prompt ảnh, hoặc prompt video với job video) và tùy chọn sinh"""
+
+    content: str
+    prompt_id: str = ""
+    kind: PromptType = PromptType.DETAILED
+    media: MediaType = MediaType.IMAGE
+    use_ai: bool = False
+    num_images: int = 4
+    download_count: Optional[int] = None
+    filename_prefix: Optional[str] = None
+    style: str = ""
+    video_prompt: str = ""
+    duration: str = "5s"
+    ratio: str = "1:1"
+    ai_topic: Optional[str] = None
+    # Batch spec (batch_config.json): priority nhỏ chạy trước; source = file prompt chưa đọc
+    priority: int = 0
+    source: Optional[str] = None
+
+    @classmethod
+    def from_prompt_data(cls, data: Dict[str, Any], **options) -> "PromptJob":
+        """Từ dict của PromptLoader / Gemini (image_prompt, video_prompt, video_duration, video_ratio)"""
+        prompt = data.get("prompt", "")
+        return cls(
+            content=data.get("image_prompt") or prompt,
+            kind=PromptType.FILE,
+            video_prompt=data.get("video_prompt") or prompt,
+            duration=data.get("video_duration") or "5s",
+            ratio=data.get("video_ratio") or "1:1",
+            **options
+        )
+
+    @property
+    def video_text(self) -> str:
+        """Prompt dùng khi sinh video (prompt chỉ có một nội dung thì dùng chung)"""
+        return self.video_prompt or self.content
+
+    @property
+    def loaded(self) -> bool:
+        """Đã có nội dung prompt (job từ file của batch spec chỉ được đọc khi tới lượt chạy)"""
+        return bool(self.content) or not self.source
+
+    def as_video(self) -> "PromptJob":
+        """Bản sao job video từ cùng prompt (nội dung là prompt video)"""
+        return replace(self, content=self.video_text, media=MediaType.VIDEO)
+
+    def as_item(self) -> Dict[str, Any]:
+        """Prompt item dạng dict cho các hàm sinh dùng chung với lệnh đơn (image, video, pipeline)"""
+        return {
+            "content": self.content,
+            "num_images": self.num_images,
+            "download_count": self.download_count,
+            "filename_prefix": self.filename_prefix,
+            "duration": self.duration,
+            "ratio": self.ratio
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Bản ghi báo cáo: chỉ các trường khác mặc định"""
+        data = {"id": self.prompt_id, "type": self.kind.value, "media": self.media.value, "content": self.content}
+        if self.use_ai:
+            data["use_ai"] = True
+            if self.ai_topic:
+                data["ai_topic"] = self.ai_topic
+        if self.media is MediaType.IMAGE:
+            data["num_images"] = self.num_images
+            if self.download_count is not None and self.download_count != self.num_images:
+                data["download_count"] = self.download_count
+        else:
+            data["duration"] = self.duration
+            data["ratio"] = self.ratio
+        if self.filename_prefix and self.filename_prefix != self.prompt_id:
+            data["filename_prefix"] = self.filename_prefix
+        if self.style:
+            data["style"] = self.style
+        if self.priority:
+            data["priority"] = self.priority
+        if self.source:
+            data["source"] = self.source
+        return data
+
+
+@dataclass(slots=True)
+class JobResult:
+    """Kết quả của một job (một ảnh / một video / một biến thể video)"""
+
+    job: PromptJob
+    media: MediaType
+    status: JobStatus = JobStatus.PENDING
+    files: Tuple[str, ...] = ()
+    error: Optional[str] = None
+    variant: Optional[str] = None
+    source_image: Optional[str] = None
+
+    @classmethod
+    def succeeded(cls, job: PromptJob, media: MediaType, files, **extra) -> "JobResult":
+        return cls(job, media, JobStatus.SUCCESS, tuple(files), **extra)
+
+    @classmethod
+    def failed(cls, job: PromptJob, media: MediaType, error: Optional[str] = None, **extra) -> "JobResult":
+        return cls(job, media, JobStatus.FAILED, error=error, **extra)
+
+    @classmethod
+    def skipped(cls, job: PromptJob, media: MediaType, error: Optional[str] = None, **extra) -> "JobResult":
+        """Job không được chạy (batch dừng vì hết credits), sẽ chạy lại khi --resume"""
+        return cls(job, media, JobStatus.SKIPPED, error=error, **extra)
+
+    @property
+    def ok(self) -> bool:
+        return self.status is JobStatus.SUCCESS
+
+    @property
+    def path(self) -> Optional[str]:
+        return self.files[0] if self.files else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"prompt_id": self.job.prompt_id, "type": self.media.value, "status": self.status.value}
+        if self.files:
+            data["files"] = list(self.files)
+        if self.variant:
+            data["variant"] = self.variant
+        if self.source_image:
+            data["source_image"] = self.source_image
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+# Khóa config có ích khi đọc lại báo cáo (không ghi api_key hay cấu hình khác)
+REPORT_CONFIG_KEYS = ("browser", "min_concurrent", "max_concurrent", "delay_between_requests",
+                      "pipeline_depth", "video_handoff", "video_variants", "ai_prefetch_depth",
+                      "credit_budget", "credit_check_every", "max_retries")
+
+
+@dataclass(slots=True)
+class BatchJob:
+    """Một batch: danh sách prompt (mỗi prompt giữ một lần) cùng cấu hình và cookie để chạy"""
+
+    prompts: List[PromptJob]
+    config: Dict[str, Any]
+    cookies: List[Dict] = field(default_factory=list)
+    available_images: List[str] = field(default_factory=list)
+    workflow: str = "unknown"
+    timestamp: str = field(default_factory=lambda: datetime.now().strftime('%Y%m%d_%H%M%S'))
+    status: JobStatus = JobStatus.PENDING
+    # batch_config.json nếu batch được định nghĩa bằng batch spec (chạy qua hàng đợi ưu tiên)
+    spec_file: Optional[str] = None
+    name: str = ""
+    image_prompts: List[PromptJob] = field(init=False)
+    video_prompts: List[PromptJob] = field(init=False)
+
+    def __post_init__(self):
+        # Hai danh sách chỉ tham chiếu tới các PromptJob trong prompts
+        self.image_prompts = [p for p in self.prompts if p.media is MediaType.IMAGE]
+        self.video_prompts = [p for p in self.prompts if p.media is MediaType.VIDEO]
+
+    @property
+    def total_items(self) -> int:
+        return len(self.prompts)
+
+    @property
+    def total_images_to_generate(self) -> int:
+        return sum(p.num_images for p in self.image_prompts)
+
+    @property
+    def total_images_to_download(self) -> int:
+        return sum(p.num_images if p.download_count is None else p.download_count for p in self.image_prompts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Thông tin job cho báo cáo: không có cookie, chỉ vài khóa config, mỗi prompt ghi một lần"""
+        data = {
+            "timestamp": self.timestamp,
+            "workflow": self.workflow,
+            "status": self.status.value,
+            "config": {key: self.config[key] for key in REPORT_CONFIG_KEYS if key in self.config},
+            "total_items": self.total_items,
+            "image_prompts": len(self.image_prompts),
+            "video_prompts": len(self.video_prompts),
+            "available_images": len(self.available_images),
+            "total_images_to_generate": self.total_images_to_generate,
+            "total_images_to_download": self.total_images_to_download,
+            "prompts": [p.to_dict() for p in self.prompts]
+        }
+        if self.spec_file:
+            data["spec_file"] = self.spec_file
+            data["name"] = self.name
+        return data
@@ -8,8 +8,6 @@ import os
 from pathlib import Path
 from typing import Dict, Any, Optional
 
-from docx import Document
-
 
 class PromptLoader:
     """Lớp xử lý việc đọc prompt từ nhiều định dạng file khác nhau."""
@@ -47,6 +45,9 @@ class PromptLoader:
     def load_from_docx(file_path: str) -> str:
         """Đọc prompt từ file Word (.docx)."""
         try:
+            # Import trễ: python-docx chỉ cần khi đọc file .docx
+            from docx import Document
+            
             doc = Document(file_path)
             content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
             return content.strip()
@@ -0,0 +1,165 @@
+"""
+Mở rộng trước (prefetch) các PROMPT_IDEA qua Gemini, chạy trước browser worker vài job
+
+Trong batch, mỗi item ai_idea phải chờ Gemini rồi mới sinh ảnh nên Gemini và browser
+thay nhau ngồi chờ. PromptPrefetcher chạy một thread producer đi theo thứ tự item, gọi
+Gemini cho các item use_ai và giữ prompt đã mở rộng trong bộ đệm tối đa ai_prefetch_depth
+item chưa được lấy. Browser worker (consumer) lấy item theo index bằng get(); trừ lúc
+đầu batch, prompt thường đã sẵn khi worker cần.
+
+Gemini lỗi (hết quota, sai key, ...) thì dùng prompt thủ công (fallback); nếu cả fallback
+cũng hỏng, get() báo PromptExpansionError (hoặc trả về ý tưởng gốc khi keep_original=True).
+"""
+
+import dataclasses
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from prompt_job import PromptJob
+
+DEFAULT_PREFETCH_DEPTH = 3
+
+
+class PromptExpansionError(Exception):
+    """Không mở rộng được ý tưởng AI (Gemini và prompt thủ công đều lỗi)"""
+
+
+class PromptPrefetcher:
+    """Bộ đệm giới hạn các item đã được Gemini mở rộng, lấy theo index của batch"""
+
+    def __init__(self, items: Sequence[PromptJob], depth: int = DEFAULT_PREFETCH_DEPTH,
+                 fallback: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None):
+        """
+        Args:
+            items: Danh sách prompt của batch (chỉ item use_ai được mở rộng)
+            depth: Số item mở rộng trước tối đa chưa được lấy (0 = mở rộng ngay lúc get)
+            fallback: Hàm topic → prompt_data khi Gemini lỗi (vd. create_manual_prompt)
+        """
+        self.items = list(items)
+        self.depth = max(0, depth)
+        self.fallback = fallback
+        self.expanded = 0
+        self.wait_seconds = 0.0
+        self._pending = [index for index, item in enumerate(self.items) if item.use_ai]
+        self._ready: Dict[int, Tuple[PromptJob, Optional[str]]] = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._generator = None
+        self._generator_error: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "PromptPrefetcher":
+        """Bắt đầu thread producer (không làm gì nếu không có item AI hoặc depth = 0)"""
+        if self._pending and self.depth > 0 and self._thread is None:
+            print(f"🔮 Prefetch Gemini: {len(self._pending)} ý tưởng, mở rộng trước tối đa {self.depth} prompt")
+            self._thread = threading.Thread(target=self._produce, name="gemini-prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def get(self, index: int, keep_original: bool = False) -> PromptJob:
+        """
+        Job thứ index, đã mở rộng nếu là ý tưởng AI (chờ producer nếu chưa xong)
+        
+        Args:
+            keep_original: Mở rộng lỗi thì trả về job gốc thay vì raise PromptExpansionError
+        """
+        item = self.items[index]
+        if not item.use_ai:
+            return item
+
+        outcome = None
+        if self._thread is not None:
+            started = time.monotonic()
+            with self._condition:
+                while index not in self._ready and not self._closed:
+                    self._condition.wait()
+                outcome = self._ready.pop(index, None)
+                self._condition.notify_all()
+
+            waited = time.monotonic() - started
+            if waited >= 0.5:
+                self.wait_seconds += waited
+                print(f"⏳ Worker chờ Gemini {waited:.1f}s cho prompt {index + 1}")
+
+        expanded, error = outcome or self._expand(item)
+        if error and not keep_original:
+            raise PromptExpansionError(error)
+        return expanded
+
+    def close(self) -> None:
+        """Dừng producer và in thống kê"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._ready.clear()
+            self._condition.notify_all()
+        if self.expanded:
+            print(f"🔮 Prefetch Gemini: đã mở rộng {self.expanded} prompt, worker chờ tổng {self.wait_seconds:.1f}s")
+
+    def __enter__(self) -> "PromptPrefetcher":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _produce(self) -> None:
+        for index in self._pending:
+            with self._condition:
+                while len(self._ready) >= self.depth and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+            expanded = self._expand(self.items[index])
+
+            with self._condition:
+                if self._closed:
+                    return
+                self._ready[index] = expanded
+                self._condition.notify_all()
+
+    def _expand(self, item: PromptJob) -> Tuple[PromptJob, Optional[str]]:
+        """Gọi Gemini (hoặc fallback); trả về (bản sao job với prompt đã mở rộng, lỗi)"""
+        topic = item.content
+        prompt_data = None
+        error = None
+        try:
+            prompt_data = self._gemini().generate_prompt(topic, save_to_file=True)
+        except Exception as e:
+            error = str(e).strip().splitlines()[0]
+            print(f"⚠️ Gemini lỗi với ý tưởng '{topic[:40]}': {error}")
+            if self.fallback:
+                try:
+                    prompt_data = self.fallback(topic)
+                except Exception as fallback_error:
+                    print(f"⚠️ Lỗi tạo prompt thủ công: {fallback_error}")
+
+        if not prompt_data or not prompt_data.get('image_prompt'):
+            return item, error or "Không thể sinh prompt từ AI"
+
+        expanded = dataclasses.replace(
+            item,
+            content=prompt_data['image_prompt'],
+            ai_topic=topic,
+            video_prompt=prompt_data.get('video_prompt', ''),
+            duration=prompt_data.get('video_duration') or item.duration,
+            ratio=prompt_data.get('video_ratio') or item.ratio
+        )
+        self.expanded += 1
+        print(f"✅ Đã mở rộng ý tưởng {item.prompt_id}: {expanded.content[:80]}...")
+        return expanded, None
+
+    def _gemini(self):
+        """GeminiPromptGenerator dùng chung (tạo một lần; lỗi khởi tạo thì mọi item dùng fallback)"""
+        if self._generator is None:
+            if self._generator_error:
+                raise Exception(self._generator_error)
+            try:
+                from gemini_prompt import GeminiPromptGenerator
+                self._generator = GeminiPromptGenerator(output_dir="prompts")
+            except Exception as e:
+                self._generator_error = str(e)
+                raise
+        return self._generator
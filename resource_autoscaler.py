@@ -0,0 +1,168 @@
+"""
+Tự co giãn số slot browser chạy song song trong batch theo tài nguyên máy
+
+Mỗi slot là một browser Chromium/Firefox (vài trăm MB). Thay vì tin hoàn toàn vào
+max_concurrent, autoscaler đọc /proc/meminfo (MemAvailable), /proc/loadavg và bộ nhớ thực tế
+của các browser đang chạy (cây tiến trình dưới các Playwright driver mà slot đã đăng ký khi mở
+browser, xem browser_recycling) để quyết định số slot:
+- không bao giờ mở thêm browser khi RAM trống trừ đi phần dự trữ không đủ cho một browser nữa
+- CPU quá tải thì giảm slot (job đang chạy vẫn chạy tiếp, chỉ không mở thêm)
+- luôn nằm trong khoảng [min_concurrent, max_concurrent]
+
+Không có /proc (Windows, macOS): chạy cố định max_concurrent slot như cấu hình.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from browser_recycling import registered_driver_pids, tree_memory_bytes
+
+DEFAULT_BROWSER_MB = 400
+DEFAULT_RESERVE_MB = 1024
+DEFAULT_MAX_LOAD = 0.85
+
+
+class DispatchStopped(Exception):
+    """Item không được chạy vì batch đã dừng cấp phát (vd. hết ngân sách credits)"""
+
+
+def read_memory_available() -> Optional[int]:
+    """MemAvailable (bytes) từ /proc/meminfo, None nếu không đọc được"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def read_cpu_load() -> Optional[float]:
+    """Load trung bình 1 phút chia cho số CPU (1.0 = mọi core đều bận)"""
+    try:
+        with open('/proc/loadavg', 'r') as f:
+            return float(f.read().split()[0]) / (os.cpu_count() or 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class BrowserAutoscaler:
+    """Quyết định số browser chạy song song dựa trên RAM trống, CPU load và RSS của browser"""
+
+    def __init__(self, min_slots: int = 1, max_slots: int = 2, browser_mb: int = DEFAULT_BROWSER_MB,
+                 reserve_mb: int = DEFAULT_RESERVE_MB, max_load: float = DEFAULT_MAX_LOAD):
+        self.min_slots = max(1, min_slots)
+        self.max_slots = max(self.min_slots, max_slots)
+        self.reserve_bytes = reserve_mb * 1024 * 1024
+        self.max_load = max_load
+        # Ước lượng bộ nhớ một browser; được cập nhật theo số đo thật khi có slot đang chạy
+        self.browser_bytes = browser_mb * 1024 * 1024
+        self.target = self.min_slots
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "BrowserAutoscaler":
+        return cls(
+            min_slots=config.get('min_concurrent', 1),
+            max_slots=config.get('max_concurrent', 1),
+            browser_mb=config.get('browser_memory_mb', DEFAULT_BROWSER_MB),
+            reserve_mb=config.get('memory_reserve_mb', DEFAULT_RESERVE_MB),
+            max_load=config.get('max_cpu_load', DEFAULT_MAX_LOAD)
+        )
+
+    def measure_browsers(self, active: int) -> Optional[int]:
+        """
+        Bộ nhớ trung bình của một browser đang chạy: chỉ cây tiến trình dưới các driver đã đăng ký,
+        không tính mọi tiến trình con (worker tối ưu ảnh upload cũng là con của process này)
+        """
+        if active <= 0:
+            return None
+        total = tree_memory_bytes(registered_driver_pids())
+        if not total:
+            return None
+        per_browser = total // active
+        # Trung bình trượt: browser mới mở còn nhẹ, đừng để ước lượng tụt quá nhanh
+        self.browser_bytes = max(per_browser, (self.browser_bytes * 3 + per_browser) // 4)
+        return per_browser
+
+    def target_slots(self, active: int) -> int:
+        """Số slot mong muốn ở thời điểm hiện tại"""
+        available = read_memory_available()
+        if available is None:
+            return self.max_slots
+
+        self.measure_browsers(active)
+        load = read_cpu_load()
+        headroom = (available - self.reserve_bytes) // max(1, self.browser_bytes)
+
+        if load is not None and load > self.max_load:
+            target = active - 1
+            reason = f"CPU load {load:.2f}/core"
+        else:
+            target = active + int(headroom)
+            reason = f"RAM trống {available / 1073741824:.1f}GB, ~{self.browser_bytes // 1048576}MB/browser"
+
+        target = min(self.max_slots, max(self.min_slots, target))
+        # Ngưỡng dưới không được ép mở browser khi thật sự thiếu RAM
+        if headroom < 1:
+            target = min(target, max(active, 1))
+
+        if target != self.target:
+            arrow = "📈" if target > self.target else "📉"
+            print(f"{arrow} Slot browser: {self.target} → {target} ({reason})")
+            self.target = target
+        return target
+
+    def can_launch(self, active: int) -> bool:
+        """Có được mở thêm một browser không (luôn cho phép khi chưa có slot nào để batch tiến triển)"""
+        if active == 0:
+            return True
+        if active >= self.max_slots:
+            return False
+        return active < self.target_slots(active)
+
+
+def run_autoscaled(items: Sequence[Any], worker: Callable[[int, Any], Any], autoscaler: BrowserAutoscaler,
+                   launch_delay: float = 0,
+                   should_stop: Optional[Callable[[], bool]] = None) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Chạy worker(index, item) cho từng item với số slot song song do autoscaler quyết định.
+
+    Args:
+        should_stop: Trả về True thì ngừng cấp phát item mới (item đang chạy vẫn chạy xong)
+
+    Returns:
+        List[(kết quả, lỗi)] cùng thứ tự với items; item chưa được cấp phát có lỗi DispatchStopped
+    """
+    outcomes: List[Tuple[Any, Optional[Exception]]] = [(None, None)] * len(items)
+    pending = deque(enumerate(items))
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=autoscaler.max_slots, thread_name_prefix="fazzy-slot") as pool:
+        while pending or running:
+            if pending and should_stop and should_stop():
+                for index, _ in pending:
+                    outcomes[index] = (None, DispatchStopped("Batch đã dừng trước khi chạy item này"))
+                pending.clear()
+
+            while pending and autoscaler.can_launch(len(running)):
+                index, item = pending.popleft()
+                running[pool.submit(worker, index, item)] = index
+                # Giãn cách lần mở browser để không dồn request lên Freepik cùng lúc
+                if launch_delay and pending and not (should_stop and should_stop()):
+                    time.sleep(launch_delay)
+
+            if not running:
+                continue
+            done, _ = wait(list(running), timeout=5, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                try:
+                    outcomes[index] = (future.result(), None)
+                except Exception as e:
+                    outcomes[index] = (None, e)
+
+    return outcomes
@@ -0,0 +1,50 @@
+"""Sắp xếp batch theo credits (order_for_budget) không được làm mất prompt"""
+
+import pytest
+
+from batch_processor import BatchProcessor
+from prompt_job import BatchJob, MediaType, PromptJob
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    # Chạy trong thư mục trống để không đọc config_template.txt của máy
+    monkeypatch.chdir(tmp_path)
+    return BatchProcessor()
+
+
+def make_job(processor, images, videos):
+    prompts = [PromptJob(f"image {i}", prompt_id=f"img_{i}", num_images=4 - i % 3) for i in range(images)]
+    prompts += [PromptJob(f"video {i}", prompt_id=f"vid_{i}", media=MediaType.VIDEO) for i in range(videos)]
+    job = BatchJob(prompts=prompts, config=processor.config, workflow='image_then_video')
+    processor.prompts = prompts
+    return job
+
+
+@pytest.mark.parametrize("images, videos", [(2, 4), (4, 2), (3, 3), (0, 3)])
+def test_order_for_budget_keeps_all_prompts(processor, images, videos):
+    job = make_job(processor, images, videos)
+
+    ordered = processor.order_for_budget(job)
+
+    assert ordered.total_items == job.total_items
+    assert sorted(map(id, ordered.prompts)) == sorted(map(id, job.prompts))
+
+
+def test_order_for_budget_keeps_image_video_pairs(processor):
+    job = make_job(processor, 3, 5)
+
+    ordered = processor.order_for_budget(job)
+
+    pairs = {image.prompt_id: video.prompt_id for image, video in zip(ordered.image_prompts, ordered.video_prompts)}
+    assert pairs == {f"img_{i}": f"vid_{i}" for i in range(3)}
+    assert [p.prompt_id for p in ordered.video_prompts[3:]] == ["vid_3", "vid_4"]
+
+
+def test_checkpoint_records_unpaired_videos(processor):
+    job = make_job(processor, 2, 4)
+
+    processor.save_checkpoint(job, [])
+
+    resumed = processor.resume_batch_job(job)
+    assert resumed.total_items == job.total_items
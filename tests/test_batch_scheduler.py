@@ -0,0 +1,48 @@
+"""Thứ tự chạy và thử lại của PriorityScheduler"""
+
+from batch_scheduler import PriorityScheduler, run_prioritized
+from prompt_job import PromptJob
+from resource_autoscaler import BrowserAutoscaler
+
+
+def job(prompt_id, priority=0):
+    return PromptJob(prompt_id, prompt_id=prompt_id, priority=priority)
+
+
+def test_pop_orders_by_priority_then_file_order():
+    scheduler = PriorityScheduler([job("a", 1), job("b", 0), job("c", 1), job("d", 0)])
+
+    assert [j.prompt_id for j in scheduler.drain()] == ["b", "d", "a", "c"]
+
+
+def test_retry_requeues_behind_same_priority_until_out_of_attempts(capsys):
+    a, b, late = job("a"), job("b"), job("late", 1)
+    scheduler = PriorityScheduler([a, b, late], max_retries=1)
+
+    first, attempt = scheduler.pop()
+    assert first is a and attempt == 0
+    assert scheduler.retry(first, attempt)
+
+    # Job thử lại xếp sau job cùng priority đang chờ, trước job priority thấp hơn
+    assert [scheduler.pop() for _ in range(3)] == [(b, 0), (a, 1), (late, 0)]
+    assert not scheduler.retry(a, 1)
+    assert scheduler.retried == 1
+
+
+def test_run_prioritized_retries_failed_results():
+    scheduler = PriorityScheduler([job("ok", 1), job("flaky", 0)], max_retries=2)
+    calls = []
+
+    def worker(j):
+        calls.append(j.prompt_id)
+        if j.prompt_id == "flaky" and calls.count("flaky") < 2:
+            raise RuntimeError("tạm lỗi")
+        return j.prompt_id
+
+    outcomes = run_prioritized(scheduler, worker, BrowserAutoscaler(max_slots=1))
+
+    # Lần thử lại giữ priority 0 nên vẫn chạy trước job priority 1
+    assert calls == ["flaky", "flaky", "ok"]
+    assert [(j.prompt_id, result, error) for j, result, error in outcomes] == [
+        ("flaky", "flaky", None), ("ok", "ok", None)
+    ]
@@ -0,0 +1,28 @@
+"""Đọc batch spec (batch_config.json)"""
+
+import json
+
+import pytest
+
+from batch_processor import BatchProcessor
+
+
+def load_spec(tmp_path, monkeypatch, prompts):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "batch_config.json").write_text(
+        json.dumps({"workflow": "image_only", "prompts": prompts}), encoding="utf-8")
+    return BatchProcessor().load_batch_spec("batch_config.json")
+
+
+def test_priority_is_read_as_int(tmp_path, monkeypatch):
+    job = load_spec(tmp_path, monkeypatch, [{"content": "a", "priority": "2"}, {"content": "b"}])
+
+    assert [p.priority for p in job.prompts] == [2, 0]
+
+
+@pytest.mark.parametrize("priority", ["high", 1.5, True, None])
+def test_invalid_priority_names_the_prompt(tmp_path, monkeypatch, capsys, priority):
+    job = load_spec(tmp_path, monkeypatch, [{"content": "a"}, {"id": "bad", "content": "b", "priority": priority}])
+
+    assert job is None
+    assert "prompt 2 (bad)" in capsys.readouterr().out
@@ -0,0 +1,101 @@
+"""Giữ chỗ / quyết toán credits của batch (CreditLedger)"""
+
+import pytest
+
+from credit_ledger import CreditLedger
+from prompt_job import MediaType, PromptJob
+
+
+def image(i):
+    return PromptJob(f"image {i}", prompt_id=f"img_{i}")
+
+
+def video(i):
+    return PromptJob(f"video {i}", prompt_id=f"vid_{i}", media=MediaType.VIDEO)
+
+
+def cost(job):
+    return 10 if job.media is MediaType.VIDEO else 2
+
+
+def test_reserve_pair_is_idempotent():
+    ledger = CreditLedger(cost, budget=100)
+    pair = (image(0), video(0))
+
+    assert ledger.reserve(*pair)
+    # Video đã giữ chỗ cùng ảnh: giữ lại lần nữa không tính thêm
+    assert ledger.reserve(pair[1])
+    assert ledger.reserved == pytest.approx(12)
+
+
+def test_reserve_is_all_or_nothing_when_exhausted():
+    ledger = CreditLedger(cost, budget=20)
+    # Sổ nhận diện job theo id(): giữ tham chiếu như batch thật
+    jobs = [image(0), video(0), image(1), video(1), image(2)]
+
+    assert ledger.reserve(jobs[0], jobs[1])
+    assert not ledger.reserve(jobs[2], jobs[3])
+    assert ledger.exhausted
+    assert "img_1" in ledger.stop_reason
+    assert ledger.reserved == pytest.approx(12)
+    # Đã dừng thì job mới (kể cả rẻ) cũng không được giữ chỗ
+    assert not ledger.reserve(jobs[4])
+
+
+def test_limit_is_smaller_of_budget_and_balance():
+    assert CreditLedger(cost, budget=50, balance=30).limit == 30
+    assert CreditLedger(cost, budget=0, balance=None).limit is None
+
+
+def test_settle_charges_completed_share_and_releases_reservation():
+    ledger = CreditLedger(cost, budget=100)
+    failed, partial = image(0), video(0)
+    ledger.reserve(failed, partial)
+
+    ledger.settle(failed, False)
+    ledger.settle(partial, 0.5)
+
+    assert ledger.reserved == pytest.approx(0)
+    assert ledger.spent == pytest.approx(5)
+    assert [entry['credits'] for entry in ledger.entries] == [0, 5]
+
+
+def test_reconcile_scales_estimates_to_measured_balance():
+    readings = iter([980])
+    ledger = CreditLedger(cost, balance=1000, balance_reader=lambda: next(readings), check_every=2)
+    jobs = [video(0), video(1)]
+    ledger.reserve(*jobs)
+
+    for job in jobs:
+        ledger.settle(job, True)
+
+    # Ước tính 20, số dư giảm 20 → rate giữ nguyên, mọi entry đã đo
+    assert ledger.balance == 980
+    assert ledger.measured
+    assert ledger.rate == pytest.approx(1.0)
+    assert all(entry['measured'] for entry in ledger.entries)
+
+
+def test_reconcile_raises_rate_when_jobs_cost_more():
+    ledger = CreditLedger(cost, balance=100, balance_reader=lambda: 60, check_every=0)
+    job = video(0)
+    ledger.reserve(job)
+    ledger.settle(job, True)
+
+    assert ledger.reconcile() == 60
+
+    assert ledger.spent == pytest.approx(40)
+    assert ledger.rate == pytest.approx(4.0)
+    assert ledger.estimate(video(1)) == pytest.approx(40)
+
+
+def test_reconcile_keeps_estimate_while_balance_lags():
+    ledger = CreditLedger(cost, balance=100, balance_reader=lambda: 100, check_every=0)
+    job = video(0)
+    ledger.reserve(job)
+    ledger.settle(job, True)
+
+    ledger.reconcile()
+
+    assert ledger.spent == pytest.approx(10)
+    assert not ledger.measured
@@ -0,0 +1,83 @@
+"""Đặt ảnh đầu vào vào session (place_file) và ghi file nguyên tử"""
+
+import errno
+import json
+import os
+
+import pytest
+
+import file_placement
+from file_placement import atomic_write_json, place_file
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "input.png"
+    path.write_bytes(b"image")
+    return str(path)
+
+
+@pytest.fixture
+def no_reflink(monkeypatch):
+    monkeypatch.setattr(file_placement, "_reflink", lambda source, dest: False)
+
+
+def test_reference_never_creates_destination(tmp_path, source):
+    dest = str(tmp_path / "session" / "input.png")
+
+    assert place_file(source, dest, "reference") == (os.path.abspath(source), "reference")
+    assert not os.path.exists(dest)
+
+
+def test_copy_mode_copies(tmp_path, source):
+    dest = str(tmp_path / "copy.png")
+
+    assert place_file(source, dest, "copy") == (dest, "copy")
+    assert open(dest, "rb").read() == b"image"
+    assert not os.path.samefile(source, dest)
+
+
+def test_other_device_falls_back_to_copy(tmp_path, source, monkeypatch):
+    monkeypatch.setattr(file_placement, "_same_device", lambda source, dest_dir: False)
+    dest = str(tmp_path / "other.png")
+
+    assert place_file(source, dest, "hardlink") == (dest, "copy")
+
+
+def test_auto_uses_hard_link_without_reflink(tmp_path, source, no_reflink):
+    dest = str(tmp_path / "linked.png")
+    (tmp_path / "linked.png").write_bytes(b"stale")
+
+    assert place_file(source, dest, "auto") == (dest, "hardlink")
+    assert os.path.samefile(source, dest)
+
+
+def test_cross_device_link_error_falls_back_to_copy(tmp_path, source, no_reflink, monkeypatch):
+    def exdev(source, dest):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(file_placement.os, "link", exdev)
+    dest = str(tmp_path / "copied.png")
+
+    assert place_file(source, dest, "auto") == (dest, "copy")
+    assert open(dest, "rb").read() == b"image"
+
+
+def test_unsupported_link_falls_back_to_reference(tmp_path, source, no_reflink, monkeypatch):
+    def unsupported(source, dest):
+        raise OSError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setattr(file_placement.os, "link", unsupported)
+
+    assert place_file(source, str(tmp_path / "x.png"), "auto") == (os.path.abspath(source), "reference")
+
+
+def test_atomic_write_json_replaces_without_leftovers(tmp_path):
+    path = str(tmp_path / "info.json")
+
+    atomic_write_json(path, {"a": 1})
+    atomic_write_json(path, {"tên": "mới"})
+
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"tên": "mới"}
+    assert os.listdir(tmp_path) == ["info.json"]
@@ -0,0 +1,36 @@
+"""`main.py --help` không được import các module nặng (xem HEAVY_STARTUP_MODULES trong main.py)"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("playwright", "google.generativeai", "docx")
+
+
+def imported_modules(stderr):
+    """Tên module từ output của `python -X importtime`"""
+    modules = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def test_help_skips_heavy_imports():
+    pytest.importorskip("click")
+    pytest.importorskip("dotenv")
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "main.py", "--help"],
+        capture_output=True, text=True, cwd=REPO_DIR, timeout=60
+    )
+
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    modules = imported_modules(proc.stderr)
+    assert "click" in modules
+    heavy = sorted(name for name in modules
+                   if any(name == h or name.startswith(h + ".") for h in HEAVY_MODULES))
+    assert heavy == []
@@ -0,0 +1,155 @@
+"""HTTP API của daemon (job_server) chạy trên cổng tạm, không có worker / browser"""
+
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from urllib import error as urllib_error
+from urllib import request as urllib_request
+
+import pytest
+
+import job_server
+from job_server import JobServer, is_loopback_host
+
+
+@pytest.fixture
+def server():
+    daemon = JobServer(cookies=[])
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), daemon._make_handler())
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    daemon.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield daemon
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(server, method, path, body=None):
+    data = body.encode("utf-8") if isinstance(body, str) else body
+    req = urllib_request.Request(server.base_url + path, data=data, method=method)
+    try:
+        with urllib_request.urlopen(req, timeout=5) as resp:
+            return resp.status, resp.read().decode("utf-8")
+    except urllib_error.HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+
+def finished_job(server, messages, status="success"):
+    job = server.submit("image", {"content": "a cat"})
+    for message in messages:
+        job.add_event(message)
+    job.set_status(status)
+    return job
+
+
+def test_events_since_skips_earlier_events(server):
+    job = finished_job(server, ["one", "two", "three"])
+
+    status, body = request(server, "GET", f"/jobs/{job.id}/events?since=1")
+
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert [line.get("message") for line in lines[:-1]] == ["two", "three"]
+    assert lines[-1] == {"final": True, "status": "success"}
+
+
+@pytest.mark.parametrize("since", ["-1", "abc", "1.5"])
+def test_invalid_since_is_rejected(server, since):
+    job = finished_job(server, ["one"])
+
+    status, _ = request(server, "GET", f"/jobs/{job.id}/events?since={since}")
+
+    assert status == 400
+
+
+@pytest.mark.parametrize("body", [
+    "[]",
+    json.dumps({"type": "image", "params": ["a cat"]}),
+    json.dumps({"type": "image", "params": {}}),
+    json.dumps({"type": "audio", "params": {"content": "a cat"}}),
+    "{not json",
+])
+def test_invalid_job_bodies_are_rejected(server, body):
+    status, _ = request(server, "POST", "/jobs", body)
+
+    assert status == 400
+    assert server.jobs == {}
+
+
+def test_submitted_job_is_queued(server):
+    status, body = request(server, "POST", "/jobs", json.dumps({"type": "image", "params": {"content": "a cat"}}))
+
+    job_id = json.loads(body)["id"]
+    assert status == 202
+    assert server.jobs[job_id].status == "queued"
+    assert request(server, "GET", f"/jobs/{job_id}/result")[0] == 409
+
+
+def test_finished_jobs_expire_after_ttl(server):
+    old = finished_job(server, [])
+    old.finished_monotonic -= job_server.FINISHED_JOB_TTL_SECONDS + 1
+    recent = finished_job(server, [])
+
+    server.submit("image", {"content": "next"})
+
+    assert old.id not in server.jobs
+    assert recent.id in server.jobs
+    assert request(server, "GET", f"/jobs/{old.id}")[0] == 404
+
+
+def test_oldest_finished_jobs_evicted_over_limit(server, monkeypatch):
+    monkeypatch.setattr(job_server, "MAX_FINISHED_JOBS", 2)
+    jobs = [finished_job(server, []) for _ in range(3)]
+    running = server.submit("video", {"content": "still running"})
+    running.set_status("running")
+
+    server.submit("image", {"content": "next"})
+
+    assert [job.id in server.jobs for job in jobs] == [False, True, True]
+    assert running.id in server.jobs
+
+
+def test_failed_job_has_error_before_status(server):
+    job = server.submit("image", {"content": "a cat"})
+    server._run_image_job = lambda params: {"files": []}
+    seen = []
+    job.changed = _RecordingCondition(job, seen)
+
+    server._run_job(job)
+
+    assert seen[-1] == ("failed", "Không có file nào được tạo")
+
+
+class _RecordingCondition:
+    """Condition ghi lại (status, error) mỗi lần job báo thay đổi"""
+
+    def __init__(self, job, seen):
+        self._condition = threading.Condition()
+        self._job = job
+        self._seen = seen
+
+    def __enter__(self):
+        return self._condition.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._condition.__exit__(*exc_info)
+
+    def notify_all(self):
+        self._seen.append((self._job.status, self._job.error))
+        self._condition.notify_all()
+
+
+@pytest.mark.parametrize("host, loopback", [
+    ("127.0.0.1", True), ("localhost", True), ("::1", True), ("[::1]", True),
+    ("0.0.0.0", False), ("192.168.1.10", False), ("example.com", False),
+])
+def test_is_loopback_host(host, loopback):
+    assert is_loopback_host(host) is loopback
+
+
+def test_non_loopback_host_requires_allow_remote():
+    with pytest.raises(ValueError):
+        JobServer(cookies=[], host="0.0.0.0")
+
+    assert JobServer(cookies=[], host="0.0.0.0", allow_remote=True).host == "0.0.0.0"
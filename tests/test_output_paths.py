@@ -0,0 +1,71 @@
+"""Giữ chỗ đường dẫn đầu ra không trùng (OutputAllocator)"""
+
+import os
+import threading
+
+from output_paths import OutputAllocator, release
+
+
+def test_parallel_reservations_never_collide(tmp_path):
+    allocator = OutputAllocator("job")
+    files, dirs = [], []
+
+    def worker():
+        for _ in range(20):
+            files.append(allocator.reserve_file(str(tmp_path / "files"), "video", ".mp4"))
+            dirs.append(allocator.reserve_dir(str(tmp_path / "dirs"), "session"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(files)) == len(files) == 160
+    assert len(set(dirs)) == len(dirs) == 160
+    assert all(os.path.isfile(path) and path.endswith(".mp4") for path in files)
+    assert all(os.path.isdir(path) for path in dirs)
+
+
+def test_taken_name_is_skipped(tmp_path, monkeypatch):
+    allocator = OutputAllocator("job")
+    names = iter(["same", "same", "other"])
+    monkeypatch.setattr(allocator, "_name", lambda prefix: next(names))
+
+    first = allocator.reserve_file(str(tmp_path), "image", ".png")
+    second = allocator.reserve_file(str(tmp_path), "image", ".png")
+
+    assert os.path.basename(first) == "same.png"
+    assert os.path.basename(second) == "other.png"
+
+
+def test_taken_directory_is_skipped(tmp_path, monkeypatch):
+    allocator = OutputAllocator("job")
+    (tmp_path / "existing").mkdir()
+    names = iter(["existing", "fresh"])
+    monkeypatch.setattr(allocator, "_name", lambda prefix: next(names))
+
+    assert allocator.reserve_dir(str(tmp_path), "session") == str(tmp_path / "fresh")
+
+
+def test_tokens_increase_per_allocator():
+    allocator = OutputAllocator("abc")
+
+    tokens = [allocator.next_token() for _ in range(3)]
+
+    assert [token.split("-")[:2] for token in tokens] == [["abc", "0001"], ["abc", "0002"], ["abc", "0003"]]
+
+
+def test_release_only_removes_empty_placeholder(tmp_path):
+    allocator = OutputAllocator("job")
+    unused = allocator.reserve_file(str(tmp_path), "image", ".png")
+    written = allocator.reserve_file(str(tmp_path), "image", ".png")
+    with open(written, "wb") as f:
+        f.write(b"data")
+
+    release(unused)
+    release(written)
+    release(None)
+
+    assert not os.path.exists(unused)
+    assert os.path.exists(written)
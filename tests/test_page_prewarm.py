@@ -0,0 +1,112 @@
+"""Page chuẩn bị trước cho job video kế tiếp (PagePrewarmer) với context / page giả"""
+
+import pytest
+
+import page_prewarm
+from page_prewarm import PagePrewarmer
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.pages = []
+
+    def new_page(self):
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(page_prewarm.time, "monotonic", lambda: now[0])
+    return now
+
+
+def prepared(key=("5s", "16:9"), ttl=120):
+    prewarmer = PagePrewarmer("video", ttl_seconds=ttl)
+    context = FakeContext()
+    prewarmer.expect(key)
+    prewarmer.prepare(context, lambda page, k: None)
+    return prewarmer, context
+
+
+def test_take_returns_page_for_same_key_once(clock):
+    prewarmer, context = prepared()
+
+    assert prewarmer.take(("5s", "16:9")) is context.pages[0]
+    assert prewarmer.take(("5s", "16:9")) is None
+    assert (prewarmer.hits, prewarmer.misses) == (1, 0)
+
+
+def test_take_with_other_key_closes_page(clock):
+    prewarmer, context = prepared()
+
+    assert prewarmer.take(("10s", "9:16")) is None
+    assert context.pages[0].closed
+    assert prewarmer.misses == 1
+
+
+def test_take_after_ttl_closes_page(clock):
+    prewarmer, context = prepared(ttl=120)
+    clock[0] += 121
+
+    assert prewarmer.take(("5s", "16:9")) is None
+    assert context.pages[0].closed
+
+
+def test_expect_other_key_discards_prepared_page(clock):
+    prewarmer, context = prepared()
+
+    prewarmer.expect(("10s", "1:1"))
+
+    assert context.pages[0].closed
+    assert prewarmer.take(("5s", "16:9")) is None
+
+
+def test_prepare_keeps_fresh_page_and_replaces_stale_one(clock):
+    prewarmer, context = prepared()
+    prewarmer.prepare(context, lambda page, k: None)
+    assert len(context.pages) == 1
+
+    clock[0] += 121
+    prewarmer.prepare(context, lambda page, k: None)
+
+    assert len(context.pages) == 2
+    assert context.pages[0].closed
+    assert prewarmer.take(("5s", "16:9")) is context.pages[1]
+
+
+def test_failed_preparation_closes_page():
+    prewarmer = PagePrewarmer("video", ttl_seconds=120)
+    context = FakeContext()
+    prewarmer.expect("key")
+
+    def broken(page, key):
+        raise RuntimeError("popup")
+
+    prewarmer.prepare(context, broken)
+
+    assert context.pages[0].closed
+    assert prewarmer.take("key") is None
+
+
+def test_disabled_or_nothing_expected_does_not_open_pages():
+    context = FakeContext()
+    disabled = PagePrewarmer("video", ttl_seconds=0)
+    disabled.expect("key")
+    disabled.prepare(context, lambda page, key: None)
+    PagePrewarmer("video", ttl_seconds=120).prepare(context, lambda page, key: None)
+
+    assert context.pages == []
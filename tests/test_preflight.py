@@ -0,0 +1,81 @@
+"""Kiểm tra hạn cookie và đọc số credits của pre-flight (không cần mạng)"""
+
+import json
+
+import pytest
+
+from preflight import ACCESS_COOKIE, REFRESH_COOKIE, check_cookie_expiry, parse_credits
+
+NOW = 1_700_000_000
+
+
+def cookie(name, expires=None, session=False):
+    data = {'name': name, 'value': 'x', 'session': session}
+    if expires is not None:
+        data['expirationDate'] = expires
+    return data
+
+
+def test_valid_refresh_cookie_passes():
+    result = check_cookie_expiry([cookie(REFRESH_COOKIE, NOW + 7 * 86400)], now=NOW)
+
+    assert result['ok']
+    assert result['messages'] == []
+    assert result['expires_in'] == 7 * 86400
+
+
+def test_expired_refresh_cookie_fails():
+    result = check_cookie_expiry([cookie(REFRESH_COOKIE, NOW - 1), cookie(ACCESS_COOKIE, NOW + 60)], now=NOW)
+
+    assert not result['ok']
+    assert REFRESH_COOKIE in result['messages'][0]
+
+
+def test_refresh_cookie_expiring_soon_only_warns():
+    result = check_cookie_expiry([cookie(REFRESH_COOKIE, NOW + 3600)], now=NOW)
+
+    assert result['ok']
+    assert "1.0 giờ" in result['messages'][0]
+
+
+def test_expired_access_cookie_is_refreshed_when_refresh_is_valid():
+    result = check_cookie_expiry([cookie(REFRESH_COOKIE, NOW + 7 * 86400), cookie(ACCESS_COOKIE, NOW - 1)], now=NOW)
+
+    assert result['ok']
+    assert ACCESS_COOKIE in result['messages'][0]
+
+
+def test_expired_access_cookie_without_refresh_fails():
+    assert not check_cookie_expiry([cookie(ACCESS_COOKIE, NOW - 1)], now=NOW)['ok']
+
+
+def test_session_cookie_has_no_expiry():
+    result = check_cookie_expiry([cookie(REFRESH_COOKIE, NOW - 1, session=True)], now=NOW)
+
+    assert result['ok']
+    assert result['expires_in'] is None
+
+
+@pytest.mark.parametrize("cookies", [[], [cookie("other", NOW + 60)], ["not a cookie"]])
+def test_missing_login_cookies_fail(cookies):
+    assert not check_cookie_expiry(cookies, now=NOW)['ok']
+
+
+@pytest.mark.parametrize("body, expected", [
+    (json.dumps({'remaining_credits': 120}), 120),
+    (json.dumps({'data': {'remaining_credits': 7.9}}), 7),
+    (json.dumps({'credits': {'remaining': 0}}), 0),
+    (json.dumps({'remaining_credits': True}), None),
+    (json.dumps({'remaining_credits': -5}), None),
+    (json.dumps([1, 2]), None),
+    ("<html>", None),
+    ("", None),
+])
+def test_parse_credits(body, expected):
+    assert parse_credits(body) == expected
+
+
+def test_parse_credits_custom_key_path():
+    body = json.dumps({'user': {'wallet': {'balance': 42}}, 'remaining_credits': 1})
+
+    assert parse_credits(body, ['user.wallet.balance']) == 42
@@ -0,0 +1,91 @@
+"""Mở rộng trước ý tưởng AI (PromptPrefetcher) với Gemini giả"""
+
+import threading
+
+import pytest
+
+from prompt_job import PromptJob
+from prompt_prefetch import PromptExpansionError, PromptPrefetcher
+
+
+class FakeGemini:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.topics = []
+
+    def generate_prompt(self, topic, save_to_file=True):
+        self.topics.append(topic)
+        if topic in self.fail:
+            raise RuntimeError("quota exceeded")
+        return {'image_prompt': f"detailed {topic}", 'video_prompt': f"motion {topic}"}
+
+
+def make_prefetcher(monkeypatch, items, depth=2, fail=(), fallback=None):
+    gemini = FakeGemini(fail)
+    prefetcher = PromptPrefetcher(items, depth=depth, fallback=fallback)
+    monkeypatch.setattr(prefetcher, "_gemini", lambda: gemini)
+    return prefetcher, gemini
+
+
+def idea(topic):
+    return PromptJob(topic, prompt_id=topic, use_ai=True)
+
+
+def test_expands_ai_items_in_batch_order(monkeypatch):
+    items = [idea("a"), PromptJob("manual", prompt_id="m"), idea("b"), idea("c")]
+    prefetcher, gemini = make_prefetcher(monkeypatch, items)
+
+    with prefetcher:
+        jobs = [prefetcher.get(i) for i in range(len(items))]
+
+    assert gemini.topics == ["a", "b", "c"]
+    assert [job.content for job in jobs] == ["detailed a", "manual", "detailed b", "detailed c"]
+    assert jobs[0].ai_topic == "a" and jobs[0].video_prompt == "motion a"
+    assert prefetcher.expanded == 3
+
+
+def test_failed_expansion_uses_fallback_or_raises(monkeypatch):
+    items = [idea("bad"), idea("worse")]
+    fallback = lambda topic: {'image_prompt': f"manual {topic}"} if topic == "bad" else None
+    prefetcher, _ = make_prefetcher(monkeypatch, items, fail={"bad", "worse"}, fallback=fallback)
+
+    with prefetcher:
+        assert prefetcher.get(0).content == "manual bad"
+        with pytest.raises(PromptExpansionError):
+            prefetcher.get(1)
+
+    assert prefetcher.get(1, keep_original=True) is items[1]
+
+
+def test_depth_zero_expands_on_get_without_thread(monkeypatch):
+    prefetcher, gemini = make_prefetcher(monkeypatch, [idea("a")], depth=0)
+
+    with prefetcher:
+        assert prefetcher._thread is None
+        assert gemini.topics == []
+        assert prefetcher.get(0).content == "detailed a"
+
+
+def test_close_releases_waiting_worker_and_stops_producer(monkeypatch):
+    release = threading.Event()
+    prefetcher, gemini = make_prefetcher(monkeypatch, [idea("slow"), idea("next")], depth=1)
+    generate = gemini.generate_prompt
+
+    def slow_generate(topic, save_to_file=True):
+        if topic == "slow":
+            release.wait(5)
+        return generate(topic, save_to_file)
+
+    gemini.generate_prompt = slow_generate
+    prefetcher.start()
+    closer = threading.Timer(0.1, prefetcher.close)
+    closer.start()
+
+    # Producer còn kẹt ở "slow": close() thả worker đang chờ, worker tự mở rộng item của nó
+    assert prefetcher.get(1).content == "detailed next"
+    closer.join()
+    release.set()
+    prefetcher._thread.join(5)
+
+    assert not prefetcher._thread.is_alive()
+    assert prefetcher._ready == {}
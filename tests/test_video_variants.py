@@ -0,0 +1,27 @@
+"""Đọc cấu hình video_variants (parse_video_variants trong main.py)"""
+
+import pytest
+
+pytest.importorskip("click")
+pytest.importorskip("dotenv")
+
+from main import parse_video_variants  # noqa: E402
+
+
+def test_parses_duration_and_ratio():
+    assert parse_video_variants(["5s:16:9", " 10s:9:16 ", "5s:1:1"]) == [
+        {'duration': '5s', 'ratio': '16:9'},
+        {'duration': '10s', 'ratio': '9:16'},
+        {'duration': '5s', 'ratio': '1:1'},
+    ]
+
+
+def test_skips_blank_and_invalid_specs(capsys):
+    variants = parse_video_variants(["", "7s:16:9", "5s:4:3", "5s", "10s:16:9"])
+
+    assert variants == [{'duration': '10s', 'ratio': '16:9'}]
+    assert capsys.readouterr().out.count("Bỏ qua biến thể") == 3
+
+
+def test_empty_config_means_single_video():
+    assert parse_video_variants([]) == []
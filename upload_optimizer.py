@@ -0,0 +1,231 @@
+"""
+Tối ưu ảnh đầu vào trước khi upload cho image-to-video
+
+Ảnh PNG gốc hoặc ảnh người dùng đưa vào thường lớn hơn nhiều so với mức model video cần.
+Trước bước browser, ảnh được cắt giữa theo tỉ lệ video, thu nhỏ về cạnh dài upload_max_side
+và nén JPEG với upload_quality. Việc xử lý chạy trong process pool (song song với lúc mở
+browser) và được cache theo hash nội dung ảnh gốc trong .fazzytool/uploads.
+
+Pillow là tùy chọn: nếu chưa cài thì ảnh gốc được upload nguyên như trước.
+"""
+
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, Iterable, Optional, Tuple
+
+from file_placement import _discard, _tmp_path
+
+UPLOAD_CACHE_DIR = os.path.join(".fazzytool", "uploads")
+
+DEFAULT_UPLOAD_SETTINGS = {
+    'upload_optimize': True,
+    'upload_max_side': 1280,
+    'upload_quality': 90
+}
+
+# Ảnh nhỏ hơn ngưỡng này, đúng tỉ lệ và không vượt kích thước thì upload nguyên bản
+SMALL_FILE_BYTES = 1024 * 1024
+
+RATIO_SIZES = {
+    "1:1": (1, 1),
+    "16:9": (16, 9),
+    "9:16": (9, 16)
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_hash_memo: Dict[Tuple[str, int, float], str] = {}
+# Ảnh đang được tối ưu (theo file đích) để prepare_many() và submit() sau đó không xử lý trùng
+_in_flight: Dict[str, Future] = {}
+_warned_missing_pillow = False
+
+
+def load_upload_settings() -> Dict[str, object]:
+    """Đọc upload_optimize / upload_max_side / upload_quality từ config_template.txt"""
+    settings = dict(DEFAULT_UPLOAD_SETTINGS)
+
+    try:
+        if os.path.exists('config_template.txt'):
+            with open('config_template.txt', 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#')[0].strip()
+                    if '=' not in line:
+                        continue
+                    key, value = [part.strip() for part in line.split('=', 1)]
+                    key = key.lower()
+                    if key == 'upload_optimize':
+                        settings['upload_optimize'] = value.lower() == 'true'
+                    elif key == 'upload_max_side' and value:
+                        settings['upload_max_side'] = max(256, int(value))
+                    elif key == 'upload_quality' and value:
+                        settings['upload_quality'] = min(100, max(1, int(value)))
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc cấu hình upload, dùng mặc định: {e}")
+
+    return settings
+
+
+def pillow_available() -> bool:
+    global _warned_missing_pillow
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        if not _warned_missing_pillow:
+            print("💡 Cài Pillow (pip install Pillow) để thu nhỏ ảnh trước khi upload video")
+            _warned_missing_pillow = True
+        return False
+
+
+def target_size(ratio: Optional[str], max_side: int) -> Tuple[int, int]:
+    """Kích thước đích (rộng, cao) theo tỉ lệ video, cạnh dài bằng max_side"""
+    w, h = RATIO_SIZES.get(ratio, (1, 1))
+    if w >= h:
+        return max_side, round(max_side * h / w)
+    return round(max_side * w / h), max_side
+
+
+def optimize_image_file(source_path: str, dest_path: str, ratio: Optional[str], max_side: int, quality: int) -> Optional[str]:
+    """
+    Cắt giữa theo tỉ lệ, thu nhỏ và nén JPEG (chạy trong process con).
+
+    Returns:
+        dest_path nếu đã ghi bản tối ưu, None nếu nên upload ảnh gốc
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        width, height = image.size
+        # ratio=None (nhiều biến thể khác tỉ lệ dùng chung một lần upload): giữ nguyên khung hình
+        ratio_w, ratio_h = RATIO_SIZES.get(ratio, (width, height))
+        target_w, target_h = target_size(ratio, max_side)
+
+        # Vùng cắt giữa đúng tỉ lệ video (Pikaso cũng sẽ cắt ảnh về tỉ lệ này)
+        crop_w, crop_h = width, round(width * ratio_h / ratio_w)
+        if crop_h > height:
+            crop_w, crop_h = round(height * ratio_w / ratio_h), height
+        needs_crop = abs(crop_w - width) > 2 or abs(crop_h - height) > 2
+        needs_resize = crop_w > target_w or crop_h > target_h
+
+        if not needs_crop and not needs_resize and os.path.getsize(source_path) <= SMALL_FILE_BYTES:
+            return None
+
+        left = (image.width - crop_w) // 2
+        top = (image.height - crop_h) // 2
+        image = image.crop((left, top, left + crop_w, top + crop_h))
+        if needs_resize:
+            scale = min(target_w / crop_w, target_h / crop_h)
+            image = image.resize((max(1, round(crop_w * scale)), max(1, round(crop_h * scale))), Image.LANCZOS)
+
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        # File tạm riêng cho mỗi lần ghi: nhiều process / thread có thể cùng tối ưu một ảnh đích
+        tmp_path = _tmp_path(dest_path)
+        try:
+            image.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+        except Exception:
+            _discard(tmp_path)
+            raise
+
+    # Bản tối ưu lớn hơn ảnh gốc (ảnh gốc đã nén tốt) → upload ảnh gốc
+    if not needs_crop and os.path.getsize(tmp_path) >= os.path.getsize(source_path):
+        _discard(tmp_path)
+        return None
+
+    os.replace(tmp_path, dest_path)
+    return dest_path
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Process pool dùng chung cho mọi generator trong tiến trình"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, min(4, (os.cpu_count() or 2) - 1)))
+    return _pool
+
+
+class PendingUpload:
+    """Kết quả tối ưu ảnh đang chạy ở nền; path() chờ và trả về file nên upload"""
+
+    def __init__(self, source_path: str, future: Optional[Future] = None, ready_path: Optional[str] = None):
+        self.source_path = source_path
+        self._future = future
+        self._ready_path = ready_path
+
+    def path(self) -> str:
+        if self._future is not None:
+            try:
+                self._ready_path = self._future.result()
+            except Exception as e:
+                print(f"⚠️ Không tối ưu được ảnh upload, dùng ảnh gốc: {e}")
+                self._ready_path = None
+            self._future = None
+
+        upload_path = self._ready_path or self.source_path
+        if upload_path != self.source_path:
+            before = os.path.getsize(self.source_path)
+            after = os.path.getsize(upload_path)
+            print(f"🗜️ Ảnh upload: {before // 1024}KB → {after // 1024}KB")
+        return upload_path
+
+
+class UploadOptimizer:
+    """Chuẩn bị ảnh đầu vào cho image-to-video: thu nhỏ / nén trước khi upload, có cache"""
+
+    def __init__(self, cache_dir: str = UPLOAD_CACHE_DIR, settings: Optional[Dict[str, object]] = None):
+        self.cache_dir = cache_dir
+        self.settings = settings or load_upload_settings()
+        self.enabled = bool(self.settings['upload_optimize']) and pillow_available()
+
+    def submit(self, image_path: str, ratio: Optional[str]) -> PendingUpload:
+        """Đưa ảnh vào process pool ngay (trước khi mở browser), trả về PendingUpload"""
+        if not self.enabled or not os.path.exists(image_path):
+            return PendingUpload(image_path)
+
+        try:
+            dest_path = self._cache_path(image_path, ratio)
+            if os.path.exists(dest_path):
+                return PendingUpload(image_path, ready_path=dest_path)
+
+            future = _in_flight.get(dest_path)
+            if future is None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                future = _get_pool().submit(
+                    optimize_image_file, image_path, dest_path, ratio,
+                    self.settings['upload_max_side'], self.settings['upload_quality']
+                )
+                _in_flight[dest_path] = future
+                future.add_done_callback(lambda _: _in_flight.pop(dest_path, None))
+            return PendingUpload(image_path, future=future)
+        except Exception as e:
+            print(f"⚠️ Bỏ qua tối ưu ảnh upload: {e}")
+            return PendingUpload(image_path)
+
+    def prepare_many(self, image_paths: Iterable[str], ratio: str) -> Dict[str, PendingUpload]:
+        """Tối ưu trước cả loạt ảnh (vd. images-to-videos) để lúc upload chỉ còn lấy từ cache"""
+        return {path: self.submit(path, ratio) for path in image_paths}
+
+    def _cache_path(self, image_path: str, ratio: Optional[str]) -> str:
+        digest = self._file_hash(image_path)
+        name = f"{digest}_{(ratio or 'orig').replace(':', 'x')}_{self.settings['upload_max_side']}_q{self.settings['upload_quality']}.jpg"
+        return os.path.join(self.cache_dir, name)
+
+    @staticmethod
+    def _file_hash(image_path: str) -> str:
+        """sha256 nội dung ảnh (nhớ theo size + mtime để không hash lại trong cùng tiến trình)"""
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime)
+        if key not in _hash_memo:
+            digest = hashlib.sha256()
+            with open(image_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            _hash_memo[key] = digest.hexdigest()[:24]
+        return _hash_memo[key]
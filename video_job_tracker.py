@@ -0,0 +1,435 @@
+"""
+Theo dõi tiến độ sinh video Pikaso qua chính traffic XHR/fetch của trang
+
+Thay cho vòng lặp quét DOM với nhiều wait_for_selector chồng timeout: tracker nghe
+page.on("response"), đọc JSON trạng thái (progress, ETA, URL video) và kết thúc ngay khi
+URL video được công bố. Deadline dùng time.monotonic() nên thời gian chờ đúng như cấu hình.
+
+Click Generate đi qua click_generate(): page.expect_response() bắt đúng response POST của
+endpoint sinh video và id của job chỉ lấy từ response đó. Sau đó chỉ JSON mang đúng id này
+được đọc (trang còn poll trạng thái / lịch sử của các video khác, telemetry, ...). Chưa biết
+id thì không nhận URL video nào từ traffic; kết quả khi đó chỉ đến từ DOM probe (bỏ các video
+đã có trên trang trước khi Generate).
+
+Callback response không gọi lệnh Playwright nào; việc cần probe DOM được đánh dấu và chạy
+trong vòng lặp wait().
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
+
+from file_placement import atomic_write_bytes
+
+if TYPE_CHECKING:
+    from playwright.sync_api import Page, Response
+
+# Chỉ đọc JSON từ các request có URL chứa một trong các gợi ý này
+STATUS_URL_HINTS = ("pikaso", "video", "generat", "creation", "task", "job")
+# Response POST của lần bấm Generate: URL chứa một trong các gợi ý này (cùng với "video")
+GENERATE_URL_HINTS = ("generate", "generation", "creation", "create")
+GENERATE_RESPONSE_TIMEOUT_MS = 15000
+PROGRESS_KEYS = ("progress", "percent", "percentage", "progress_percent")
+ETA_KEYS = ("eta", "eta_seconds", "estimated_time", "remaining_time", "remaining_seconds", "time_left")
+STATUS_KEYS = ("status", "state")
+ID_KEYS = ("task_id", "job_id", "generation_id", "creation_id", "id", "uuid")
+ASSET_KEYS = ("video_url", "download_url", "asset_url", "url", "src", "video")
+FAILED_STATUSES = ("failed", "failure", "error", "rejected", "cancelled", "canceled")
+DONE_STATUSES = ("completed", "complete", "done", "finished", "success", "succeeded", "ready")
+
+# Một lần evaluate duy nhất thay cho nhiều wait_for_selector
+DOM_PROBE_JS = """
+(baseline) => {
+    const seen = new Set(baseline || []);
+    let videoSrc = null;
+    document.querySelectorAll('video, video source').forEach(el => {
+        const src = el.currentSrc || el.src || el.getAttribute('src');
+        if (src && !seen.has(src) && !videoSrc) videoSrc = src;
+    });
+    const link = Array.from(document.querySelectorAll("a[download][href], a[href*='.mp4']"))
+        .map(a => a.href).find(href => href && !seen.has(href)) || null;
+    const bar = document.querySelector("[role='progressbar'][aria-valuenow]");
+    const text = document.body ? document.body.innerText.slice(0, 5000) : '';
+    return {
+        video_src: videoSrc,
+        download_href: link,
+        download_buttons: Array.from(document.querySelectorAll('button'))
+            .filter(b => /download/i.test(b.textContent || '')).length,
+        progress: bar ? Number(bar.getAttribute('aria-valuenow')) : null,
+        failed: /generation failed|something went wrong|not enough credits/i.test(text)
+    };
+}
+"""
+
+BASELINE_JS = """
+() => {
+    const urls = [];
+    document.querySelectorAll('video, video source').forEach(el => {
+        const src = el.currentSrc || el.src || el.getAttribute('src');
+        if (src) urls.push(src);
+    });
+    document.querySelectorAll("a[download][href], a[href*='.mp4']").forEach(a => urls.push(a.href));
+    return {
+        urls: urls,
+        download_buttons: Array.from(document.querySelectorAll('button'))
+            .filter(b => /download/i.test(b.textContent || '')).length
+    };
+}
+"""
+
+
+class VideoJobTracker:
+    """Theo dõi một lần sinh video: tiến độ, ETA và URL video từ traffic trạng thái của Pikaso"""
+
+    def __init__(self, page: "Page", timeout_seconds: int = 300, dom_probe_interval: float = 5.0,
+                 status_poll_interval: float = 10.0):
+        self.page = page
+        self.timeout_seconds = timeout_seconds
+        self.dom_probe_interval = dom_probe_interval
+        self.status_poll_interval = status_poll_interval
+
+        self.job_id: Optional[str] = None
+        self.status: Optional[str] = None
+        self.progress: Optional[float] = None
+        self.reported_eta: Optional[float] = None
+        self.asset_url: Optional[str] = None
+        self.status_url: Optional[str] = None
+        self.error: Optional[str] = None
+        self.finished_without_url = False
+
+        self._started_at: Optional[float] = None
+        self._last_update_at: Optional[float] = None
+        self._baseline_urls = []
+        self._baseline_download_buttons = 0
+        self._listening = False
+        self._probe_requested = False
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.monotonic() - self._started_at if self._started_at else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """ETA do server báo, nếu không có thì ước lượng từ tốc độ tiến độ"""
+        if self.reported_eta is not None:
+            return self.reported_eta
+        if self.progress and 0 < self.progress < 100:
+            return self.elapsed_seconds * (100 - self.progress) / self.progress
+        return None
+
+    @property
+    def is_done(self) -> bool:
+        return bool(self.asset_url) or self.finished_without_url
+
+    def start(self) -> None:
+        """Ghi nhận trạng thái ban đầu và bắt đầu nghe response; gọi TRƯỚC khi click Generate"""
+        try:
+            baseline = self.page.evaluate(BASELINE_JS)
+            self._baseline_urls = baseline.get("urls", [])
+            self._baseline_download_buttons = baseline.get("download_buttons", 0)
+        except Exception:
+            pass
+
+        self.page.on("response", self._on_response)
+        self._listening = True
+        self._started_at = time.monotonic()
+        self._last_update_at = self._started_at
+
+    def click_generate(self, click: Callable[[], None],
+                       timeout_ms: int = GENERATE_RESPONSE_TIMEOUT_MS) -> None:
+        """
+        Gọi click() (bấm Generate) và lấy id của job từ response POST của endpoint sinh video.
+
+        Lỗi của click() được ném lại; không thấy response Generate thì chỉ báo và theo dõi bằng
+        DOM probe (tracker không nhận URL video từ traffic khi chưa có id).
+        """
+        if self._started_at is None:
+            self.start()
+
+        clicked = False
+        try:
+            with self.page.expect_response(self._is_generate_response, timeout=timeout_ms) as info:
+                click()
+                clicked = True
+            response = info.value
+        except Exception as e:
+            if not clicked:
+                raise
+            print(f"⚠️ Không bắt được response Generate ({str(e).splitlines()[0] if str(e) else e}), theo dõi qua trang")
+            return
+
+        try:
+            payload = response.json()
+        except Exception:
+            print("⚠️ Response Generate không phải JSON, theo dõi qua trang")
+            return
+        self._apply_payload(payload, creation=True)
+        if self.job_id:
+            print(f"🆔 Job video: {self.job_id}")
+
+    def stop(self) -> None:
+        """Gỡ listener khỏi page (page warm còn được dùng lại)"""
+        if self._listening:
+            try:
+                self.page.remove_listener("response", self._on_response)
+            except Exception:
+                pass
+            self._listening = False
+
+    def wait(self, during_wait: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Chờ tới khi URL video được công bố, job lỗi hoặc hết deadline.
+
+        Args:
+            during_wait: Việc chạy một lần giữa các lượt poll khi job đã bắt đầu sinh
+                         (vd. chuẩn bị page cho job kế tiếp); event response của page này
+                         vẫn được xử lý trong các lệnh Playwright của nó
+
+        Returns:
+            True nếu video đã sẵn sàng
+        """
+        if self._started_at is None:
+            self.start()
+
+        deadline = self._started_at + self.timeout_seconds
+        next_probe = time.monotonic() + self.dom_probe_interval
+        last_report = None
+
+        try:
+            while time.monotonic() < deadline:
+                # wait_for_timeout (không dùng time.sleep) để Playwright xử lý event response
+                self.page.wait_for_timeout(1000)
+
+                now = time.monotonic()
+                if self.error:
+                    print(f"❌ Pikaso báo lỗi sinh video: {self.error}")
+                    return False
+                if self._probe_requested:
+                    # Server báo xong nhưng chưa kèm URL: probe DOM ngay (ngoài callback response)
+                    self._probe_requested = False
+                    self._probe_dom()
+                if self.is_done:
+                    break
+
+                if during_wait is not None:
+                    task, during_wait = during_wait, None
+                    try:
+                        task()
+                    except Exception as e:
+                        print(f"⚠️ Lỗi việc chạy kèm khi chờ video: {e}")
+                    continue
+
+                # Không có cập nhật qua mạng một lúc → chủ động hỏi status URL bằng cookie của session
+                if self.status_url and now - self._last_update_at >= self.status_poll_interval:
+                    self._poll_status_url()
+
+                if now >= next_probe:
+                    self._probe_dom()
+                    next_probe = now + self.dom_probe_interval
+                    if self.is_done or self.error:
+                        continue
+
+                report = (self.status, round(self.progress or 0))
+                if report != last_report:
+                    last_report = report
+                    self._print_progress()
+
+            if self.is_done:
+                print(f"✅ Video đã được sinh ra sau {self.elapsed_seconds:.0f}s")
+                return True
+
+            print(f"⏰ Hết {self.timeout_seconds}s mà video chưa xong (tiến độ: {self.progress or 0:.0f}%)")
+            return False
+        finally:
+            self.stop()
+
+    def download(self, filepath: str) -> bool:
+        """Tải video từ asset URL bằng context.request (dùng cookie của session)"""
+        if not self.asset_url or not self.asset_url.startswith("http"):
+            return False
+
+        try:
+            response = self.page.context.request.get(self.asset_url, timeout=120000)
+            if not response.ok:
+                print(f"⚠️ Tải video lỗi HTTP {response.status}")
+                return False
+            atomic_write_bytes(filepath, response.body())
+            return True
+        except Exception as e:
+            print(f"⚠️ Lỗi tải video từ URL: {e}")
+            return False
+
+    def summary(self) -> Dict[str, Any]:
+        """Thông tin gọn để lưu vào metadata session"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": self.progress,
+            "generation_seconds": round(self.elapsed_seconds, 1),
+            "asset_url": self.asset_url
+        }
+
+    def _print_progress(self) -> None:
+        parts = [f"{self.progress:.0f}%" if self.progress is not None else "đang xử lý"]
+        if self.status:
+            parts.append(self.status)
+        eta = self.eta_seconds
+        if eta is not None:
+            parts.append(f"còn ~{eta:.0f}s")
+        print(f"⏳ Video: {' | '.join(parts)} ({self.elapsed_seconds:.0f}s)")
+
+    @staticmethod
+    def _is_generate_response(response: "Response") -> bool:
+        """Response POST (JSON) của endpoint tạo video"""
+        try:
+            request = response.request
+            if request.method != "POST" or request.resource_type not in ("xhr", "fetch"):
+                return False
+            path = response.url.lower().split("?", 1)[0]
+            return "video" in path and any(hint in path for hint in GENERATE_URL_HINTS) \
+                and "json" in (response.headers.get("content-type") or "")
+        except Exception:
+            return False
+
+    def _on_response(self, response: "Response") -> None:
+        """Đọc JSON trạng thái từ các XHR/fetch liên quan tới việc sinh video (không gọi lệnh Playwright)"""
+        try:
+            if response.request.resource_type not in ("xhr", "fetch"):
+                return
+            url = response.url.lower()
+            if not any(hint in url for hint in STATUS_URL_HINTS):
+                return
+            if "json" not in (response.headers.get("content-type") or ""):
+                return
+            if self.job_id is None and self._is_generate_response(response):
+                # Response Generate do click_generate() đọc
+                return
+
+            if self._apply_payload(response.json()):
+                self.status_url = response.url
+        except Exception:
+            # Response đã bị hủy hoặc không phải JSON hợp lệ
+            return
+
+    def _poll_status_url(self) -> None:
+        try:
+            response = self.page.context.request.get(self.status_url)
+            if response.ok:
+                self._apply_payload(response.json())
+        except Exception:
+            pass
+        self._last_update_at = time.monotonic()
+
+    def _probe_dom(self) -> None:
+        """Fallback khi không đọc được traffic trạng thái: một lần evaluate duy nhất"""
+        try:
+            state = self.page.evaluate(DOM_PROBE_JS, self._baseline_urls)
+        except Exception:
+            return
+
+        if state.get("failed"):
+            self.error = "Trang báo lỗi khi sinh video"
+            return
+        if state.get("progress") is not None and self.progress is None:
+            self.progress = float(state["progress"])
+
+        src = state.get("download_href") or state.get("video_src")
+        if src and src.startswith("http") and ".mp4" in src.lower():
+            self.asset_url = src
+        elif src or state.get("download_buttons", 0) > self._baseline_download_buttons:
+            # Có video/nút Download mới nhưng URL không tải trực tiếp được (blob, ...)
+            self.finished_without_url = True
+
+    def _apply_payload(self, payload: Any, creation: bool = False) -> bool:
+        """
+        Lấy status/progress/ETA/URL video từ JSON trạng thái.
+
+        Args:
+            creation: Response Generate bắt được trong click_generate() (id của job lấy từ đây)
+
+        Returns:
+            True nếu payload trông giống trạng thái của lần sinh video này
+        """
+        if self.job_id:
+            # Chỉ đọc phần JSON của đúng job này (bỏ payload / mục lịch sử của job khác)
+            payload = self._find_job_node(payload, depth=0)
+            if payload is None:
+                return False
+
+        fields = {}
+        self._collect_fields(payload, fields, depth=0)
+        if creation and fields.get("id"):
+            self.job_id = str(fields["id"])
+        if not any(key in fields for key in ("status", "progress", "asset_url")):
+            return bool(creation and self.job_id)
+        if fields.get("status"):
+            self.status = str(fields["status"]).lower()
+        if fields.get("progress") is not None:
+            progress = float(fields["progress"])
+            self.progress = progress * 100 if 0 < progress <= 1 else progress
+        if fields.get("eta") is not None:
+            self.reported_eta = float(fields["eta"])
+        if fields.get("asset_url"):
+            self.asset_url = fields["asset_url"]
+
+        # Chỉ tin trạng thái lỗi khi payload đúng là của job này (khớp id, hoặc có tiến độ khi chưa biết id)
+        if self.status in FAILED_STATUSES and (self.job_id or fields.get("progress") is not None):
+            self.error = fields.get("error") or self.status
+        elif self.status in DONE_STATUSES and not self.asset_url:
+            # Server báo xong nhưng chưa kèm URL: wait() probe DOM ngay ở lượt sau
+            self._probe_requested = True
+
+        self._last_update_at = time.monotonic()
+        return True
+
+    def _find_job_node(self, node: Any, depth: int) -> Optional[Dict[str, Any]]:
+        """Object JSON (giới hạn độ sâu) có một trường id bằng id của job"""
+        if depth > 4:
+            return None
+        if isinstance(node, list):
+            items = node[:50]
+        elif isinstance(node, dict):
+            for key, value in node.items():
+                if str(key).lower() in ID_KEYS and isinstance(value, (str, int)) and str(value) == self.job_id:
+                    return node
+            items = list(node.values())
+        else:
+            return None
+
+        for item in items:
+            found = self._find_job_node(item, depth + 1)
+            if found is not None:
+                return found
+        return None
+
+    def _collect_fields(self, node: Any, fields: Dict[str, Any], depth: int) -> None:
+        """Duyệt JSON (giới hạn độ sâu) để tìm các trường trạng thái quen thuộc"""
+        if depth > 4:
+            return
+
+        if isinstance(node, list):
+            for item in node[:10]:
+                self._collect_fields(item, fields, depth + 1)
+            return
+        if not isinstance(node, dict):
+            return
+
+        for key, value in node.items():
+            lower = str(key).lower()
+            if isinstance(value, (dict, list)):
+                self._collect_fields(value, fields, depth + 1)
+                continue
+
+            if lower in STATUS_KEYS and isinstance(value, str) and "status" not in fields:
+                fields["status"] = value
+            elif lower in PROGRESS_KEYS and isinstance(value, (int, float)) and "progress" not in fields:
+                fields["progress"] = value
+            elif lower in ETA_KEYS and isinstance(value, (int, float)) and "eta" not in fields:
+                fields["eta"] = value
+            elif lower in ID_KEYS and isinstance(value, (str, int)) and "id" not in fields:
+                fields["id"] = value
+            elif lower in ("error", "message") and isinstance(value, str) and "error" not in fields:
+                fields["error"] = value
+            elif lower in ASSET_KEYS and isinstance(value, str) and ".mp4" in value.lower():
+                # Chưa biết id thì không biết URL thuộc job nào → không nhận
+                if self.job_id:
+                    fields.setdefault("asset_url", value)